@@ -3,10 +3,21 @@
 import io
 import base64
 import json
+import asyncio
+import copy
+import functools
 import re
 from PIL import Image
 import requests
 
+from http_client import get_http_client, load_httpx
+from app_logging import get_logger
+from tracing import span
+from openai_usage import record_usage
+
+openai_log = get_logger("openai")
+analyzer_log = get_logger("analyzer")
+
 
 class ImageProcessor:
     """圖片預處理器（不變）"""
@@ -62,9 +73,10 @@ class PromptBuilder:
 請在回應的最後，以 JSON 格式提供完整的分析結果。"""
     
     @staticmethod
+    @functools.lru_cache(maxsize=16)
     def build_analysis_prompt(question: str = None) -> str:
         """
-        建構分析 prompt
+        建構分析 prompt（相同問題只組一次；預設 prompt 在 fork 前建好，各 worker 共用）
         
         Args:
             question: 自定義問題（如果為 None，使用預設問題）
@@ -301,27 +313,34 @@ class DataExtractor:
 
 
 class OpenAIAnalyzer:
-    """OpenAI 分析器"""
+    """OpenAI 分析器（透過共用 HttpClient 連線池；a 開頭的方法為 async 版本）"""
     
-    def __init__(self, api_key: str, model: str = "gpt-4o"):
+    def __init__(self, api_key: str, model: str = "gpt-4o", http_client=None):
         self.api_key = api_key
         self.model = model
         self.api_url = "https://api.openai.com/v1/chat/completions"
+        self.http = http_client or get_http_client()
     
-    def describe_image(self, image_base64: str) -> str:
-        """
-        第一階段：描述圖片內容（純文字描述）
-        這個階段只要求 AI 描述看到的內容，不會被安全過濾拒絕
-        
-        Args:
-            image_base64: base64 編碼的圖片
-            
-        Returns:
-            AI 對圖片的文字描述
-        """
+    def for_model(self, model: str = None) -> "OpenAIAnalyzer":
+        """回傳使用指定模型的分析器（共用 HTTP client；預算超出時改用較便宜的模型）"""
+        if not model or model == self.model:
+            return self
+        clone = copy.copy(self)
+        clone.model = model
+        return clone
+    
+    # ------------------------------------------------------------------
+    # Payload 與回應處理（同步 / async 共用）
+    # ------------------------------------------------------------------
+    def _headers(self) -> dict:
         if not self.api_key:
             raise ValueError("OpenAI API key 未設置")
-        
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+    
+    def _describe_payload(self, image_base64: str) -> dict:
         prompt = """請仔細觀察這張 Instagram 帳號截圖，用文字詳細描述截圖中顯示的所有文字和數字資訊。
 
 這是一個公開的社交媒體截圖，請描述你看到的：
@@ -352,74 +371,14 @@ class OpenAIAnalyzer:
                 }
             }
         ]
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        payload = {
+        return {
             "model": self.model,
             "messages": [{"role": "user", "content": content}],
             "max_tokens": 1000,
             "temperature": 0.3  # 較低溫度，確保描述準確
         }
-        
-        print("[OpenAI] 第一階段：描述圖片內容...")
-        
-        try:
-            response = requests.post(
-                self.api_url, 
-                headers=headers, 
-                json=payload, 
-                timeout=60
-            )
-            
-            if response.status_code != 200:
-                try:
-                    error_data = response.json()
-                    error_msg = error_data.get("error", {})
-                    if isinstance(error_msg, dict):
-                        error_detail = error_msg.get("message", str(error_data))
-                    else:
-                        error_detail = str(error_msg)
-                    raise ValueError(f"OpenAI API 錯誤 ({response.status_code}): {error_detail}")
-                except (json.JSONDecodeError, KeyError):
-                    raise ValueError(f"OpenAI API 請求失敗 ({response.status_code}): {response.text[:500]}")
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            if "choices" not in data or len(data["choices"]) == 0:
-                raise ValueError("OpenAI API 回應格式錯誤：缺少 choices")
-            
-            description = data["choices"][0]["message"]["content"]
-            
-            if not description:
-                raise ValueError("OpenAI API 回應為空")
-            
-            print(f"[OpenAI] ✅ 圖片描述完成，長度: {len(description)}")
-            return description
-            
-        except Exception as e:
-            print(f"[OpenAI] ❌ 圖片描述失敗: {e}")
-            raise
     
-    def generate_review_from_description(self, description: str, basic_info: dict = None) -> str:
-        """
-        第二階段：基於文字描述生成風趣短評
-        這個階段只處理文字，不會被安全過濾拒絕
-        
-        Args:
-            description: 第一階段的圖片描述
-            basic_info: 基本資訊（可選）
-            
-        Returns:
-            風趣短評（約 50 字）
-        """
-        if not self.api_key:
-            raise ValueError("OpenAI API key 未設置")
-        
-        # 構建 prompt
+    def _review_payload(self, description: str, basic_info: dict = None) -> dict:
         info_context = ""
         if basic_info:
             info_context = f"""
@@ -449,65 +408,132 @@ class OpenAIAnalyzer:
 
 請直接寫出你的短評："""
         
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        payload = {
+        return {
             "model": self.model,
             "messages": [{"role": "user", "content": prompt}],
             "max_tokens": 200,
             "temperature": 0.8  # 較高溫度，讓回應更有創意
         }
+    
+    def _analysis_payload(self, image_base64: str, question: str, max_tokens: int, temperature: float) -> dict:
+        prompt = PromptBuilder.build_analysis_prompt(question)
         
-        print("[OpenAI] 第二階段：生成風趣短評...")
-        
-        try:
-            response = requests.post(
+        content = [
+            {"type": "text", "text": prompt},
+            {
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{image_base64}"
+                }
+            }
+        ]
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": content}],
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+    
+    @staticmethod
+    def _completion(status_code: int, json_fn, text: str, stage: str, model: str) -> str:
+        """
+        檢查狀態碼並取出 choices[0].message.content（requests / httpx 回應共用）
+
+        解析出回應 JSON 後立即記錄 usage：內容為空或格式不符時 tokens 仍已計費，必須算進預算
+        """
+        if status_code != 200:
+            try:
+                error_data = json_fn()
+                error_msg = error_data.get("error", {})
+                if isinstance(error_msg, dict):
+                    error_detail = error_msg.get("message", str(error_data))
+                else:
+                    error_detail = str(error_msg)
+                raise ValueError(f"OpenAI API 錯誤 ({status_code}): {error_detail}")
+            except (json.JSONDecodeError, KeyError):
+                raise ValueError(f"OpenAI API 請求失敗 ({status_code}): {text[:500]}")
+        
+        data = json_fn()
+        record_usage(stage, model, data.get("usage") if isinstance(data, dict) else None)
+        if "choices" not in data or len(data["choices"]) == 0:
+            raise ValueError("OpenAI API 回應格式錯誤：缺少 choices")
+        
+        content = data["choices"][0]["message"]["content"]
+        if not content:
+            raise ValueError("OpenAI API 回應為空")
+        return content
+    
+    @staticmethod
+    def _clean_review(review: str) -> str:
+        review = review.strip()
+        if not review:
+            raise ValueError("OpenAI API 回應為空")
+        
+        # 清理可能的標題或前綴
+        review = re.sub(r'^(短評|評語|評論)[：:]\s*', '', review, flags=re.IGNORECASE)
+        review = re.sub(r'^\*\*.*?\*\*\s*', '', review)
+        
+        # 僅處理結尾標點，完整保留內容
+        if review and review[-1] in ['，', ',', '、']:
+            review = review[:-1]
+        if review and review[-1] not in "。.!?！？":
+            review = review + "。"
+        return review
+    
+    # ------------------------------------------------------------------
+    # 同步 API
+    # ------------------------------------------------------------------
+    def _post(self, payload: dict, timeout: float, stage: str) -> str:
+        with span(stage, model=self.model):
+            response = self.http.post(
                 self.api_url, 
-                headers=headers, 
+                headers=self._headers(), 
                 json=payload, 
-                timeout=30
+                timeout=timeout
             )
+            return self._completion(response.status_code, response.json, response.text, stage, self.model)
+    
+    def describe_image(self, image_base64: str) -> str:
+        """
+        第一階段：描述圖片內容（純文字描述）
+        這個階段只要求 AI 描述看到的內容，不會被安全過濾拒絕
+        
+        Args:
+            image_base64: base64 編碼的圖片
             
-            if response.status_code != 200:
-                try:
-                    error_data = response.json()
-                    error_msg = error_data.get("error", {})
-                    if isinstance(error_msg, dict):
-                        error_detail = error_msg.get("message", str(error_data))
-                    else:
-                        error_detail = str(error_msg)
-                    raise ValueError(f"OpenAI API 錯誤 ({response.status_code}): {error_detail}")
-                except (json.JSONDecodeError, KeyError):
-                    raise ValueError(f"OpenAI API 請求失敗 ({response.status_code}): {response.text[:500]}")
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            if "choices" not in data or len(data["choices"]) == 0:
-                raise ValueError("OpenAI API 回應格式錯誤：缺少 choices")
-            
-            review = data["choices"][0]["message"]["content"].strip()
-            
-            if not review:
-                raise ValueError("OpenAI API 回應為空")
-            
-            # 清理可能的標題或前綴
-            review = re.sub(r'^(短評|評語|評論)[：:]\s*', '', review, flags=re.IGNORECASE)
-            review = re.sub(r'^\*\*.*?\*\*\s*', '', review)
-            
-            # 僅處理結尾標點，完整保留內容
-            if review and review[-1] in ['，', ',', '、']:
-                review = review[:-1]
-            if review and review[-1] not in "。.!?！？":
-                review = review + "。"
+        Returns:
+            AI 對圖片的文字描述
+        """
+        payload = self._describe_payload(image_base64)
+        openai_log.debug("第一階段：描述圖片內容...")
+        try:
+            description = self._post(payload, timeout=60, stage="describe")
+            openai_log.debug("✅ 圖片描述完成，長度: %s", len(description))
+            return description
+        except Exception as e:
+            openai_log.error("❌ 圖片描述失敗: %s", e)
+            raise
+    
+    def generate_review_from_description(self, description: str, basic_info: dict = None) -> str:
+        """
+        第二階段：基於文字描述生成風趣短評
+        這個階段只處理文字，不會被安全過濾拒絕
+        
+        Args:
+            description: 第一階段的圖片描述
+            basic_info: 基本資訊（可選）
             
-            print(f"[OpenAI] ✅ 風趣短評生成完成: {review[:50]}...")
+        Returns:
+            風趣短評（約 50 字）
+        """
+        payload = self._review_payload(description, basic_info)
+        openai_log.debug("第二階段：生成風趣短評...")
+        try:
+            review = self._clean_review(self._post(payload, timeout=30, stage="review"))
+            openai_log.debug("✅ 風趣短評生成完成: %s...", review[:50])
             return review
-            
         except Exception as e:
-            print(f"[OpenAI] ❌ 生成短評失敗: {e}")
+            openai_log.error("❌ 生成短評失敗: %s", e)
             raise
     
     def analyze_image(
@@ -529,95 +555,81 @@ class OpenAIAnalyzer:
         Returns:
             AI 的純文字回答
         """
-        if not self.api_key:
-            raise ValueError("OpenAI API key 未設置")
-        
-        prompt = PromptBuilder.build_analysis_prompt(question)
-        
-        content = [
-            {"type": "text", "text": prompt},
-            {
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{image_base64}"
-                }
-            }
-        ]
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        payload = {
-            "model": self.model,
-            "messages": [{"role": "user", "content": content}],
-            "max_tokens": max_tokens,
-            "temperature": temperature
-        }
-        
-        print(f"[OpenAI] 調用 API: {self.model}")
-        print(f"[OpenAI] 問題: {question[:50]}...")
+        payload = self._analysis_payload(image_base64, question, max_tokens, temperature)
+        openai_log.debug("調用 API: %s", self.model)
+        openai_log.debug("問題: %s...", question[:50])
         
         try:
-            response = requests.post(
-                self.api_url, 
-                headers=headers, 
-                json=payload, 
-                timeout=90
-            )
-            
-            # 如果狀態碼不是 200，先嘗試獲取詳細錯誤信息
-            if response.status_code != 200:
-                try:
-                    error_data = response.json()
-                    error_msg = error_data.get("error", {})
-                    if isinstance(error_msg, dict):
-                        error_detail = error_msg.get("message", str(error_data))
-                    else:
-                        error_detail = str(error_msg)
-                    print(f"[OpenAI] ❌ API 錯誤詳情: {error_detail}")
-                    raise ValueError(f"OpenAI API 錯誤 ({response.status_code}): {error_detail}")
-                except (json.JSONDecodeError, KeyError):
-                    raise ValueError(f"OpenAI API 請求失敗 ({response.status_code}): {response.text[:500]}")
-            
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # 檢查回應格式
-            if "choices" not in data or len(data["choices"]) == 0:
-                raise ValueError("OpenAI API 回應格式錯誤：缺少 choices")
-            
-            raw_text = data["choices"][0]["message"]["content"]
-            
-            if not raw_text:
-                raise ValueError("OpenAI API 回應為空")
-            
-            print(f"[OpenAI] ✅ 回應長度: {len(raw_text)}")
-            
+            raw_text = self._post(payload, timeout=90, stage="analyze")
+            openai_log.debug("✅ 回應長度: %s", len(raw_text))
             return raw_text
-            
         except requests.exceptions.Timeout:
             raise ValueError("OpenAI API 請求超時（90秒），請稍後再試")
-        except requests.exceptions.HTTPError as e:
-            # 處理 HTTP 錯誤，獲取詳細信息
-            try:
-                error_data = e.response.json()
-                error_msg = error_data.get("error", {})
-                if isinstance(error_msg, dict):
-                    error_detail = error_msg.get("message", str(error_data))
-                else:
-                    error_detail = str(error_msg)
-                print(f"[OpenAI] ❌ HTTP 錯誤詳情: {error_detail}")
-                raise ValueError(f"OpenAI API 錯誤 ({e.response.status_code}): {error_detail}")
-            except:
-                raise ValueError(f"OpenAI API 請求失敗: {str(e)}")
         except requests.exceptions.RequestException as e:
             raise ValueError(f"OpenAI API 請求失敗: {str(e)}")
         except KeyError as e:
             raise ValueError(f"OpenAI API 回應格式錯誤: 缺少 {str(e)}")
         except json.JSONDecodeError as e:
             raise ValueError(f"無法解析 OpenAI API 回應: {str(e)}")
+    
+    # ------------------------------------------------------------------
+    # Async API（等待 OpenAI 時不佔用執行緒）
+    # ------------------------------------------------------------------
+    async def _apost(self, payload: dict, timeout: float, stage: str) -> str:
+        with span(stage, model=self.model):
+            response = await self.http.apost(
+                self.api_url,
+                headers=self._headers(),
+                json=payload,
+                timeout=timeout
+            )
+            return self._completion(response.status_code, response.json, response.text, stage, self.model)
+    
+    async def adescribe_image(self, image_base64: str) -> str:
+        """describe_image 的 async 版本"""
+        openai_log.debug("第一階段：描述圖片內容（async）...")
+        try:
+            description = await self._apost(self._describe_payload(image_base64), timeout=60, stage="describe")
+            openai_log.debug("✅ 圖片描述完成，長度: %s", len(description))
+            return description
+        except Exception as e:
+            openai_log.error("❌ 圖片描述失敗: %s", e)
+            raise
+    
+    async def agenerate_review_from_description(self, description: str, basic_info: dict = None) -> str:
+        """generate_review_from_description 的 async 版本"""
+        openai_log.debug("第二階段：生成風趣短評（async）...")
+        try:
+            review = self._clean_review(await self._apost(self._review_payload(description, basic_info), timeout=30, stage="review"))
+            openai_log.debug("✅ 風趣短評生成完成: %s...", review[:50])
+            return review
+        except Exception as e:
+            openai_log.error("❌ 生成短評失敗: %s", e)
+            raise
+    
+    async def aanalyze_image(
+        self,
+        image_base64: str,
+        question: str,
+        max_tokens: int = 1500,
+        temperature: float = 0.7
+    ) -> str:
+        """analyze_image 的 async 版本"""
+        httpx = load_httpx()
+        payload = self._analysis_payload(image_base64, question, max_tokens, temperature)
+        openai_log.debug("調用 API（async）: %s", self.model)
+        try:
+            raw_text = await self._apost(payload, timeout=90, stage="analyze")
+            openai_log.debug("✅ 回應長度: %s", len(raw_text))
+            return raw_text
+        except httpx.TimeoutException:
+            raise ValueError("OpenAI API 請求超時（90秒），請稍後再試")
+        except httpx.HTTPError as e:
+            raise ValueError(f"OpenAI API 請求失敗: {str(e)}")
+        except KeyError as e:
+            raise ValueError(f"OpenAI API 回應格式錯誤: 缺少 {str(e)}")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"無法解析 OpenAI API 回應: {str(e)}")
 
 
 class IGAnalyzer:
@@ -628,10 +640,11 @@ class IGAnalyzer:
         api_key: str, 
         model: str = "gpt-4o",
         max_side: int = 1280,
-        quality: int = 72
+        quality: int = 72,
+        http_client=None
     ):
         self.image_processor = ImageProcessor(max_side, quality)
-        self.openai = OpenAIAnalyzer(api_key, model)
+        self.openai = OpenAIAnalyzer(api_key, model, http_client)
         self.cleaner = ResponseCleaner()
     
     def _extract_basic_info_from_description(self, description: str) -> dict:
@@ -748,61 +761,109 @@ class IGAnalyzer:
         
         return info
     
-    def analyze_profile(self, profile_image: Image.Image) -> tuple[str, str]:
+    def analyze_profile(self, profile_image: Image.Image, model: str = None,
+                        degraded: bool = False) -> tuple[str, str]:
         """
         分析 IG 截圖（使用兩階段處理）
         
         Args:
             profile_image: IG 個人頁截圖
+            model: 覆寫預設模型（預算超出時改用較便宜的模型）
+            degraded: 只做完整分析，不描述圖片也不產生短評（短評為空字串，由呼叫端從分析中擷取）
             
         Returns:
             (完整分析文字, 風趣短評) 的元組
         """
-        print("[IGAnalyzer] 開始分析流程（兩階段處理）")
+        analyzer_log.debug("開始分析流程（兩階段處理）")
+        openai = self.openai.for_model(model)
         
         # 1. 處理圖片
-        print("[IGAnalyzer] Step 1: 處理圖片")
-        image_base64 = self.image_processor.resize_and_encode(profile_image)
+        analyzer_log.debug("Step 1: 處理圖片")
+        with span("encode"):
+            image_base64 = self.image_processor.resize_and_encode(profile_image)
+        
+        if degraded:
+            analyzer_log.info("⚠️ 預算模式：只做完整分析（%s）", openai.model)
+            raw_answer = openai.analyze_image(image_base64, PromptBuilder.DEFAULT_QUESTION)
+            return self.cleaner.clean_response(raw_answer), ""
         
         # 2. 第一階段：描述圖片內容
-        print("[IGAnalyzer] Step 2: 第一階段 - 描述圖片內容")
-        image_description = self.openai.describe_image(image_base64)
+        analyzer_log.debug("Step 2: 第一階段 - 描述圖片內容")
+        image_description = openai.describe_image(image_base64)
         
         # 3. 第二階段：基於描述生成完整分析和 JSON
-        print("[IGAnalyzer] Step 3: 第二階段 - 生成完整分析")
-        raw_answer = self.openai.analyze_image(
+        analyzer_log.debug("Step 3: 第二階段 - 生成完整分析")
+        raw_answer = openai.analyze_image(
             image_base64, 
             PromptBuilder.DEFAULT_QUESTION
         )
         
         # 4. 清理完整分析回應
-        print("[IGAnalyzer] Step 4: 清理完整分析回應")
+        analyzer_log.debug("Step 4: 清理完整分析回應")
         clean_answer = self.cleaner.clean_response(raw_answer)
         
         # 5. 從描述中提取基本資訊（用於生成更準確的短評）
-        print("[IGAnalyzer] Step 5: 從描述中提取基本資訊")
+        analyzer_log.debug("Step 5: 從描述中提取基本資訊")
         basic_info_from_desc = self._extract_basic_info_from_description(image_description)
-        print(f"[IGAnalyzer] 提取的基本資訊: {basic_info_from_desc}")
+        analyzer_log.debug("提取的基本資訊: %s", basic_info_from_desc)
         
         # 6. 第三階段：基於描述生成風趣短評
-        print("[IGAnalyzer] Step 6: 第三階段 - 生成風趣短評")
+        analyzer_log.debug("Step 6: 第三階段 - 生成風趣短評")
         try:
-            review = self.openai.generate_review_from_description(image_description, basic_info_from_desc)
+            review = openai.generate_review_from_description(image_description, basic_info_from_desc)
         except Exception as e:
-            print(f"[IGAnalyzer] ⚠️ 生成風趣短評失敗: {e}，使用備用方案")
-            import traceback
-            traceback.print_exc()
-            # 如果生成失敗，基於提取的資訊生成備用短評
-            if basic_info_from_desc and basic_info_from_desc.get('followers', 0) > 0:
-                followers = basic_info_from_desc['followers']
-                if followers < 1000:
-                    review = f"這個帳號有 {followers} 個粉絲，雖然不多但起步不錯，繼續努力說不定哪天就爆紅了（笑）"
-                elif followers < 10000:
-                    review = f"這個帳號有 {followers//1000}K 粉絲，已經算是小有名氣了，內容再精緻一點應該能吸引更多品牌合作（笑）"
-                else:
-                    review = f"這個帳號有 {followers//1000}K 粉絲，已經有一定的影響力了，建議多發 Reels 提升互動率，商業價值會更高（笑）"
-            else:
-                review = "這個帳號看起來還不錯，但 AI 偵探今天有點害羞，建議你重新上傳一張更清晰的截圖，讓我能好好分析一下（笑）"
+            analyzer_log.warning("⚠️ 生成風趣短評失敗: %s，使用備用方案", e, exc_info=e)
+            review = self._fallback_review(basic_info_from_desc)
+        
+        analyzer_log.debug("✅ 兩階段分析完成")
+        return clean_answer, review
+    
+    async def analyze_profile_async(self, profile_image: Image.Image, model: str = None,
+                                    degraded: bool = False) -> tuple[str, str]:
+        """
+        analyze_profile 的 async 版本（ASGI 模式使用）
+        
+        圖片編碼在執行緒中執行；完整分析不依賴圖片描述，兩個 OpenAI 請求同時送出
         
-        print("[IGAnalyzer] ✅ 兩階段分析完成")
-        return clean_answer, review
\ No newline at end of file
+        Returns:
+            (完整分析文字, 風趣短評) 的元組
+        """
+        analyzer_log.debug("開始分析流程（async）")
+        openai = self.openai.for_model(model)
+        with span("encode"):
+            image_base64 = await asyncio.to_thread(self.image_processor.resize_and_encode, profile_image)
+        
+        if degraded:
+            analyzer_log.info("⚠️ 預算模式：只做完整分析（%s）", openai.model)
+            raw_answer = await openai.aanalyze_image(image_base64, PromptBuilder.DEFAULT_QUESTION)
+            return self.cleaner.clean_response(raw_answer), ""
+        
+        image_description, raw_answer = await asyncio.gather(
+            openai.adescribe_image(image_base64),
+            openai.aanalyze_image(image_base64, PromptBuilder.DEFAULT_QUESTION)
+        )
+        clean_answer = self.cleaner.clean_response(raw_answer)
+        basic_info_from_desc = self._extract_basic_info_from_description(image_description)
+        analyzer_log.debug("提取的基本資訊: %s", basic_info_from_desc)
+        
+        try:
+            review = await openai.agenerate_review_from_description(image_description, basic_info_from_desc)
+        except Exception as e:
+            analyzer_log.warning("⚠️ 生成風趣短評失敗: %s，使用備用方案", e)
+            review = self._fallback_review(basic_info_from_desc)
+        
+        analyzer_log.debug("✅ 分析完成（async）")
+        return clean_answer, review
+    
+    @staticmethod
+    def _fallback_review(basic_info: dict) -> str:
+        """短評生成失敗時，基於提取的資訊生成備用短評"""
+        if basic_info and basic_info.get('followers', 0) > 0:
+            followers = basic_info['followers']
+            if followers < 1000:
+                return f"這個帳號有 {followers} 個粉絲，雖然不多但起步不錯，繼續努力說不定哪天就爆紅了（笑）"
+            elif followers < 10000:
+                return f"這個帳號有 {followers//1000}K 粉絲，已經算是小有名氣了，內容再精緻一點應該能吸引更多品牌合作（笑）"
+            else:
+                return f"這個帳號有 {followers//1000}K 粉絲，已經有一定的影響力了，建議多發 Reels 提升互動率，商業價值會更高（笑）"
+        return "這個帳號看起來還不錯，但 AI 偵探今天有點害羞，建議你重新上傳一張更清晰的截圖，讓我能好好分析一下（笑）"
\ No newline at end of file
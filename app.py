@@ -9,21 +9,50 @@ import os
 import json
 import re
 import secrets
+import sys
+import atexit
+import base64
+import contextlib
+import gc
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from urllib.parse import urlencode, urljoin
-import requests
-import firebase_admin
-from firebase_admin import credentials, auth as firebase_auth
-from flask import Flask, request, jsonify, send_from_directory, redirect
+
+# 啟動計時（/api/admin/startup 與 startup_report.py 使用）
+_BOOT_STARTED = time.perf_counter()
+
+from flask import Flask, request, jsonify, send_file, redirect, g, abort
 from flask_cors import CORS
 from PIL import Image
 import io
 import jwt
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, text
+from sqlalchemy import Column, Integer, BigInteger, String, Text, LargeBinary, DateTime, ForeignKey, Index, UniqueConstraint, text, func, or_, and_, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import declarative_base, sessionmaker, joinedload, relationship
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import declarative_base, sessionmaker, joinedload, relationship, deferred, undefer_group
 from ai_analyzer import IGAnalyzer, PromptBuilder
+from data_codec import PayloadCodec
+from migrations import Migration, MigrationRunner, add_column, create_index, extract_account_value
+from db_engines import create_db_engine, pool_metrics
+from search_index import SearchIndex, SEARCH_FIELDS
+from write_behind import WriteBehindQueue
+from ttl_cache import TTLCache, create_invalidation_channel
+from response_cache import ResponseCache
+from rate_limit import RateLimiter, RateLimitExceeded, create_rate_limit_store
+from response_compression import compress_response, compress, negotiate_encoding, encoded_etag, etag_matches, COMPRESS_MIN_SIZE
+from json_provider import FastJSONProvider
+from http_client import get_http_client
+from password_hasher import PasswordHasher, HasherBusyError
+from app_logging import setup_logging, get_logger, new_request_id, request_id_var, REQUEST_ID_HEADER
+import app_logging
+from metrics import REGISTRY
+from tracing import REQUEST_LATENCY, span, start_trace, end_trace, current_trace, instrument_engine
+from static_assets import AssetManifest, STATIC_BUILD_DIR, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+from openai_usage import BudgetPolicy, BudgetDecision, start_ledger, end_ledger, MICRO_USD
 
 # 載入 .env 檔案（如果存在）
 try:
@@ -33,8 +62,25 @@ try:
 except ImportError:
     pass  # dotenv 是可選的
 
-# 初始化 Flask 應用
-app = Flask(__name__, static_folder='static', static_url_path='/static')
+# 結構化日誌（LOG_LEVEL / LOG_FORMAT / LOG_SAMPLE_RATES，見 app_logging.py）
+setup_logging()
+init_log = get_logger("init")
+startup_log = get_logger("startup")
+db_log = get_logger("db")
+codec_log = get_logger("codec")
+search_log = get_logger("search")
+firebase_log = get_logger("firebase")
+auth_log = get_logger("auth")
+analysis_log = get_logger("analysis")
+extract_log = get_logger("extract")
+api_log = get_logger("api")
+admin_log = get_logger("admin")
+leaderboard_log = get_logger("leaderboard")
+
+# 初始化 Flask 應用（/static 由 serve_static_asset 提供預先壓縮、指紋化的版本）
+app = Flask(__name__, static_folder=None)
+# JSON：orjson 可用時使用 orjson，datetime 直接輸出 ISO 8601（見 json_provider.py）
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # 環境變數配置
@@ -48,6 +94,8 @@ PORT = int(os.getenv('PORT', 8000))
 MAX_SIDE = int(os.getenv('MAX_SIDE', 1280))
 JPEG_QUALITY = int(os.getenv('JPEG_QUALITY', 72))
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///data/results.db')
+# 唯讀 replica（可選）；未設定時讀取端點使用主資料庫
+READ_DATABASE_URL = os.getenv('READ_DATABASE_URL')
 JWT_SECRET = os.getenv('JWT_SECRET', 'dev-secret-change-me')
 JWT_EXPIRES_MINUTES = int(os.getenv('JWT_EXPIRES_MINUTES', 60 * 24))  # default 1 day
 JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
@@ -62,26 +110,86 @@ FACEBOOK_CLIENT_ID = os.getenv('FACEBOOK_CLIENT_ID')
 FACEBOOK_CLIENT_SECRET = os.getenv('FACEBOOK_CLIENT_SECRET')
 FACEBOOK_API_VERSION = os.getenv('FACEBOOK_API_VERSION', 'v18.0')
 FIREBASE_SERVICE_ACCOUNT = os.getenv('FIREBASE_SERVICE_ACCOUNT')
+# Firebase ID token 本地驗證（公開憑證快取 + 背景更新；0=改用 firebase_admin 驗證）
+FIREBASE_LOCAL_VERIFY = os.getenv('FIREBASE_LOCAL_VERIFY', '1') == '1'
+FIREBASE_PROJECT_ID = os.getenv('FIREBASE_PROJECT_ID')
+FIREBASE_CERTS_URL = os.getenv('FIREBASE_CERTS_URL')  # 未設定時使用 Google 的 x509 端點
+FIREBASE_CERTS_CACHE_PATH = os.getenv('FIREBASE_CERTS_CACHE_PATH', 'data/firebase_certs.json')
+FIREBASE_VERIFY_CACHE_TTL = float(os.getenv('FIREBASE_VERIFY_CACHE_TTL', 60))
+# 分析結果批次背景寫入（1=開啟；關閉時每次分析同步寫入）
+ANALYSIS_WRITE_BEHIND = os.getenv('ANALYSIS_WRITE_BEHIND', '0') == '1'
+WRITE_BEHIND_MAX_BATCH = int(os.getenv('WRITE_BEHIND_MAX_BATCH', 50))
+WRITE_BEHIND_MAX_DELAY_MS = int(os.getenv('WRITE_BEHIND_MAX_DELAY_MS', 50))
+WRITE_BEHIND_SPILL_PATH = os.getenv('WRITE_BEHIND_SPILL_PATH', 'data/write_behind_spill.jsonl')
+# 分析結果二進位編碼（msgpack + zstd；共享字典存在資料庫，PAYLOAD_DICT_DIR 只是本機快取）
+PAYLOAD_COMPRESSION = os.getenv('PAYLOAD_COMPRESSION', '1') == '1'
+PAYLOAD_DICT_DIR = os.getenv('PAYLOAD_DICT_DIR', 'data/codec')
+PAYLOAD_MIGRATE_ON_START = os.getenv('PAYLOAD_MIGRATE_ON_START', '0') == '1'
+# 驗證快取：已驗證的 JWT payload（到 exp 為止）與序列化後的用戶（短 TTL）
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 5000))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 60))
+# 公開讀取 API（排行榜、分析結果）的回應快取：伺服器端新鮮 / 過期仍可用秒數，與給瀏覽器、CDN 的 max-age
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 512))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 300))
+RESPONSE_CACHE_STALE = float(os.getenv('RESPONSE_CACHE_STALE', 60))
+RESPONSE_CACHE_MAX_AGE = int(os.getenv('RESPONSE_CACHE_MAX_AGE', 30))
+# 密碼雜湊：行程池大小、等待上限與 werkzeug 雜湊參數（參數變更後，用戶下次登入時自動重新雜湊）
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 1))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 16))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+# 跨 worker 快取失效通道（file:///path 或 redis://...）；未設定且 WEB_CONCURRENCY > 1 時使用 data/ 下的檔案通道，
+# 單一 worker 時只失效本 worker（多台機器請設定 redis://...）
+CACHE_INVALIDATION_URL = os.getenv('CACHE_INVALIDATION_URL', '') or (
+    'file://data/cache_invalidation.log' if int(os.getenv('WEB_CONCURRENCY', 1)) > 1 else ''
+)
+# 昂貴端點的頻率限制（見 rate_limit.py）；多 worker 共用計數請設定 sqlite:///data/ratelimit.db 或 redis://...
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMIT_STORAGE_URL = os.getenv('RATE_LIMIT_STORAGE_URL', '')
+RATE_LIMIT_ANALYZE = os.getenv('RATE_LIMIT_ANALYZE', '10/minute;100/day')  # 登入用戶（以用戶計）
+RATE_LIMIT_ANALYZE_ANON = os.getenv('RATE_LIMIT_ANALYZE_ANON', '3/minute;20/day')  # 匿名（以 IP 計）
+RATE_LIMIT_AUTH = os.getenv('RATE_LIMIT_AUTH', '10/minute;100/hour')  # 登入、註冊（以 IP 計）
+# 前方反向代理的層數（Render、nginx 後方設為 1），以 X-Forwarded-For 取得用戶端 IP；0 = 直接使用連線位址
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', 0))
+# 啟動時自動執行資料庫遷移（SQLite 單機開發預設開啟；多 worker 部署請改用 python migrate.py upgrade）
+MIGRATE_ON_START = os.getenv('MIGRATE_ON_START', '1' if DATABASE_URL.startswith('sqlite') else '0') == '1'
+
+# 啟動後以背景執行緒預先初始化資料庫檢查、Firebase 與 AI 分析器（不阻擋 /health）
+STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', '1') == '1'
+# 預先建立對外 TLS 連線（OpenAI 等）
+HTTP_WARMUP = os.getenv('HTTP_WARMUP', '1') == '1'
+# 設定時靜態檔案交給 nginx 送出（X-Accel-Redirect 的 internal location，對應 STATIC_BUILD_DIR）
+STATIC_ACCEL_PREFIX = os.getenv('STATIC_ACCEL_PREFIX', '')
+# /metrics 的 Bearer token（留空時只有管理員可讀取）
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+HTTP_WARMUP_URLS = [u.strip() for u in os.getenv('HTTP_WARMUP_URLS', 'https://api.openai.com/v1/models').split(',') if u.strip()]
 
 # 初始化 AI 分析器
 analyzer = None
+http_client = get_http_client()
 last_ai_response = None
 
 # -----------------------------------------------------------------------------
 # Database Setup
 # -----------------------------------------------------------------------------
-engine_kwargs = {}
-if DATABASE_URL.startswith('sqlite'):
-    engine_kwargs["connect_args"] = {"check_same_thread": False}
-    db_path = DATABASE_URL.replace('sqlite:///', '')
-    db_dir = os.path.dirname(db_path)
-    if db_dir and not os.path.exists(db_dir):
-        os.makedirs(db_dir, exist_ok=True)
-
-engine = create_engine(DATABASE_URL, **engine_kwargs)
+engine = create_db_engine(DATABASE_URL)
+# 唯讀端點（排行榜、結果、統計）使用的 engine：
+# 設定 READ_DATABASE_URL 時指向 replica；SQLite 另開唯讀連線池（WAL 下讀取不被寫入阻擋）
+if READ_DATABASE_URL:
+    read_engine = create_db_engine(READ_DATABASE_URL, read_only=True)
+elif DATABASE_URL.startswith('sqlite'):
+    read_engine = create_db_engine(DATABASE_URL, read_only=True)
+else:
+    read_engine = engine
+instrument_engine(engine, "primary")
+if read_engine is not engine:
+    instrument_engine(read_engine, "read")
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
 Base = declarative_base()
 firebase_app = None
+firebase_verifier = None
 
 class User(Base):
     __tablename__ = "users"
@@ -97,6 +205,11 @@ class User(Base):
     provider_data = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # keyset 分頁使用 (created_at, id) 複合索引
+    __table_args__ = (
+        Index('ix_users_created_at_id', 'created_at', 'id'),
+    )
 
 
 class AnalysisResult(Base):
@@ -107,54 +220,137 @@ class AnalysisResult(Base):
     username_key = Column(String(255), nullable=False, unique=True, index=True)
     display_name = Column(String(255))
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True, index=True)
-    data = Column(Text, nullable=False)
+    # 舊資料為 JSON 文字；新資料寫入 data_blob（data 留空字串），讀取請用 load_record_data()
+    # 完整內容延遲載入：列表查詢只讀 summary，詳情查詢用 undefer_group('payload')
+    data = deferred(Column(Text, nullable=False), group='payload')
+    data_blob = deferred(Column(LargeBinary, nullable=True), group='payload')
+    # 列表用的精簡摘要（JSON），儲存時由 build_analysis_summary() 產生
+    summary = Column(Text, nullable=True)
+    # 從 data JSON 抽出的帳號價值，供管理後台在資料庫端做範圍篩選
+    account_asset_value = Column(BigInteger, nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 關聯到 User
     user = relationship("User", backref="analyses")
+    
+    __table_args__ = (
+        Index('ix_analysis_results_created_at_id', 'created_at', 'id'),
+    )
 
-def ensure_analysis_user_column():
-    try:
-        with engine.connect() as conn:
-            dialect = engine.dialect.name
-            if dialect == 'sqlite':
-                cols = [row[1] for row in conn.execute(text("PRAGMA table_info(analysis_results)"))]
-                if 'user_id' not in cols:
-                    conn.execute(text("ALTER TABLE analysis_results ADD COLUMN user_id INTEGER"))
-                user_cols = {row[1] for row in conn.execute(text("PRAGMA table_info(users)"))}
-                if 'provider' not in user_cols:
-                    conn.execute(text("ALTER TABLE users ADD COLUMN provider TEXT"))
-                if 'provider_id' not in user_cols:
-                    conn.execute(text("ALTER TABLE users ADD COLUMN provider_id TEXT"))
-                if 'provider_data' not in user_cols:
-                    conn.execute(text("ALTER TABLE users ADD COLUMN provider_data TEXT"))
-            else:
-                conn.execute(text("ALTER TABLE analysis_results ADD COLUMN IF NOT EXISTS user_id INTEGER"))
-                conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS provider VARCHAR(50)"))
-                conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS provider_id VARCHAR(255)"))
-                conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS provider_data TEXT"))
-    except Exception as e:
-        print(f"[DB] ⚠️ 檢查/新增 user_id 欄位失敗: {e}")
+class AnalysisHistory(Base):
+    """分析快照（append-only），每次分析新增一筆，只保留關鍵指標"""
+    __tablename__ = "analysis_history"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=True)
+    username_key = Column(String(255), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    account_asset_value = Column(BigInteger)
+    post_value = Column(BigInteger)
+    story_value = Column(BigInteger)
+    reels_value = Column(BigInteger)
+    followers = Column(BigInteger)
+    # 本次分析的 OpenAI 用量（成本單位為百萬分之一美元）
+    prompt_tokens = Column(BigInteger)
+    completion_tokens = Column(BigInteger)
+    cost_micros = Column(BigInteger)
+    
+    __table_args__ = (
+        Index('ix_analysis_history_user_created', 'user_id', 'created_at'),
+        Index('ix_analysis_history_key_created', 'username_key', 'created_at'),
+    )
+
+
+class AnalysisRollup(Base):
+    """每位用戶、每個 IG 帳號的日/月彙總，寫入時同步維護"""
+    __tablename__ = "analysis_rollups"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    period = Column(String(8), nullable=False)  # 'day' / 'month'
+    period_start = Column(DateTime, nullable=False)
+    username_key = Column(String(255), nullable=False)
+    username = Column(String(255))
+    count = Column(Integer, nullable=False, default=0)
+    sum_value = Column(BigInteger, nullable=False, default=0)
+    min_value = Column(BigInteger)
+    max_value = Column(BigInteger)
+    last_value = Column(BigInteger)
+    first_at = Column(DateTime)
+    last_at = Column(DateTime)
+    
+    __table_args__ = (
+        UniqueConstraint('user_id', 'period', 'period_start', 'username_key', name='uq_analysis_rollups_period'),
+    )
+
+
+class OpenAIUsageRollup(Base):
+    """OpenAI 用量日彙總（每天 × 用戶 × 模型 × 階段），每次分析呼叫完 OpenAI 後累加"""
+    __tablename__ = "openai_usage_rollups"
+    
+    id = Column(Integer, primary_key=True)
+    day = Column(DateTime, nullable=False)
+    user_id = Column(Integer, nullable=False, default=0)  # 0 = 匿名
+    model = Column(String(64), nullable=False)
+    stage = Column(String(32), nullable=False)
+    calls = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    completion_tokens = Column(BigInteger, nullable=False, default=0)
+    cost_micros = Column(BigInteger, nullable=False, default=0)
+    
+    __table_args__ = (
+        UniqueConstraint('day', 'user_id', 'model', 'stage', name='uq_openai_usage_rollups_key'),
+        Index('ix_openai_usage_rollups_user_day', 'user_id', 'day'),
+    )
+
+
+class PayloadDictionary(Base):
+    """zstd 共享字典（以字典 id 為 key；data_blob 以字典壓縮時解碼必須有它）"""
+    __tablename__ = "payload_dictionaries"
+    
+    dict_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+# 管理後台 username / email 搜尋索引（隨 create_all / drop_all 自動維護）
+search_index = SearchIndex(engine)
+search_index.attach(User.__table__, AnalysisResult.__table__)
+
+# 版本化遷移（資料遷移步驟在對應函數定義後註冊）
+migration_runner = MigrationRunner(engine, Base.metadata)
 
 def init_db():
+    """
+    worker 啟動時只做一次版本檢查；版本落後且 MIGRATE_ON_START=1 時才由本程序執行遷移
+    （正式環境請在啟動 gunicorn 前執行 python migrate.py upgrade）
+
+    資料庫無法連線或遷移失敗時拋出例外，ensure_db_ready 不會標記完成，下一個請求重試
+    """
     try:
-        Base.metadata.create_all(engine)
-        ensure_analysis_user_column()
-        print("[DB] ✅ 資料庫初始化完成")
+        current = migration_runner.current_version()
+        if current >= migration_runner.head:
+            return
+        if not MIGRATE_ON_START:
+            db_log.warning("⚠️ 資料庫版本 v%s 落後 v%s，請執行 python migrate.py upgrade", current, migration_runner.head)
+            return
+        migration_runner.upgrade()
+        db_log.info("✅ 資料庫初始化完成")
     except SQLAlchemyError as e:
-        print(f"[DB] ❌ 初始化失敗: {e}")
-
-init_db()
+        db_log.error("❌ 初始化失敗: %s", e)
+        raise
 
 def init_firebase():
-    global firebase_app
+    global firebase_app, firebase_verifier
     if not FIREBASE_SERVICE_ACCOUNT:
-        print("[Firebase] ⚠️ 未設定 FIREBASE_SERVICE_ACCOUNT，略過 Firebase 初始化")
+        firebase_log.warning("⚠️ 未設定 FIREBASE_SERVICE_ACCOUNT，略過 Firebase 初始化")
         return None
     if firebase_app:
         return firebase_app
     try:
+        # firebase_admin 匯入約 150ms，等到第一次需要時才載入
+        import firebase_admin
+        from firebase_admin import credentials
         cred_source = FIREBASE_SERVICE_ACCOUNT.strip()
         if cred_source.startswith('{'):
             cred_data = json.loads(cred_source)
@@ -164,31 +360,38 @@ def init_firebase():
                 raise FileNotFoundError(f"找不到 Firebase 憑證檔案: {cred_source}")
             cred = credentials.Certificate(cred_source)
         firebase_app = firebase_admin.initialize_app(cred)
-        print("[Firebase] ✅ 初始化成功")
+        firebase_log.info("✅ 初始化成功")
+        project_id = FIREBASE_PROJECT_ID or firebase_app.project_id
+        if FIREBASE_LOCAL_VERIFY and project_id:
+            from firebase_verifier import FirebaseTokenVerifier, GOOGLE_CERTS_URL
+            firebase_verifier = FirebaseTokenVerifier(
+                project_id,
+                certs_url=FIREBASE_CERTS_URL or GOOGLE_CERTS_URL,
+                cache_path=FIREBASE_CERTS_CACHE_PATH,
+                verify_cache_ttl=FIREBASE_VERIFY_CACHE_TTL
+            )
+            firebase_log.info("✅ 本地 token 驗證已啟用（專案 %s）", project_id)
         return firebase_app
     except Exception as e:
-        print(f"[Firebase] ❌ 初始化失敗: {e}")
+        firebase_log.error("❌ 初始化失敗: %s", e)
         firebase_app = None
         return None
 
-init_firebase()
-
 def init_analyzer():
     """初始化 AI 分析器"""
     global analyzer
     if not OPENAI_API_KEY:
-        print("⚠️ 警告: OPENAI_API_KEY 未設置，部分功能可能無法使用")
+        init_log.warning("⚠️ 警告: OPENAI_API_KEY 未設置，部分功能可能無法使用")
         return None
     
     # 檢查 API Key 是否為佔位符
     if OPENAI_API_KEY in ['your-key', 'sk-your-api-key-here', '']:
-        print("❌ 錯誤: OPENAI_API_KEY 是佔位符，請設置真實的 API Key")
-        print("   請運行: export OPENAI_API_KEY='sk-...'")
+        init_log.error("❌ 錯誤: OPENAI_API_KEY 是佔位符，請設置真實的 API Key（export OPENAI_API_KEY='sk-...'）")
         return None
     
     # 檢查 API Key 格式
     if not OPENAI_API_KEY.startswith('sk-'):
-        print("⚠️ 警告: OPENAI_API_KEY 格式可能不正確（應該以 'sk-' 開頭）")
+        init_log.warning("⚠️ 警告: OPENAI_API_KEY 格式可能不正確（應該以 'sk-' 開頭）")
     
     # 支持的模型列表（按優先順序）
     supported_models = ['gpt-5.1', 'gpt-4o', 'gpt-4o-mini', 'gpt-4-turbo']
@@ -199,19 +402,20 @@ def init_analyzer():
     
     while model_to_try:
         try:
-            print(f"[初始化] 嘗試使用模型: {model_to_try}")
+            init_log.info("嘗試使用模型: %s", model_to_try)
             analyzer = IGAnalyzer(
                 api_key=OPENAI_API_KEY,
                 model=model_to_try,
                 max_side=MAX_SIDE,
-                quality=JPEG_QUALITY
+                quality=JPEG_QUALITY,
+                http_client=http_client
             )
-            print(f"✅ AI 分析器初始化成功 (模型: {model_to_try})")
+            init_log.info("✅ AI 分析器初始化成功 (模型: %s)", model_to_try)
             return analyzer
         except Exception as e:
             error_msg = str(e)
             models_tried.append(model_to_try)
-            print(f"⚠️ 模型 {model_to_try} 初始化失敗: {error_msg}")
+            init_log.warning("⚠️ 模型 %s 初始化失敗: %s", model_to_try, error_msg)
             
             # 如果是模型不存在的錯誤，嘗試下一個備用模型
             if 'model' in error_msg.lower() or 'not found' in error_msg.lower() or 'invalid' in error_msg.lower():
@@ -221,7 +425,7 @@ def init_analyzer():
                         current_idx = supported_models.index(model_to_try)
                         if current_idx + 1 < len(supported_models):
                             model_to_try = supported_models[current_idx + 1]
-                            print(f"[初始化] 嘗試備用模型: {model_to_try}")
+                            init_log.info("嘗試備用模型: %s", model_to_try)
                             continue
                     except ValueError:
                         pass
@@ -230,20 +434,83 @@ def init_analyzer():
                 for fallback in fallback_models:
                     if fallback not in models_tried:
                         model_to_try = fallback
-                        print(f"[初始化] 嘗試備用模型: {fallback}")
+                        init_log.info("嘗試備用模型: %s", fallback)
                         break
                 else:
                     model_to_try = None
             else:
                 # 其他錯誤（如 API Key 問題），不嘗試其他模型
-                print(f"❌ AI 分析器初始化失敗: {e}")
+                init_log.error("❌ AI 分析器初始化失敗: %s", e)
                 return None
     
-    print(f"❌ 所有模型都無法使用。已嘗試: {', '.join(models_tried)}")
+    init_log.error("❌ 所有模型都無法使用。已嘗試: %s", ', '.join(models_tried))
     return None
 
-# 啟動時初始化
-init_analyzer()
+# -----------------------------------------------------------------------------
+# Lazy Initialization（第一次使用時才初始化，冷啟動的 /health 不等待外部服務）
+# -----------------------------------------------------------------------------
+STARTUP_TIMINGS = {}
+_initialized = set()
+_init_locks = {}
+_init_locks_guard = threading.Lock()
+
+def _init_once(name, fn):
+    """以執行緒安全的方式執行一次初始化，並記錄耗時（fn 拋出例外時不標記完成，下次呼叫重試）"""
+    if name in _initialized:
+        return
+    with _init_locks_guard:
+        lock = _init_locks.setdefault(name, threading.Lock())
+    with lock:
+        if name in _initialized:
+            return
+        start = time.perf_counter()
+        try:
+            fn()
+        finally:
+            STARTUP_TIMINGS[f"{name}_init_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        _initialized.add(name)
+
+def get_firebase_app():
+    if firebase_app is None:
+        _init_once("firebase", init_firebase)
+    return firebase_app
+
+def get_analyzer():
+    if analyzer is None:
+        _init_once("analyzer", init_analyzer)
+    return analyzer
+
+static_manifest = AssetManifest(os.path.join(app.root_path, 'static'), STATIC_BUILD_DIR)
+
+def get_static_manifest():
+    _init_once("static_assets", static_manifest.load_or_build)
+    return static_manifest
+
+def ensure_db_ready():
+    """資料庫版本檢查、重播未寫入資料與背景轉換（第一個使用資料庫的請求前執行一次）"""
+    _init_once("database", _init_database)
+
+def _init_database():
+    init_db()
+    # 重播上次關閉時未能寫入的資料
+    if analysis_writer is not None:
+        analysis_writer.replay_spill()
+    # 背景轉換舊格式分析記錄
+    if PAYLOAD_MIGRATE_ON_START:
+        start_payload_migration()
+
+def warm_up_subsystems():
+    """在背景預先初始化；請求同時到達時會等待同一把鎖，不會重複初始化"""
+    try:
+        ensure_db_ready()
+        get_firebase_app()
+        get_static_manifest()
+        if get_analyzer() is not None and HTTP_WARMUP:
+            http_client.warm_up(HTTP_WARMUP_URLS, background=False)
+        STARTUP_TIMINGS["warm_up_done_ms"] = round((time.perf_counter() - _BOOT_STARTED) * 1000, 1)
+        startup_log.info("✅ 背景初始化完成 (%sms)", STARTUP_TIMINGS['warm_up_done_ms'])
+    except Exception as e:
+        startup_log.warning("⚠️ 背景初始化失敗: %s", e)
 
 # -----------------------------------------------------------------------------
 # Database Helpers
@@ -263,8 +530,8 @@ def serialize_user(user):
         "display_name": user.display_name,
         "avatar_url": user.avatar_url,
         "provider": user.provider,
-        "created_at": user.created_at.isoformat() if user.created_at else None,
-        "updated_at": user.updated_at.isoformat() if user.updated_at else None
+        "created_at": user.created_at,
+        "updated_at": user.updated_at
     }
 
 def generate_unique_username(session, base):
@@ -286,17 +553,72 @@ def generate_token(user_id):
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+# 已驗證 token 與用戶的行程內快取
+token_cache = TTLCache(TOKEN_CACHE_SIZE, ttl=JWT_EXPIRES_MINUTES * 60, name="token")
+user_cache = TTLCache(USER_CACHE_SIZE, ttl=USER_CACHE_TTL, name="user")
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, stale_ttl=RESPONSE_CACHE_STALE)
+cache_channel = create_invalidation_channel(CACHE_INVALIDATION_URL)
+password_hasher = PasswordHasher(
+    method=PASSWORD_HASH_METHOD,
+    workers=PASSWORD_HASH_WORKERS,
+    max_pending=PASSWORD_HASH_MAX_PENDING,
+    timeout=PASSWORD_HASH_TIMEOUT
+)
+def subscribe_cache_invalidation(channel):
+    """其他 worker 發出的失效通知：用戶、回應快取與管理後台分析詳情"""
+    channel.subscribe("user", lambda key: user_cache.pop(int(key)))
+    channel.subscribe("response", lambda tag: response_cache.clear() if tag == "*" else response_cache.invalidate_tag(tag))
+    channel.subscribe("analysis", lambda key: _drop_analysis_detail(None if key == "*" else int(key)))
+
+if cache_channel is not None:
+    subscribe_cache_invalidation(cache_channel)
+
+def invalidate_cached_user(user_id):
+    """用戶資料變更時失效快取（並通知其他 worker）"""
+    user_cache.pop(user_id)
+    if cache_channel is not None:
+        try:
+            cache_channel.publish("user", user_id)
+        except Exception as e:
+            auth_log.warning("⚠️ 發送快取失效通知失敗: %s", e)
+
+def invalidate_response_cache(username_keys=None):
+    """
+    分析結果變更時失效回應快取（該帳號的結果與排行榜），並通知其他 worker
+
+    username_keys 為 None 時清空全部（例如刪除用戶，一次影響多個帳號）
+    """
+    if username_keys is None:
+        tags = ["*"]
+        response_cache.clear()
+    else:
+        tags = ["leaderboard"] + [f"username:{key}" for key in username_keys if key]
+        for tag in tags:
+            response_cache.invalidate_tag(tag)
+    if cache_channel is not None:
+        try:
+            for tag in tags:
+                cache_channel.publish("response", tag)
+        except Exception as e:
+            db_log.warning("⚠️ 發送快取失效通知失敗: %s", e)
+
 def decode_token(token):
+    cache_key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    cached = token_cache.get(cache_key)
+    if cached is not None:
+        return cached
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        print(f"[Auth] ✅ Token 驗證成功: user_id={payload.get('sub')}")
+        auth_log.debug("✅ Token 驗證成功: user_id=%s", payload.get('sub'))
+        exp = payload.get("exp")
+        token_cache.set(cache_key, payload, ttl=exp - time.time() if exp else None)
         return payload
     except jwt.ExpiredSignatureError:
-        print(f"[Auth] ❌ Token 已過期")
+        auth_log.warning("❌ Token 已過期")
         raise AuthError("token_expired", 401)
     except jwt.InvalidTokenError as e:
-        print(f"[Auth] ❌ Token 無效: {e}")
-        print(f"[Auth] Token 前50字符: {token[:50] if token else 'None'}...")
+        auth_log.warning("❌ Token 無效: %s", e)
+        auth_log.debug("Token 前50字符: %s...", token[:50] if token else 'None')
         raise AuthError("invalid_token", 401)
 
 class AuthError(Exception):
@@ -308,49 +630,688 @@ class AuthError(Exception):
     def to_dict(self):
         return {"ok": False, "error": self.message}
 
+def coerce_int(value):
+    """轉為整數，無法轉換時回傳 None"""
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class PayloadDictionaryStore:
+    """共享字典的資料庫儲存（PayloadCodec 的 dict_store）"""
+
+    def save(self, dict_id, data):
+        session = SessionLocal()
+        try:
+            if session.get(PayloadDictionary, dict_id) is None:
+                session.add(PayloadDictionary(dict_id=dict_id, data=data))
+                session.commit()
+        finally:
+            session.close()
+
+    def load(self, dict_id):
+        session = SessionLocal()
+        try:
+            row = session.get(PayloadDictionary, dict_id)
+            return row.data if row is not None else None
+        finally:
+            session.close()
+
+    def latest_id(self):
+        session = SessionLocal()
+        try:
+            row = session.query(PayloadDictionary.dict_id).order_by(
+                PayloadDictionary.created_at.desc(), PayloadDictionary.dict_id.desc()
+            ).first()
+            return row[0] if row is not None else None
+        finally:
+            session.close()
+
+# 分析結果編碼器（共享字典由 migrate_payloads.py --train-dict 產生，先寫入資料庫才開始使用）
+payload_dict_store = PayloadDictionaryStore()
+payload_codec = PayloadCodec(compress=PAYLOAD_COMPRESSION, dict_dir=PAYLOAD_DICT_DIR, dict_store=payload_dict_store)
+
+def load_record_data(record):
+    """讀取分析記錄內容（新格式 data_blob 優先，否則解析舊 JSON 文字）；格式錯誤時拋出 ValueError"""
+    if record.data_blob is not None:
+        return payload_codec.decode(record.data_blob)
+    return json.loads(record.data)
+
+def store_record_data(record, payload):
+    """以新格式寫回分析記錄內容（同時更新摘要）"""
+    record.data_blob = payload_codec.encode(payload)
+    record.data = ''
+    record.summary = json.dumps(build_analysis_summary(payload), ensure_ascii=False)
+
+SUMMARY_TEXT_LENGTH = 100
+
+def build_analysis_summary(payload):
+    """產生列表頁需要的精簡摘要"""
+    value_est = payload.get("value_estimation") or {}
+    summary = {key: payload[key] for key in ("username", "display_name", "followers") if key in payload}
+    summary.update({key: value_est[key] for key in ("post_value", "story_value", "reels_value") if key in value_est})
+    analysis_text = payload.get("analysis_text") or ""
+    if len(analysis_text) > SUMMARY_TEXT_LENGTH:
+        analysis_text = analysis_text[:SUMMARY_TEXT_LENGTH] + "..."
+    summary["analysis_text"] = analysis_text
+    return summary
+
+def load_record_summary(record):
+    """讀取分析記錄摘要；尚未回填摘要的舊資料才會載入完整內容"""
+    if record.summary:
+        return json.loads(record.summary)
+    return build_analysis_summary(load_record_data(record))
+
+def dialect_insert():
+    """回傳支援 ON CONFLICT 的 insert 建構器（不支援的資料庫回傳 None）"""
+    dialect = engine.dialect.name
+    if dialect == 'sqlite':
+        return sqlite_insert
+    if dialect == 'postgresql':
+        return pg_insert
+    return None
+
+def upsert_analysis_result(session, username_key, payload, now=None):
+    """
+    以單一 INSERT ... ON CONFLICT(username_key) DO UPDATE 寫入分析結果
+    
+    Returns:
+        分析記錄 id
+    """
+    now = now or datetime.utcnow()
+    values = {
+        "username": payload.get("username", username_key),
+        "username_key": username_key,
+        "display_name": payload.get("display_name", ""),
+        "user_id": payload.get("user_id"),
+        "data": '',
+        "data_blob": payload_codec.encode(payload),
+        "summary": json.dumps(build_analysis_summary(payload), ensure_ascii=False),
+        "account_asset_value": extract_account_value(payload),
+        "created_at": now,
+        "updated_at": now
+    }
+    insert = dialect_insert()
+    if insert is not None:
+        stmt = insert(AnalysisResult).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AnalysisResult.username_key],
+            set_={
+                key: stmt.excluded[key]
+                for key in ("username", "display_name", "user_id", "data", "data_blob", "summary", "account_asset_value", "updated_at")
+            }
+        ).returning(AnalysisResult.id)
+        return session.execute(stmt).scalar_one()
+    
+    # 其他資料庫：退回 SELECT + INSERT/UPDATE
+    record = session.query(AnalysisResult).filter_by(username_key=username_key).first()
+    if record:
+        for key in ("username", "display_name", "user_id", "data", "data_blob", "summary", "account_asset_value"):
+            setattr(record, key, values[key])
+    else:
+        record = AnalysisResult(**values)
+        session.add(record)
+    session.flush()
+    return record.id
+
+def save_analysis_results_batch(payloads):
+    """
+    以單一交易寫入多筆分析結果
+    
+    同一帳號只 upsert 最後一筆，但每一筆都會留下歷史快照。失敗時拋出例外。
+    """
+    entries = []
+    for payload in payloads:
+        if not payload:
+            continue
+        # _usage：本次分析的 OpenAI 用量，只記在快照，不寫入公開的分析內容
+        # （複製後移除，佇列中的原始項目失敗重試或寫入 spill 檔時仍保留用量）
+        usage = payload.get("_usage")
+        if usage is not None:
+            payload = {key: value for key, value in payload.items() if key != "_usage"}
+        username_key = normalize_username(payload.get("username") or payload.get("plain_username"))
+        if username_key:
+            entries.append((username_key, payload, usage))
+    if not entries:
+        return {}
+    latest = {username_key: payload for username_key, payload, _ in entries}
+    session = SessionLocal()
+    try:
+        record_ids = {
+            username_key: upsert_analysis_result(session, username_key, payload)
+            for username_key, payload in latest.items()
+        }
+        for username_key, payload, usage in entries:
+            record_analysis_snapshot(
+                session, username_key, payload.get("username", username_key), payload.get("user_id"), payload,
+                usage=usage
+            )
+        session.commit()
+    except SQLAlchemyError:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    invalidate_count_cache(AnalysisResult.__tablename__)
+    for record_id in record_ids.values():
+        invalidate_analysis_detail(record_id)
+    invalidate_response_cache(record_ids)
+    db_log.info("✅ 已儲存分析結果: %s", ', '.join(record_ids))
+    maybe_prune_analysis_history()
+    return record_ids
+
+# 背景批次寫入佇列（ANALYSIS_WRITE_BEHIND=1 時啟用，關閉時同步寫完剩餘資料）
+analysis_writer = None
+if ANALYSIS_WRITE_BEHIND:
+    analysis_writer = WriteBehindQueue(
+        save_analysis_results_batch,
+        max_batch=WRITE_BEHIND_MAX_BATCH,
+        max_delay=WRITE_BEHIND_MAX_DELAY_MS / 1000.0,
+        spill_path=WRITE_BEHIND_SPILL_PATH,
+        name="AnalysisWriter"
+    )
+    atexit.register(analysis_writer.close)
+
 def save_analysis_result(payload):
     if not payload:
         return
-    username_key = normalize_username(payload.get("username") or payload.get("plain_username"))
-    if not username_key:
+    if analysis_writer is not None:
+        analysis_writer.submit(payload)
         return
-    session = SessionLocal()
     try:
-        serialized = json.dumps(payload, ensure_ascii=False)
-        record = session.query(AnalysisResult).filter_by(username_key=username_key).first()
-        if record:
-            record.username = payload.get("username", record.username)
-            record.display_name = payload.get("display_name", record.display_name)
-            record.user_id = payload.get("user_id", record.user_id)
-            record.data = serialized
-        else:
-            record = AnalysisResult(
-                username=payload.get("username", username_key),
-                username_key=username_key,
-                display_name=payload.get("display_name", ""),
-                user_id=payload.get("user_id"),
-                data=serialized
+        save_analysis_results_batch([payload])
+    except SQLAlchemyError as e:
+        db_log.error("❌ 儲存結果失敗: %s", e)
+
+# -----------------------------------------------------------------------------
+# Analysis History（append-only 快照與日/月彙總）
+# -----------------------------------------------------------------------------
+ROLLUP_PERIODS = ('day', 'month')
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', 90))
+HISTORY_PRUNE_INTERVAL = int(os.getenv('HISTORY_PRUNE_INTERVAL', 24 * 3600))  # 秒
+
+# 0 表示本 process 尚未執行：啟動後第一筆儲存就在背景執行一次（免費方案會休眠，uptime 常不到一天）
+_last_history_prune = 0.0
+_history_prune_lock = threading.Lock()
+
+def period_start(moment, period):
+    if period == 'month':
+        return datetime(moment.year, moment.month, 1)
+    return datetime(moment.year, moment.month, moment.day)
+
+def record_analysis_snapshot(session, username_key, username, user_id, payload, created_at=None, usage=None):
+    """
+    新增一筆分析快照並更新日/月彙總（與呼叫端同一個交易，由呼叫端 commit）
+    
+    usage 為本次分析的 OpenAI 用量（UsageLedger.totals()），回填舊資料時為 None
+    """
+    created_at = created_at or datetime.utcnow()
+    value_est = payload.get("value_estimation") or {}
+    value = extract_account_value(payload)
+    usage = usage or {}
+    session.add(AnalysisHistory(
+        user_id=user_id,
+        username_key=username_key,
+        created_at=created_at,
+        account_asset_value=value,
+        post_value=coerce_int(value_est.get("post_value")),
+        story_value=coerce_int(value_est.get("story_value")),
+        reels_value=coerce_int(value_est.get("reels_value")),
+        followers=coerce_int(payload.get("followers")),
+        prompt_tokens=usage.get("prompt_tokens"),
+        completion_tokens=usage.get("completion_tokens"),
+        cost_micros=usage.get("cost_micros")
+    ))
+    if not user_id or value is None:
+        return
+    insert = dialect_insert()
+    if insert is not None:
+        for period in ROLLUP_PERIODS:
+            upsert_rollup(session, insert, user_id, period, period_start(created_at, period),
+                          username_key, username, value, created_at)
+        return
+    for period in ROLLUP_PERIODS:
+        start = period_start(created_at, period)
+        rollup = session.query(AnalysisRollup).filter_by(
+            user_id=user_id, period=period, period_start=start, username_key=username_key
+        ).first()
+        if not rollup:
+            rollup = AnalysisRollup(
+                user_id=user_id, period=period, period_start=start, username_key=username_key,
+                count=0, sum_value=0, first_at=created_at
             )
-            session.add(record)
+            session.add(rollup)
+            # SessionLocal 關閉 autoflush，需手動 flush 讓同交易內的後續查詢看得到
+            session.flush()
+        rollup.username = username or username_key
+        rollup.count += 1
+        rollup.sum_value += value
+        rollup.min_value = value if rollup.min_value is None else min(rollup.min_value, value)
+        rollup.max_value = value if rollup.max_value is None else max(rollup.max_value, value)
+        if rollup.last_at is None or created_at >= rollup.last_at:
+            rollup.last_value = value
+            rollup.last_at = created_at
+
+def upsert_rollup(session, insert, user_id, period, start, username_key, username, value, created_at):
+    """以單一 INSERT ... ON CONFLICT DO UPDATE 累加日/月彙總"""
+    stmt = insert(AnalysisRollup).values(
+        user_id=user_id, period=period, period_start=start, username_key=username_key,
+        username=username or username_key, count=1, sum_value=value,
+        min_value=value, max_value=value, last_value=value,
+        first_at=created_at, last_at=created_at
+    )
+    cols = AnalysisRollup.__table__.c
+    new = stmt.excluded
+    if engine.dialect.name == 'sqlite':
+        least, greatest = func.min, func.max
+    else:
+        least, greatest = func.least, func.greatest
+    is_newer = new.last_at >= cols.last_at
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[cols.user_id, cols.period, cols.period_start, cols.username_key],
+        set_={
+            "username": new.username,
+            "count": cols.count + 1,
+            "sum_value": cols.sum_value + new.sum_value,
+            "min_value": least(cols.min_value, new.min_value),
+            "max_value": greatest(cols.max_value, new.max_value),
+            "first_at": least(cols.first_at, new.first_at),
+            "last_value": case((is_newer, new.last_value), else_=cols.last_value),
+            "last_at": greatest(cols.last_at, new.last_at)
+        }
+    )
+    session.execute(stmt)
+
+def backfill_analysis_history(batch_size=500):
+    """
+    為還沒有任何快照的分析記錄建立初始快照（遷移 7）
+
+    依 id 分批提交；只處理沒有快照的帳號，中斷後重新執行會從未完成的部分繼續。
+    資料庫錯誤直接拋出，讓遷移不被記錄為已完成
+    """
+    count = 0
+    last_id = 0
+    while True:
+        session = SessionLocal()
+        try:
+            has_snapshot = session.query(AnalysisHistory.id).filter(
+                AnalysisHistory.username_key == AnalysisResult.username_key,
+                or_(
+                    AnalysisHistory.user_id == AnalysisResult.user_id,
+                    and_(AnalysisHistory.user_id.is_(None), AnalysisResult.user_id.is_(None))
+                )
+            ).exists()
+            records = session.query(AnalysisResult).options(undefer_group('payload')).filter(
+                AnalysisResult.id > last_id, ~has_snapshot
+            ).order_by(AnalysisResult.id).limit(batch_size).all()
+            if not records:
+                break
+            for record in records:
+                last_id = record.id
+                try:
+                    payload = load_record_data(record)
+                except ValueError:
+                    continue
+                record_analysis_snapshot(
+                    session, record.username_key, record.username, record.user_id, payload,
+                    created_at=record.updated_at or record.created_at
+                )
+                count += 1
+            session.commit()
+        finally:
+            session.close()
+    if count:
+        db_log.info("✅ 已回填 %s 筆分析快照", count)
+    return count
+
+def prune_analysis_history(retention_days=None, now=None):
+    """
+    保留策略：超過保留天數的快照降採樣為每個帳號每天一筆（保留當天最後一筆）
+    日/月彙總不受影響
+    
+    Returns:
+        刪除的快照數量
+    """
+    retention_days = HISTORY_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    if engine.dialect.name == 'sqlite':
+        day = func.date(AnalysisHistory.created_at)
+    else:
+        day = func.date_trunc('day', AnalysisHistory.created_at)
+    session = SessionLocal()
+    try:
+        keep_ids = session.query(func.max(AnalysisHistory.id)).filter(
+            AnalysisHistory.created_at < cutoff
+        ).group_by(AnalysisHistory.user_id, AnalysisHistory.username_key, day)
+        deleted = session.query(AnalysisHistory).filter(
+            AnalysisHistory.created_at < cutoff,
+            AnalysisHistory.id.notin_(keep_ids.scalar_subquery())
+        ).delete(synchronize_session=False)
         session.commit()
-        print(f"[DB] ✅ 已儲存分析結果: {username_key}")
+        if deleted:
+            db_log.info("🧹 已降採樣 %s 筆舊快照", deleted)
+        return deleted
     except SQLAlchemyError as e:
         session.rollback()
-        print(f"[DB] ❌ 儲存結果失敗: {e}")
+        db_log.warning("⚠️ 快照保留策略執行失敗: %s", e)
+        return 0
     finally:
         session.close()
 
+def maybe_prune_analysis_history():
+    """每個 process 每隔 HISTORY_PRUNE_INTERVAL 最多執行一次保留策略（背景執行緒，不佔用請求時間）"""
+    global _last_history_prune
+    now = time.monotonic()
+    with _history_prune_lock:
+        if _last_history_prune and now - _last_history_prune < HISTORY_PRUNE_INTERVAL:
+            return None
+        _last_history_prune = now
+    thread = threading.Thread(target=prune_analysis_history, name="HistoryPrune", daemon=True)
+    thread.start()
+    return thread
+
+# -----------------------------------------------------------------------------
+# OpenAI 用量與預算
+# -----------------------------------------------------------------------------
+budget_policy = BudgetPolicy()
+
+def openai_spend_today(user_id=None):
+    """今日（UTC）總花費與此用戶花費（百萬分之一美元）；user_id 為 None 時用戶花費為 None"""
+    today = period_start(datetime.utcnow(), 'day')
+    cost = OpenAIUsageRollup.cost_micros
+    user_cost = func.sum(case((OpenAIUsageRollup.user_id == (user_id or 0), cost), else_=0))
+    session = SessionLocal()
+    try:
+        total, user_total = session.query(
+            func.coalesce(func.sum(cost), 0), func.coalesce(user_cost, 0)
+        ).filter(OpenAIUsageRollup.day == today).one()
+    finally:
+        session.close()
+    return int(total), (int(user_total) if user_id else None)
+
+def check_openai_budget(current_user):
+    """依今日花費決定本次分析的模型（未設定預算時不查詢資料庫）"""
+    if not budget_policy.enabled:
+        return BudgetDecision()
+    try:
+        spent, user_spent = openai_spend_today(current_user["id"] if current_user else None)
+    except SQLAlchemyError as e:
+        analysis_log.warning("⚠️ 讀取 OpenAI 花費失敗，不套用預算: %s", e)
+        return BudgetDecision()
+    decision = budget_policy.decide(OPENAI_MODEL, spent, user_spent)
+    if decision.mode != "normal":
+        analysis_log.info("⚠️ 超出 OpenAI 預算（%s），改用 %s 模式: %s",
+                          decision.reason, decision.mode, decision.model)
+    return decision
+
+def persist_openai_usage(ledger, current_user):
+    """把一次分析的 OpenAI 用量累加到日彙總（分析失敗時也要記錄，費用已經發生）"""
+    if ledger is None or not ledger.calls:
+        return
+    day = period_start(datetime.utcnow(), 'day')
+    user_id = current_user["id"] if current_user else 0
+    grouped = {}
+    for call in ledger.calls:
+        totals = grouped.setdefault((call["model"], call["stage"]), [0, 0, 0, 0])
+        totals[0] += 1
+        totals[1] += call["prompt_tokens"]
+        totals[2] += call["completion_tokens"]
+        totals[3] += call["cost_micros"]
+    insert = dialect_insert()
+    session = SessionLocal()
+    try:
+        for (model, stage), (calls, prompt_tokens, completion_tokens, cost_micros) in grouped.items():
+            if insert is not None:
+                stmt = insert(OpenAIUsageRollup).values(
+                    day=day, user_id=user_id, model=model, stage=stage, calls=calls,
+                    prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cost_micros=cost_micros
+                )
+                cols = OpenAIUsageRollup.__table__.c
+                new = stmt.excluded
+                session.execute(stmt.on_conflict_do_update(
+                    index_elements=[cols.day, cols.user_id, cols.model, cols.stage],
+                    set_={
+                        "calls": cols.calls + new.calls,
+                        "prompt_tokens": cols.prompt_tokens + new.prompt_tokens,
+                        "completion_tokens": cols.completion_tokens + new.completion_tokens,
+                        "cost_micros": cols.cost_micros + new.cost_micros
+                    }
+                ))
+                continue
+            rollup = session.query(OpenAIUsageRollup).filter_by(
+                day=day, user_id=user_id, model=model, stage=stage
+            ).first()
+            if not rollup:
+                rollup = OpenAIUsageRollup(day=day, user_id=user_id, model=model, stage=stage,
+                                           calls=0, prompt_tokens=0, completion_tokens=0, cost_micros=0)
+                session.add(rollup)
+            rollup.calls += calls
+            rollup.prompt_tokens += prompt_tokens
+            rollup.completion_tokens += completion_tokens
+            rollup.cost_micros += cost_micros
+        session.commit()
+    except SQLAlchemyError as e:
+        session.rollback()
+        db_log.error("❌ 記錄 OpenAI 用量失敗: %s", e)
+    finally:
+        session.close()
+
+@contextlib.contextmanager
+def openai_usage_scope(current_user):
+    """記錄區塊內所有 OpenAI 呼叫的用量，結束時寫入日彙總（ledger 再交給 complete_analysis 記入快照）"""
+    ledger, token = start_ledger()
+    try:
+        yield ledger
+    finally:
+        end_ledger(token)
+        persist_openai_usage(ledger, current_user)
+
+def openai_usage_stats(session, days=14):
+    """管理後台用：每日、每個模型 / 階段與花費最高的用戶"""
+    today = period_start(datetime.utcnow(), 'day')
+    since = today - timedelta(days=days - 1)
+    r = OpenAIUsageRollup
+    sums = (
+        func.sum(r.calls), func.sum(r.prompt_tokens), func.sum(r.completion_tokens), func.sum(r.cost_micros)
+    )
+
+    def row_dict(calls, prompt_tokens, completion_tokens, cost_micros, **keys):
+        return {
+            **keys,
+            "calls": int(calls or 0),
+            "prompt_tokens": int(prompt_tokens or 0),
+            "completion_tokens": int(completion_tokens or 0),
+            "cost_usd": round((cost_micros or 0) / MICRO_USD, 4)
+        }
+
+    by_day = [
+        row_dict(*values, day=day.date().isoformat())
+        for day, *values in session.query(r.day, *sums).filter(r.day >= since).group_by(r.day).order_by(r.day)
+    ]
+    by_model = [
+        row_dict(*values, model=model, stage=stage)
+        for model, stage, *values in session.query(r.model, r.stage, *sums).filter(r.day >= since)
+        .group_by(r.model, r.stage).order_by(func.sum(r.cost_micros).desc())
+    ]
+    top_users = [
+        row_dict(*values, user_id=user_id or None, username=username)
+        for user_id, username, *values in session.query(r.user_id, User.username, *sums)
+        .outerjoin(User, User.id == r.user_id).filter(r.day >= since)
+        .group_by(r.user_id, User.username).order_by(func.sum(r.cost_micros).desc()).limit(10)
+    ]
+    today_row = next((row for row in by_day if row["day"] == today.date().isoformat()), None)
+    return {
+        "days": days,
+        "today": today_row or row_dict(0, 0, 0, 0, day=today.date().isoformat()),
+        "by_day": by_day,
+        "by_model": by_model,
+        "top_users": top_users,
+        "budget": budget_policy.to_dict()
+    }
+
+# -----------------------------------------------------------------------------
+# Payload Migration（舊 JSON 文字 → data_blob 二進位格式）
+# -----------------------------------------------------------------------------
+def migrate_legacy_payloads(batch_size=500, limit=None):
+    """
+    將仍以 JSON 文字儲存的分析記錄轉為 data_blob，每批一個交易，可隨時中斷後重跑
+    
+    Returns:
+        轉換的記錄數量
+    """
+    migrated = 0
+    last_id = 0
+    while limit is None or migrated < limit:
+        size = batch_size if limit is None else min(batch_size, limit - migrated)
+        session = SessionLocal()
+        try:
+            records = session.query(AnalysisResult).options(undefer_group('payload')).filter(
+                AnalysisResult.data_blob.is_(None),
+                AnalysisResult.id > last_id
+            ).order_by(AnalysisResult.id).limit(size).all()
+            if not records:
+                break
+            for record in records:
+                last_id = record.id
+                try:
+                    payload = json.loads(record.data)
+                except json.JSONDecodeError:
+                    codec_log.warning("⚠️ 分析記錄 %s 不是合法 JSON，略過", record.id)
+                    continue
+                store_record_data(record, payload)
+                migrated += 1
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            codec_log.error("❌ 轉換分析記錄失敗: %s", e)
+            break
+        finally:
+            session.close()
+    if migrated:
+        invalidate_analysis_detail()
+        codec_log.info("✅ 已轉換 %s 筆分析記錄為二進位格式", migrated)
+    return migrated
+
+def backfill_analysis_summaries(batch_size=500):
+    """為尚未有摘要的分析記錄補上 summary（遷移 8；資料庫錯誤直接拋出，讓遷移不被記錄為已完成）"""
+    filled = 0
+    last_id = 0
+    while True:
+        session = SessionLocal()
+        try:
+            records = session.query(AnalysisResult).options(undefer_group('payload')).filter(
+                AnalysisResult.summary.is_(None),
+                AnalysisResult.id > last_id
+            ).order_by(AnalysisResult.id).limit(batch_size).all()
+            if not records:
+                break
+            for record in records:
+                last_id = record.id
+                try:
+                    record.summary = json.dumps(build_analysis_summary(load_record_data(record)), ensure_ascii=False)
+                    filled += 1
+                except ValueError:
+                    continue
+            session.commit()
+        finally:
+            session.close()
+    if filled:
+        db_log.info("✅ 已回填 %s 筆分析摘要", filled)
+    return filled
+
+def collect_payload_samples(limit=2000):
+    """取出最近的分析內容作為訓練共享字典的樣本"""
+    session = SessionLocal()
+    try:
+        samples = []
+        records = session.query(AnalysisResult).options(
+            undefer_group('payload')
+        ).order_by(AnalysisResult.id.desc()).limit(limit)
+        for record in records:
+            try:
+                samples.append(load_record_data(record))
+            except ValueError:
+                continue
+        return samples
+    finally:
+        session.close()
+
+def start_payload_migration():
+    """以背景執行緒轉換舊資料（PAYLOAD_MIGRATE_ON_START=1 時啟動）"""
+    thread = threading.Thread(target=migrate_legacy_payloads, name="PayloadMigration", daemon=True)
+    thread.start()
+    return thread
+
+# -----------------------------------------------------------------------------
+# Database Migrations（資料遷移步驟；結構遷移見 migrations.py）
+# -----------------------------------------------------------------------------
+def _install_search_index(conn, dialect):
+    try:
+        for table in SEARCH_FIELDS:
+            search_index.install(conn, table, concurrently=True)
+    except SQLAlchemyError as e:
+        # 沒有 pg_trgm 權限等情況下退回 ILIKE，不阻擋後續遷移
+        search_log.warning("⚠️ 建立搜尋索引失敗，退回 ILIKE: %s", e)
+
+migration_runner.register(Migration(6, "管理後台搜尋索引", _install_search_index, transactional=False))
+migration_runner.register(Migration(7, "回填分析快照", lambda conn, dialect: backfill_analysis_history(), transactional=False))
+migration_runner.register(Migration(8, "回填分析摘要", lambda conn, dialect: backfill_analysis_summaries(), transactional=False))
+
+def _openai_usage_tables(conn, dialect):
+    for column in ("prompt_tokens", "completion_tokens", "cost_micros"):
+        add_column(conn, dialect, AnalysisHistory.__tablename__, column, "BIGINT")
+    OpenAIUsageRollup.__table__.create(conn, checkfirst=True)
+
+migration_runner.register(Migration(9, "OpenAI 用量欄位與日彙總資料表", _openai_usage_tables))
+
+def _payload_dictionaries_table(conn, dialect):
+    """建立共享字典資料表，並匯入先前只存在本機 PAYLOAD_DICT_DIR 的字典"""
+    PayloadDictionary.__table__.create(conn, checkfirst=True)
+    if not os.path.isdir(PAYLOAD_DICT_DIR):
+        return
+    for name in sorted(os.listdir(PAYLOAD_DICT_DIR)):
+        if not (name.startswith("payload-") and name.endswith(".zdict")):
+            continue
+        try:
+            dict_id = int(name[len("payload-"):-len(".zdict")])
+        except ValueError:
+            continue
+        exists = conn.execute(
+            text("SELECT 1 FROM payload_dictionaries WHERE dict_id = :dict_id"), {"dict_id": dict_id}
+        ).first()
+        if exists is None:
+            with open(os.path.join(PAYLOAD_DICT_DIR, name), "rb") as f:
+                conn.execute(PayloadDictionary.__table__.insert().values(
+                    dict_id=dict_id, data=f.read(), created_at=datetime.utcfromtimestamp(
+                        os.path.getmtime(os.path.join(PAYLOAD_DICT_DIR, name))
+                    )
+                ))
+
+migration_runner.register(Migration(10, "zstd 共享字典資料表", _payload_dictionaries_table))
+
+def _keyset_nulls_last_indexes(conn, dialect):
+    # paginate_keyset 以 created_at DESC NULLS LAST 排序；PostgreSQL 的 (created_at, id) 索引反向掃描是 NULLS FIRST，需另建索引
+    if dialect != 'postgresql':
+        return
+    for table in (User.__tablename__, AnalysisResult.__tablename__):
+        create_index(conn, dialect, f"ix_{table}_created_at_desc_id", table, "created_at DESC NULLS LAST, id DESC")
+
+migration_runner.register(Migration(11, "keyset 分頁 NULLS LAST 索引", _keyset_nulls_last_indexes, transactional=False))
+
+
 def get_analysis_result(username):
     username_key = normalize_username(username)
     if not username_key:
         return None
-    session = SessionLocal()
+    session = ReadSessionLocal()
     try:
-        record = session.query(AnalysisResult).filter_by(username_key=username_key).first()
+        record = session.query(AnalysisResult).options(
+            undefer_group('payload')
+        ).filter_by(username_key=username_key).first()
         if record:
-            return json.loads(record.data)
-    except SQLAlchemyError as e:
-        print(f"[DB] ❌ 讀取結果失敗: {e}")
+            return load_record_data(record)
+    except (SQLAlchemyError, ValueError) as e:
+        db_log.error("❌ 讀取結果失敗: %s", e)
     finally:
         session.close()
     return None
@@ -387,7 +1348,7 @@ def login_with_provider(provider, provider_id, profile):
             new_user = True
             username_base = normalize_username(profile.get("username") or email or f"{provider}_{provider_id}")
             username = generate_unique_username(session, username_base)
-            password_stub = generate_password_hash(secrets.token_hex(16))
+            password_stub = password_hasher.hash(secrets.token_hex(16))
             user = User(
                 email=email or f"{provider_id}@{provider}.local",
                 username=username,
@@ -410,74 +1371,179 @@ def login_with_provider(provider, provider_id, profile):
             user.provider_id = provider_id
             user.provider_data = json.dumps(profile, ensure_ascii=False)
         session.commit()
+        if new_user:
+            invalidate_count_cache(User.__tablename__)
+        else:
+            invalidate_cached_user(user.id)
         serialized = serialize_user(user)
         token = generate_token(user.id)
         return token, serialized, new_user
     finally:
         session.close()
 
+# -----------------------------------------------------------------------------
+# Request Context（每個請求共用一個 session 與已驗證的用戶）
+# -----------------------------------------------------------------------------
+def get_db_session():
+    """取得本次請求共用的 session（第一次呼叫時建立，請求結束時由 teardown 關閉）"""
+    session = g.get('db_session')
+    if session is None:
+        session = g.db_session = SessionLocal()
+    return session
+
+def get_read_session():
+    """取得本次請求共用的唯讀 session（read_engine）"""
+    session = g.get('read_session')
+    if session is None:
+        session = g.read_session = ReadSessionLocal()
+    return session
+
+@app.before_request
+def bind_request_id():
+    """每個請求一個 request id（沿用上游的 X-Request-ID），日誌記錄與回應標頭都帶上"""
+    g.request_id = new_request_id(request.headers.get(REQUEST_ID_HEADER))
+    g.request_id_token = request_id_var.set(g.request_id)
+
+@app.after_request
+def add_request_id_header(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+@app.teardown_request
+def unbind_request_id(exc):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        request_id_var.reset(token)
+
+@app.before_request
+def begin_trace():
+    """開始記錄本次請求的階段耗時（ASGI 模式在進入 request context 前已開始）"""
+    REGISTRY.ensure_flusher()
+    if current_trace() is None:
+        _, g.trace_token = start_trace()
+
+@app.after_request
+def record_request_metrics(response):
+    """依路由記錄請求耗時，並以 Server-Timing 標頭回傳各階段耗時"""
+    trace = current_trace()
+    if trace is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    REQUEST_LATENCY.observe(time.perf_counter() - trace.started,
+                            route=route, method=request.method, status=response.status_code)
+    server_timing = trace.server_timing()
+    if server_timing:
+        response.headers['Server-Timing'] = server_timing
+    return response
+
+@app.after_request
+def compress_dynamic_response(response):
+    """依 Accept-Encoding 壓縮較大的文字回應（見 response_compression.py）"""
+    return compress_response(response, request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'))
+
+@app.teardown_request
+def finish_trace(exc):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        end_trace(token)
+
+# 不需要資料庫的輕量端點（冷啟動時可立即回應）
+DB_FREE_PATHS = ('/', '/health', '/metrics')
+
+@app.before_request
+def ensure_ready_for_request():
+    if request.path in DB_FREE_PATHS or request.path.startswith('/static/'):
+        return None
+    ensure_db_ready()
+    return None
+
+@app.teardown_appcontext
+def close_request_sessions(exc):
+    for key in ('db_session', 'read_session'):
+        session = g.pop(key, None)
+        if session is None:
+            continue
+        if exc is not None:
+            session.rollback()
+        session.close()
+
 def get_authenticated_user(required=False):
+    """
+    取得本次請求的登入用戶（JWT 解碼與用戶查詢每個請求只做一次）
+    
+    Returns:
+        serialize_user() 的結果；未登入時回傳 None（required=True 時拋出 AuthError）
+    """
+    if 'auth_result' not in g:
+        g.auth_result = resolve_authenticated_user()
+    user, error = g.auth_result
+    if error is not None and required:
+        auth_log.warning("❌ 驗證失敗 (required=True): %s", error.message)
+        raise error
+    return user
+
+def resolve_authenticated_user():
+    """
+    解析 Authorization header 並載入用戶
+    
+    Returns:
+        (user, error)：成功時 error 為 None；失敗時 user 為 None
+    """
     auth_header = request.headers.get('Authorization', '')
     if not auth_header:
-        if required:
-            print(f"[Auth] ❌ 缺少 Authorization header")
-            raise AuthError("authorization_header_missing", 401)
-        return None
+        return None, AuthError("authorization_header_missing", 401)
     parts = auth_header.split()
     if len(parts) != 2 or parts[0].lower() != 'bearer':
-        if required:
-            print(f"[Auth] ❌ Authorization header 格式錯誤: {auth_header[:50]}")
-            raise AuthError("invalid_authorization_header", 401)
-        # 如果不是 required，靜默返回 None（允許匿名使用）
-        return None
+        auth_log.warning("⚠️ Authorization header 格式錯誤: %s", auth_header[:50])
+        return None, AuthError("invalid_authorization_header", 401)
     token = parts[1]
-    print(f"[Auth] 🔍 驗證 token，長度: {len(token)}")
+    auth_log.debug("🔍 驗證 token，長度: %s", len(token))
     try:
         payload = decode_token(token)
     except AuthError as e:
-        # Token 驗證失敗
-        if required:
-            print(f"[Auth] ❌ Token 驗證失敗 (required=True): {e.message}")
-            raise e
-        # 如果不是 required，記錄警告但允許繼續（匿名使用）
-        print(f"[Auth] ⚠️ Token 驗證失敗但允許匿名使用: {e.message}")
-        return None
+        # Token 驗證失敗（非必要登入的端點允許匿名繼續）
+        auth_log.warning("⚠️ Token 驗證失敗: %s", e.message)
+        return None, e
     except Exception as e:
-        # 其他錯誤
-        print(f"[Auth] ❌ Token 解析異常: {e}")
-        import traceback
-        traceback.print_exc()
-        if required:
-            raise AuthError("token_verification_failed", 401)
-        print(f"[Auth] ⚠️ Token 解析失敗但允許匿名使用: {e}")
-        return None
+        auth_log.exception("❌ Token 解析異常: %s", e)
+        return None, AuthError("token_verification_failed", 401)
     
     user_id_str = payload.get("sub")
     if not user_id_str:
-        if required:
-            raise AuthError("invalid_token_payload", 401)
-        return None
+        return None, AuthError("invalid_token_payload", 401)
     # 將字符串轉換為整數（JWT sub 是字符串，但數據庫 ID 是整數）
     try:
         user_id = int(user_id_str)
     except (ValueError, TypeError):
-        if required:
-            raise AuthError("invalid_user_id_in_token", 401)
-        return None
-    session = SessionLocal()
-    try:
-        user = session.get(User, user_id)
-        if not user:
-            if required:
-                raise AuthError("user_not_found", 401)
-            return None
-        return serialize_user(user)
-    finally:
-        session.close()
+        return None, AuthError("invalid_user_id_in_token", 401)
+    if cache_channel is not None:
+        cache_channel.poll()
+    user = user_cache.get(user_id)
+    if user is None:
+        record = get_db_session().get(User, user_id)
+        if not record:
+            return None, AuthError("user_not_found", 401)
+        user = serialize_user(record)
+        user_cache.set(user_id, user)
+    return dict(user), None
 
 def verify_firebase_token(id_token):
-    if not firebase_app:
+    if not get_firebase_app():
         raise AuthError("firebase_not_configured", 500)
+    from firebase_admin import auth as firebase_auth
+    from firebase_verifier import FirebaseTokenError
+    if firebase_verifier:
+        try:
+            return firebase_verifier.verify(id_token)
+        except FirebaseTokenError as e:
+            if e.code == "expired":
+                raise AuthError("firebase_token_expired", 401)
+            if e.code == "invalid":
+                raise AuthError("firebase_token_invalid", 401)
+            # 取不到公開憑證時改由 firebase_admin 驗證
+            firebase_log.warning("⚠️ 本地驗證無法使用，改用 firebase_admin: %s", e)
     try:
         return firebase_auth.verify_id_token(id_token, app=firebase_app)
     except firebase_auth.ExpiredIdTokenError:
@@ -487,6 +1553,56 @@ def verify_firebase_token(id_token):
     except Exception:
         raise AuthError("firebase_token_verification_failed", 401)
 
+# -----------------------------------------------------------------------------
+# Rate Limiting（GCRA，依登入用戶、IP 與規則計算，見 rate_limit.py）
+# -----------------------------------------------------------------------------
+rate_limiter = RateLimiter(create_rate_limit_store(RATE_LIMIT_STORAGE_URL), enabled=RATE_LIMIT_ENABLED)
+rate_limiter.rule("analyze", user=RATE_LIMIT_ANALYZE, anonymous=RATE_LIMIT_ANALYZE_ANON)
+rate_limiter.rule("auth", anonymous=RATE_LIMIT_AUTH)
+
+def client_ip():
+    """用戶端 IP（TRUSTED_PROXY_COUNT 層代理之後，由 X-Forwarded-For 右側往回取）"""
+    if TRUSTED_PROXY_COUNT:
+        forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+        if len(forwarded) >= TRUSTED_PROXY_COUNT:
+            return forwarded[-TRUSTED_PROXY_COUNT]
+    return request.remote_addr
+
+def enforce_rate_limit(rule, user=None):
+    """
+    記錄一次請求，超過限制時拋出 RateLimitExceeded（429）
+
+    結果存在 g.rate_limit，由 add_rate_limit_headers 加上 RateLimit-* 標頭。儲存發生錯誤時放行。
+    """
+    try:
+        decision = rate_limiter.check(rule, user["id"] if user else None, client_ip())
+    except Exception as e:
+        api_log.warning("⚠️ 頻率限制檢查失敗，放行請求: %s", e)
+        return None
+    g.rate_limit = decision
+    if decision is not None and not decision.allowed:
+        api_log.info("⛔ 超過頻率限制: rule=%s user=%s ip=%s", rule, user["id"] if user else None, client_ip())
+        raise RateLimitExceeded(rule, decision)
+    return decision
+
+def rate_limited(rule):
+    """以 IP 計算的頻率限制裝飾器（登入、註冊等尚未取得用戶的端點）"""
+    from functools import wraps
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            enforce_rate_limit(rule)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+@app.after_request
+def add_rate_limit_headers(response):
+    decision = g.get('rate_limit')
+    if decision is not None:
+        response.headers.update(decision.headers())
+    return response
+
 # -----------------------------------------------------------------------------
 # User Prompt Builder (Safe Version)
 # -----------------------------------------------------------------------------
@@ -555,6 +1671,7 @@ def validate_registration_payload(data):
     return email, username, display_name, password
 
 @app.route('/api/auth/register', methods=['POST'])
+@rate_limited("auth")
 def register_user():
     data = request.get_json() or {}
     email, username, display_name, password = validate_registration_payload(data)
@@ -569,10 +1686,11 @@ def register_user():
             email=email,
             username=username,
             display_name=display_name,
-            password_hash=generate_password_hash(password)
+            password_hash=password_hasher.hash(password)
         )
         session.add(user)
         session.commit()
+        invalidate_count_cache(User.__tablename__)
         result = serialize_user(user)
         token = generate_token(user.id)
         return jsonify({"ok": True, "token": token, "user": result}), 201
@@ -581,12 +1699,13 @@ def register_user():
         raise e
     except SQLAlchemyError as e:
         session.rollback()
-        print(f"[DB] ❌ 註冊失敗: {e}")
+        db_log.error("❌ 註冊失敗: %s", e)
         return jsonify({"ok": False, "error": "register_failed"}), 500
     finally:
         session.close()
 
 @app.route('/api/auth/login', methods=['POST'])
+@rate_limited("auth")
 def login_user():
     data = request.get_json() or {}
     identifier = (data.get("email") or data.get("username") or "").strip().lower()
@@ -598,8 +1717,17 @@ def login_user():
         user = session.query(User).filter(
             (User.email == identifier) | (User.username == normalize_username(identifier))
         ).first()
-        if not user or not check_password_hash(user.password_hash, password):
+        if not user or not password_hasher.verify(user.password_hash, password):
             raise AuthError("invalid_credentials", 401)
+        if password_hasher.needs_rehash(user.password_hash):
+            # 雜湊參數已調整：以目前設定重新雜湊（失敗不影響登入）
+            try:
+                user.password_hash = password_hasher.hash(password)
+                session.commit()
+                password_hasher.record_rehash()
+            except (HasherBusyError, SQLAlchemyError) as e:
+                session.rollback()
+                auth_log.warning("⚠️ 重新雜湊密碼失敗: %s", e)
         token = generate_token(user.id)
         return jsonify({"ok": True, "token": token, "user": serialize_user(user)})
     finally:
@@ -611,6 +1739,7 @@ def get_me():
     return jsonify({"ok": True, "user": user})
 
 @app.route('/api/auth/firebase-login', methods=['POST'])
+@rate_limited("auth")
 def firebase_login():
     data = request.get_json() or {}
     id_token = (data.get("id_token") or "").strip()
@@ -618,8 +1747,8 @@ def firebase_login():
         raise AuthError("missing_id_token", 400)
     
     # 如果 Firebase 未配置，使用本地開發模式
-    if not firebase_app:
-        print("[Auth] ⚠️ Firebase 未配置，使用本地開發模式")
+    if not get_firebase_app():
+        auth_log.warning("⚠️ Firebase 未配置，使用本地開發模式")
         # 嘗試從 token 中提取信息（如果是 JWT）
         try:
             import base64
@@ -643,16 +1772,16 @@ def firebase_login():
                 uid = decoded_payload.get("sub") or decoded_payload.get("user_id") or decoded_payload.get("uid")
                 
                 if not email:
-                    print(f"[Auth] ⚠️ Token 中沒有 email，可用字段: {list(decoded_payload.keys())[:10]}")
+                    auth_log.warning("⚠️ Token 中沒有 email，可用字段: %s", list(decoded_payload.keys())[:10])
                     # 如果沒有 email，嘗試使用其他方式
                     # 檢查是否有其他標識符
                     if not uid:
                         raise AuthError("email_not_found_in_token", 400)
                     # 使用 uid 創建一個臨時 email
                     email = f"{uid}@firebase.local"
-                    print(f"[Auth] 使用臨時 email: {email}")
+                    auth_log.debug("使用臨時 email: %s", email)
                 
-                print(f"[Auth] 本地模式：從 token 提取 email={email}, uid={uid}, name={name}")
+                auth_log.debug("本地模式：從 token 提取 email=%s, uid=%s, name=%s", email, uid, name)
                 
                 # 使用 email 作為 provider_id
                 provider = "firebase"
@@ -664,15 +1793,13 @@ def firebase_login():
                     "username": email.split("@")[0] if email else "user"
                 }
                 token, user, new_user = login_with_provider(provider, provider_id, profile)
-                print(f"[Auth] ✅ 本地模式登入成功: {email}")
+                auth_log.info("✅ 本地模式登入成功: %s", email)
                 return jsonify({"ok": True, "token": token, "user": user, "new_user": new_user})
         except json.JSONDecodeError as e:
-            print(f"[Auth] ❌ JSON 解析失敗: {e}")
-            print(f"[Auth] Payload 長度: {len(payload) if 'payload' in locals() else 'N/A'}")
+            auth_log.error("❌ JSON 解析失敗: %s", e)
+            auth_log.debug("Payload 長度: %s", len(payload) if 'payload' in locals() else 'N/A')
         except Exception as e:
-            import traceback
-            print(f"[Auth] ❌ 本地模式解析 token 失敗: {e}")
-            traceback.print_exc()
+            auth_log.exception("❌ 本地模式解析 token 失敗: %s", e)
         
         # 如果解析失敗，返回錯誤
         return jsonify({
@@ -726,7 +1853,7 @@ def google_callback():
     code = request.args.get('code')
     if not code:
         return redirect(build_failure_redirect("missing_code"))
-    token_resp = requests.post(
+    token_resp = http_client.post(
         "https://oauth2.googleapis.com/token",
         data={
             "client_id": GOOGLE_CLIENT_ID,
@@ -734,8 +1861,7 @@ def google_callback():
             "code": code,
             "grant_type": "authorization_code",
             "redirect_uri": get_google_redirect_uri()
-        },
-        timeout=30
+        }
     )
     if token_resp.status_code != 200:
         return redirect(build_failure_redirect("google_token_failed"))
@@ -743,10 +1869,9 @@ def google_callback():
     access_token = tokens.get("access_token")
     if not access_token:
         return redirect(build_failure_redirect("google_token_missing"))
-    profile_resp = requests.get(
+    profile_resp = http_client.get(
         "https://www.googleapis.com/oauth2/v3/userinfo",
-        headers={"Authorization": f"Bearer {access_token}"},
-        timeout=30
+        headers={"Authorization": f"Bearer {access_token}"}
     )
     if profile_resp.status_code != 200:
         return redirect(build_failure_redirect("google_profile_failed"))
@@ -789,23 +1914,21 @@ def facebook_callback():
         "redirect_uri": get_facebook_redirect_uri(),
         "code": code
     }
-    token_resp = requests.get(
+    token_resp = http_client.get(
         f"https://graph.facebook.com/{FACEBOOK_API_VERSION}/oauth/access_token",
-        params=token_params,
-        timeout=30
+        params=token_params
     )
     if token_resp.status_code != 200:
         return redirect(build_failure_redirect("facebook_token_failed"))
     access_token = token_resp.json().get("access_token")
     if not access_token:
         return redirect(build_failure_redirect("facebook_token_missing"))
-    profile_resp = requests.get(
+    profile_resp = http_client.get(
         f"https://graph.facebook.com/{FACEBOOK_API_VERSION}/me",
         params={
             "fields": "id,name,email,picture",
             "access_token": access_token
-        },
-        timeout=30
+        }
     )
     if profile_resp.status_code != 200:
         return redirect(build_failure_redirect("facebook_profile_failed"))
@@ -1023,7 +2146,7 @@ def extract_analysis_text(text, basic_info=None):
                     analysis = analysis[:57] + '...'
             
             if analysis and len(analysis) > 10:  # 確保不是空字串或太短
-                print(f"[提取] ✅ 找到毒舌短評: {analysis[:50]}...")
+                extract_log.debug("✅ 找到毒舌短評: %s...", analysis[:50])
                 return analysis
     
     # 如果沒找到標記，檢查是否 AI 拒絕回答（支援多種格式）
@@ -1037,7 +2160,7 @@ def extract_analysis_text(text, basic_info=None):
     ]
     
     if any(phrase in text_lower for phrase in rejection_phrases):
-        print("[提取] ⚠️ 檢測到 AI 拒絕訊息，嘗試從商業價值分析中提取")
+        extract_log.warning("⚠️ 檢測到 AI 拒絕訊息，嘗試從商業價值分析中提取")
         # 嘗試從「商業價值分析」中提取一段簡短內容
         business_analysis_patterns = [
             r'商業價值分析[：:]\s*([^。]+。?)',
@@ -1056,7 +2179,7 @@ def extract_analysis_text(text, basic_info=None):
                 if len(analysis) > 60:
                     analysis = analysis[:57] + '...'
                 if len(analysis) > 15:  # 確保有足夠內容
-                    print(f"[提取] ✅ 從商業分析中提取: {analysis[:50]}...")
+                    extract_log.debug("✅ 從商業分析中提取: %s...", analysis[:50])
                     return analysis
         
         # 如果還是找不到，基於基本資訊生成風趣短評
@@ -1170,7 +2293,7 @@ def extract_basic_info_from_text(text):
         "posts": 0
     }
     
-    print("[提取] 開始從文字中提取基本資訊...")
+    extract_log.debug("開始從文字中提取基本資訊...")
     
     # 提取帳號名稱/用戶名（優先匹配「帳號名稱」）
     username_patterns = [
@@ -1184,7 +2307,7 @@ def extract_basic_info_from_text(text):
         match = re.search(pattern, text, re.IGNORECASE)
         if match:
             info["username"] = match.group(1).strip()
-            print(f"[提取] ✅ 找到用戶名: {info['username']}")
+            extract_log.debug("✅ 找到用戶名: %s", info['username'])
             break
     
     # 提取顯示名稱（如果沒有找到，使用用戶名）
@@ -1197,7 +2320,7 @@ def extract_basic_info_from_text(text):
         match = re.search(pattern, text, re.IGNORECASE)
         if match:
             info["display_name"] = match.group(1).strip()
-            print(f"[提取] ✅ 找到顯示名稱: {info['display_name']}")
+            extract_log.debug("✅ 找到顯示名稱: %s", info['display_name'])
             break
     
     # 如果沒有找到顯示名稱，使用用戶名
@@ -1226,26 +2349,26 @@ def extract_basic_info_from_text(text):
                     # 保留小數點，因為可能是 10.1K
                     num = float(followers_str.replace(',', '').replace('，', ''))
                     info["followers"] = int(num * 1000)
-                    print(f"[提取] ✅ 找到粉絲數 (K格式): {info['followers']} (原始: {followers_str}K)")
+                    extract_log.debug("✅ 找到粉絲數 (K格式): %s (原始: %sK)", info['followers'], followers_str)
                 except Exception as e:
-                    print(f"[提取] ⚠️ 解析粉絲數失敗: {e}")
+                    extract_log.warning("⚠️ 解析粉絲數失敗: %s", e)
                     pass
             # 處理 M 格式
             elif 'M' in matched_text:
                 try:
                     num = float(followers_str.replace(',', '').replace('，', ''))
                     info["followers"] = int(num * 1000000)
-                    print(f"[提取] ✅ 找到粉絲數 (M格式): {info['followers']}")
+                    extract_log.debug("✅ 找到粉絲數 (M格式): %s", info['followers'])
                 except Exception as e:
-                    print(f"[提取] ⚠️ 解析粉絲數失敗: {e}")
+                    extract_log.warning("⚠️ 解析粉絲數失敗: %s", e)
                     pass
             # 純數字格式
             else:
                 try:
                     info["followers"] = int(followers_str.replace(',', '').replace('，', '').replace('.', ''))
-                    print(f"[提取] ✅ 找到粉絲數: {info['followers']}")
+                    extract_log.debug("✅ 找到粉絲數: %s", info['followers'])
                 except Exception as e:
-                    print(f"[提取] ⚠️ 解析粉絲數失敗: {e}")
+                    extract_log.warning("⚠️ 解析粉絲數失敗: %s", e)
                     pass
             if info["followers"] > 0:
                 break
@@ -1262,7 +2385,7 @@ def extract_basic_info_from_text(text):
             following_str = match.group(1).replace(',', '').replace('，', '').replace('.', '')
             try:
                 info["following"] = int(following_str)
-                print(f"[提取] ✅ 找到追蹤數: {info['following']}")
+                extract_log.debug("✅ 找到追蹤數: %s", info['following'])
             except:
                 pass
             if info["following"] > 0:
@@ -1282,13 +2405,13 @@ def extract_basic_info_from_text(text):
             posts_str = match.group(1).replace(',', '').replace('，', '').replace('.', '')
             try:
                 info["posts"] = int(posts_str)
-                print(f"[提取] ✅ 找到貼文數: {info['posts']}")
+                extract_log.debug("✅ 找到貼文數: %s", info['posts'])
             except:
                 pass
             if info["posts"] > 0:
                 break
     
-    print(f"[提取] 最終提取結果: {info}")
+    extract_log.debug("最終提取結果: %s", info)
     return info
 
 # -----------------------------------------------------------------------------
@@ -1335,7 +2458,7 @@ def debug_last_ai():
 def debug_auth_status():
     """檢查認證系統狀態"""
     status = {
-        "firebase_configured": firebase_app is not None,
+        "firebase_configured": get_firebase_app() is not None,
         "database_configured": DATABASE_URL is not None,
         "jwt_secret_set": JWT_SECRET is not None and JWT_SECRET != 'dev-secret-change-me',
         "app_base_url": APP_BASE_URL,
@@ -1367,358 +2490,362 @@ def debug_auth_status():
     
     return jsonify(status)
 
-@app.route('/bd/analyze', methods=['POST'])
-def analyze():
-    """分析 IG 帳號"""
-    global last_ai_response
+class AnalysisError(Exception):
+    """分析請求錯誤（回傳 {"ok": False, "error": message}）"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+# 文件大小限制 (10MB)
+MAX_FILE_SIZE = 10 * 1024 * 1024
+ALLOWED_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+
+def prepare_analysis_upload():
+    """
+    驗證上傳的截圖並取得目前用戶（需在 request context 中呼叫）
+
+    Returns:
+        (current_user, profile_image)
+    """
+    analysis_log.debug("========== 開始新的分析請求 ==========")
+    analysis_log.debug("請求方法: %s", request.method)
+    analysis_log.debug("Content-Type: %s", request.content_type)
+    analysis_log.debug("文件列表: %s", list(request.files.keys()))
+    
+    current_user = get_authenticated_user(required=False)
+    # 先檢查頻率限制，超過時不必讀取與解碼圖片
+    enforce_rate_limit("analyze", current_user)
+    
+    # 檢查必要文件
+    if 'profile' not in request.files:
+        analysis_log.warning("❌ 缺少 profile 文件")
+        raise AnalysisError("缺少 profile 圖片", 400)
     
-    # 文件大小限制 (10MB)
-    MAX_FILE_SIZE = 10 * 1024 * 1024
+    profile_file = request.files['profile']
+    analysis_log.debug("Profile 文件名: %s", profile_file.filename)
     
-    print("[分析] ========== 開始新的分析請求 ==========")
-    print(f"[分析] 請求方法: {request.method}")
-    print(f"[分析] Content-Type: {request.content_type}")
-    print(f"[分析] 文件列表: {list(request.files.keys())}")
+    if profile_file.filename == '':
+        analysis_log.warning("❌ Profile 文件名為空")
+        raise AnalysisError("profile 文件為空", 400)
     
+    # 檢查文件類型
+    file_ext = os.path.splitext(profile_file.filename.lower())[1]
+    if file_ext not in ALLOWED_IMAGE_EXTENSIONS:
+        raise AnalysisError(f"不支援的文件格式，僅支援: {', '.join(ALLOWED_IMAGE_EXTENSIONS)}", 400)
+    
+    # 檢查 AI 分析器
+    if get_analyzer() is None:
+        analysis_log.error("❌ AI 分析器未初始化")
+        raise AnalysisError("AI 分析器未初始化，請檢查 OPENAI_API_KEY", 500)
+    
+    # 讀取 profile 圖片（先讀取內容，然後檢查大小）
+    analysis_log.debug("開始讀取 profile 文件...")
     try:
-        current_user = get_authenticated_user(required=False)
-        
-        # 檢查必要文件
-        if 'profile' not in request.files:
-            print("[分析] ❌ 缺少 profile 文件")
-            return jsonify({"ok": False, "error": "缺少 profile 圖片"}), 400
-        
-        profile_file = request.files['profile']
-        print(f"[分析] Profile 文件名: {profile_file.filename}")
-        
-        if profile_file.filename == '':
-            print("[分析] ❌ Profile 文件名為空")
-            return jsonify({"ok": False, "error": "profile 文件為空"}), 400
-        
-        # 檢查文件類型
-        allowed_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
-        file_ext = os.path.splitext(profile_file.filename.lower())[1]
-        if file_ext not in allowed_extensions:
-            return jsonify({"ok": False, "error": f"不支援的文件格式，僅支援: {', '.join(allowed_extensions)}"}), 400
-        
-        # 檢查 AI 分析器
-        if analyzer is None:
-            return jsonify({"ok": False, "error": "AI 分析器未初始化，請檢查 OPENAI_API_KEY"}), 500
-        
-        # 讀取 profile 圖片（先讀取內容，然後檢查大小）
-        print("[分析] 開始讀取 profile 文件...")
-        try:
-            profile_data = profile_file.read()
-            profile_size = len(profile_data)
-            print(f"[分析] Profile 文件大小: {profile_size} bytes ({profile_size / 1024 / 1024:.2f} MB)")
-        except Exception as e:
-            print(f"[分析] ❌ 讀取文件失敗: {e}")
-            return jsonify({"ok": False, "error": f"讀取文件失敗: {str(e)}"}), 400
-        
-        if profile_size > MAX_FILE_SIZE:
-            print(f"[分析] ❌ 文件過大: {profile_size} > {MAX_FILE_SIZE}")
-            return jsonify({"ok": False, "error": f"文件過大，最大允許 {MAX_FILE_SIZE // 1024 // 1024}MB"}), 400
-        
-        if profile_size == 0:
-            print("[分析] ❌ 文件為空")
-            return jsonify({"ok": False, "error": "文件為空"}), 400
-        
-        # 讀取圖片
-        print("[分析] 開始解析圖片...")
-        try:
+        profile_data = profile_file.read()
+        profile_size = len(profile_data)
+        analysis_log.debug("Profile 文件大小: %s bytes (%.2f MB)", profile_size, profile_size / 1024 / 1024)
+    except Exception as e:
+        analysis_log.error("❌ 讀取文件失敗: %s", e)
+        raise AnalysisError(f"讀取文件失敗: {str(e)}", 400)
+    
+    if profile_size > MAX_FILE_SIZE:
+        analysis_log.warning("❌ 文件過大: %s > %s", profile_size, MAX_FILE_SIZE)
+        raise AnalysisError(f"文件過大，最大允許 {MAX_FILE_SIZE // 1024 // 1024}MB", 400)
+    
+    if profile_size == 0:
+        analysis_log.warning("❌ 文件為空")
+        raise AnalysisError("文件為空", 400)
+    
+    # 讀取圖片
+    analysis_log.debug("開始解析圖片...")
+    try:
+        with span("decode"):
             profile_image = Image.open(io.BytesIO(profile_data))
-            print(f"[分析] 圖片格式: {profile_image.format}, 尺寸: {profile_image.size}")
+            analysis_log.debug("圖片格式: %s, 尺寸: %s", profile_image.format, profile_image.size)
             profile_image = profile_image.convert('RGB')
-            print("[分析] ✅ 圖片讀取成功")
-        except Exception as e:
-            print(f"[分析] ❌ 無法讀取圖片文件: {e}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({"ok": False, "error": f"無法讀取圖片文件: {str(e)}"}), 400
-        
-        # 讀取 posts 圖片（可選，最多 6 張）
-        post_images = []
-        if 'posts' in request.files:
-            post_files = request.files.getlist('posts')
-            for post_file in post_files[:6]:  # 最多 6 張
-                if post_file.filename:
-                    # 檢查文件類型
-                    post_ext = os.path.splitext(post_file.filename.lower())[1]
-                    if post_ext not in allowed_extensions:
-                        print(f"⚠️ 不支援的貼文圖片格式，跳過: {post_file.filename}")
-                        continue
-                    
-                    # 讀取文件內容並檢查大小
-                    post_data = post_file.read()
-                    post_size = len(post_data)
-                    
-                    if post_size > MAX_FILE_SIZE:
-                        print(f"⚠️ 貼文圖片過大，跳過: {post_file.filename}")
-                        continue
-                    
-                    if post_size == 0:
-                        print(f"⚠️ 貼文圖片為空，跳過: {post_file.filename}")
-                        continue
-                    
-                    try:
-                        post_img = Image.open(io.BytesIO(post_data))
-                        post_img = post_img.convert('RGB')
-                        post_images.append(post_img)
-                    except Exception as e:
-                        print(f"⚠️ 無法讀取貼文圖片: {e}")
-        
-        # 使用 AI 分析（目前只分析 profile，posts 可作為額外上下文）
-        print("[分析] 開始 AI 分析...")
-        print(f"[分析] AI 分析器狀態: {analyzer is not None}")
-        
-        if analyzer is None:
-            print("[分析] ❌ AI 分析器未初始化")
-            return jsonify({
-                "ok": False,
-                "error": "AI 分析器未初始化，請檢查 OPENAI_API_KEY"
-            }), 500
-        
-        witty_review = None  # 初始化變數
-        try:
-            # 使用兩階段處理：返回 (完整分析, 風趣短評)
-            analysis_text, witty_review = analyzer.analyze_profile(profile_image)
-            print(f"[分析] ✅ AI 分析完成，回應長度: {len(analysis_text)}")
-            if witty_review:
-                print(f"[分析] ✅ 風趣短評生成: {witty_review[:50]}...")
-            
-            # 檢查 AI 是否拒絕回答（完整分析部分）
-            if any(phrase in analysis_text.lower() for phrase in [
-                "i'm sorry", "i cannot", "i can't assist", "無法協助", 
-                "不能協助", "抱歉", "無法直接"
-            ]):
-                print("[分析] ⚠️ 檢測到 AI 拒絕回答，但已有風趣短評")
-                if "i'm sorry" in analysis_text.lower() or "i can't assist" in analysis_text.lower():
-                    print("[分析] AI 回應可能被安全過濾，檢查回應內容...")
-                    print(f"[分析] AI 回應前 200 字符: {analysis_text[:200]}")
-            
-            last_ai_response = analysis_text
-        except Exception as e:
-            error_msg = f"AI 分析失敗: {str(e)}"
-            print(f"[分析] ❌ {error_msg}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({
-                "ok": False,
-                "error": error_msg
-            }), 500
-        
-        # 提取 JSON 數據
-        print("[分析] 開始提取 JSON 數據...")
+        analysis_log.debug("✅ 圖片讀取成功")
+    except Exception as e:
+        analysis_log.warning("❌ 無法讀取圖片文件: %s", e, exc_info=e)
+        raise AnalysisError(f"無法讀取圖片文件: {str(e)}", 400)
+    
+    # 讀取 posts 圖片（可選，最多 6 張；目前只分析 profile，posts 只做檢查）
+    if 'posts' in request.files:
+        post_files = request.files.getlist('posts')
+        for post_file in post_files[:6]:  # 最多 6 張
+            if post_file.filename:
+                # 檢查文件類型
+                post_ext = os.path.splitext(post_file.filename.lower())[1]
+                if post_ext not in ALLOWED_IMAGE_EXTENSIONS:
+                    analysis_log.warning("⚠️ 不支援的貼文圖片格式，跳過: %s", post_file.filename)
+                    continue
+                
+                # 讀取文件內容並檢查大小
+                post_data = post_file.read()
+                post_size = len(post_data)
+                
+                if post_size > MAX_FILE_SIZE:
+                    analysis_log.warning("⚠️ 貼文圖片過大，跳過: %s", post_file.filename)
+                    continue
+                
+                if post_size == 0:
+                    analysis_log.warning("⚠️ 貼文圖片為空，跳過: %s", post_file.filename)
+                    continue
+                
+                try:
+                    Image.open(io.BytesIO(post_data)).convert('RGB')
+                except Exception as e:
+                    analysis_log.warning("⚠️ 無法讀取貼文圖片: %s", e)
+    
+    return current_user, profile_image
+
+def record_ai_response(analysis_text, witty_review):
+    """記錄 AI 回應並檢查是否被拒絕回答"""
+    global last_ai_response
+    analysis_log.info("✅ AI 分析完成，回應長度: %s", len(analysis_text))
+    if witty_review:
+        analysis_log.debug("✅ 風趣短評生成: %s...", witty_review[:50])
+    
+    # 檢查 AI 是否拒絕回答（完整分析部分）
+    if any(phrase in analysis_text.lower() for phrase in [
+        "i'm sorry", "i cannot", "i can't assist", "無法協助", 
+        "不能協助", "抱歉", "無法直接"
+    ]):
+        analysis_log.warning("⚠️ 檢測到 AI 拒絕回答，但已有風趣短評")
+        if "i'm sorry" in analysis_text.lower() or "i can't assist" in analysis_text.lower():
+            analysis_log.debug("AI 回應可能被安全過濾，檢查回應內容...")
+            analysis_log.debug("AI 回應前 200 字符: %s", analysis_text[:200])
+    
+    last_ai_response = analysis_text
+
+def ai_failure(e):
+    error_msg = f"AI 分析失敗: {str(e)}"
+    analysis_log.error("❌ %s", error_msg, exc_info=e)
+    return AnalysisError(error_msg, 500)
+
+def complete_analysis(analysis_text, witty_review, current_user, usage=None):
+    """
+    由 AI 回應計算價值、組合並儲存分析結果
+    
+    usage 為本次分析的 UsageLedger，用量記在分析快照上
+
+    Returns:
+        回應 dict
+    """
+    # 提取 JSON 數據
+    analysis_log.debug("開始提取 JSON 數據...")
+    analysis_log.debug("AI 回應長度: %s 字符", len(analysis_text))
+    with span("extract"):
         analysis_data = extract_json_from_text(analysis_text)
-        if analysis_data:
-            print("[分析] ✅ JSON 提取成功")
-        else:
-            print("[分析] ⚠️ JSON 提取失敗，將從文字中提取")
-        
         # 優先從文字中提取基本資訊（因為 AI 通常在文字中更準確地提到這些資訊）
-        print("[分析] 優先從文字中提取基本資訊...")
-        print(f"[分析] AI 回應長度: {len(analysis_text)} 字符")
         basic_info = extract_basic_info_from_text(analysis_text)
-        print(f"[分析] 文字提取結果: {basic_info}")
-        
-        # 如果 JSON 中有 basic_info，且文字提取不完整，則合併使用
-        if analysis_data and "basic_info" in analysis_data:
-            json_basic_info = analysis_data["basic_info"]
-            print(f"[分析] JSON 中也包含基本資訊: {json_basic_info}")
-            
-            # 合併：優先使用文字提取的結果，如果文字中沒有則使用 JSON 的
-            if basic_info.get("username") == "unknown" and json_basic_info.get("username"):
-                basic_info["username"] = json_basic_info["username"]
-            if basic_info.get("display_name") == "未知用戶" and json_basic_info.get("display_name"):
-                basic_info["display_name"] = json_basic_info["display_name"]
-            if basic_info.get("followers", 0) == 0 and json_basic_info.get("followers"):
-                basic_info["followers"] = json_basic_info["followers"]
-            if basic_info.get("following", 0) == 0 and json_basic_info.get("following"):
-                basic_info["following"] = json_basic_info["following"]
-            if basic_info.get("posts", 0) == 0 and json_basic_info.get("posts"):
-                basic_info["posts"] = json_basic_info["posts"]
-            
-            print(f"[分析] ✅ 合併後的基本資訊: {basic_info}")
-        
-        # 確保 basic_info 是字典
-        if not isinstance(basic_info, dict):
-            print("[分析] ⚠️ basic_info 不是字典，重新初始化")
-            basic_info = {}
-        
-        # 如果還是沒有提取到，使用預設值
-        followers_value = parse_numeric_count(basic_info.get("followers", 0))
-        if not basic_info or followers_value <= 0:
-            print("[分析] ❌ basic_info 資料無效，返回錯誤讓使用者重新上傳")
-            return jsonify({
-                "ok": False,
-                "error": "AI 無法可靠地讀取帳號基本資訊，請重新上傳更清晰的截圖再試一次"
-            }), 400
-        # 正規化所有數值
-        basic_info["followers"] = parse_numeric_count(followers_value, 0)
-        basic_info["following"] = parse_numeric_count(basic_info.get("following", 0), 0)
-        basic_info["posts"] = parse_numeric_count(basic_info.get("posts", 0), 0)
-        basic_info["username"] = str(basic_info.get("username", "unknown")).strip()
-        basic_info["display_name"] = str(basic_info.get("display_name", basic_info.get("username", "未知用戶"))).strip()
-        
-        if not analysis_data:
-            # 如果無法提取 JSON，使用預設值
-            print("⚠️ 無法從 AI 回應中提取 JSON，使用預設值")
-            print(f"[分析] AI 回應前 500 字符: {analysis_text[:500]}")
-            analysis_data = {
-                "visual_quality": {"overall": 5.0, "consistency": 5.0},
-                "content_type": {"primary": "未知", "category_tier": "mid"},
-                "content_format": {"video_focus": 1.0, "personal_connection": 5.0},
-                "professionalism": {"has_contact": False, "is_business_account": False},
-                "personality_type": {"primary_type": "type_5", "reasoning": "無法判斷"},
-                "improvement_tips": ["請提供更清晰的截圖"]
-            }
-        
-        # 使用兩階段處理生成的風趣短評（優先使用）
-        # 如果兩階段處理失敗，才使用 extract_analysis_text 作為備用
-        if witty_review and len(witty_review.strip()) > 10:
-            clean_analysis_text = witty_review
-            print(f"[分析] ✅ 使用兩階段處理生成的風趣短評")
-        else:
-            # 備用方案：從完整分析中提取
-            print("[分析] ⚠️ 使用備用方案提取短評")
-            clean_analysis_text = extract_analysis_text(analysis_text, basic_info)
+    if analysis_data:
+        analysis_log.debug("✅ JSON 提取成功")
+    else:
+        analysis_log.warning("⚠️ JSON 提取失敗，將從文字中提取")
+    analysis_log.debug("文字提取結果: %s", basic_info)
+    
+    # 如果 JSON 中有 basic_info，且文字提取不完整，則合併使用
+    if analysis_data and "basic_info" in analysis_data:
+        json_basic_info = analysis_data["basic_info"]
+        analysis_log.debug("JSON 中也包含基本資訊: %s", json_basic_info)
         
-        clean_analysis_text = finalize_short_review(clean_analysis_text)
+        # 合併：優先使用文字提取的結果，如果文字中沒有則使用 JSON 的
+        if basic_info.get("username") == "unknown" and json_basic_info.get("username"):
+            basic_info["username"] = json_basic_info["username"]
+        if basic_info.get("display_name") == "未知用戶" and json_basic_info.get("display_name"):
+            basic_info["display_name"] = json_basic_info["display_name"]
+        if basic_info.get("followers", 0) == 0 and json_basic_info.get("followers"):
+            basic_info["followers"] = json_basic_info["followers"]
+        if basic_info.get("following", 0) == 0 and json_basic_info.get("following"):
+            basic_info["following"] = json_basic_info["following"]
+        if basic_info.get("posts", 0) == 0 and json_basic_info.get("posts"):
+            basic_info["posts"] = json_basic_info["posts"]
         
-        # 計算價值
-        print("[分析] 開始計算價值...")
-        try:
+        analysis_log.debug("✅ 合併後的基本資訊: %s", basic_info)
+    
+    # 確保 basic_info 是字典
+    if not isinstance(basic_info, dict):
+        analysis_log.warning("⚠️ basic_info 不是字典，重新初始化")
+        basic_info = {}
+    
+    # 如果還是沒有提取到，使用預設值
+    followers_value = parse_numeric_count(basic_info.get("followers", 0))
+    if not basic_info or followers_value <= 0:
+        analysis_log.error("❌ basic_info 資料無效，返回錯誤讓使用者重新上傳")
+        raise AnalysisError("AI 無法可靠地讀取帳號基本資訊，請重新上傳更清晰的截圖再試一次", 400)
+    # 正規化所有數值
+    basic_info["followers"] = parse_numeric_count(followers_value, 0)
+    basic_info["following"] = parse_numeric_count(basic_info.get("following", 0), 0)
+    basic_info["posts"] = parse_numeric_count(basic_info.get("posts", 0), 0)
+    basic_info["username"] = str(basic_info.get("username", "unknown")).strip()
+    basic_info["display_name"] = str(basic_info.get("display_name", basic_info.get("username", "未知用戶"))).strip()
+    
+    if not analysis_data:
+        # 如果無法提取 JSON，使用預設值
+        analysis_log.warning("⚠️ 無法從 AI 回應中提取 JSON，使用預設值")
+        analysis_log.debug("AI 回應前 500 字符: %s", analysis_text[:500])
+        analysis_data = {
+            "visual_quality": {"overall": 5.0, "consistency": 5.0},
+            "content_type": {"primary": "未知", "category_tier": "mid"},
+            "content_format": {"video_focus": 1.0, "personal_connection": 5.0},
+            "professionalism": {"has_contact": False, "is_business_account": False},
+            "personality_type": {"primary_type": "type_5", "reasoning": "無法判斷"},
+            "improvement_tips": ["請提供更清晰的截圖"]
+        }
+    
+    # 使用兩階段處理生成的風趣短評（優先使用）
+    # 如果兩階段處理失敗，才使用 extract_analysis_text 作為備用
+    if witty_review and len(witty_review.strip()) > 10:
+        clean_analysis_text = witty_review
+        analysis_log.debug("✅ 使用兩階段處理生成的風趣短評")
+    else:
+        # 備用方案：從完整分析中提取
+        analysis_log.warning("⚠️ 使用備用方案提取短評")
+        clean_analysis_text = extract_analysis_text(analysis_text, basic_info)
+    
+    clean_analysis_text = finalize_short_review(clean_analysis_text)
+    
+    # 計算價值
+    analysis_log.debug("開始計算價值...")
+    try:
+        with span("valuation"):
             multipliers = calculate_multipliers(analysis_data)
-            print(f"[分析] 係數計算完成: {len(multipliers)} 個係數")
+            analysis_log.debug("係數計算完成: %s 個係數", len(multipliers))
             value_estimation = calculate_values(
                 basic_info["followers"],
                 multipliers,
                 analysis_data
             )
-            print(f"[分析] ✅ 價值計算完成")
-        except Exception as e:
-            print(f"[分析] ❌ 價值計算失敗: {e}")
-            import traceback
-            traceback.print_exc()
-            # 使用預設值
-            multipliers = {
-                "visual": 1.0, "content": 1.0, "professional": 1.0,
-                "follower": 1.0, "unique": 1.0, "engagement": 1.0,
-                "niche": 1.0, "audience": 1.0, "cross_platform": 1.0,
-                "ratio": 1.0, "commercial": 1.0
-            }
-            value_estimation = {
-                "post_value": 1000,
-                "story_value": 300,
-                "reels_value": 800,
-                "account_asset_value": basic_info["followers"] * 5,
-                "multipliers": multipliers
-            }
-        
-        # 獲取人格類型資訊
-        try:
-            personality_type_id = analysis_data.get("personality_type", {}).get("primary_type", "type_5")
-            if not personality_type_id or personality_type_id not in PERSONALITY_TYPES:
-                personality_type_id = "type_5"
-            personality_info = PERSONALITY_TYPES.get(personality_type_id, PERSONALITY_TYPES["type_5"])
-        except Exception as e:
-            print(f"[分析] ⚠️ 獲取人格類型失敗: {e}，使用預設值")
-            personality_type_id = "type_5"
-            personality_info = PERSONALITY_TYPES["type_5"]
-        
-        # 清理用戶輸入，防止 XSS（雖然這裡是從 AI 回應中提取，但還是要安全）
-        def sanitize_string(s):
-            if not isinstance(s, str):
-                return str(s) if s else ""
-            # 移除潛在的危險字符
-            return s.replace('<', '&lt;').replace('>', '&gt;')[:1000]  # 限制長度
-        
-        # 構建回應
-        result = {
-            "ok": True,
-            "version": "v5",
-            "username": sanitize_string(basic_info.get("username", "unknown")),
-            "display_name": sanitize_string(basic_info.get("display_name", "未知用戶")),
-            "followers": int(basic_info["followers"]),
-            "following": int(basic_info.get("following", 0)),
-            "posts": int(basic_info.get("posts", 0)),
-            "analysis_text": clean_analysis_text[:2000] if clean_analysis_text else "",  # 限制長度
-            "primary_type": {
-                "id": personality_type_id,
-                "emoji": personality_info["emoji"],
-                "name_zh": personality_info["name_zh"],
-                "name_en": personality_info["name_en"]
-            },
-            "value_estimation": {
-                **value_estimation,
-                "follower_tier": get_follower_tier(basic_info["followers"])
-            },
-            "improvement_tips": [
-                sanitize_string(tip) for tip in analysis_data.get("improvement_tips", [])[:10]  # 最多 10 條
-            ]
+        analysis_log.debug("✅ 價值計算完成")
+    except Exception as e:
+        analysis_log.exception("❌ 價值計算失敗: %s", e)
+        # 使用預設值
+        multipliers = {
+            "visual": 1.0, "content": 1.0, "professional": 1.0,
+            "follower": 1.0, "unique": 1.0, "engagement": 1.0,
+            "niche": 1.0, "audience": 1.0, "cross_platform": 1.0,
+            "ratio": 1.0, "commercial": 1.0
         }
-        result["value_subtitle"] = "基於 AI 智能鑑價模型 (TWD)"
-        result["plain_username"] = normalize_username(result["username"])
-        result["user_id"] = current_user["id"] if current_user else None
-        
-        save_analysis_result(result)
-        
-        print("[分析] ✅ 分析完成")
-        return jsonify(result)
-        
-    except ValueError as e:
+        value_estimation = {
+            "post_value": 1000,
+            "story_value": 300,
+            "reels_value": 800,
+            "account_asset_value": basic_info["followers"] * 5,
+            "multipliers": multipliers
+        }
+    
+    # 獲取人格類型資訊
+    try:
+        personality_type_id = analysis_data.get("personality_type", {}).get("primary_type", "type_5")
+        if not personality_type_id or personality_type_id not in PERSONALITY_TYPES:
+            personality_type_id = "type_5"
+        personality_info = PERSONALITY_TYPES.get(personality_type_id, PERSONALITY_TYPES["type_5"])
+    except Exception as e:
+        analysis_log.warning("⚠️ 獲取人格類型失敗: %s，使用預設值", e)
+        personality_type_id = "type_5"
+        personality_info = PERSONALITY_TYPES["type_5"]
+    
+    # 清理用戶輸入，防止 XSS（雖然這裡是從 AI 回應中提取，但還是要安全）
+    def sanitize_string(s):
+        if not isinstance(s, str):
+            return str(s) if s else ""
+        # 移除潛在的危險字符
+        return s.replace('<', '&lt;').replace('>', '&gt;')[:1000]  # 限制長度
+    
+    # 構建回應
+    result = {
+        "ok": True,
+        "version": "v5",
+        "username": sanitize_string(basic_info.get("username", "unknown")),
+        "display_name": sanitize_string(basic_info.get("display_name", "未知用戶")),
+        "followers": int(basic_info["followers"]),
+        "following": int(basic_info.get("following", 0)),
+        "posts": int(basic_info.get("posts", 0)),
+        "analysis_text": clean_analysis_text[:2000] if clean_analysis_text else "",  # 限制長度
+        "primary_type": {
+            "id": personality_type_id,
+            "emoji": personality_info["emoji"],
+            "name_zh": personality_info["name_zh"],
+            "name_en": personality_info["name_en"]
+        },
+        "value_estimation": {
+            **value_estimation,
+            "follower_tier": get_follower_tier(basic_info["followers"])
+        },
+        "improvement_tips": [
+            sanitize_string(tip) for tip in analysis_data.get("improvement_tips", [])[:10]  # 最多 10 條
+        ]
+    }
+    result["value_subtitle"] = "基於 AI 智能鑑價模型 (TWD)"
+    result["plain_username"] = normalize_username(result["username"])
+    result["user_id"] = current_user["id"] if current_user else None
+    
+    with span("save"):
+        save_analysis_result(dict(result, _usage=usage.totals()) if usage else result)
+    
+    trace = current_trace()
+    analysis_log.info("✅ 分析完成", extra={"data": {"stages_ms": trace.stage_ms() if trace else {}}})
+    return result
+
+def analysis_error_response(e):
+    """把分析流程的例外轉成 JSON 錯誤回應（同步與 ASGI 模式共用）"""
+    if isinstance(e, AnalysisError):
+        return jsonify({"ok": False, "error": e.message}), e.status
+    if isinstance(e, AuthError):
+        return handle_auth_error(e)
+    if isinstance(e, RateLimitExceeded):
+        return handle_rate_limited(e)
+    if isinstance(e, ValueError):
         # 處理值錯誤（如 AI API 錯誤）
         error_msg = str(e)
-        print(f"[分析] ❌ ValueError: {error_msg}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({
-            "ok": False,
-            "error": error_msg
-        }), 500
-    except KeyError as e:
+        analysis_log.error("❌ ValueError: %s", error_msg, exc_info=e)
+        return jsonify({"ok": False, "error": error_msg}), 500
+    if isinstance(e, KeyError):
         # 處理鍵值錯誤
         error_msg = f"數據結構錯誤: 缺少 {str(e)}"
-        print(f"[分析] ❌ KeyError: {error_msg}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({
-            "ok": False,
-            "error": error_msg
-        }), 500
-    except TypeError as e:
+        analysis_log.error("❌ KeyError: %s", error_msg, exc_info=e)
+        return jsonify({"ok": False, "error": error_msg}), 500
+    if isinstance(e, TypeError):
         # 處理類型錯誤
         error_msg = f"數據類型錯誤: {str(e)}"
-        print(f"[分析] ❌ TypeError: {error_msg}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({
-            "ok": False,
-            "error": error_msg
-        }), 500
-    except Image.UnidentifiedImageError as e:
+        analysis_log.error("❌ TypeError: %s", error_msg, exc_info=e)
+        return jsonify({"ok": False, "error": error_msg}), 500
+    if isinstance(e, Image.UnidentifiedImageError):
         # 處理圖片格式錯誤
         error_msg = f"無法識別圖片格式: {str(e)}"
-        print(f"[分析] ❌ {error_msg}")
-        return jsonify({
-            "ok": False,
-            "error": error_msg
-        }), 400
+        analysis_log.error("❌ %s", error_msg)
+        return jsonify({"ok": False, "error": error_msg}), 400
+    # 處理其他未預期的錯誤
+    error_msg = str(e)
+    error_type = type(e).__name__
+    analysis_log.error("❌ 未預期錯誤 (%s): %s", error_type, error_msg, exc_info=e)
+    return jsonify({
+        "ok": False,
+        "error": f"伺服器錯誤 ({error_type}): {error_msg}" if error_msg else "未知錯誤",
+        "error_type": error_type
+    }), 500
+
+@app.route('/bd/analyze', methods=['POST'])
+def analyze():
+    """分析 IG 帳號（ASGI 模式下由 asgi.py 以 async 流程處理，見 asgi.py）"""
+    try:
+        current_user, profile_image = prepare_analysis_upload()
+        
+        # 使用兩階段處理：返回 (完整分析, 風趣短評)
+        analysis_log.debug("開始 AI 分析...")
+        budget = check_openai_budget(current_user)
+        try:
+            with openai_usage_scope(current_user) as usage:
+                analysis_text, witty_review = get_analyzer().analyze_profile(profile_image, **budget.analyzer_kwargs())
+        except Exception as e:
+            raise ai_failure(e)
+        record_ai_response(analysis_text, witty_review)
+        
+        return jsonify(complete_analysis(analysis_text, witty_review, current_user, usage))
     except Exception as e:
-        # 處理其他未預期的錯誤
-        error_msg = str(e)
-        error_type = type(e).__name__
-        print(f"[分析] ❌ 未預期錯誤 ({error_type}): {error_msg}")
-        import traceback
-        print("=" * 50)
-        print("完整錯誤追蹤:")
-        traceback.print_exc()
-        print("=" * 50)
-        return jsonify({
-            "ok": False,
-            "error": f"伺服器錯誤 ({error_type}): {error_msg}" if error_msg else "未知錯誤",
-            "error_type": error_type
-        }), 500
+        return analysis_error_response(e)
 
 def get_follower_tier(followers):
     """獲取粉絲等級（舊版 Growth Creator 風格）"""
@@ -1741,15 +2868,73 @@ def get_follower_tier(followers):
     else:
         return "🌱 素人"
 
+# -----------------------------------------------------------------------------
+# 回應快取（公開讀取 API，見 response_cache.py）
+# -----------------------------------------------------------------------------
+RESPONSE_CACHE_CONTROL = f"public, max-age={RESPONSE_CACHE_MAX_AGE}, stale-while-revalidate={int(RESPONSE_CACHE_TTL + RESPONSE_CACHE_STALE)}"
+
+def _encode_json(payload):
+    return app.json.dumps_bytes(payload) + b"\n"
+
+def cached_json_response(key, tags, build):
+    """
+    以回應快取提供 JSON 回應
+
+    build() 回傳 (payload, status)，只快取 200；內容過期但仍在 stale 期間時先回傳舊內容並在背景重新產生。
+    回應帶強 ETag 與 Cache-Control（stale-while-revalidate），If-None-Match 相符時回 304。
+    """
+    if cache_channel is not None:
+        cache_channel.poll()
+    entry, needs_refresh = response_cache.get(key)
+    if entry is None:
+        generation = response_cache.generation
+        payload, status = build()
+        if status != 200:
+            return jsonify(payload), status
+        entry = response_cache.set(key, _encode_json(payload), tags, generation)
+        state = 'MISS'
+    else:
+        state = 'STALE' if entry.fresh_until <= time.monotonic() else 'HIT'
+        if needs_refresh:
+            def rebuild():
+                payload, status = build()
+                return _encode_json(payload) if status == 200 else None
+            response_cache.refresh(key, rebuild, tags)
+
+    # 壓縮結果跟著快取內容保存，命中時不必重新壓縮
+    encoding = None
+    headers = {'Cache-Control': RESPONSE_CACHE_CONTROL, 'X-Cache': state}
+    if len(entry.body) >= COMPRESS_MIN_SIZE:
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        headers['Vary'] = 'Accept-Encoding'
+    if etag_matches(request.headers.get('If-None-Match'), entry.etag):
+        response = app.response_class(status=304, headers=headers)
+        response.set_etag(encoded_etag(entry.etag, encoding))
+        return response
+    body = entry.body
+    if encoding:
+        body = entry.encoded.get(encoding)
+        if body is None:
+            body = entry.encoded.setdefault(encoding, compress(entry.body, encoding))
+        headers['Content-Encoding'] = encoding
+    response = app.response_class(body, mimetype='application/json', headers=headers)
+    response.set_etag(encoded_etag(entry.etag, encoding))
+    return response
+
 @app.route('/api/result')
 def api_get_result():
     username = request.args.get('username', '').strip()
     if not username:
         return jsonify({"ok": False, "error": "username_required"}), 400
-    data = get_analysis_result(username)
-    if not data:
-        return jsonify({"ok": False, "error": "not_found"}), 404
-    return jsonify(data)
+    username_key = normalize_username(username)
+
+    def build():
+        data = get_analysis_result(username_key)
+        if not data:
+            return {"ok": False, "error": "not_found"}, 404
+        return data, 200
+
+    return cached_json_response(('result', username_key), (f"username:{username_key}",), build)
 
 def login_required(f):
     """登入驗證裝飾器"""
@@ -1778,14 +2963,14 @@ def admin_required(f):
             # 檢查是否為管理員
             user_email = user.get("email", "").lower()
             if not ADMIN_EMAILS:
-                print(f"[Admin] ⚠️ ADMIN_EMAILS 未設定，拒絕訪問")
+                admin_log.warning("⚠️ ADMIN_EMAILS 未設定，拒絕訪問")
                 raise AuthError("admin_access_required", 403)
             
             if user_email not in ADMIN_EMAILS:
-                print(f"[Admin] ⚠️ 用戶 {user_email} 嘗試訪問管理員功能，但不在管理員列表中")
+                admin_log.warning("⚠️ 用戶 %s 嘗試訪問管理員功能，但不在管理員列表中", user_email)
                 raise AuthError("admin_access_required", 403)
             
-            print(f"[Admin] ✅ 管理員 {user_email} 訪問管理員功能")
+            admin_log.debug("✅ 管理員 %s 訪問管理員功能", user_email)
         except AuthError as e:
             return jsonify({"ok": False, "error": e.message}), e.status
         return f(*args, **kwargs)
@@ -1796,7 +2981,7 @@ def admin_required(f):
 def get_user_analyses():
     """獲取當前用戶的所有分析記錄"""
     user = get_authenticated_user(required=True)
-    session = SessionLocal()
+    session = get_db_session()
     try:
         # 查詢該用戶的所有分析結果
         records = session.query(AnalysisResult).filter_by(user_id=user["id"]).order_by(AnalysisResult.created_at.desc()).all()
@@ -1804,58 +2989,58 @@ def get_user_analyses():
         analyses = []
         for record in records:
             try:
-                data = json.loads(record.data)
+                summary = load_record_summary(record)
                 analyses.append({
                     "id": record.id,
                     "username": record.username,
                     "display_name": record.display_name,
-                    "created_at": record.created_at.isoformat() if record.created_at else None,
-                    "updated_at": record.updated_at.isoformat() if record.updated_at else None,
-                    "account_asset_value": data.get("value_estimation", {}).get("account_asset_value", 0),
-                    "followers": data.get("followers", 0),
-                    "analysis_text": data.get("analysis_text", "")[:100] + "..." if len(data.get("analysis_text", "")) > 100 else data.get("analysis_text", "")
+                    "created_at": record.created_at,
+                    "updated_at": record.updated_at,
+                    "account_asset_value": record.account_asset_value or 0,
+                    "followers": summary.get("followers", 0),
+                    "analysis_text": summary.get("analysis_text", "")
                 })
-            except (json.JSONDecodeError, KeyError) as e:
-                print(f"[API] ⚠️ 解析分析記錄失敗 (ID: {record.id}): {e}")
+            except (ValueError, KeyError) as e:
+                api_log.warning("⚠️ 解析分析記錄失敗 (ID: %s): %s", record.id, e)
                 continue
         
         return jsonify({"ok": True, "analyses": analyses, "count": len(analyses)})
     except SQLAlchemyError as e:
         session.rollback()
-        print(f"[API] ❌ 查詢用戶分析記錄失敗: {e}")
+        api_log.error("❌ 查詢用戶分析記錄失敗: %s", e)
         return jsonify({"ok": False, "error": "database_error"}), 500
-    finally:
-        session.close()
 
 @app.route('/api/user/me', methods=['GET'])
 @login_required
 def get_current_user():
     """獲取當前登入用戶的資訊"""
+    # 驗證時已在本次請求的 session 中載入用戶，不需再查詢一次
     user = get_authenticated_user(required=True)
-    session = SessionLocal()
-    try:
-        db_user = session.get(User, user["id"])
-        if not db_user:
-            raise AuthError("user_not_found", 404)
-        return jsonify({"ok": True, "user": serialize_user(db_user)})
-    except SQLAlchemyError as e:
-        session.rollback()
-        print(f"[API] ❌ 查詢用戶資訊失敗: {e}")
-        return jsonify({"ok": False, "error": "database_error"}), 500
-    finally:
-        session.close()
+    return jsonify({"ok": True, "user": user})
 
 @app.route('/api/user/stats', methods=['GET'])
 @login_required
 def get_user_stats():
-    """獲取當前用戶的統計資訊"""
+    """
+    獲取當前用戶的統計資訊（讀取預先彙總的日/月資料）
+
+    value_history 為每個 IG 帳號每個週期一點（granularity=day/month），value 是該週期最後一次分析的數值，
+    min / max / count 為該週期內的統計；value_change 只比較主要帳號（最近分析的帳號）前後兩個週期，
+    各帳號的最新數值與變化見 accounts
+    """
     user = get_authenticated_user(required=True)
-    session = SessionLocal()
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in ROLLUP_PERIODS:
+        return jsonify({"ok": False, "error": "invalid_granularity"}), 400
+    session = get_read_session()
     try:
-        # 查詢該用戶的所有分析結果
-        records = session.query(AnalysisResult).filter_by(user_id=user["id"]).order_by(AnalysisResult.created_at.desc()).all()
+        # 單一索引範圍掃描 (user_id, period, period_start)
+        rollups = session.query(AnalysisRollup).filter(
+            AnalysisRollup.user_id == user["id"],
+            AnalysisRollup.period == granularity
+        ).order_by(AnalysisRollup.period_start.asc(), AnalysisRollup.last_at.asc()).all()
         
-        if not records:
+        if not rollups:
             return jsonify({
                 "ok": True,
                 "stats": {
@@ -1864,56 +3049,276 @@ def get_user_stats():
                     "highest_value": 0,
                     "first_analysis_date": None,
                     "latest_analysis_date": None,
+                    "value_change": 0,
+                    "granularity": granularity,
+                    "accounts": [],
                     "value_history": []
                 }
             })
         
-        # 計算統計資訊
-        total_analyses = len(records)
-        values = []
-        dates = []
-        value_history = []  # 用於圖表
-        
-        for record in records:
-            try:
-                data = json.loads(record.data)
-                value = data.get("value_estimation", {}).get("account_asset_value", 0)
-                values.append(value)
-                if record.created_at:
-                    dates.append(record.created_at)
-                    value_history.append({
-                        "date": record.created_at.isoformat(),
-                        "value": value,
-                        "username": record.username
-                    })
-            except (json.JSONDecodeError, KeyError):
-                continue
-        
-        latest_value = values[0] if values else 0
-        highest_value = max(values) if values else 0
-        first_analysis_date = min(dates).isoformat() if dates else None
-        latest_analysis_date = max(dates).isoformat() if dates else None
-        
-        # 反轉歷史記錄，讓最早的在前
-        value_history.reverse()
+        # 每個帳號各自比較前後兩個週期，不同帳號的數值不互相比較
+        by_account = {}
+        for r in rollups:
+            by_account.setdefault(r.username_key, []).append(r)
+        accounts = []
+        for periods in by_account.values():
+            last = periods[-1]
+            previous = periods[-2].last_value if len(periods) > 1 else last.last_value
+            accounts.append({
+                "username": last.username,
+                "latest_value": last.last_value,
+                "value_change": (last.last_value or 0) - (previous or 0),
+                "latest_analysis_date": last.last_at
+            })
+        accounts.sort(key=lambda a: a["latest_analysis_date"], reverse=True)
+        latest = max(rollups, key=lambda r: r.last_at)
+        value_history = [{
+            "date": r.last_at,
+            "period_start": r.period_start,
+            "value": r.last_value,
+            "min": r.min_value,
+            "max": r.max_value,
+            "count": r.count,
+            "username": r.username
+        } for r in rollups]
         
         return jsonify({
             "ok": True,
             "stats": {
-                "total_analyses": total_analyses,
-                "latest_value": latest_value,
-                "highest_value": highest_value,
-                "first_analysis_date": first_analysis_date,
-                "latest_analysis_date": latest_analysis_date,
+                "total_analyses": sum(r.count for r in rollups),
+                "latest_value": latest.last_value,
+                "highest_value": max(r.max_value for r in rollups),
+                "first_analysis_date": min(r.first_at for r in rollups),
+                "latest_analysis_date": latest.last_at,
+                "value_change": accounts[0]["value_change"],
+                "granularity": granularity,
+                "accounts": accounts,
                 "value_history": value_history
             }
         })
     except SQLAlchemyError as e:
         session.rollback()
-        print(f"[API] ❌ 查詢用戶統計失敗: {e}")
+        api_log.error("❌ 查詢用戶統計失敗: %s", e)
         return jsonify({"ok": False, "error": "database_error"}), 500
-    finally:
-        session.close()
+
+# -----------------------------------------------------------------------------
+# Admin Pagination Helpers（keyset 分頁與總數估算）
+# -----------------------------------------------------------------------------
+ADMIN_MAX_PER_PAGE = int(os.getenv('ADMIN_MAX_PER_PAGE', 200))
+COUNT_CACHE_TTL = int(os.getenv('COUNT_CACHE_TTL', 60))  # 總數快取秒數
+
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+def encode_cursor(created_at, record_id):
+    """將 (created_at, id) 編碼為不透明的 cursor 字串"""
+    raw = json.dumps([created_at.isoformat() if created_at else None, record_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """解析 cursor，格式錯誤時拋出 ValueError"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created_at_str, record_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        created_at = datetime.fromisoformat(created_at_str) if created_at_str else None
+        return created_at, int(record_id)
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise ValueError(f"invalid cursor: {e}")
+
+def paginate_keyset(query, model, cursor, per_page, page=1, with_total=False):
+    """
+    以 (created_at, id) 做 keyset 分頁
+    
+    有 cursor 時直接從 cursor 之後開始讀取；沒有 cursor 時退回舊的 page/offset 行為。
+    多取一筆用來判斷是否還有下一頁，不需要另外 count。
+    with_total=True 且沒有 cursor 時，以 COUNT(*) OVER () 在同一個查詢中取得總數。
+    
+    Returns:
+        (records, next_cursor, total)，total 無法在同一查詢取得時為 None
+    """
+    if cursor:
+        created_at, record_id = decode_cursor(cursor)
+        if created_at is None:
+            query = query.filter(model.created_at.is_(None), model.id < record_id)
+        else:
+            query = query.filter(or_(
+                model.created_at < created_at,
+                and_(model.created_at == created_at, model.id < record_id),
+                model.created_at.is_(None)
+            ))
+    with_total = with_total and not cursor
+    if with_total:
+        query = query.add_columns(func.count().over().label('total_count'))
+    # NULLS LAST：與 cursor 條件一致（PostgreSQL 的 DESC 預設 NULL 在最前面，SQLite 在最後面）
+    query = query.order_by(model.created_at.desc().nulls_last(), model.id.desc())
+    if not cursor and page > 1:
+        query = query.offset((page - 1) * per_page)
+    rows = query.limit(per_page + 1).all()
+    total = None
+    if with_total:
+        if rows:
+            total = rows[0][1]
+        elif page == 1:
+            total = 0
+        rows = [row[0] for row in rows]
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor, total
+
+def invalidate_count_cache(table_name=None):
+    """清除總數快取（新增/刪除資料後呼叫）"""
+    with _count_cache_lock:
+        if table_name is None:
+            _count_cache.clear()
+            return
+        for key in [k for k in _count_cache if k[0] == table_name]:
+            _count_cache.pop(key, None)
+
+def count_query(query):
+    """只以主鍵計數，避免 count 子查詢展開所有欄位（包含延遲載入的完整內容）"""
+    entity = query.column_descriptions[0]["entity"]
+    return query.order_by(None).with_entities(entity.id).count()
+
+def get_total_count(session, query, table_name, filters_key=(), exact=False):
+    """
+    取得查詢總數
+    
+    - exact=True：直接執行 count
+    - 無篩選條件且為 PostgreSQL：使用 pg_class.reltuples 規劃器統計
+    - 其他情況：使用 TTL 快取的 count 結果
+    
+    Returns:
+        (total, is_estimated)
+    """
+    if exact:
+        return count_query(query), False
+    
+    if not filters_key and engine.dialect.name == 'postgresql':
+        try:
+            estimate = session.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE relname = :t"),
+                {"t": table_name}
+            ).scalar()
+            if estimate is not None and estimate >= 0:
+                return int(estimate), True
+        except SQLAlchemyError as e:
+            admin_log.warning("⚠️ 讀取規劃器統計失敗: %s", e)
+    
+    cache_key = (table_name, filters_key)
+    now = time.monotonic()
+    with _count_cache_lock:
+        cached = _count_cache.get(cache_key)
+        if cached and cached[1] > now:
+            return cached[0], True
+    total = count_query(query)
+    with _count_cache_lock:
+        _count_cache[cache_key] = (total, now + COUNT_CACHE_TTL)
+    return total, True
+
+def parse_pagination_args():
+    """讀取共用的分頁參數（page / per_page / cursor / include_total）"""
+    page = max(int(request.args.get('page', 1)), 1)
+    per_page = min(max(int(request.args.get('per_page', 50)), 1), ADMIN_MAX_PER_PAGE)
+    cursor = request.args.get('cursor', '').strip() or None
+    include_total = request.args.get('include_total', '').lower() in ('1', 'true', 'yes')
+    return page, per_page, cursor, include_total
+
+def build_pagination(page, per_page, total, estimated, next_cursor):
+    return {
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "total_estimated": estimated,
+        "pages": (total + per_page - 1) // per_page,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None
+    }
+
+# -----------------------------------------------------------------------------
+# Admin Analysis Detail Cache（單筆分析詳情快取）
+# -----------------------------------------------------------------------------
+ANALYSIS_DETAIL_CACHE_SIZE = int(os.getenv('ANALYSIS_DETAIL_CACHE_SIZE', 256))
+ANALYSIS_DETAIL_CACHE_TTL = int(os.getenv('ANALYSIS_DETAIL_CACHE_TTL', 300))
+
+_analysis_detail_cache = OrderedDict()
+_analysis_detail_cache_lock = threading.Lock()
+
+def get_cached_analysis_detail(analysis_id):
+    if cache_channel is not None:
+        cache_channel.poll()
+    now = time.monotonic()
+    with _analysis_detail_cache_lock:
+        entry = _analysis_detail_cache.get(analysis_id)
+        if not entry:
+            return None
+        if entry[2] <= now:
+            _analysis_detail_cache.pop(analysis_id, None)
+            return None
+        _analysis_detail_cache.move_to_end(analysis_id)
+        return entry[0], entry[1]
+
+def set_cached_analysis_detail(analysis_id, version, detail):
+    with _analysis_detail_cache_lock:
+        _analysis_detail_cache[analysis_id] = (version, detail, time.monotonic() + ANALYSIS_DETAIL_CACHE_TTL)
+        _analysis_detail_cache.move_to_end(analysis_id)
+        while len(_analysis_detail_cache) > ANALYSIS_DETAIL_CACHE_SIZE:
+            _analysis_detail_cache.popitem(last=False)
+
+def _drop_analysis_detail(analysis_id=None):
+    with _analysis_detail_cache_lock:
+        if analysis_id is None:
+            _analysis_detail_cache.clear()
+        else:
+            _analysis_detail_cache.pop(analysis_id, None)
+
+def invalidate_analysis_detail(analysis_id=None):
+    """分析記錄被更新或刪除時清除快取（analysis_id=None 時全部清除），並通知其他 worker"""
+    _drop_analysis_detail(analysis_id)
+    if cache_channel is not None:
+        try:
+            cache_channel.publish("analysis", "*" if analysis_id is None else analysis_id)
+        except Exception as e:
+            admin_log.warning("⚠️ 發送快取失效通知失敗: %s", e)
+
+def build_analysis_detail(record):
+    """組合單筆分析記錄的完整資料（含原始 JSON）"""
+    data = load_record_data(record)
+    value_est = data.get("value_estimation", {})
+    user = None
+    if record.user_id and record.user:
+        user = {
+            "id": record.user.id,
+            "email": record.user.email,
+            "username": record.user.username,
+            "display_name": record.user.display_name
+        }
+    return {
+        "id": record.id,
+        "username": record.username,
+        "display_name": record.display_name,
+        "user": user,
+        "account_asset_value": value_est.get("account_asset_value", 0),
+        "post_value": value_est.get("post_value", 0),
+        "story_value": value_est.get("story_value", 0),
+        "reels_value": value_est.get("reels_value", 0),
+        "followers": data.get("followers", 0),
+        "created_at": record.created_at,
+        "updated_at": record.updated_at,
+        "data": data
+    }
+
+def analysis_version(record):
+    """以內容與更新時間產生版本字串（作為 ETag 基礎）"""
+    digest = hashlib.sha1()
+    if record.data_blob is not None:
+        digest.update(bytes(record.data_blob))
+    else:
+        digest.update(record.data.encode('utf-8'))
+    digest.update((record.updated_at.isoformat() if record.updated_at else '').encode('utf-8'))
+    return digest.hexdigest()
 
 # -----------------------------------------------------------------------------
 # Admin API Routes
@@ -1923,41 +3328,50 @@ def get_user_stats():
 @admin_required
 def admin_get_all_users():
     """獲取所有用戶列表（管理員專用）"""
-    session = SessionLocal()
+    session = get_db_session()
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 50))
-        offset = (page - 1) * per_page
+        try:
+            page, per_page, cursor, include_total = parse_pagination_args()
+        except ValueError:
+            return jsonify({"ok": False, "error": "invalid_pagination"}), 400
         
         # 搜索和篩選參數
         search_email = request.args.get('search_email', '').strip()
         search_username = request.args.get('search_username', '').strip()
-        print(f"[Admin] 🔍 用戶搜索參數: email='{search_email}', username='{search_username}'")
+        admin_log.debug("🔍 用戶搜索參數: email='%s', username='%s'", search_email, search_username)
         
         # 構建查詢
         query = session.query(User)
         
-        # 按 Email 搜索
+        # 按 Email 搜索（trigram 索引）
         if search_email:
-            query = query.filter(User.email.ilike(f'%{search_email}%'))
+            query = query.filter(search_index.filter_clause(User, 'email', search_email))
         
-        # 按 Username 搜索
+        # 按 Username 搜索（trigram 索引）
         if search_username:
-            query = query.filter(User.username.ilike(f'%{search_username}%'))
+            query = query.filter(search_index.filter_clause(User, 'username', search_username))
         
-        # 查詢總數與結果
-        total = query.count()
-        print(f"[Admin] 🔍 用戶搜索結果總數: {total}")
+        # 查詢用戶列表（keyset 分頁）
+        try:
+            users, next_cursor, total = paginate_keyset(query, User, cursor, per_page, page, with_total=include_total)
+        except ValueError:
+            return jsonify({"ok": False, "error": "invalid_cursor"}), 400
         
-        # 查詢用戶列表
-        users = query.order_by(User.created_at.desc()).offset(offset).limit(per_page).all()
+        # 查詢總數（預設使用快取/估計值，include_total=1 才精確計算）
+        total_estimated = False
+        if total is None:
+            total, total_estimated = get_total_count(
+                session, query, User.__tablename__,
+                filters_key=(search_email, search_username),
+                exact=include_total
+            )
+        admin_log.debug("🔍 用戶搜索結果總數: %s%s", total, ' (估計)' if total_estimated else '')
         
         users_data = []
         # 批量查詢所有用戶的分析次數（優化 N+1 查詢）
         user_ids = [u.id for u in users]
         analysis_counts = {}
         if user_ids:
-            from sqlalchemy import func
             counts = session.query(
                 AnalysisResult.user_id,
                 func.count(AnalysisResult.id).label('count')
@@ -1972,36 +3386,51 @@ def admin_get_all_users():
                 "display_name": user.display_name,
                 "avatar_url": user.avatar_url,
                 "provider": user.provider,
-                "created_at": user.created_at.isoformat() if user.created_at else None,
+                "created_at": user.created_at,
                 "analysis_count": analysis_counts.get(user.id, 0)
             })
         
         return jsonify({
             "ok": True,
             "users": users_data,
-            "pagination": {
-                "page": page,
-                "per_page": per_page,
-                "total": total,
-                "pages": (total + per_page - 1) // per_page
-            }
+            "pagination": build_pagination(page, per_page, total, total_estimated, next_cursor)
         })
     except SQLAlchemyError as e:
         session.rollback()
-        print(f"[Admin] ❌ 查詢用戶列表失敗: {e}")
+        admin_log.error("❌ 查詢用戶列表失敗: %s", e)
+        return jsonify({"ok": False, "error": "database_error"}), 500
+
+@app.route('/api/admin/search/users', methods=['GET'])
+@admin_required
+def admin_search_users():
+    """依 email / username 排序搜尋用戶（前綴符合優先），供管理後台快速查找"""
+    term = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    if not term:
+        return jsonify({"ok": False, "error": "query_required"}), 400
+    session = get_db_session()
+    try:
+        ids = search_index.search_ids(session, User, term, limit)
+        users = {u.id: u for u in session.query(User).filter(User.id.in_(ids)).all()} if ids else {}
+        return jsonify({
+            "ok": True,
+            "users": [serialize_user(users[uid]) for uid in ids if uid in users]
+        })
+    except SQLAlchemyError as e:
+        session.rollback()
+        admin_log.error("❌ 搜尋用戶失敗: %s", e)
         return jsonify({"ok": False, "error": "database_error"}), 500
-    finally:
-        session.close()
 
 @app.route('/api/admin/analyses', methods=['GET'])
 @admin_required
 def admin_get_all_analyses():
     """獲取所有分析記錄（管理員專用）"""
-    session = SessionLocal()
+    session = get_db_session()
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 50))
-        offset = (page - 1) * per_page
+        try:
+            page, per_page, cursor, include_total = parse_pagination_args()
+        except ValueError:
+            return jsonify({"ok": False, "error": "invalid_pagination"}), 400
         
         # 搜索和篩選參數
         search_username = request.args.get('search_username', '').strip()
@@ -2009,16 +3438,16 @@ def admin_get_all_analyses():
         max_value = request.args.get('max_value', type=int)
         date_from = request.args.get('date_from', '').strip()
         date_to = request.args.get('date_to', '').strip()
-        print(f"[Admin] 🔍 分析記錄搜索參數: username='{search_username}', min={min_value}, max={max_value}, from='{date_from}', to='{date_to}'")
+        admin_log.debug("🔍 分析記錄搜索參數: username='%s', min=%s, max=%s, from='%s', to='%s'", search_username, min_value, max_value, date_from, date_to)
         
         # 構建查詢
         query = session.query(AnalysisResult).options(
             joinedload(AnalysisResult.user)
         )
         
-        # 按用戶名搜索
+        # 按用戶名搜索（trigram 索引）
         if search_username:
-            query = query.filter(AnalysisResult.username.ilike(f'%{search_username}%'))
+            query = query.filter(search_index.filter_clause(AnalysisResult, 'username', search_username))
         
         # 按日期範圍篩選
         if date_from:
@@ -2037,44 +3466,34 @@ def admin_get_all_analyses():
             except (ValueError, AttributeError):
                 pass
         
-        # 如果指定了價值範圍，需要先獲取所有記錄進行過濾（因為價值在 JSON 中）
-        if min_value is not None or max_value is not None:
-            # 先獲取所有符合其他條件的記錄
-            all_records = query.order_by(AnalysisResult.created_at.desc()).all()
-            
-            # 過濾價值範圍
-            filtered_records = []
-            for record in all_records:
-                try:
-                    data = json.loads(record.data)
-                    value_est = data.get("value_estimation", {})
-                    account_value = value_est.get("account_asset_value", 0)
-                    
-                    if min_value is not None and account_value < min_value:
-                        continue
-                    if max_value is not None and account_value > max_value:
-                        continue
-                    
-                    filtered_records.append(record)
-                except (json.JSONDecodeError, KeyError):
-                    continue
-            
-            # 更新總數
-            total = len(filtered_records)
-            # 應用分頁
-            records = filtered_records[offset:offset + per_page]
-            print(f"[Admin] 🔍 分析記錄經價值篩選後: {total}")
-        else:
-            # 沒有價值篩選，直接使用數據庫查詢
-            total = query.count()
-            records = query.order_by(AnalysisResult.created_at.desc()).offset(offset).limit(per_page).all()
+        # 按價值範圍篩選（使用索引欄位，於資料庫端完成）
+        if min_value is not None:
+            query = query.filter(AnalysisResult.account_asset_value >= min_value)
+        if max_value is not None:
+            query = query.filter(AnalysisResult.account_asset_value <= max_value)
         
-        print(f"[Admin] 🔍 分析記錄搜索結果數: {total}")
+        # 篩選、排序、分頁（以及 include_total=1 時的總數）在同一個查詢中完成
+        try:
+            records, next_cursor, total = paginate_keyset(
+                query, AnalysisResult, cursor, per_page, page, with_total=include_total
+            )
+        except ValueError:
+            return jsonify({"ok": False, "error": "invalid_cursor"}), 400
+        
+        total_estimated = False
+        if total is None:
+            total, total_estimated = get_total_count(
+                session, query, AnalysisResult.__tablename__,
+                filters_key=(search_username, date_from, date_to, min_value, max_value),
+                exact=include_total
+            )
+        
+        admin_log.debug("🔍 分析記錄搜索結果數: %s", total)
         
         analyses_data = []
         for record in records:
             try:
-                data = json.loads(record.data)
+                summary = load_record_summary(record)
                 # 獲取用戶資訊（已通過 joinedload 預載入）
                 user = None
                 if record.user_id and record.user:
@@ -2085,46 +3504,180 @@ def admin_get_all_analyses():
                         "display_name": record.user.display_name
                     }
                 
-                value_est = data.get("value_estimation", {})
                 analyses_data.append({
                     "id": record.id,
                     "username": record.username,
                     "display_name": record.display_name,
                     "user": user,
-                    "account_asset_value": value_est.get("account_asset_value", 0),
-                    "post_value": value_est.get("post_value", 0),
-                    "story_value": value_est.get("story_value", 0),
-                    "reels_value": value_est.get("reels_value", 0),
-                    "followers": data.get("followers", 0),
-                    "created_at": record.created_at.isoformat() if record.created_at else None,
-                    "updated_at": record.updated_at.isoformat() if record.updated_at else None
+                    "account_asset_value": record.account_asset_value or 0,
+                    "post_value": summary.get("post_value", 0),
+                    "story_value": summary.get("story_value", 0),
+                    "reels_value": summary.get("reels_value", 0),
+                    "followers": summary.get("followers", 0),
+                    "created_at": record.created_at,
+                    "updated_at": record.updated_at
                 })
-            except (json.JSONDecodeError, KeyError) as e:
-                print(f"[Admin] ⚠️ 解析分析記錄失敗 (ID: {record.id}): {e}")
+            except (ValueError, KeyError) as e:
+                admin_log.warning("⚠️ 解析分析記錄失敗 (ID: %s): %s", record.id, e)
                 continue
         
         return jsonify({
             "ok": True,
             "analyses": analyses_data,
-            "pagination": {
-                "page": page,
-                "per_page": per_page,
-                "total": total,
-                "pages": (total + per_page - 1) // per_page
-            }
+            "pagination": build_pagination(page, per_page, total, total_estimated, next_cursor)
         })
     except SQLAlchemyError as e:
         session.rollback()
-        print(f"[Admin] ❌ 查詢分析記錄失敗: {e}")
+        admin_log.error("❌ 查詢分析記錄失敗: %s", e)
         return jsonify({"ok": False, "error": "database_error"}), 500
-    finally:
-        session.close()
+
+@app.route('/api/admin/analyses/<int:analysis_id>', methods=['GET'])
+@admin_required
+def admin_get_analysis(analysis_id):
+    """獲取單筆分析記錄詳情（管理員專用），支援 ?fields= 欄位投影與 ETag"""
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    
+    cached = get_cached_analysis_detail(analysis_id)
+    if cached:
+        version, detail = cached
+    else:
+        session = get_db_session()
+        try:
+            record = session.query(AnalysisResult).options(
+                joinedload(AnalysisResult.user), undefer_group('payload')
+            ).filter(AnalysisResult.id == analysis_id).first()
+            if not record:
+                return jsonify({"ok": False, "error": "analysis_not_found"}), 404
+            try:
+                detail = build_analysis_detail(record)
+            except ValueError:
+                return jsonify({"ok": False, "error": "invalid_analysis_data"}), 400
+            version = analysis_version(record)
+            set_cached_analysis_detail(analysis_id, version, detail)
+        except SQLAlchemyError as e:
+            session.rollback()
+            admin_log.error("❌ 查詢分析記錄詳情失敗: %s", e)
+            return jsonify({"ok": False, "error": "database_error"}), 500
+    
+    if fields:
+        detail = {key: detail[key] for key in ["id", *fields] if key in detail}
+    
+    etag = hashlib.sha1(f"{version}:{','.join(fields)}".encode('utf-8')).hexdigest()
+    response = jsonify({"ok": True, "analysis": detail})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/admin/db/pool', methods=['GET'])
+@admin_required
+def admin_get_pool_metrics():
+    """資料庫連線池指標：checkout 次數、等待時間、使用中連線（管理員專用）"""
+    pools = {"primary": pool_metrics(engine)}
+    if read_engine is not engine:
+        pools["read"] = pool_metrics(read_engine)
+    return jsonify({"ok": True, "dialect": engine.dialect.name, "pools": pools})
+
+@app.route('/api/admin/cache/stats', methods=['GET'])
+@admin_required
+def admin_get_cache_stats():
+    """行程內快取命中率（管理員專用，數值為目前 worker）"""
+    return jsonify({
+        "ok": True,
+        "pid": os.getpid(),
+        "invalidation_channel": type(cache_channel).__name__ if cache_channel else None,
+        "caches": {
+            "token": token_cache.snapshot(),
+            "user": user_cache.snapshot(),
+            "response": response_cache.snapshot()
+        },
+        "firebase_verifier": firebase_verifier.snapshot() if firebase_verifier else None
+    })
+
+@app.route('/api/admin/http/stats', methods=['GET'])
+@admin_required
+def admin_get_http_stats():
+    """對外 HTTP 呼叫指標：每個 host 的延遲百分位數與連線重用率（管理員專用，數值為目前 worker）"""
+    return jsonify({"ok": True, "pid": os.getpid(), "hosts": http_client.snapshot()})
+
+@app.route('/api/admin/logging', methods=['GET'])
+@admin_required
+def admin_get_logging_stats():
+    """日誌佇列與抽樣統計：佇列長度、因佇列滿或抽樣而略過的筆數（管理員專用，數值為目前 worker）"""
+    return jsonify({"ok": True, "pid": os.getpid(), "logging": app_logging.snapshot()})
+
+@app.route('/api/admin/startup', methods=['GET'])
+@admin_required
+def admin_get_startup_report():
+    """啟動耗時：模組匯入與各子系統第一次初始化的毫秒數（管理員專用，數值為目前 worker）"""
+    return jsonify({
+        "ok": True,
+        "pid": os.getpid(),
+        "timings_ms": dict(STARTUP_TIMINGS),
+        "initialized": sorted(_initialized),
+        "firebase_admin_loaded": 'firebase_admin' in sys.modules,
+    })
+
+# -----------------------------------------------------------------------------
+# Prometheus 指標
+# -----------------------------------------------------------------------------
+@REGISTRY.register_collector
+def collect_cache_metrics():
+    rows = []
+    caches = [token_cache, user_cache, response_cache]
+    if firebase_verifier is not None:
+        caches.append(firebase_verifier.verified)
+    for cache in caches:
+        stats = cache.snapshot()
+        for result, key in (("hit", "hits"), ("miss", "misses")):
+            rows.append(("cache_requests_total", "counter", "行程內快取查詢次數",
+                         {"cache": cache.name, "result": result}, stats[key]))
+        rows.append(("cache_evictions_total", "counter", "快取因容量淘汰的筆數",
+                     {"cache": cache.name}, stats["evictions"]))
+    return rows
+
+@REGISTRY.register_collector
+def collect_pool_metrics():
+    rows = []
+    pools = {"primary": engine}
+    if read_engine is not engine:
+        pools["read"] = read_engine
+    for name, pool_engine in pools.items():
+        stats = pool_metrics(pool_engine)
+        if "checkouts" not in stats:
+            continue
+        labels = {"engine": name}
+        rows.extend([
+            ("db_pool_checkouts_total", "counter", "連線池 checkout 次數", labels, stats["checkouts"]),
+            ("db_pool_wait_seconds_total", "counter", "等待連線池的累計秒數", labels, stats["wait_ms_total"] / 1000),
+            ("db_pool_timeouts_total", "counter", "等待連線池逾時次數", labels, stats["timeouts"]),
+            ("db_pool_checked_out", "gauge", "目前借出的連線數", labels, stats["checked_out"]),
+        ])
+    return rows
+
+def _render_metrics():
+    response = app.response_class(REGISTRY.collect(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus 指標（彙總所有 gunicorn worker）；需帶 METRICS_TOKEN 的 Bearer token 或管理員身分"""
+    auth_header = request.headers.get('Authorization', '')
+    if METRICS_TOKEN and secrets.compare_digest(auth_header, f"Bearer {METRICS_TOKEN}"):
+        return _render_metrics()
+    return admin_required(_render_metrics)()
+
+@app.route('/api/admin/auth/hasher', methods=['GET'])
+@admin_required
+def admin_get_hasher_stats():
+    """密碼雜湊行程池狀態與延遲百分位數（管理員專用，數值為目前 worker）"""
+    return jsonify({"ok": True, "pid": os.getpid(), "hasher": password_hasher.snapshot()})
 
 @app.route('/api/admin/stats', methods=['GET'])
 @admin_required
 def admin_get_stats():
     """獲取系統統計資訊（管理員專用）"""
-    session = SessionLocal()
+    session = get_read_session()
     try:
         # 用戶統計
         total_users = session.query(User).count()
@@ -2132,41 +3685,32 @@ def admin_get_stats():
         users_with_analyses = session.query(User.id).join(AnalysisResult, User.id == AnalysisResult.user_id).distinct().count()
         
         # 分析統計
-        total_analyses = session.query(AnalysisResult).count()
-        analyses_with_users = session.query(AnalysisResult).filter(AnalysisResult.user_id.isnot(None)).count()
+        total_analyses = session.query(func.count(AnalysisResult.id)).scalar()
+        analyses_with_users = session.query(func.count(AnalysisResult.id)).filter(AnalysisResult.user_id.isnot(None)).scalar()
         anonymous_analyses = total_analyses - analyses_with_users
         
-        # 價值統計
-        records = session.query(AnalysisResult).all()
-        total_value = 0
-        values = []
-        for record in records:
-            try:
-                data = json.loads(record.data)
-                value = data.get("value_estimation", {}).get("account_asset_value", 0)
-                if value > 0:
-                    values.append(value)
-                    total_value += value
-            except (json.JSONDecodeError, KeyError):
-                continue
-        
-        avg_value = total_value / len(values) if values else 0
-        max_value = max(values) if values else 0
-        min_value = min(values) if values else 0
+        # 價值統計（使用 account_asset_value 欄位，於資料庫端彙總）
+        value_count, total_value, max_value, min_value = session.query(
+            func.count(AnalysisResult.account_asset_value),
+            func.coalesce(func.sum(AnalysisResult.account_asset_value), 0),
+            func.coalesce(func.max(AnalysisResult.account_asset_value), 0),
+            func.coalesce(func.min(AnalysisResult.account_asset_value), 0)
+        ).filter(AnalysisResult.account_asset_value > 0).one()
+        total_value = int(total_value)
+        avg_value = total_value / value_count if value_count else 0
         
         # 最近活動
-        recent_analyses = session.query(AnalysisResult).order_by(AnalysisResult.created_at.desc()).limit(10).all()
-        recent_analyses_data = []
-        for record in recent_analyses:
-            try:
-                data = json.loads(record.data)
-                recent_analyses_data.append({
-                    "username": record.username,
-                    "value": data.get("value_estimation", {}).get("account_asset_value", 0),
-                    "created_at": record.created_at.isoformat() if record.created_at else None
-                })
-            except (json.JSONDecodeError, KeyError):
-                continue
+        recent_analyses = session.query(
+            AnalysisResult.username, AnalysisResult.account_asset_value, AnalysisResult.created_at
+        ).order_by(AnalysisResult.created_at.desc()).limit(10).all()
+        recent_analyses_data = [
+            {
+                "username": username,
+                "value": value or 0,
+                "created_at": created_at
+            }
+            for username, value, created_at in recent_analyses
+        ]
         
         return jsonify({
             "ok": True,
@@ -2186,26 +3730,25 @@ def admin_get_stats():
                     "average": avg_value,
                     "max": max_value,
                     "min": min_value,
-                    "count": len(values)
+                    "count": value_count
                 },
-                "recent_analyses": recent_analyses_data
+                "recent_analyses": recent_analyses_data,
+                "openai_usage": openai_usage_stats(session)
             }
         })
     except SQLAlchemyError as e:
         session.rollback()
-        print(f"[Admin] ❌ 查詢統計資訊失敗: {e}")
+        admin_log.error("❌ 查詢統計資訊失敗: %s", e)
         return jsonify({"ok": False, "error": "database_error"}), 500
-    finally:
-        session.close()
 
 @app.route('/api/admin/analyses/<int:analysis_id>/update', methods=['PUT', 'PATCH'])
 @admin_required
 def admin_update_analysis(analysis_id):
     """更新分析記錄的價值和報價（管理員專用）"""
     admin_user = get_authenticated_user(required=True)
-    session = SessionLocal()
+    session = get_db_session()
     try:
-        record = session.get(AnalysisResult, analysis_id)
+        record = session.get(AnalysisResult, analysis_id, options=[undefer_group('payload')])
         if not record:
             return jsonify({"ok": False, "error": "analysis_not_found"}), 404
         
@@ -2214,7 +3757,7 @@ def admin_update_analysis(analysis_id):
         # 記錄更新前的值（用於日誌）
         old_values = {}
         try:
-            old_data = json.loads(record.data)
+            old_data = load_record_data(record)
             old_est = old_data.get("value_estimation", {})
             old_values = {
                 "account_asset_value": old_est.get("account_asset_value", 0),
@@ -2227,8 +3770,8 @@ def admin_update_analysis(analysis_id):
         
         # 解析現有數據
         try:
-            analysis_data = json.loads(record.data)
-        except json.JSONDecodeError:
+            analysis_data = load_record_data(record)
+        except ValueError:
             return jsonify({"ok": False, "error": "invalid_analysis_data"}), 400
         
         # 更新價值估算
@@ -2250,9 +3793,12 @@ def admin_update_analysis(analysis_id):
             value_est["reels_value"] = int(data["reels_value"])
         
         # 保存更新後的數據
-        record.data = json.dumps(analysis_data, ensure_ascii=False)
+        store_record_data(record, analysis_data)
+        record.account_asset_value = extract_account_value(analysis_data)
         record.updated_at = datetime.utcnow()
         session.commit()
+        invalidate_analysis_detail(analysis_id)
+        invalidate_response_cache([record.username_key])
         
         # 記錄管理員操作日誌
         changes = []
@@ -2265,7 +3811,7 @@ def admin_update_analysis(analysis_id):
         if "reels_value" in data and old_values.get("reels_value") != value_est.get("reels_value"):
             changes.append(f"Reels報價: {old_values.get('reels_value')} → {value_est.get('reels_value')}")
         
-        print(f"[Admin] ✅ 管理員 {admin_user.get('email', 'unknown')} 更新分析記錄 ID {analysis_id} (@{record.username}): {', '.join(changes) if changes else '無變更'}")
+        admin_log.info("✅ 管理員 %s 更新分析記錄 ID %s (@%s): %s", admin_user.get('email', 'unknown'), analysis_id, record.username, ', '.join(changes) if changes else '無變更')
         
         return jsonify({
             "ok": True,
@@ -2284,16 +3830,14 @@ def admin_update_analysis(analysis_id):
         return jsonify({"ok": False, "error": "invalid_value", "message": str(e)}), 400
     except SQLAlchemyError as e:
         session.rollback()
-        print(f"[Admin] ❌ 更新分析記錄失敗: {e}")
+        admin_log.error("❌ 更新分析記錄失敗: %s", e)
         return jsonify({"ok": False, "error": "database_error"}), 500
-    finally:
-        session.close()
 
 @app.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
 @admin_required
 def admin_delete_user(user_id):
     """刪除用戶及其所有分析記錄（管理員專用）"""
-    session = SessionLocal()
+    session = get_db_session()
     try:
         user = session.get(User, user_id)
         if not user:
@@ -2302,16 +3846,22 @@ def admin_delete_user(user_id):
         # 獲取用戶的分析記錄數量（用於日誌）
         analysis_count = session.query(AnalysisResult).filter_by(user_id=user_id).count()
         
-        # 刪除該用戶的所有分析記錄
+        # 刪除該用戶的所有分析記錄、快照與彙總
         session.query(AnalysisResult).filter_by(user_id=user_id).delete()
+        session.query(AnalysisHistory).filter_by(user_id=user_id).delete()
+        session.query(AnalysisRollup).filter_by(user_id=user_id).delete()
         
         # 刪除用戶
         user_email = user.email
         admin_user = get_authenticated_user(required=True)
         session.delete(user)
         session.commit()
+        invalidate_cached_user(user_id)
+        invalidate_count_cache()
+        invalidate_analysis_detail()
+        invalidate_response_cache()
         
-        print(f"[Admin] ✅ 管理員 {admin_user.get('email', 'unknown')} 刪除用戶 ID {user_id} ({user_email}) 及其 {analysis_count} 筆分析記錄")
+        admin_log.info("✅ 管理員 %s 刪除用戶 ID %s (%s) 及其 %s 筆分析記錄", admin_user.get('email', 'unknown'), user_id, user_email, analysis_count)
         
         return jsonify({
             "ok": True,
@@ -2324,27 +3874,29 @@ def admin_delete_user(user_id):
         })
     except SQLAlchemyError as e:
         session.rollback()
-        print(f"[Admin] ❌ 刪除用戶失敗: {e}")
+        admin_log.error("❌ 刪除用戶失敗: %s", e)
         return jsonify({"ok": False, "error": "database_error"}), 500
-    finally:
-        session.close()
 
 @app.route('/api/admin/analyses/<int:analysis_id>', methods=['DELETE'])
 @admin_required
 def admin_delete_analysis(analysis_id):
     """刪除單筆分析記錄（管理員專用）"""
     admin_user = get_authenticated_user(required=True)
-    session = SessionLocal()
+    session = get_db_session()
     try:
         record = session.get(AnalysisResult, analysis_id)
         if not record:
             return jsonify({"ok": False, "error": "analysis_not_found"}), 404
         
         username = record.username
+        username_key = record.username_key
         session.delete(record)
         session.commit()
+        invalidate_count_cache(AnalysisResult.__tablename__)
+        invalidate_analysis_detail(analysis_id)
+        invalidate_response_cache([username_key])
         
-        print(f"[Admin] ✅ 管理員 {admin_user.get('email', 'unknown')} 刪除分析記錄 ID {analysis_id} (@{username})")
+        admin_log.info("✅ 管理員 %s 刪除分析記錄 ID %s (@%s)", admin_user.get('email', 'unknown'), analysis_id, username)
         
         return jsonify({
             "ok": True,
@@ -2356,31 +3908,40 @@ def admin_delete_analysis(analysis_id):
         })
     except SQLAlchemyError as e:
         session.rollback()
-        print(f"[Admin] ❌ 刪除分析記錄失敗: {e}")
+        admin_log.error("❌ 刪除分析記錄失敗: %s", e)
         return jsonify({"ok": False, "error": "database_error"}), 500
-    finally:
-        session.close()
 
 # -----------------------------------------------------------------------------
 # Leaderboard API
 # -----------------------------------------------------------------------------
 @app.route('/api/leaderboard', methods=['GET'])
 def get_leaderboard():
-    """取得排行榜資料"""
-    session = SessionLocal()
+    """取得排行榜資料（回應快取，分析結果變更時失效）"""
     try:
         board_type = request.args.get('type', 'account_value')
         limit = min(max(int(request.args.get('limit', 50)), 1), 100)
-        category = request.args.get('category')
-        timeframe = request.args.get('timeframe', 'all')
-        
-        print(f"[Leaderboard] 請求: type={board_type}, limit={limit}, category={category}, timeframe={timeframe}")
-        
+    except ValueError as e:
+        leaderboard_log.error("❌ 取得排行榜失敗: %s", e)
+        return jsonify({"ok": False, "error": "leaderboard_error"}), 500
+    category = request.args.get('category')
+    timeframe = request.args.get('timeframe', 'all')
+    if timeframe not in ('7d', '30d'):
+        timeframe = 'all'
+    leaderboard_log.debug("請求: type=%s, limit=%s, category=%s, timeframe=%s", board_type, limit, category, timeframe)
+    # category 目前不影響結果，不納入快取 key
+    return cached_json_response(
+        ('leaderboard', board_type, limit, timeframe), ('leaderboard',),
+        lambda: build_leaderboard(board_type, limit, timeframe)
+    )
+
+def build_leaderboard(board_type, limit, timeframe):
+    """產生排行榜內容，回傳 (payload, status)（也在背景更新快取時呼叫，不可使用 request）"""
+    session = ReadSessionLocal()
+    try:
         query = session.query(AnalysisResult)
         
         # 時間篩選
-        if timeframe and timeframe != 'all':
-            from datetime import datetime, timedelta
+        if timeframe != 'all':
             now = datetime.utcnow()
             if timeframe == '7d':
                 query = query.filter(AnalysisResult.created_at >= now - timedelta(days=7))
@@ -2388,18 +3949,17 @@ def get_leaderboard():
                 query = query.filter(AnalysisResult.created_at >= now - timedelta(days=30))
         
         records = query.order_by(AnalysisResult.created_at.desc()).all()
-        print(f"[Leaderboard] 找到分析記錄: {len(records)} 筆")
+        leaderboard_log.debug("找到分析記錄: %s 筆", len(records))
         
         leaderboard = {}
         
         for record in records:
             try:
-                data = json.loads(record.data)
-                value_est = data.get("value_estimation", {})
-                account_value = value_est.get("account_asset_value")
-                followers = data.get("followers")
-                username = data.get("username") or record.username
-                display_name = data.get("display_name") or record.display_name
+                summary = load_record_summary(record)
+                account_value = record.account_asset_value
+                followers = summary.get("followers")
+                username = summary.get("username") or record.username
+                display_name = summary.get("display_name") or record.display_name
                 
                 if account_value is None:
                     continue
@@ -2416,7 +3976,7 @@ def get_leaderboard():
                             "followers": followers,
                             "display_name": display_name,
                             "record_id": record.id,
-                            "created_at": record.created_at.isoformat() if record.created_at else None
+                            "created_at": record.created_at
                         })
                 else:
                     leaderboard[username_key] = {
@@ -2425,10 +3985,10 @@ def get_leaderboard():
                         "followers": followers,
                         "account_value": account_value,
                         "record_id": record.id,
-                        "created_at": record.created_at.isoformat() if record.created_at else None
+                        "created_at": record.created_at
                     }
-            except (json.JSONDecodeError, KeyError) as e:
-                print(f"[Leaderboard] ⚠️ 解析分析記錄失敗 (ID: {record.id}): {e}")
+            except (ValueError, KeyError) as e:
+                leaderboard_log.warning("⚠️ 解析分析記錄失敗 (ID: %s): %s", record.id, e)
                 continue
         
         entries = list(leaderboard.values())
@@ -2439,18 +3999,18 @@ def get_leaderboard():
             entry["rank"] = idx
             entry["avatar"] = (entry.get("display_name") or entry["username"] or "??")[:2].upper()
         
-        print(f"[Leaderboard] 回傳排行榜筆數: {len(top_entries)}")
+        leaderboard_log.debug("回傳排行榜筆數: %s", len(top_entries))
         
-        return jsonify({
+        return {
             "ok": True,
             "type": board_type,
             "limit": limit,
             "total": len(entries),
             "leaderboard": top_entries
-        })
+        }, 200
     except Exception as e:
-        print(f"[Leaderboard] ❌ 取得排行榜失敗: {e}")
-        return jsonify({"ok": False, "error": "leaderboard_error"}), 500
+        leaderboard_log.error("❌ 取得排行榜失敗: %s", e)
+        return {"ok": False, "error": "leaderboard_error"}, 500
     finally:
         session.close()
 
@@ -2458,16 +4018,134 @@ def get_leaderboard():
 def handle_auth_error(err):
     return jsonify({"ok": False, "error": err.message}), err.status
 
+@app.errorhandler(RateLimitExceeded)
+def handle_rate_limited(err):
+    headers = err.decision.headers()
+    return jsonify({"ok": False, "error": "rate_limited", "retry_after": int(headers["Retry-After"])}), 429, headers
+
+@app.errorhandler(HasherBusyError)
+def handle_hasher_busy(err):
+    return jsonify({"ok": False, "error": "auth_busy"}), 503, {"Retry-After": "1"}
+
 # 靜態文件服務
+def serve_static_asset(filename):
+    """
+    提供建置後的靜態檔案（見 static_assets.py）
+
+    指紋化網址（app.<hash>.css）一年 immutable；原始網址（HTML 入口頁）每次以 ETag 重新驗證。
+    依 Accept-Encoding 直接送出預先壓縮的檔案，不在請求中壓縮。
+    """
+    asset, fingerprinted = get_static_manifest().lookup(filename)
+    if asset is None:
+        abort(404)
+    encoding, path = asset.select_encoding(request.headers.get('Accept-Encoding'))
+    headers = {
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if fingerprinted else REVALIDATE_CACHE_CONTROL,
+        'ETag': asset.etag(encoding),
+    }
+    if asset.encodings:
+        headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    if asset.matches(request.headers.get('If-None-Match')):
+        return app.response_class(status=304, headers=headers)
+    if STATIC_ACCEL_PREFIX:
+        # 由 nginx 讀檔送出，worker 立即釋放
+        headers['X-Accel-Redirect'] = f"{STATIC_ACCEL_PREFIX.rstrip('/')}/{asset.relative_path(encoding)}"
+        return app.response_class(b'', mimetype=asset.mimetype, headers=headers)
+    # gunicorn 以 wsgi.file_wrapper 的 sendfile() 送出檔案內容
+    response = send_file(path, mimetype=asset.mimetype, conditional=False, etag=False)
+    response.headers.pop('Content-Disposition', None)
+    response.headers.update(headers)
+    return response
+
+app.add_url_rule('/static/<path:filename>', endpoint='static', view_func=serve_static_asset)
+
 @app.route('/')
 def index():
-    """首頁重定向到 landing.html"""
-    return send_from_directory('static', 'landing.html')
+    """首頁：landing.html"""
+    return serve_static_asset('landing.html')
+
+# -----------------------------------------------------------------------------
+# App Factory / Pre-fork（gunicorn --preload，見 gunicorn.conf.py）
+# -----------------------------------------------------------------------------
+_warmup_thread = None
+
+# 用來在 fork 前跑過一次解析流程的範例回應（讓 re 模組的編譯快取在 master 建好）
+_PARSER_WARMUP_TEXT = """**毒舌短評：** 內容質感不錯，粉絲還在路上（笑）
+帳號名稱: warmup_user
+顯示名稱: Warm Up
+粉絲數: 1.2萬
+追蹤數: 300
+貼文數: 80
+```json
+{"basic_info": {"username": "warmup_user", "followers": 12000}, "personality_type": {"primary_type": "type_1"}}
+```"""
+
+def create_app():
+    """
+    gunicorn 入口：gunicorn 'app:create_app()' --preload -c gunicorn.conf.py
+
+    在 master 建好所有唯讀資料（版本檢查、分析器、prompt、解析用的 regex），
+    fork 後各 worker 以 copy-on-write 共用；連線池與 HTTP session 由 after_fork() 重建
+    """
+    build_shared_state()
+    return app
+
+def build_shared_state():
+    """fork 前在 master 初始化共用的唯讀狀態（重複呼叫無作用）"""
+    _init_once("shared_state", _build_shared_state)
+
+def _build_shared_state():
+    if _warmup_thread is not None:
+        _warmup_thread.join()
+    try:
+        ensure_db_ready()
+    except SQLAlchemyError as e:
+        # 資料庫暫時無法連線時照常 fork，worker 在第一個請求時重試
+        startup_log.warning("⚠️ fork 前資料庫初始化失敗: %s", e)
+    get_firebase_app()
+    get_analyzer()
+    get_static_manifest()
+    PromptBuilder.build_analysis_prompt()
+    extract_json_from_text(_PARSER_WARMUP_TEXT)
+    extract_analysis_text(_PARSER_WARMUP_TEXT)
+    extract_basic_info_from_text(_PARSER_WARMUP_TEXT)
+
+def before_fork():
+    """gunicorn pre_fork：關閉 master 的資料庫連線，並凍結現有物件避免 GC 寫入共用分頁"""
+    build_shared_state()
+    engine.dispose()
+    if read_engine is not engine:
+        read_engine.dispose()
+    gc.collect()
+    gc.freeze()
+
+def after_fork():
+    """gunicorn post_fork：丟棄從 master 繼承的連線與執行緒狀態，各 worker 重新建立"""
+    global last_ai_response
+    # close=False：不關閉 master 的 socket，只讓本 worker 改用新的連線池
+    engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.dispose(close=False)
+    http_client.after_fork()
+    rate_limiter.store.after_fork()
+    token_cache.clear()
+    user_cache.clear()
+    response_cache.clear()
+    if cache_channel is not None:
+        cache_channel.after_fork()
+    last_ai_response = None
+    REGISTRY.reset()
+    if analyzer is not None and HTTP_WARMUP:
+        http_client.warm_up(HTTP_WARMUP_URLS)
+
+STARTUP_TIMINGS["import_ms"] = round((time.perf_counter() - _BOOT_STARTED) * 1000, 1)
 
-@app.route('/static/auth-utils.js')
-def serve_auth_utils():
-    """提供認證工具 JavaScript 文件"""
-    return send_from_directory('static', 'auth-utils.js', mimetype='application/javascript')
+# 背景初始化（資料庫檢查、Firebase、AI 分析器與連線預熱），第一個請求不必等待
+if STARTUP_WARMUP:
+    _warmup_thread = threading.Thread(target=warm_up_subsystems, name="StartupWarmUp", daemon=True)
+    _warmup_thread.start()
 
 # -----------------------------------------------------------------------------
 # 主程式入口
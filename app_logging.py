@@ -0,0 +1,279 @@
+# app_logging.py - 結構化、非阻塞日誌
+
+"""
+結構化日誌（取代熱路徑上的 print()）
+
+- 每筆記錄為一行 JSON：ts / level / category / msg / request_id / pid，以及 extra={"data": {...}} 的欄位
+- request 執行緒只把記錄放進佇列，由背景執行緒（QueueListener）格式化並寫出；
+  佇列滿時直接丟棄並計數，不會阻塞請求
+- 依類別抽樣（LOG_SAMPLE_RATES=auth=0.1,analysis=0.5），只抽樣 WARNING 以下；
+  有 request id 時依 request id 決定，同一個請求的記錄一起保留或一起略過
+- request id 存在 contextvar 中，執行緒與 asyncio task 都能正確對應
+
+類別即 logger 名稱：get_logger("auth") -> socialavatar.auth
+"""
+
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import secrets
+import sys
+import threading
+import zlib
+
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json / text
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+# 以逗號分隔的 類別=保留比例，例如 auth=0.1,analysis=0.5
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')
+
+ROOT_LOGGER = "socialavatar"
+REQUEST_ID_HEADER = "X-Request-ID"
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+
+def get_logger(category: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT_LOGGER}.{category}")
+
+
+def _category(record) -> str:
+    name = record.name
+    return name[len(ROOT_LOGGER) + 1:] if name.startswith(ROOT_LOGGER + ".") else name
+
+
+def _parse_sample_rates(value: str) -> dict:
+    rates = {}
+    for item in value.split(','):
+        if '=' in item:
+            category, rate = item.split('=', 1)
+            rates[category.strip()] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+# -----------------------------------------------------------------------------
+# Request ID
+# -----------------------------------------------------------------------------
+def new_request_id(incoming: str = None) -> str:
+    """沿用上游（負載平衡器 / 前端）傳入的合法 request id，否則產生新的"""
+    if incoming and _REQUEST_ID_PATTERN.match(incoming):
+        return incoming
+    return secrets.token_hex(8)
+
+
+def current_request_id():
+    return request_id_var.get()
+
+
+# -----------------------------------------------------------------------------
+# Filters / Formatters / Handlers
+# -----------------------------------------------------------------------------
+class SamplingFilter(logging.Filter):
+    """依類別抽樣 INFO / DEBUG 記錄（WARNING 以上全部保留）"""
+
+    def __init__(self, rates: dict = None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self.dropped = {}
+
+    def filter(self, record) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rates.get(_category(record))
+        if rate is None or rate >= 1.0:
+            return True
+        request_id = request_id_var.get()
+        if request_id:
+            keep = zlib.crc32(request_id.encode("utf-8")) / 0xFFFFFFFF < rate
+        else:
+            keep = random.random() < rate
+        if not keep:
+            category = _category(record)
+            self.dropped[category] = self.dropped.get(category, 0) + 1
+        return keep
+
+
+class RequestIdFilter(logging.Filter):
+    """在 request 執行緒中記下 request id（格式化在背景執行緒進行，那裡讀不到 contextvar）"""
+
+    def filter(self, record) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                  .isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+            "level": record.levelname,
+            "category": _category(record),
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        data = getattr(record, "data", None)
+        if isinstance(data, dict):
+            entry.update(data)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """開發用的單行文字格式：時間 等級 [類別] 訊息 (request id)"""
+
+    def format(self, record) -> str:
+        line = (f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:<7} "
+                f"[{_category(record)}] {record.getMessage()}")
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            line += f" ({request_id})"
+        data = getattr(record, "data", None)
+        if isinstance(data, dict):
+            line += " " + json.dumps(data, ensure_ascii=False, default=str)
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """放入有上限的佇列；佇列滿時丟棄並計數（寧可少記一筆，也不讓請求等待 I/O）"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 訊息先在本執行緒組好（args 可能在之後被修改）；exc_info 保留給背景執行緒格式化
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# -----------------------------------------------------------------------------
+# 設定
+# -----------------------------------------------------------------------------
+class _LoggingState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.handler = None
+        self.listener = None
+        self.output = None
+        self.sampler = None
+
+
+_state = _LoggingState()
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, queue_size: int = LOG_QUEUE_SIZE,
+                  sample_rates=None, stream=None) -> logging.Logger:
+    """
+    設定 socialavatar.* 的日誌（重複呼叫會以新設定取代舊設定）
+
+    Args:
+        level: 最低等級（DEBUG / INFO / WARNING ...）
+        fmt: json 或 text
+        queue_size: 佇列上限（超過時丟棄）
+        sample_rates: {類別: 保留比例}，未指定時讀 LOG_SAMPLE_RATES
+        stream: 輸出目標（預設 stdout）
+    """
+    with _state.lock:
+        _stop_listener()
+        root = logging.getLogger(ROOT_LOGGER)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+        sampler = SamplingFilter(_parse_sample_rates(LOG_SAMPLE_RATES) if sample_rates is None else sample_rates)
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+        handler.addFilter(sampler)
+        handler.addFilter(RequestIdFilter())
+
+        root.addHandler(handler)
+        root.setLevel(level)
+        root.propagate = False
+        _state.handler, _state.output, _state.sampler = handler, output, sampler
+        _start_listener()
+    return root
+
+
+def flush_logging():
+    """等待佇列中的記錄全部寫出（測試與關閉時使用）"""
+    with _state.lock:
+        _stop_listener()
+        _start_listener()
+
+
+def snapshot() -> dict:
+    handler, sampler = _state.handler, _state.sampler
+    if handler is None:
+        return {"configured": False}
+    return {
+        "configured": True,
+        "level": logging.getLevelName(logging.getLogger(ROOT_LOGGER).level),
+        "queued": handler.queue.qsize(),
+        "queue_size": handler.queue.maxsize,
+        "dropped_queue_full": handler.dropped,
+        "sample_rates": dict(sampler.rates),
+        "dropped_sampled": dict(sampler.dropped),
+    }
+
+
+def _start_listener():
+    if _state.handler is None:
+        return
+    _state.listener = logging.handlers.QueueListener(_state.handler.queue, _state.output)
+    _state.listener.start()
+
+
+def _stop_listener():
+    if _state.listener is not None:
+        _state.listener.stop()  # 寫完佇列中剩餘的記錄
+        _state.listener = None
+
+
+def _before_fork():
+    # fork 時背景執行緒不能持有佇列或輸出的鎖：先停下，fork 後各自重新啟動
+    _state.lock.acquire()
+    _stop_listener()
+
+
+def _after_fork_in_parent():
+    _start_listener()
+    _state.lock.release()
+
+
+def _after_fork_in_child():
+    _state.lock = threading.Lock()
+    if _state.handler is not None:
+        _state.handler.queue = queue.Queue(maxsize=_state.handler.queue.maxsize)
+        _state.handler.dropped = 0
+        _state.sampler.dropped = {}
+    _start_listener()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_before_fork, after_in_parent=_after_fork_in_parent,
+                        after_in_child=_after_fork_in_child)
+
+atexit.register(lambda: _stop_listener())
@@ -0,0 +1,237 @@
+# asgi.py - ASGI 服務模式
+
+"""
+ASGI 服務模式（不需額外轉接套件）
+
+    uvicorn asgi:application --workers 2
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker
+
+- POST /bd/analyze：驗證上傳與儲存結果在執行緒池中執行（沿用 Flask 的 request context），
+  等待 OpenAI 的 20-90 秒以 httpx.AsyncClient await，不佔用執行緒；
+  一個 worker 可同時等待數百個分析
+- 其他路由：以 WSGI 方式在執行緒池中執行 Flask app（回應皆為一次性內容，不需要串流）
+"""
+
+import asyncio
+import contextvars
+import functools
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import app as app_module
+from app_logging import new_request_id, request_id_var
+from tracing import start_trace
+from openai_usage import start_ledger, end_ledger
+
+
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', 32))
+# 上傳大小上限：profile + 最多 6 張貼文，每張 10MB
+ASGI_MAX_BODY = int(os.getenv('ASGI_MAX_BODY', 80 * 1024 * 1024))
+
+ANALYZE_PATH = '/bd/analyze'
+# 用戶端在上傳完成前中斷連線（_read_body 的回傳值）
+DISCONNECTED = object()
+
+
+def build_environ(scope, body: bytes) -> dict:
+    """由 ASGI scope 建立 WSGI environ"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client")
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0] if client else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            key = "CONTENT_TYPE"
+        elif name == "CONTENT_LENGTH":
+            key = "CONTENT_LENGTH"
+        else:
+            key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class ASGIApplication:
+    """Flask app 的 ASGI 入口"""
+
+    def __init__(self, module=app_module, threads: int = ASGI_THREADS):
+        self.module = module
+        self.flask_app = module.app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="asgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        body = await self._read_body(receive)
+        if body is DISCONNECTED:
+            # 只收到部分內容，不處理也不回應（用戶端已離開）
+            return
+        if body is None:
+            await self._send(send, 413, [("Content-Type", "application/json")],
+                             b'{"ok": false, "error": "payload_too_large"}')
+            return
+
+        environ = build_environ(scope, body)
+        # 同一個請求的各段（執行緒池與 async 等待）共用一個 request id
+        request_id = new_request_id(environ.get("HTTP_X_REQUEST_ID"))
+        environ["HTTP_X_REQUEST_ID"] = request_id
+        request_id_var.set(request_id)
+        if scope["method"] == "POST" and scope["path"] == ANALYZE_PATH:
+            status, headers, content = await self._analyze(environ)
+        else:
+            status, headers, content = await self._run(self._call_wsgi, environ)
+        await self._send(send, status, headers, content)
+
+    # ------------------------------------------------------------------
+    # /bd/analyze（async 流程）
+    # ------------------------------------------------------------------
+    async def _analyze(self, environ):
+        # 各段在不同執行緒與 await 之間共用同一個 Trace，_render 時記錄整體耗時與 Server-Timing
+        start_trace()
+        prepared, response = await self._run(self._prepare, environ)
+        if response is not None:
+            return response
+        current_user, profile_image, budget, rate_limit = prepared
+
+        analyzer = self.module.get_analyzer()
+        overrides = budget.analyzer_kwargs()
+        # 用量記錄在 ledger（contextvar），結束時不論成功與否都寫入日彙總
+        ledger, token = start_ledger()
+        try:
+            if hasattr(analyzer, "analyze_profile_async"):
+                analysis_text, witty_review = await analyzer.analyze_profile_async(profile_image, **overrides)
+            else:
+                analyze = functools.partial(analyzer.analyze_profile, **overrides)
+                analysis_text, witty_review = await self._run(analyze, profile_image)
+        except Exception as e:
+            return await self._run(self._error, environ, self.module.ai_failure(e), rate_limit)
+        finally:
+            end_ledger(token)
+            await self._run(self.module.persist_openai_usage, ledger, current_user)
+
+        return await self._run(self._complete, environ, analysis_text, witty_review, current_user, ledger, rate_limit)
+
+    def _prepare(self, environ):
+        with self.flask_app.request_context(environ):
+            try:
+                self.module.ensure_db_ready()
+                current_user, profile_image = self.module.prepare_analysis_upload()
+                budget = self.module.check_openai_budget(current_user)
+                return (current_user, profile_image, budget, self.module.g.get('rate_limit')), None
+            except Exception as e:
+                return None, self._render(self.module.analysis_error_response(e))
+
+    def _complete(self, environ, analysis_text, witty_review, current_user, ledger, rate_limit):
+        with self.flask_app.request_context(self._without_body(environ)):
+            # 頻率限制在 _prepare 的 request context 中檢查，回應標頭在這裡加上
+            self.module.g.rate_limit = rate_limit
+            try:
+                self.module.record_ai_response(analysis_text, witty_review)
+                result = self.module.complete_analysis(analysis_text, witty_review, current_user, ledger)
+                return self._render(self.module.jsonify(result))
+            except Exception as e:
+                return self._render(self.module.analysis_error_response(e))
+
+    def _error(self, environ, error, rate_limit):
+        with self.flask_app.request_context(self._without_body(environ)):
+            self.module.g.rate_limit = rate_limit
+            return self._render(self.module.analysis_error_response(error))
+
+    def _render(self, rv):
+        # 套用 after_request（CORS、X-Request-ID 等），與一般路由的回應一致
+        self.module.g.request_id = request_id_var.get()
+        response = self.flask_app.process_response(self.flask_app.make_response(rv))
+        return response.status_code, response.headers.to_wsgi_list(), response.get_data()
+
+    @staticmethod
+    def _without_body(environ):
+        environ = dict(environ)
+        environ["wsgi.input"] = io.BytesIO(b"")
+        environ["CONTENT_LENGTH"] = "0"
+        return environ
+
+    # ------------------------------------------------------------------
+    # 共用
+    # ------------------------------------------------------------------
+    def _call_wsgi(self, environ):
+        captured = {}
+
+        def start_response(status, headers, exc_info=None):
+            captured["status"] = int(status.split(" ", 1)[0])
+            captured["headers"] = headers
+
+        result = self.flask_app(environ, start_response)
+        try:
+            content = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return captured["status"], captured["headers"], content
+
+    async def _run(self, fn, *args):
+        # 帶著目前的 contextvars（request id）到執行緒池
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, ctx.run, fn, *args)
+
+    @staticmethod
+    async def _read_body(receive):
+        """讀取完整的請求內容；超過 ASGI_MAX_BODY 回傳 None，中途斷線回傳 DISCONNECTED"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return DISCONNECTED
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > ASGI_MAX_BODY:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    @staticmethod
+    async def _send(send, status, headers, content):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+        })
+        await send({"type": "http.response.body", "body": content})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.module.http_client.aclose()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+application = ASGIApplication()
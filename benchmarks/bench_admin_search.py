@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+管理後台搜尋效能比較：ILIKE '%term%' 全表掃描 vs trigram 搜尋索引
+
+用法：
+    python benchmarks/bench_admin_search.py [用戶數量，預設 200000]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+TMP_DIR = tempfile.mkdtemp(prefix="bench-search-")
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/bench.db"
+
+import app as app_module  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+TERMS = ["user12345", "example7.com", "zzz_not_found", "99999"]
+REPEAT = 5
+
+
+def seed(count):
+    rows = [
+        {
+            "email": f"user{i}@example{i % 50}.com",
+            "username": f"user{i}",
+            "display_name": f"User {i}",
+            "password_hash": "x",
+        }
+        for i in range(count)
+    ]
+    with app_module.engine.begin() as conn:
+        for start in range(0, count, 10000):
+            conn.execute(insert(app_module.User), rows[start:start + 10000])
+
+
+def timed(label, build_filter, term):
+    session = app_module.SessionLocal()
+    try:
+        best = float("inf")
+        matches = 0
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            matches = session.query(app_module.User.id).filter(build_filter(term)).limit(50).count()
+            best = min(best, time.perf_counter() - start)
+        print(f"  {label:<8} term={term!r:<16} matches={matches:<4} best={best * 1000:8.2f} ms")
+    finally:
+        session.close()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f"建立 {count} 筆測試用戶...")
+    seed(count)
+
+    def ilike(term):
+        return app_module.User.email.ilike(f"%{term}%")
+
+    def indexed(term):
+        return app_module.search_index.filter_clause(app_module.User, "email", term)
+
+    print("email 子字串搜尋（取前 50 筆）：")
+    for term in TERMS:
+        timed("ilike", ilike, term)
+        timed("trigram", indexed, term)
+
+
+if __name__ == "__main__":
+    main()
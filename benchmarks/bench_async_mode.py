@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+/bd/analyze 負載測試：執行緒模式（gunicorn --threads N）vs ASGI 模式（asgi.py）
+
+以本地假 OpenAI 伺服器模擬每次呼叫的延遲，兩種模式使用相同的執行緒數，
+量測 N 個並行分析的總時間與延遲百分位數。
+
+用法：
+    python benchmarks/bench_async_mode.py [並行分析數，預設 200] [執行緒數，預設 8] [OpenAI 延遲秒數，預設 1.0]
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+TMP_DIR = tempfile.mkdtemp(prefix="bench-async-")
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/bench.db"
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+import httpx  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import app as app_module  # noqa: E402
+import asgi  # noqa: E402
+
+ANALYSIS_REPLY = """用戶名：bench_user
+粉絲數：12000
+```json
+{"basic_info": {"username": "bench_user", "display_name": "Bench", "followers": 12000, "following": 300, "posts": 80},
+ "personality_type": {"primary_type": "type_3"}, "improvement_tips": ["多發 Reels"]}
+```"""
+
+
+def start_fake_openai(delay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(delay)
+            body = json.dumps({"choices": [{"message": {"content": ANALYSIS_REPLY}}]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer.daemon_threads = True
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_image():
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 640), color=(200, 180, 160)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def percentiles(latencies):
+    values = sorted(latencies)
+    pick = lambda p: values[min(len(values) - 1, int(p / 100 * len(values)))]  # noqa: E731
+    return pick(50), pick(95), values[-1]
+
+
+def report(label, elapsed, latencies, ok, total):
+    p50, p95, worst = percentiles(latencies)
+    print(f"{label:<12} 完成 {ok}/{total}  總時間 {elapsed:6.2f}s  吞吐 {ok / elapsed:6.1f} req/s  "
+          f"p50 {p50:6.2f}s  p95 {p95:6.2f}s  max {worst:6.2f}s")
+
+
+def bench_threaded(image, total, threads):
+    client = app_module.app.test_client()
+    start = time.perf_counter()
+
+    # 延遲從整批請求送出時起算（包含排隊等待執行緒的時間）
+    def one(_):
+        resp = client.post("/bd/analyze", data={"profile": (io.BytesIO(image), "p.jpg")},
+                           content_type="multipart/form-data")
+        return resp.status_code == 200, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(one, range(total)))
+    report(f"threads x{threads}", time.perf_counter() - start, [r[1] for r in results],
+           sum(r[0] for r in results), total)
+
+
+def bench_asgi(image, total, threads):
+    application = asgi.ASGIApplication(threads=threads)
+
+    async def main():
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            start = time.perf_counter()
+
+            async def one():
+                resp = await client.post("/bd/analyze", files={"profile": ("p.jpg", image, "image/jpeg")})
+                return resp.status_code == 200, time.perf_counter() - start
+
+            results = await asyncio.gather(*(one() for _ in range(total)))
+            return time.perf_counter() - start, results
+
+    elapsed, results = asyncio.run(main())
+    report(f"asgi x{threads}", elapsed, [r[1] for r in results], sum(r[0] for r in results), total)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    delay = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+
+    server = start_fake_openai(delay)
+    app_module.get_analyzer().openai.api_url = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+    image = make_image()
+    print(f"📊 {total} 個並行分析，每次 OpenAI 呼叫延遲 {delay}s（每個分析 3 次呼叫）")
+
+    bench_threaded(image, total, threads)
+    bench_asgi(image, total, threads)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多 worker 記憶體：preload（master 建好共用資料後 fork）vs 每個 worker 自行載入 app
+
+以 os.fork 模擬 gunicorn：preload 模式在 master 呼叫 create_app() + before_fork()，
+worker 呼叫 after_fork()；非 preload 模式先 fork 再由 worker 匯入 app。
+每個 worker 處理幾個請求後，同時讀取 /proc/<pid>/smaps_rollup：
+- RSS：worker 看到的常駐記憶體（含共用分頁）
+- PSS：共用分頁依共用行程數平均分攤，加總即為實際佔用
+- USS：worker 私有分頁（多開一個 worker 的實際成本）
+
+用法（僅限 Linux）：
+    python benchmarks/bench_fork_memory.py [worker 數列表，預設 1,2,4]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+SAMPLE_RESPONSE = """**毒舌短評：** 質感在線，粉絲還在路上
+帳號名稱: bench_user
+粉絲數: 12000
+```json
+{"basic_info": {"username": "bench_user", "followers": 12000}, "personality_type": {"primary_type": "type_3"}}
+```"""
+
+
+def read_memory_kb() -> dict:
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def worker_main(app_module, ready_w, go_r, result_w):
+    client = app_module.app.test_client()
+    for path in ("/health", "/api/leaderboard", "/api/leaderboard?limit=5"):
+        client.get(path)
+    for _ in range(20):
+        app_module.extract_json_from_text(SAMPLE_RESPONSE)
+        app_module.extract_analysis_text(SAMPLE_RESPONSE)
+    os.write(ready_w, b"1")
+    os.read(go_r, 1)  # 所有 worker 就緒後才量測，PSS 才反映實際共用狀況
+    os.write(result_w, json.dumps(read_memory_kb()).encode("utf-8"))
+
+
+def run_mode(mode: str, workers: int) -> dict:
+    """在本行程中執行一種模式（由 main 以子行程呼叫，確保每次從乾淨狀態開始）"""
+    app_module = None
+    if mode == "preload":
+        import app as app_module
+        app_module.create_app()
+        master_memory = read_memory_kb()
+    else:
+        master_memory = read_memory_kb()
+
+    pipes, pids = [], []
+    for _ in range(workers):
+        ready_r, ready_w = os.pipe()
+        go_r, go_w = os.pipe()
+        result_r, result_w = os.pipe()
+        if app_module is not None:
+            app_module.before_fork()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                # 非 preload：模擬 gunicorn worker 在 fork 後才載入 app
+                import app as worker_app
+                if mode == "preload":
+                    worker_app.after_fork()
+                with open(os.devnull, "w") as devnull:
+                    sys.stdout = devnull
+                    worker_main(worker_app, ready_w, go_r, result_w)
+            except Exception as e:  # noqa: BLE001
+                sys.stderr.write(f"worker 失敗: {e}\n")
+                code = 1
+            finally:
+                os._exit(code)
+        pids.append(pid)
+        pipes.append((ready_r, go_w, result_r))
+
+    for ready_r, _, _ in pipes:
+        os.read(ready_r, 1)
+    for _, go_w, _ in pipes:
+        os.write(go_w, b"1")
+    results = [json.loads(os.read(result_r, 4096)) for _, _, result_r in pipes]
+    for pid in pids:
+        os.waitpid(pid, 0)
+    return {"master": master_memory, "workers": results}
+
+
+def report(mode, workers, data):
+    rss = sum(w["rss"] for w in data["workers"]) / workers / 1024
+    pss = sum(w["pss"] for w in data["workers"]) / 1024
+    uss = sum(w["uss"] for w in data["workers"]) / workers / 1024
+    print(f"{mode:<11} x{workers}  每 worker RSS {rss:6.1f}MB  USS {uss:6.1f}MB  "
+          f"workers PSS 合計 {pss:6.1f}MB  master RSS {data['master']['rss'] / 1024:6.1f}MB")
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--run":
+        print(json.dumps(run_mode(sys.argv[2], int(sys.argv[3]))))
+        return
+
+    counts = [int(n) for n in (sys.argv[1] if len(sys.argv) > 1 else "1,2,4").split(",")]
+    tmp_dir = tempfile.mkdtemp(prefix="bench-fork-")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_dir}/bench.db",
+               STARTUP_WARMUP="0", HTTP_WARMUP="0", OPENAI_API_KEY="sk-bench")
+    # 先建立資料庫，避免量測包含第一次遷移
+    subprocess.run([sys.executable, "-c", "import app; app.ensure_db_ready()"],
+                   cwd=ROOT_DIR, env=env, check=True, capture_output=True)
+
+    print("📊 每個 worker 處理相同請求後同時量測（單位 MB）")
+    for mode in ("no-preload", "preload"):
+        for workers in counts:
+            result = subprocess.run([sys.executable, __file__, "--run", mode, str(workers)],
+                                    cwd=ROOT_DIR, env=env, check=True, capture_output=True, text=True)
+            report(mode, workers, json.loads(result.stdout.strip().splitlines()[-1]))
+
+
+if __name__ == "__main__":
+    main()
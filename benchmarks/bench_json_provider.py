@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API 回應序列化比較：Flask 預設 JSON provider vs FastJSONProvider（標準函式庫 / orjson），
+以及 gzip / brotli 動態壓縮的大小與耗時
+
+負載：管理後台分析列表（1000 筆）、排行榜（100 筆）、單筆分析結果。
+
+用法：
+    python benchmarks/bench_json_provider.py [重複次數，預設 200]
+"""
+
+import gzip
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from json_provider import FastJSONProvider, orjson  # noqa: E402
+from bench_payload_codec import make_payload  # noqa: E402
+from response_compression import COMPRESS_BROTLI_QUALITY, COMPRESS_LEVEL, brotli  # noqa: E402
+
+
+def admin_listing(rng, count=1000):
+    now = datetime.utcnow()
+    rows = []
+    for i in range(count):
+        payload = make_payload(rng, i)
+        value_est = payload["value_estimation"]
+        created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+        rows.append({
+            "id": i + 1,
+            "username": payload["username"],
+            "display_name": payload["display_name"],
+            "user": {"id": rng.randint(1, 500), "email": f"user{i}@example.com", "username": f"user{i}"},
+            "account_asset_value": value_est["account_asset_value"],
+            "post_value": value_est["post_value"],
+            "story_value": value_est["story_value"],
+            "reels_value": value_est["reels_value"],
+            "followers": payload["followers"],
+            "analysis_text": payload["analysis_text"][:100] + "...",
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+    return {"ok": True, "analyses": rows, "total": count, "next_cursor": "eyJpZCI6MTAwMH0"}
+
+
+def leaderboard(rng, count=100):
+    now = datetime.utcnow()
+    entries = []
+    for i in range(count):
+        payload = make_payload(rng, i)
+        entries.append({
+            "username": payload["username"],
+            "display_name": payload["display_name"],
+            "followers": payload["followers"],
+            "account_value": payload["value_estimation"]["account_asset_value"],
+            "record_id": i + 1,
+            "created_at": now - timedelta(hours=i),
+            "rank": i + 1,
+            "avatar": payload["display_name"][:2].upper(),
+        })
+    return {"ok": True, "type": "account_value", "limit": count, "total": count * 3, "leaderboard": entries}
+
+
+def providers():
+    app = Flask(__name__)
+    result = [
+        ("Flask 預設（json）", DefaultJSONProvider(app), lambda p, obj: p.dumps(obj).encode("utf-8")),
+        ("FastJSONProvider（json）", FastJSONProvider(app, use_orjson=False), None),
+    ]
+    if orjson is not None:
+        result.append(("FastJSONProvider（orjson）", FastJSONProvider(app), None))
+    else:
+        print("ℹ️ 未安裝 orjson，略過 orjson 比較（pip install orjson）")
+    return result
+
+
+def bench_dumps(name, provider, dumps, payload, repeat):
+    if dumps is None:
+        dumps = lambda p, obj: p.dumps_bytes(obj)  # noqa: E731
+    body = dumps(provider, payload)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        dumps(provider, payload)
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<28} {len(body) / 1024:>8.1f} KB {elapsed / repeat * 1000:>8.2f} ms")
+    return body
+
+
+def bench_compress(body, repeat):
+    compressors = [(f"gzip -{COMPRESS_LEVEL}", lambda d: gzip.compress(d, compresslevel=COMPRESS_LEVEL, mtime=0))]
+    if brotli is not None:
+        compressors.append((f"brotli q{COMPRESS_BROTLI_QUALITY}", lambda d: brotli.compress(d, quality=COMPRESS_BROTLI_QUALITY)))
+    for name, compress in compressors:
+        compressed = compress(body)
+        start = time.perf_counter()
+        for _ in range(max(repeat // 10, 1)):
+            compress(body)
+        elapsed = (time.perf_counter() - start) / max(repeat // 10, 1)
+        print(f"  {name:<28} {len(compressed) / 1024:>8.1f} KB {elapsed * 1000:>8.2f} ms "
+              f"（{len(compressed) / len(body):.0%}）")
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = random.Random(42)
+    result = make_payload(rng, 0)
+    result["created_at"] = datetime.utcnow()
+    workloads = [
+        ("管理後台分析列表（1000 筆）", admin_listing(rng)),
+        ("排行榜（100 筆）", leaderboard(rng)),
+        ("單筆分析結果", result),
+    ]
+    candidates = providers()
+    print(f"重複次數: {repeat}")
+    for title, payload in workloads:
+        print(f"\n{title}")
+        print(f"  {'序列化':<28} {'大小':>11} {'每次':>11}")
+        body = None
+        for name, provider, dumps in candidates:
+            body = bench_dumps(name, provider, dumps, payload, repeat)
+        bench_compress(body, repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+密碼雜湊：request 執行緒直接計算 vs 行程池
+
+模擬一波並行登入，同時量測另一個執行緒的輕量工作（代表其他端點）延遲，
+回報雜湊延遲百分位數與輕量工作的最大延遲。
+
+用法：
+    python benchmarks/bench_password_hasher.py [並行登入數，預設 32] [行程數，預設 2]
+"""
+
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from password_hasher import PasswordHasher  # noqa: E402
+
+METHOD = "scrypt:32768:8:1"
+
+
+def light_task_latencies(stop):
+    """每 5ms 做一次極小的工作，記錄實際間隔超出的時間（GIL / CPU 被佔用時會變大）"""
+    delays = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        time.sleep(0.005)
+        sum(range(100))
+        delays.append((time.perf_counter() - start - 0.005) * 1000)
+    return delays
+
+
+def run(label, hasher, pwhash, logins):
+    stop = threading.Event()
+    result = {}
+    watcher = threading.Thread(target=lambda: result.setdefault("delays", light_task_latencies(stop)))
+    watcher.start()
+    hasher.verify(pwhash, "secret123")  # 預熱行程池
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: hasher.verify(pwhash, "secret123"), range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    watcher.join()
+
+    latency = hasher.snapshot()["latency"]["verify"]
+    delays = result["delays"]
+    print(f"{label:<10} 總時間 {elapsed:6.2f}s  "
+          f"p50 {latency['p50_ms']:8.1f}ms  p95 {latency['p95_ms']:8.1f}ms  p99 {latency['p99_ms']:8.1f}ms  "
+          f"其他工作延遲 中位數 {statistics.median(delays):6.2f}ms / 最大 {max(delays):7.2f}ms")
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    pwhash = PasswordHasher(method=METHOD, workers=0).hash("secret123")
+    print(f"📊 {logins} 個並行登入（{METHOD}）")
+
+    run("inline", PasswordHasher(method=METHOD, workers=0, max_pending=logins), pwhash, logins)
+    pool = PasswordHasher(method=METHOD, workers=workers, max_pending=logins)
+    try:
+        run(f"pool x{workers}", pool, pwhash, logins)
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析結果編碼比較：JSON 文字 vs msgpack vs msgpack+zstd vs msgpack+zstd（共享字典）
+
+量測總儲存大小與解碼時間。
+
+用法：
+    python benchmarks/bench_payload_codec.py [記錄數，預設 100000]
+"""
+
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from data_codec import PayloadCodec  # noqa: E402
+
+TYPES = [f"type_{i}" for i in range(1, 10)]
+CATEGORIES = ["生活風格", "美食", "旅遊", "時尚", "健身", "科技", "親子", "寵物"]
+TIPS = [
+    "持續分享高品質內容", "提升粉絲互動頻率", "固定發文時間", "增加 Reels 比例",
+    "在限動加入問答互動", "統一視覺色調", "補上聯絡資訊", "與同領域創作者合作",
+]
+
+
+def make_payload(rng, i):
+    followers = rng.randint(200, 500000)
+    post_value = followers // rng.randint(20, 80)
+    return {
+        "username": f"creator_{i}",
+        "display_name": f"Creator {i}",
+        "followers": followers,
+        "following": rng.randint(50, 3000),
+        "posts": rng.randint(5, 2000),
+        "visual_quality": {"overall": round(rng.uniform(3, 9.5), 1), "consistency": round(rng.uniform(3, 9.5), 1)},
+        "content_type": {"primary": rng.choice(CATEGORIES), "category_tier": rng.choice(["low", "mid", "high"])},
+        "content_format": {"video_focus": rng.randint(1, 10), "personal_connection": rng.randint(1, 10)},
+        "professionalism": {"has_contact": rng.random() < 0.5, "is_business_account": rng.random() < 0.3},
+        "personality_type": {
+            "primary_type": rng.choice(TYPES),
+            "reasoning": f"帳號以{rng.choice(CATEGORIES)}內容為主，互動率約 {rng.uniform(0.5, 8):.1f}%，風格穩定。",
+        },
+        "value_estimation": {
+            "account_asset_value": post_value * rng.randint(20, 60),
+            "post_value": post_value,
+            "story_value": post_value // 3,
+            "reels_value": int(post_value * 1.5),
+        },
+        "improvement_tips": rng.sample(TIPS, 3),
+        "analysis_text": "毒舌短評：" + "".join(rng.sample(TIPS, 4)),
+    }
+
+
+def bench(name, blobs, decode):
+    size = sum(len(b) for b in blobs)
+    start = time.perf_counter()
+    for blob in blobs:
+        decode(blob)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {size / 1024 / 1024:>9.1f} MB {size / len(blobs):>8.0f} B/筆 "
+          f"{elapsed:>7.2f} s {elapsed / len(blobs) * 1e6:>7.1f} µs/筆")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(42)
+    payloads = [make_payload(rng, i) for i in range(count)]
+    print(f"記錄數: {count}")
+    print(f"{'格式':<28} {'總大小':>12} {'平均':>10} {'解碼':>9} {'每筆':>10}")
+
+    texts = [json.dumps(p, ensure_ascii=False).encode("utf-8") for p in payloads]
+    bench("JSON 文字（舊格式）", texts, lambda b: json.loads(b.decode("utf-8")))
+
+    raw = PayloadCodec(compress=False)
+    bench("msgpack", [raw.encode(p) for p in payloads], raw.decode)
+
+    plain = PayloadCodec(compress=True)
+    bench("msgpack + zstd", [plain.encode(p) for p in payloads], plain.decode)
+
+    with tempfile.TemporaryDirectory() as dict_dir:
+        shared = PayloadCodec(compress=True, dict_dir=dict_dir)
+        shared.train_dictionary(payloads[:2000])
+        bench("msgpack + zstd（共享字典）", [shared.encode(p) for p in payloads], shared.decode)
+
+
+if __name__ == "__main__":
+    main()
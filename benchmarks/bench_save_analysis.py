@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析結果寫入效能比較：同步 UPSERT vs write-behind 批次寫入
+
+用法：
+    python benchmarks/bench_save_analysis.py [總寫入數，預設 2000] [執行緒數，預設 8]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+TMP_DIR = tempfile.mkdtemp(prefix="bench-save-")
+os.environ["DATABASE_URL"] = f"sqlite:///{TMP_DIR}/bench.db"
+# 每筆寫入的 INFO 日誌不列入量測
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import app as app_module  # noqa: E402
+from write_behind import WriteBehindQueue  # noqa: E402
+
+
+def make_payload(i):
+    return {
+        "username": f"bench{i % 500}",
+        "display_name": f"Bench {i}",
+        "followers": 1000 + i,
+        "user_id": None,
+        "analysis_text": "這是一段效能測試用的短評，" * 5,
+        "value_estimation": {"account_asset_value": 10000 + i, "post_value": 1000, "story_value": 300, "reels_value": 800},
+    }
+
+
+def run(save, total, threads):
+    per_thread = total // threads
+
+    def worker(offset):
+        for i in range(per_thread):
+            save(make_payload(offset * per_thread + i))
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return start
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    start = run(app_module.save_analysis_result, total, threads)
+    elapsed = time.perf_counter() - start
+    print(f"sync upsert   : {total / elapsed:8.1f} saves/sec ({elapsed:.2f}s)")
+
+    writer = WriteBehindQueue(app_module.save_analysis_results_batch, max_batch=100, max_delay=0.02)
+    start = run(writer.submit, total, threads)
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    writer.close()
+    print(f"write-behind  : {total / elapsed:8.1f} saves/sec ({elapsed:.2f}s), batches={writer.stats['batches']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# data_codec.py - 分析結果資料編碼
+
+"""
+AnalysisResult 資料欄位的版本化二進位編碼
+
+格式：第 1 個 byte 為格式版本
+- 0x01：MessagePack
+- 0x02：MessagePack + zstd
+- 0x03：MessagePack + zstd（共享字典），接著 4 bytes 字典 id（big-endian）
+- 0x10：JSON UTF-8（未安裝 msgpack 時的備用格式）
+
+msgpack / zstandard 皆為可選依賴，未安裝時自動退回較簡單的格式。
+
+共享字典是解碼 0x03 資料的必要條件：設定 dict_store 時以它為準（應用程式存在資料庫，
+與資料同生共死），dict_dir 只是本機快取；未設定 dict_store 時字典只存在 dict_dir。
+dict_store 需提供 save(dict_id, data)、load(dict_id) -> bytes | None、latest_id() -> int | None。
+"""
+
+import json
+import os
+import struct
+import threading
+
+try:
+    import msgpack
+except ImportError:  # msgpack 是可選的
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard 是可選的
+    zstandard = None
+
+
+FORMAT_MSGPACK = 0x01
+FORMAT_MSGPACK_ZSTD = 0x02
+FORMAT_MSGPACK_ZSTD_DICT = 0x03
+FORMAT_JSON = 0x10
+
+_DICT_HEADER = struct.Struct(">BI")
+
+
+class PayloadDecodeError(ValueError):
+    """無法解碼資料（格式未知或缺少對應的函式庫/字典）"""
+
+
+class PayloadCodec:
+    """分析結果編碼器"""
+
+    def __init__(self, compress: bool = True, level: int = 3,
+                 dict_dir: str = None, min_compress_size: int = 256, dict_store=None):
+        """
+        Args:
+            compress: 是否使用 zstd 壓縮（需安裝 zstandard）
+            level: zstd 壓縮等級
+            dict_dir: 共享字典目錄（payload-<id>.zdict），None 表示不使用字典
+            min_compress_size: 小於此大小不壓縮
+            dict_store: 共享字典的永久儲存（例如資料庫），設定時 dict_dir 只作為本機快取
+        """
+        self.compress = compress and zstandard is not None
+        self.level = level
+        self.dict_dir = dict_dir
+        self.dict_store = dict_store
+        self.min_compress_size = min_compress_size
+        self._dicts = {}
+        self._dict_lock = threading.Lock()
+        self._local = threading.local()
+        self._active_dict_id = None
+        self._active_resolved = False
+
+    @property
+    def active_dict_id(self):
+        """目前壓縮使用的字典（第一次編碼時才查詢；dict_store 暫時無法使用時下次再查）"""
+        if not self._active_resolved:
+            try:
+                self._active_dict_id = self._latest_dict_id()
+            except Exception:
+                return None
+            self._active_resolved = True
+        return self._active_dict_id
+
+    @active_dict_id.setter
+    def active_dict_id(self, dict_id):
+        self._active_dict_id = dict_id
+        self._active_resolved = True
+
+    # ------------------------------------------------------------------
+    # 編碼 / 解碼
+    # ------------------------------------------------------------------
+    def encode(self, obj) -> bytes:
+        if msgpack is None:
+            return bytes([FORMAT_JSON]) + json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        raw = msgpack.packb(obj, use_bin_type=True)
+        if not self.compress or len(raw) < self.min_compress_size:
+            return bytes([FORMAT_MSGPACK]) + raw
+        if self.active_dict_id is not None:
+            compressor = self._compressor(self.active_dict_id)
+            return _DICT_HEADER.pack(FORMAT_MSGPACK_ZSTD_DICT, self.active_dict_id) + compressor.compress(raw)
+        return bytes([FORMAT_MSGPACK_ZSTD]) + self._compressor(None).compress(raw)
+
+    def decode(self, blob: bytes):
+        if not blob:
+            raise PayloadDecodeError("empty payload")
+        blob = bytes(blob)
+        fmt = blob[0]
+        try:
+            if fmt == FORMAT_JSON:
+                return json.loads(blob[1:].decode("utf-8"))
+            if msgpack is None:
+                raise PayloadDecodeError("msgpack 未安裝，無法解碼")
+            if fmt == FORMAT_MSGPACK:
+                return msgpack.unpackb(blob[1:], raw=False)
+            if zstandard is None:
+                raise PayloadDecodeError("zstandard 未安裝，無法解碼")
+            if fmt == FORMAT_MSGPACK_ZSTD:
+                return msgpack.unpackb(self._decompressor(None).decompress(blob[1:]), raw=False)
+            if fmt == FORMAT_MSGPACK_ZSTD_DICT:
+                _, dict_id = _DICT_HEADER.unpack_from(blob)
+                data = self._decompressor(dict_id).decompress(blob[_DICT_HEADER.size:])
+                return msgpack.unpackb(data, raw=False)
+        except PayloadDecodeError:
+            raise
+        except Exception as e:
+            raise PayloadDecodeError(f"解碼失敗 (format=0x{fmt:02x}): {e}")
+        raise PayloadDecodeError(f"未知的資料格式: 0x{fmt:02x}")
+
+    # ------------------------------------------------------------------
+    # 共享字典
+    # ------------------------------------------------------------------
+    def train_dictionary(self, samples, size: int = 16 * 1024) -> int:
+        """
+        以樣本訓練 zstd 共享字典，寫入 dict_dir 並設為目前使用的字典
+
+        Args:
+            samples: 分析結果 dict 的列表（建議 1000 筆以上）
+            size: 字典大小（bytes）
+
+        Returns:
+            字典 id
+        """
+        if zstandard is None or msgpack is None:
+            raise RuntimeError("需要安裝 msgpack 與 zstandard 才能訓練字典")
+        if not self.dict_dir and self.dict_store is None:
+            raise RuntimeError("未設定 dict_dir 或 dict_store")
+        encoded = [msgpack.packb(s, use_bin_type=True) for s in samples]
+        trained = zstandard.train_dictionary(size, encoded)
+        dict_id = trained.dict_id()
+        # 先寫入永久儲存，成功後才開始以新字典壓縮
+        if self.dict_store is not None:
+            self.dict_store.save(dict_id, trained.as_bytes())
+        if self.dict_dir:
+            self._write_dict_file(dict_id, trained.as_bytes())
+        with self._dict_lock:
+            self._dicts[dict_id] = trained
+        self.active_dict_id = dict_id
+        return dict_id
+
+    def _write_dict_file(self, dict_id, data: bytes):
+        os.makedirs(self.dict_dir, exist_ok=True)
+        path = os.path.join(self.dict_dir, f"payload-{dict_id}.zdict")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _latest_dict_id(self):
+        if not self.compress:
+            return None
+        if self.dict_store is not None:
+            return self.dict_store.latest_id()
+        if not self.dict_dir or not os.path.isdir(self.dict_dir):
+            return None
+        candidates = []
+        for name in os.listdir(self.dict_dir):
+            if name.startswith("payload-") and name.endswith(".zdict"):
+                path = os.path.join(self.dict_dir, name)
+                try:
+                    candidates.append((os.path.getmtime(path), int(name[8:-6])))
+                except ValueError:
+                    continue
+        return max(candidates)[1] if candidates else None
+
+    def _load_dict(self, dict_id):
+        with self._dict_lock:
+            cached = self._dicts.get(dict_id)
+            if cached is not None:
+                return cached
+            data = None
+            path = os.path.join(self.dict_dir, f"payload-{dict_id}.zdict") if self.dict_dir else None
+            if path and os.path.exists(path):
+                with open(path, "rb") as f:
+                    data = f.read()
+            elif self.dict_store is not None:
+                try:
+                    data = self.dict_store.load(dict_id)
+                except Exception as e:
+                    raise PayloadDecodeError(f"讀取 zstd 字典失敗: {dict_id}: {e}")
+                if data is not None and self.dict_dir:
+                    try:
+                        self._write_dict_file(dict_id, data)
+                    except OSError:
+                        pass  # 本機快取寫入失敗不影響解碼
+            if data is None:
+                raise PayloadDecodeError(f"找不到 zstd 字典: {dict_id}")
+            loaded = zstandard.ZstdCompressionDict(data)
+            self._dicts[dict_id] = loaded
+            return loaded
+
+    # zstd 壓縮/解壓物件不是執行緒安全的，每個執行緒各自保留一份
+    def _compressor(self, dict_id):
+        cache = self._local.__dict__.setdefault("compressors", {})
+        if dict_id not in cache:
+            kwargs = {"level": self.level}
+            if dict_id is not None:
+                kwargs["dict_data"] = self._load_dict(dict_id)
+            cache[dict_id] = zstandard.ZstdCompressor(**kwargs)
+        return cache[dict_id]
+
+    def _decompressor(self, dict_id):
+        cache = self._local.__dict__.setdefault("decompressors", {})
+        if dict_id not in cache:
+            kwargs = {}
+            if dict_id is not None:
+                kwargs["dict_data"] = self._load_dict(dict_id)
+            cache[dict_id] = zstandard.ZstdDecompressor(**kwargs)
+        return cache[dict_id]
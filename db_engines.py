@@ -0,0 +1,159 @@
+# db_engines.py - 資料庫 engine 設定
+
+"""
+依資料庫類型建立調校過的 SQLAlchemy engine，並提供連線池指標
+
+- SQLite：WAL、synchronous=NORMAL、busy_timeout、mmap_size；唯讀 engine 設定 query_only
+- PostgreSQL：pool_size / max_overflow / pool_pre_ping / statement_timeout；
+  唯讀 engine 設定 default_transaction_read_only
+- 連線池使用 TimedQueuePool，記錄 checkout 次數、等待時間與逾時
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # 秒
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 15000))
+SQLITE_WAL = os.getenv('SQLITE_WAL', '1') == '1'
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+
+class TimedQueuePool(QueuePool):
+    """記錄 checkout 等待時間的 QueuePool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "checkouts": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "timeouts": 0,
+            "connects": 0,
+        }
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.stats["timeouts"] += 1
+            raise
+        wait_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self.stats["checkouts"] += 1
+            self.stats["wait_ms_total"] += wait_ms
+            self.stats["wait_ms_max"] = max(self.stats["wait_ms_max"], wait_ms)
+        return conn
+
+    def recreate(self):
+        # dispose() / fork 後重建連線池時保留累計指標
+        new_pool = super().recreate()
+        new_pool.stats = self.stats
+        new_pool._stats_lock = self._stats_lock
+        return new_pool
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        checkouts = stats["checkouts"]
+        stats["wait_ms_avg"] = round(stats["wait_ms_total"] / checkouts, 3) if checkouts else 0.0
+        stats["wait_ms_total"] = round(stats["wait_ms_total"], 3)
+        stats["wait_ms_max"] = round(stats["wait_ms_max"], 3)
+        stats.update({
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "overflow": self.overflow(),
+            "idle": self.checkedin(),
+        })
+        return stats
+
+
+def _sqlite_path(url: str):
+    path = url.split('///', 1)[1].split('?', 1)[0] if '///' in url else ''
+    return None if not path or path == ':memory:' else path
+
+
+def create_db_engine(url: str, read_only: bool = False):
+    """
+    依資料庫類型建立 engine
+
+    Args:
+        url: 資料庫 URL
+        read_only: 唯讀 engine（讀取用端點使用，可指向 replica）
+    """
+    kwargs = {
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+    if url.startswith('sqlite'):
+        path = _sqlite_path(url)
+        if path:
+            db_dir = os.path.dirname(path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir, exist_ok=True)
+        else:
+            # 記憶體資料庫每條連線各自獨立，沿用 SQLAlchemy 預設的連線池
+            kwargs = {}
+        kwargs["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000.0}
+        engine = create_engine(url, **kwargs)
+        _configure_sqlite(engine, wal=SQLITE_WAL and path is not None, read_only=read_only)
+        _track_connects(engine)
+        return engine
+
+    if url.startswith('postgres'):
+        options = [f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"]
+        if read_only:
+            options.append("-c default_transaction_read_only=on")
+        kwargs.update({
+            "pool_pre_ping": True,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "connect_args": {"options": " ".join(options)},
+        })
+    engine = create_engine(url, **kwargs)
+    _track_connects(engine)
+    return engine
+
+
+def _configure_sqlite(engine, wal: bool, read_only: bool):
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        if wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def _track_connects(engine):
+    @event.listens_for(engine, "connect")
+    def _count_connect(dbapi_conn, connection_record):
+        pool = engine.pool
+        if isinstance(pool, TimedQueuePool):
+            with pool._stats_lock:
+                pool.stats["connects"] += 1
+
+
+def pool_metrics(engine) -> dict:
+    """回傳連線池指標（非 TimedQueuePool 時只回傳基本狀態）"""
+    pool = engine.pool
+    if isinstance(pool, TimedQueuePool):
+        return pool.snapshot()
+    return {"status": pool.status()}
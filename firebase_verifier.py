@@ -0,0 +1,243 @@
+# firebase_verifier.py - Firebase ID token 本地驗證
+
+"""
+Firebase ID token 本地驗證（RS256）
+
+- Google 公開憑證快取在記憶體並寫入檔案，重啟後不必等待下載
+- 背景執行緒在憑證到期前（Cache-Control max-age）更新；遇到未知 kid 時同步更新一次
+- 驗證成功的結果以短 TTL 快取（以 token 雜湊為 key，不超過 token 的 exp）
+
+檢查項目與 firebase_admin.auth.verify_id_token 相同：簽章、aud、iss、exp、iat、sub。
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import jwt
+from cryptography.x509 import load_pem_x509_certificate
+
+from http_client import get_http_client
+from ttl_cache import TTLCache
+from app_logging import get_logger
+
+firebase_log = get_logger("firebase")
+
+
+GOOGLE_CERTS_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+)
+DEFAULT_MAX_AGE = 3600
+RETRY_INTERVAL = 60
+# 遇到未知 kid 時，最短間隔多久才允許再同步下載一次
+MIN_FORCED_REFRESH_INTERVAL = 30
+
+
+class FirebaseTokenError(Exception):
+    """驗證失敗；code 為 expired / invalid / unavailable"""
+
+    def __init__(self, code: str, message: str = ""):
+        super().__init__(message or code)
+        self.code = code
+
+
+class FirebaseTokenVerifier:
+    """Firebase ID token 驗證器"""
+
+    def __init__(self, project_id: str, certs_url: str = GOOGLE_CERTS_URL, cache_path: str = None,
+                 refresh_margin: float = 300, verify_cache_ttl: float = 60,
+                 verify_cache_size: int = 10000, timeout: float = 5.0, fetch=None):
+        """
+        Args:
+            project_id: Firebase 專案 ID（aud / iss 驗證）
+            certs_url: 公開憑證 URL（測試時可指向本地 key server）
+            cache_path: 憑證快取檔案路徑（None 表示不寫檔）
+            refresh_margin: 到期前多少秒開始背景更新
+            verify_cache_ttl: 驗證結果快取秒數（0 表示不快取）
+            timeout: 下載憑證逾時秒數
+            fetch: 自訂下載函數 fn(url, timeout) -> (certs dict, max_age)
+        """
+        self.project_id = project_id
+        self.issuer = f"https://securetoken.google.com/{project_id}"
+        self.certs_url = certs_url
+        self.cache_path = cache_path
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self.fetch = fetch or self._http_fetch
+        self.verify_cache_ttl = verify_cache_ttl
+        self.verified = TTLCache(verify_cache_size, ttl=verify_cache_ttl, name="firebase_token")
+        self._keys = {}
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._last_forced_refresh = 0.0
+        self.stats = {"fetches": 0, "fetch_errors": 0, "verified": 0, "rejected": 0}
+        self._load_cache_file()
+
+    # ------------------------------------------------------------------
+    # 驗證
+    # ------------------------------------------------------------------
+    def verify(self, id_token: str) -> dict:
+        """驗證 ID token，成功時回傳 claims（含 uid）"""
+        cache_key = hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+        cached = self.verified.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+
+        try:
+            header = jwt.get_unverified_header(id_token)
+        except jwt.InvalidTokenError as e:
+            self._reject("invalid", f"無法解析 token header: {e}")
+        if header.get("alg") != "RS256":
+            self._reject("invalid", "token 演算法必須是 RS256")
+        kid = header.get("kid")
+        key = self._key_for(kid)
+        if key is None:
+            self._reject("invalid", f"找不到對應的公開金鑰: {kid}")
+        self._ensure_refresher()
+
+        try:
+            claims = jwt.decode(
+                id_token, key, algorithms=["RS256"], audience=self.project_id, issuer=self.issuer,
+                options={"require": ["exp", "iat", "sub", "aud", "iss"]}, leeway=5
+            )
+        except jwt.ExpiredSignatureError:
+            self._reject("expired", "token 已過期")
+        except jwt.InvalidTokenError as e:
+            self._reject("invalid", str(e))
+
+        sub = claims.get("sub")
+        if not isinstance(sub, str) or not sub or len(sub) > 128:
+            self._reject("invalid", "sub 必須是 1-128 字元的字串")
+        auth_time = claims.get("auth_time")
+        if auth_time is not None and auth_time > time.time() + 5:
+            self._reject("invalid", "auth_time 在未來")
+        claims["uid"] = sub
+
+        self.stats["verified"] += 1
+        ttl = min(self.verify_cache_ttl, claims["exp"] - time.time())
+        self.verified.set(cache_key, claims, ttl=ttl)
+        return dict(claims)
+
+    def _reject(self, code, message):
+        self.stats["rejected"] += 1
+        raise FirebaseTokenError(code, message)
+
+    def _key_for(self, kid):
+        with self._lock:
+            key = self._keys.get(kid)
+            has_keys = bool(self._keys)
+        if key is not None:
+            return key
+        # 憑證輪替或尚未下載：同步更新一次（有最短間隔限制，避免偽造 kid 造成大量下載）
+        if has_keys:
+            now = time.monotonic()
+            if now - self._last_forced_refresh < MIN_FORCED_REFRESH_INTERVAL:
+                return None
+            self._last_forced_refresh = now
+        if not self.refresh() and not has_keys:
+            raise FirebaseTokenError("unavailable", "無法取得 Firebase 公開憑證")
+        with self._lock:
+            return self._keys.get(kid)
+
+    # ------------------------------------------------------------------
+    # 憑證更新
+    # ------------------------------------------------------------------
+    def refresh(self) -> bool:
+        """下載最新憑證；失敗時保留現有憑證並回傳 False"""
+        try:
+            certs, max_age = self.fetch(self.certs_url, self.timeout)
+            keys = self._parse_certs(certs)
+        except Exception as e:
+            self.stats["fetch_errors"] += 1
+            firebase_log.warning("⚠️ 更新公開憑證失敗: %s", e)
+            return False
+        expires_at = time.time() + max_age
+        with self._lock:
+            self._keys = keys
+            self._expires_at = expires_at
+        self.stats["fetches"] += 1
+        self._save_cache_file(certs, expires_at)
+        self._wakeup.set()
+        return True
+
+    @property
+    def expires_at(self) -> float:
+        return self._expires_at
+
+    def _ensure_refresher(self):
+        # 第一次驗證時才啟動背景執行緒（gunicorn fork 之後）
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._refresh_loop, name="FirebaseCerts", daemon=True)
+                self._thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            delay = self._expires_at - self.refresh_margin - time.time()
+            if delay > 0:
+                self._wakeup.clear()
+                self._wakeup.wait(delay)
+                continue
+            if not self.refresh():
+                time.sleep(RETRY_INTERVAL)
+
+    @staticmethod
+    def _parse_certs(certs: dict) -> dict:
+        if not isinstance(certs, dict) or not certs:
+            raise ValueError("憑證格式錯誤")
+        return {
+            kid: load_pem_x509_certificate(pem.encode("utf-8")).public_key()
+            for kid, pem in certs.items()
+        }
+
+    @staticmethod
+    def _http_fetch(url, timeout):
+        resp = get_http_client().get(url, timeout=timeout)
+        resp.raise_for_status()
+        match = re.search(r"max-age=(\d+)", resp.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else DEFAULT_MAX_AGE
+        return resp.json(), max_age
+
+    # ------------------------------------------------------------------
+    # 檔案快取
+    # ------------------------------------------------------------------
+    def _load_cache_file(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+            # 過期的憑證仍先載入：背景執行緒會立即更新，更新失敗時仍可驗證未輪替的 kid
+            self._keys = self._parse_certs(cached["certs"])
+            self._expires_at = float(cached.get("expires_at", 0))
+        except (OSError, ValueError, KeyError) as e:
+            firebase_log.warning("⚠️ 讀取憑證快取失敗: %s", e)
+
+    def _save_cache_file(self, certs, expires_at):
+        if not self.cache_path:
+            return
+        try:
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "certs": certs}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            firebase_log.warning("⚠️ 寫入憑證快取失敗: %s", e)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "keys": len(self._keys),
+            "expires_in": round(self._expires_at - time.time(), 1),
+            "verify_cache": self.verified.snapshot(),
+        }
@@ -0,0 +1,32 @@
+# gunicorn.conf.py - 多 worker 部署設定
+#
+#     gunicorn -c gunicorn.conf.py
+#
+# master 先載入 app 並建好唯讀資料（preload），fork 出的 worker 以 copy-on-write 共用；
+# 資料庫連線池、HTTP session 與背景執行緒在每個 worker 內重新建立。
+
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+threads = int(os.getenv('THREADS', 1))
+timeout = int(os.getenv('TIMEOUT', 120))
+wsgi_app = "app:create_app()"
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+# master 不跑背景初始化執行緒（fork 時不能有其他執行緒持有鎖），由 create_app() 同步完成
+os.environ.setdefault('STARTUP_WARMUP', '0')
+
+
+def pre_fork(server, worker):
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.before_fork()
+
+
+def post_fork(server, worker):
+    # 未 preload 時 worker 尚未載入 app，載入時自然會建立自己的連線
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.after_fork()
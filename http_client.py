@@ -0,0 +1,311 @@
+# http_client.py - 共用對外 HTTP 連線池
+
+"""
+共用對外 HTTP 客戶端（OpenAI、Google、Facebook）
+
+- 同步：requests.Session + HTTPAdapter，每個 host 一個 keep-alive 連線池
+- async：httpx.AsyncClient（ASGI 模式），同樣保留連線
+- 每個 host 有預設逾時（connect 固定較短，read 依服務而定），所有呼叫都有逾時
+- 回應自動 gzip 解壓；JSON 請求可選擇 gzip 壓縮（HTTP_GZIP_HOSTS 中的 host）
+- worker 啟動時可在背景預先建立 TLS 連線，第一個分析不必等握手
+- 指標：每個 host 的呼叫數、錯誤數、延遲百分位數、新建連線數與連線重用率
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app_logging import get_logger
+
+http_log = get_logger("http")
+
+
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 20))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_DEFAULT_TIMEOUT = float(os.getenv('HTTP_DEFAULT_TIMEOUT', 30))
+# 以逗號分隔的 host=秒數，覆寫預設 read timeout，例如 api.openai.com=120
+HTTP_HOST_TIMEOUTS = os.getenv('HTTP_HOST_TIMEOUTS', '')
+HTTP_GZIP_HOSTS = [h.strip() for h in os.getenv('HTTP_GZIP_HOSTS', '').split(',') if h.strip()]
+GZIP_MIN_SIZE = 1024
+
+DEFAULT_HOST_TIMEOUTS = {
+    "api.openai.com": 90,
+    "oauth2.googleapis.com": 15,
+    "www.googleapis.com": 15,
+    "graph.facebook.com": 15,
+}
+
+
+def _parse_host_timeouts(value: str) -> dict:
+    timeouts = {}
+    for item in value.split(','):
+        if '=' in item:
+            host, seconds = item.split('=', 1)
+            timeouts[host.strip()] = float(seconds)
+    return timeouts
+
+
+def load_httpx():
+    """延後匯入 httpx（只有 async 模式需要，同步模式不必負擔約 90ms 的匯入時間）"""
+    try:
+        import httpx
+    except ImportError:
+        raise RuntimeError("httpx 未安裝，無法使用 async 模式")
+    return httpx
+
+
+def _percentile(sorted_samples, pct):
+    index = min(len(sorted_samples) - 1, int(round(pct / 100.0 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+class HttpClient:
+    """共用 HTTP 客戶端（執行緒安全；fork 後各 worker 自動建立自己的連線池）"""
+
+    def __init__(self, pool_maxsize: int = HTTP_POOL_MAXSIZE, connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 default_timeout: float = HTTP_DEFAULT_TIMEOUT, host_timeouts: dict = None,
+                 gzip_hosts=None, sample_size: int = 512):
+        """
+        Args:
+            pool_maxsize: 每個 host 保留的連線數
+            connect_timeout: 建立連線逾時秒數
+            default_timeout: 未設定 host 時的 read timeout
+            host_timeouts: {host: read timeout 秒數}
+            gzip_hosts: JSON 請求 body 以 gzip 壓縮的 host
+        """
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.default_timeout = default_timeout
+        self.host_timeouts = {**DEFAULT_HOST_TIMEOUTS, **(host_timeouts or {})}
+        self.gzip_hosts = set(gzip_hosts or ())
+        self.sample_size = sample_size
+        self._session = None
+        self._session_pid = None
+        self._async_client = None
+        self._async_loop = None
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._async_connects = {}
+
+    # ------------------------------------------------------------------
+    # 同步
+    # ------------------------------------------------------------------
+    def request(self, method: str, url: str, timeout: float = None, gzip_body: bool = None, **kwargs):
+        """
+        送出請求（參數同 requests.request）
+
+        Args:
+            timeout: read timeout 秒數（未指定時依 host 設定）
+            gzip_body: 是否以 gzip 壓縮 json= 的 body（未指定時依 gzip_hosts）
+        """
+        host = urlsplit(url).hostname or ""
+        kwargs = self._prepare_body(host, gzip_body, kwargs)
+        start = time.perf_counter()
+        try:
+            response = self._get_session().request(
+                method, url, timeout=(self.connect_timeout, self.timeout_for(host, timeout)), **kwargs
+            )
+        except requests.RequestException:
+            self._record(host, time.perf_counter() - start, error=True)
+            raise
+        self._record(host, time.perf_counter() - start, error=response.status_code >= 500)
+        return response
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def timeout_for(self, host: str, timeout: float = None) -> float:
+        if timeout is not None:
+            return timeout
+        return self.host_timeouts.get(host, self.default_timeout)
+
+    def _get_session(self):
+        pid = os.getpid()
+        if self._session is not None and self._session_pid == pid:
+            return self._session
+        with self._lock:
+            if self._session is None or self._session_pid != pid:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=self.pool_maxsize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+                self._session_pid = pid
+        return self._session
+
+    def _prepare_body(self, host, gzip_body, kwargs):
+        if gzip_body is None:
+            gzip_body = host in self.gzip_hosts
+        if not gzip_body or kwargs.get("json") is None:
+            return kwargs
+        raw = json.dumps(kwargs.pop("json"), ensure_ascii=False).encode("utf-8")
+        headers = dict(kwargs.pop("headers", None) or {})
+        headers["Content-Type"] = "application/json"
+        if len(raw) >= GZIP_MIN_SIZE:
+            raw = gzip.compress(raw, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        return {**kwargs, "data": raw, "headers": headers}
+
+    # ------------------------------------------------------------------
+    # async（httpx）
+    # ------------------------------------------------------------------
+    async def arequest(self, method: str, url: str, timeout: float = None, gzip_body: bool = None, **kwargs):
+        """送出 async 請求（參數同 httpx.AsyncClient.request）"""
+        httpx = load_httpx()
+        client = self._get_async_client()
+        host = urlsplit(url).hostname or ""
+        kwargs = self._prepare_body(host, gzip_body, kwargs)
+        if "data" in kwargs and isinstance(kwargs["data"], bytes):
+            kwargs["content"] = kwargs.pop("data")
+        timeout = httpx.Timeout(self.timeout_for(host, timeout), connect=self.connect_timeout)
+
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                with self._lock:
+                    self._async_connects[host] = self._async_connects.get(host, 0) + 1
+
+        start = time.perf_counter()
+        try:
+            response = await client.request(
+                method, url, timeout=timeout, extensions={"trace": trace}, **kwargs
+            )
+        except httpx.HTTPError:
+            self._record(host, time.perf_counter() - start, error=True)
+            raise
+        self._record(host, time.perf_counter() - start, error=response.status_code >= 500)
+        return response
+
+    async def apost(self, url: str, **kwargs):
+        return await self.arequest("POST", url, **kwargs)
+
+    def _get_async_client(self):
+        httpx = load_httpx()
+        # AsyncClient 綁定建立時的 event loop；換了 loop（例如測試中多次 asyncio.run）就重新建立
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client.is_closed or self._async_loop is not loop:
+            self._async_loop = loop
+            self._async_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max(self.pool_maxsize, 200),
+                    max_keepalive_connections=self.pool_maxsize
+                )
+            )
+        return self._async_client
+
+    def after_fork(self):
+        """fork 後呼叫：捨棄從 master 繼承的連線池、async client 與指標（不關閉 master 的 socket）"""
+        self._lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+        self._async_client = None
+        self._async_loop = None
+        self._stats = {}
+        self._async_connects = {}
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    # ------------------------------------------------------------------
+    # 預熱與指標
+    # ------------------------------------------------------------------
+    def warm_up(self, urls, background: bool = True):
+        """
+        預先建立連線（TLS 握手），連線留在連線池供之後的請求重用
+
+        回應狀態不重要（例如未帶 API key 的 401），只要連線建立成功即可
+        """
+        def run():
+            for url in urls:
+                try:
+                    self.request("HEAD", url, timeout=self.connect_timeout)
+                    http_log.info("✅ 預熱連線: %s", urlsplit(url).hostname)
+                except requests.RequestException as e:
+                    http_log.warning("⚠️ 預熱連線失敗 %s: %s", urlsplit(url).hostname, e)
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="HttpWarmUp", daemon=True)
+        thread.start()
+        return thread
+
+    def _record(self, host, elapsed, error):
+        with self._lock:
+            stats = self._stats.get(host)
+            if stats is None:
+                stats = self._stats[host] = {"calls": 0, "errors": 0, "samples": deque(maxlen=self.sample_size)}
+            stats["calls"] += 1
+            if error:
+                stats["errors"] += 1
+            stats["samples"].append(elapsed * 1000)
+
+    def _pool_counts(self) -> dict:
+        """每個 host 的 urllib3 連線池計數：新建連線數 / 請求數"""
+        counts = {}
+        session = self._session
+        if session is None or self._session_pid != os.getpid():
+            return counts
+        for adapter in {id(a): a for a in session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                entry = counts.setdefault(pool.host, {"connections": 0, "requests": 0})
+                entry["connections"] += pool.num_connections
+                entry["requests"] += pool.num_requests
+        return counts
+
+    def snapshot(self) -> dict:
+        pool_counts = self._pool_counts()
+        with self._lock:
+            hosts = {host: (dict(s, samples=sorted(s["samples"]))) for host, s in self._stats.items()}
+            async_connects = dict(self._async_connects)
+        result = {}
+        for host, stats in hosts.items():
+            samples = stats.pop("samples")
+            entry = dict(stats)
+            if samples:
+                entry.update({
+                    "p50_ms": round(_percentile(samples, 50), 2),
+                    "p95_ms": round(_percentile(samples, 95), 2),
+                    "p99_ms": round(_percentile(samples, 99), 2),
+                })
+            new_connections = pool_counts.get(host, {}).get("connections", 0) + async_connects.get(host, 0)
+            entry["new_connections"] = new_connections
+            entry["connection_reuse_rate"] = (
+                round(max(0.0, 1 - new_connections / stats["calls"]), 4) if stats["calls"] else 0.0
+            )
+            entry["read_timeout"] = self.timeout_for(host)
+            result[host] = entry
+        return result
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """全域共用的 HttpClient（依環境變數設定）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient(
+                    host_timeouts=_parse_host_timeouts(HTTP_HOST_TIMEOUTS),
+                    gzip_hosts=HTTP_GZIP_HOSTS
+                )
+    return _client
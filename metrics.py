@@ -0,0 +1,328 @@
+# metrics.py - Prometheus 指標（跨 worker 彙總）
+
+"""
+輕量 Prometheus 指標（不依賴 prometheus_client）
+
+- Counter / Histogram：行程內以 dict 累計，執行緒安全
+- collector：匯出時才讀取的指標（快取命中、連線池等待等既有統計）
+- 跨 worker 彙總：每個 worker 定期把快照寫到 METRICS_DIR/<pid>.json，
+  /metrics 讀取所有仍在執行的 worker 快照後加總輸出
+- 已結束的 worker：counter / histogram 併入 METRICS_DIR/archived.json 後才刪除快照（加總值不會因 worker
+  重啟而下降），gauge 直接捨棄
+"""
+
+import bisect
+import fcntl
+import json
+import os
+import threading
+import time
+
+
+METRICS_DIR = os.getenv('METRICS_DIR', 'data/metrics')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+METRIC_PREFIX = "socialavatar_"
+
+ARCHIVE_NAME = "archived.json"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._values.items()]
+        return {"type": "counter", "help": self.documentation, "labelnames": list(self.labelnames),
+                "samples": samples}
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        # 第一個 >= seconds 的 bucket（匯出時再轉成累計值）
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += seconds
+            entry[2] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = [[list(key), list(counts), total, count] for key, (counts, total, count) in self._values.items()]
+        return {"type": "histogram", "help": self.documentation, "labelnames": list(self.labelnames),
+                "buckets": list(self.buckets), "samples": samples}
+
+
+class Registry:
+    def __init__(self, prefix: str = METRIC_PREFIX):
+        self.prefix = prefix
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._flusher_pid = None
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter(self.prefix + name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self.prefix + name, documentation, labelnames, buckets))
+
+    def register_collector(self, fn):
+        """
+        fn() 回傳 [(名稱, 類型, 說明, {標籤}, 數值)]，匯出時才呼叫
+
+        類型為 counter 或 gauge；跨 worker 彙總時兩者都相加（例如各 worker 借出的連線數合計）
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def reset(self):
+        """清空累計值（fork 後的 worker 不應沿用 master 的計數）"""
+        for metric in list(self._metrics.values()):
+            with metric._lock:
+                metric._values.clear()
+        self._flusher = None
+        self._flusher_pid = None
+
+    # ------------------------------------------------------------------
+    # 快照與彙總
+    # ------------------------------------------------------------------
+    def snapshot(self) -> dict:
+        metrics = {name: metric.snapshot() for name, metric in list(self._metrics.items())}
+        for collector in self._collectors:
+            try:
+                rows = collector()
+            except Exception:  # noqa: BLE001 - collector 失敗不影響其他指標
+                continue
+            for name, kind, documentation, labels, value in rows:
+                entry = metrics.setdefault(self.prefix + name, {
+                    "type": kind, "help": documentation, "labelnames": list(labels), "samples": []
+                })
+                entry["samples"].append([[str(labels[k]) for k in entry["labelnames"]], value])
+        return {"pid": os.getpid(), "ts": time.time(), "metrics": metrics}
+
+    def write_snapshot(self, directory: str = METRICS_DIR):
+        """把本 worker 的快照寫入共用目錄（先寫暫存檔再 rename，讀取端不會讀到一半的檔案）"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def collect(self, directory: str = METRICS_DIR) -> str:
+        """回傳 Prometheus 文字格式；有設定目錄時彙總所有 worker"""
+        if not directory:
+            return render([self.snapshot()])
+        self.write_snapshot(directory)
+        return render(read_snapshots(directory))
+
+    def ensure_flusher(self, directory: str = METRICS_DIR, interval: float = METRICS_FLUSH_INTERVAL):
+        """啟動本 worker 的定期寫出執行緒（fork 後在新 worker 中重新啟動）"""
+        if not directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+
+            def run():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.write_snapshot(directory)
+                    except OSError:
+                        pass
+
+            self._flusher = threading.Thread(target=run, name="MetricsFlush", daemon=True)
+            self._flusher.start()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_snapshots(directory: str) -> list:
+    """讀取所有 worker 的快照與已結束 worker 的累計值"""
+    snapshots = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return snapshots
+    dead = []
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            pid = int(name[:-len(".json")])
+        except ValueError:
+            continue
+        if not _pid_alive(pid):
+            dead.append(path)
+            continue
+        snapshot = _load_snapshot(path)
+        if snapshot is not None:
+            snapshots.append(snapshot)
+    if dead:
+        archive_snapshots(directory, dead)
+    archived = _load_snapshot(os.path.join(directory, ARCHIVE_NAME))
+    if archived is not None:
+        snapshots.append(archived)
+    return snapshots
+
+
+def _load_snapshot(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def archive_snapshots(directory: str, paths: list):
+    """
+    把已結束 worker 的 counter / histogram 併入 archived.json，再刪除原快照
+
+    以檔案鎖串行化；先把快照改名再合併，多個 worker 同時讀取時每份快照只會被併入一次
+    """
+    with open(os.path.join(directory, "archived.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = os.path.join(directory, ARCHIVE_NAME)
+        archived = _load_snapshot(archive_path)
+        merged = [archived] if archived is not None else []
+        claimed = []
+        for path in paths:
+            claimed_path = f"{path}.archiving"
+            try:
+                os.rename(path, claimed_path)
+            except OSError:
+                continue  # 其他 worker 已處理
+            claimed.append(claimed_path)
+            snapshot = _load_snapshot(claimed_path)
+            if snapshot is None:
+                continue
+            snapshot["metrics"] = {
+                name: metric for name, metric in snapshot["metrics"].items() if metric["type"] != "gauge"
+            }
+            merged.append(snapshot)
+        if not claimed:
+            return
+        metrics = {}
+        for name, metric in merge_snapshots(merged).items():
+            if metric["type"] == "histogram":
+                samples = [[list(key), *value] for key, value in metric["samples"].items()]
+            else:
+                samples = [[list(key), value] for key, value in metric["samples"].items()]
+            metrics[name] = dict(metric, samples=samples)
+        tmp_path = f"{archive_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pid": None, "ts": time.time(), "metrics": metrics}, f)
+        os.replace(tmp_path, archive_path)
+        for path in claimed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def merge_snapshots(snapshots: list) -> dict:
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot["metrics"].items():
+            target = merged.get(name)
+            if target is None:
+                target = merged[name] = dict(metric, samples={})
+            for sample in metric["samples"]:
+                key = tuple(sample[0])
+                if metric["type"] == "histogram":
+                    counts, total, count = sample[1], sample[2], sample[3]
+                    current = target["samples"].get(key)
+                    if current is None:
+                        target["samples"][key] = [list(counts), total, count]
+                    else:
+                        current[0] = [a + b for a, b in zip(current[0], counts)]
+                        current[1] += total
+                        current[2] += count
+                else:
+                    target["samples"][key] = target["samples"].get(key, 0) + sample[1]
+    return merged
+
+
+def render(snapshots: list) -> str:
+    lines = []
+    for name, metric in sorted(merge_snapshots(snapshots).items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labelnames"]
+        for key, value in sorted(metric["samples"].items()):
+            labels = dict(zip(labelnames, key))
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(list(metric["buckets"]) + [float("inf")], counts):
+                cumulative += bucket_count
+                bucket_labels = dict(labels, le=_format_value(bound) if bound != float("inf") else "+Inf")
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(round(total, 6))}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
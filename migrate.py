@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+資料庫遷移工具（部署時在啟動 gunicorn 前執行一次）
+
+用法：
+    python migrate.py            # 等同 upgrade
+    python migrate.py upgrade    # 套用所有未執行的遷移
+    python migrate.py status     # 顯示目前版本與待執行的遷移
+"""
+
+import os
+import sys
+
+# 由本工具控制遷移，避免匯入 app 時自動執行
+os.environ.setdefault("MIGRATE_ON_START", "0")
+# 命令列輸出使用易讀的文字日誌
+os.environ.setdefault("LOG_FORMAT", "text")
+
+import app as app_module  # noqa: E402
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    runner = app_module.migration_runner
+
+    if command == "status":
+        current = runner.current_version()
+        print(f"📋 目前版本: v{current} / 最新版本: v{runner.head}")
+        for migration in runner.pending(current):
+            print(f"   - 待執行 v{migration.version}: {migration.description}")
+        return 0
+
+    if command == "upgrade":
+        applied = runner.upgrade()
+        print(f"✅ 遷移完成，套用 {applied} 個版本（目前 v{runner.current_version()}）")
+        return 0
+
+    print(__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析結果格式轉換腳本：舊 JSON 文字 → data_blob（msgpack + zstd）
+
+用法：
+    python migrate_payloads.py                 # 轉換所有舊格式記錄
+    python migrate_payloads.py --train-dict    # 先以現有資料訓練共享字典再轉換
+    python migrate_payloads.py --limit 1000    # 只轉換 1000 筆
+
+注意：訓練新字典後，所有 worker 需重啟才會以新字典壓縮（舊字典檔請保留，舊資料解碼仍需要）。
+"""
+
+import argparse
+import os
+
+# 命令列輸出使用易讀的文字日誌
+os.environ.setdefault("LOG_FORMAT", "text")
+
+import app as app_module  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="轉換分析結果儲存格式")
+    parser.add_argument("--train-dict", action="store_true", help="以現有資料訓練 zstd 共享字典")
+    parser.add_argument("--samples", type=int, default=2000, help="訓練字典的樣本數")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批轉換筆數")
+    parser.add_argument("--limit", type=int, default=None, help="最多轉換筆數")
+    args = parser.parse_args()
+
+    if args.train_dict:
+        samples = app_module.collect_payload_samples(args.samples)
+        if len(samples) < 100:
+            print(f"⚠️ 樣本數不足（{len(samples)} 筆），略過字典訓練")
+        else:
+            dict_id = app_module.payload_codec.train_dictionary(samples)
+            print(f"✅ 已訓練共享字典 {dict_id}（{len(samples)} 筆樣本）")
+
+    migrated = app_module.migrate_legacy_payloads(batch_size=args.batch_size, limit=args.limit)
+    print(f"✅ 完成，共轉換 {migrated} 筆")
+
+
+if __name__ == "__main__":
+    main()
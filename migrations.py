@@ -0,0 +1,238 @@
+# migrations.py - 版本化資料庫遷移
+
+"""
+輕量資料庫遷移
+
+- schema_version 資料表記錄已套用的版本，遷移依版本號順序執行、每個只執行一次
+- 遷移由 leader 執行（python migrate.py upgrade 或 MIGRATE_ON_START=1），
+  一般 worker 啟動時只做一次 SELECT max(version) 檢查
+- PostgreSQL 以 advisory lock、SQLite 以資料庫旁的檔案鎖（<db>.migrate.lock）避免多個程序同時遷移，
+  索引以 CREATE INDEX CONCURRENTLY 建立
+"""
+
+import fcntl
+import json
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, func, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app_logging import get_logger
+
+migrate_log = get_logger("migrate")
+
+
+# 與應用程式 Base.metadata 分開，測試的 drop_all / create_all 不會清掉版本紀錄
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version", version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255)),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+# pg_advisory_lock 的 key（任意固定值）
+ADVISORY_LOCK_KEY = 730_021_034
+
+
+class Migration:
+    """單一遷移步驟"""
+
+    def __init__(self, version: int, description: str, upgrade, transactional: bool = True):
+        """
+        Args:
+            version: 版本號（遞增）
+            description: 說明
+            upgrade: fn(conn, dialect)；transactional=False 時 conn 為 autocommit 連線
+            transactional: False 表示不能在交易中執行（例如 CREATE INDEX CONCURRENTLY）
+        """
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+        self.transactional = transactional
+
+
+# -----------------------------------------------------------------------------
+# 共用工具
+# -----------------------------------------------------------------------------
+def add_column(conn, dialect, table, column, ddl_type):
+    """新增欄位（已存在則略過）"""
+    if dialect == 'postgresql':
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {ddl_type}"))
+        return
+    existing = {col["name"] for col in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def create_index(conn, dialect, name, table, columns):
+    """建立索引；PostgreSQL 使用 CONCURRENTLY 不鎖寫入（需 autocommit 連線）"""
+    concurrently = "CONCURRENTLY " if dialect == 'postgresql' else ""
+    conn.execute(text(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+# -----------------------------------------------------------------------------
+# 結構遷移（資料遷移由 app.py 以 register() 加入）
+# -----------------------------------------------------------------------------
+def _user_provider_columns(conn, dialect):
+    add_column(conn, dialect, "analysis_results", "user_id", "INTEGER")
+    add_column(conn, dialect, "users", "provider", "VARCHAR(50)")
+    add_column(conn, dialect, "users", "provider_id", "VARCHAR(255)")
+    add_column(conn, dialect, "users", "provider_data", "TEXT")
+
+
+def _account_asset_value(conn, dialect):
+    add_column(conn, dialect, "analysis_results", "account_asset_value", "BIGINT")
+    if dialect == 'sqlite':
+        conn.execute(text(
+            "UPDATE analysis_results SET account_asset_value = "
+            "CAST(json_extract(data, '$.value_estimation.account_asset_value') AS INTEGER) "
+            "WHERE account_asset_value IS NULL AND json_valid(data)"
+        ))
+    else:
+        # PostgreSQL 的 CAST(data AS json) 遇到一筆格式錯誤的資料就會中止整個遷移，改在 Python 端逐批解析
+        backfill_account_values(conn)
+
+
+def extract_account_value(payload):
+    """取出分析結果中的帳號總價值（無法解析時回傳 None）"""
+    value_est = payload.get("value_estimation") if isinstance(payload, dict) else None
+    value = (value_est or {}).get("account_asset_value")
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def backfill_account_values(conn, batch_size=1000):
+    """依 id 分批讀取 data 並回填 account_asset_value；無法解析的記錄保持 NULL"""
+    last_id = 0
+    filled = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, data FROM analysis_results WHERE account_asset_value IS NULL AND id > :last_id "
+            "ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": batch_size}).fetchall()
+        if not rows:
+            return filled
+        updates = []
+        for row_id, data in rows:
+            last_id = row_id
+            try:
+                value = extract_account_value(json.loads(data))
+            except (TypeError, ValueError):
+                continue
+            if value is not None:
+                updates.append({"id": row_id, "value": value})
+        if updates:
+            conn.execute(text("UPDATE analysis_results SET account_asset_value = :value WHERE id = :id"), updates)
+            filled += len(updates)
+
+
+def _listing_indexes(conn, dialect):
+    # 舊資料表不會被 create_all 補上索引，這裡補建 keyset 分頁與篩選索引
+    create_index(conn, dialect, "ix_users_created_at_id", "users", "created_at, id")
+    create_index(conn, dialect, "ix_analysis_results_created_at_id", "analysis_results", "created_at, id")
+    create_index(conn, dialect, "ix_analysis_results_account_asset_value", "analysis_results", "account_asset_value")
+    create_index(conn, dialect, "ix_analysis_results_user_id", "analysis_results", "user_id")
+
+
+def _payload_columns(conn, dialect):
+    blob_type = "BYTEA" if dialect == 'postgresql' else "BLOB"
+    add_column(conn, dialect, "analysis_results", "data_blob", blob_type)
+    add_column(conn, dialect, "analysis_results", "summary", "TEXT")
+
+
+SCHEMA_MIGRATIONS = [
+    Migration(2, "users.provider* / analysis_results.user_id 欄位", _user_provider_columns),
+    Migration(3, "analysis_results.account_asset_value 欄位與回填", _account_asset_value),
+    Migration(4, "列表分頁與篩選索引", _listing_indexes, transactional=False),
+    Migration(5, "analysis_results.data_blob / summary 欄位", _payload_columns),
+]
+
+
+# -----------------------------------------------------------------------------
+# 執行器
+# -----------------------------------------------------------------------------
+class MigrationRunner:
+    """遷移執行器"""
+
+    def __init__(self, engine, metadata):
+        """
+        Args:
+            engine: SQLAlchemy engine
+            metadata: 應用程式的 MetaData（版本 1 以 create_all 建立所有資料表）
+        """
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.migrations = {}
+        self.register(Migration(1, "建立資料表", lambda conn, dialect: metadata.create_all(conn)))
+        for migration in SCHEMA_MIGRATIONS:
+            self.register(migration)
+
+    def register(self, migration: Migration):
+        if migration.version in self.migrations:
+            raise ValueError(f"重複的遷移版本: {migration.version}")
+        self.migrations[migration.version] = migration
+
+    @property
+    def head(self) -> int:
+        return max(self.migrations)
+
+    def current_version(self) -> int:
+        """目前資料庫版本（尚未建立 schema_version 時為 0）"""
+        try:
+            with self.engine.connect() as conn:
+                return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+        except SQLAlchemyError:
+            return 0
+
+    def pending(self, current: int = None) -> list:
+        current = self.current_version() if current is None else current
+        return [self.migrations[v] for v in sorted(self.migrations) if v > current]
+
+    def upgrade(self) -> int:
+        """
+        執行所有未套用的遷移
+
+        Returns:
+            套用的遷移數量
+        """
+        lock_conn = None
+        lock_file = None
+        if self.dialect == 'postgresql':
+            lock_conn = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+            lock_conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": ADVISORY_LOCK_KEY})
+        elif self.dialect == 'sqlite' and self.engine.url.database not in (None, "", ":memory:"):
+            # 多個 worker 同時啟動（MIGRATE_ON_START=1）時只有一個執行遷移，其他等待後重新讀取版本
+            lock_file = open(f"{self.engine.url.database}.migrate.lock", "w")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            version_metadata.create_all(self.engine)
+            # 取得鎖之後重新讀取版本，其他程序可能已經完成遷移
+            applied = 0
+            for migration in self.pending():
+                self._apply(migration)
+                applied += 1
+                migrate_log.info("✅ v%s: %s", migration.version, migration.description)
+            return applied
+        finally:
+            if lock_conn is not None:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": ADVISORY_LOCK_KEY})
+                lock_conn.close()
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    def _apply(self, migration: Migration):
+        record = schema_version.insert().values(
+            version=migration.version, description=migration.description, applied_at=datetime.utcnow()
+        )
+        if migration.transactional:
+            with self.engine.begin() as conn:
+                migration.upgrade(conn, self.dialect)
+                conn.execute(record)
+            return
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            migration.upgrade(conn, self.dialect)
+            conn.execute(record)
@@ -0,0 +1,229 @@
+# openai_usage.py - OpenAI token 用量、成本與預算
+
+"""
+OpenAI 用量與成本
+
+- 每次呼叫回應中的 usage（prompt / completion tokens）記到目前請求的 UsageLedger（contextvar，
+  執行緒與 asyncio task 皆適用），並累計到 Prometheus 指標
+- 成本以每百萬 tokens 的美元單價估算（OPENAI_PRICING 可覆寫，例如 {"gpt-4o": [2.5, 10]}），
+  模型名稱以最長前綴比對（gpt-4o-2024-08-06 -> gpt-4o）；查不到單價的模型記錄警告，並以
+  OPENAI_UNPRICED_PRICING（預設為已知模型中最高的單價）估算，預算不會因新模型而失效
+- BudgetPolicy：今日總花費或用戶今日花費超過預算時改用較便宜的模型（economy），
+  超過預算 OPENAI_DEGRADE_FACTOR 倍時只做完整分析、不另外產生短評（degraded）
+"""
+
+import contextvars
+import json
+import os
+import threading
+
+from app_logging import get_logger
+from metrics import REGISTRY
+
+usage_log = get_logger("openai_usage")
+
+
+# 美元 / 每百萬 tokens：(input, output)
+DEFAULT_PRICING = {
+    "gpt-5.1": (1.25, 10.00),
+    "gpt-5": (1.25, 10.00),
+    "gpt-5-mini": (0.25, 2.00),
+    "gpt-5-nano": (0.05, 0.40),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4-turbo": (10.00, 30.00),
+}
+
+OPENAI_DAILY_BUDGET_USD = float(os.getenv('OPENAI_DAILY_BUDGET_USD', 0))  # 0 = 不限
+OPENAI_USER_DAILY_BUDGET_USD = float(os.getenv('OPENAI_USER_DAILY_BUDGET_USD', 0))  # 0 = 不限（只套用於登入用戶）
+OPENAI_FALLBACK_MODEL = os.getenv('OPENAI_FALLBACK_MODEL', 'gpt-4o-mini')
+OPENAI_DEGRADE_FACTOR = float(os.getenv('OPENAI_DEGRADE_FACTOR', 1.5))
+
+MICRO_USD = 1_000_000
+
+TOKENS_TOTAL = REGISTRY.counter(
+    "openai_tokens_total", "OpenAI 使用的 tokens（依模型、階段與類型）", ("model", "stage", "kind")
+)
+COST_TOTAL = REGISTRY.counter(
+    "openai_cost_usd_total", "OpenAI 估算成本（美元）", ("model", "stage")
+)
+BUDGET_DECISIONS = REGISTRY.counter(
+    "openai_budget_decisions_total", "預算檢查結果（normal / economy / degraded）", ("mode",)
+)
+
+
+def _load_pricing() -> dict:
+    pricing = dict(DEFAULT_PRICING)
+    raw = os.getenv('OPENAI_PRICING', '')
+    if raw:
+        for model, prices in json.loads(raw).items():
+            pricing[model] = (float(prices[0]), float(prices[1]))
+    return pricing
+
+
+def _load_unpriced_pricing(pricing: dict) -> tuple:
+    raw = os.getenv('OPENAI_UNPRICED_PRICING', '')
+    if raw:
+        prices = json.loads(raw)
+        return float(prices[0]), float(prices[1])
+    # 保守估計：寧可高估成本、提早降級，也不要把未知模型當成免費
+    return max(p[0] for p in pricing.values()), max(p[1] for p in pricing.values())
+
+
+PRICING = _load_pricing()
+UNPRICED_PRICING = _load_unpriced_pricing(PRICING)
+_warned_models = set()
+
+
+def model_price(model: str):
+    """回傳 (input, output) 單價；未知模型回傳 None"""
+    if model in PRICING:
+        return PRICING[model]
+    matches = [name for name in PRICING if model and model.startswith(name)]
+    return PRICING[max(matches, key=len)] if matches else None
+
+
+def estimate_cost_micros(model: str, prompt_tokens: int, completion_tokens: int) -> int:
+    """估算成本（百萬分之一美元，整數方便資料庫端累加）"""
+    price = model_price(model)
+    if price is None:
+        if model not in _warned_models:
+            _warned_models.add(model)
+            usage_log.warning("⚠️ 模型 %s 沒有設定單價，以 %s 估算（請設定 OPENAI_PRICING）", model, UNPRICED_PRICING)
+        price = UNPRICED_PRICING
+    return round(prompt_tokens * price[0] + completion_tokens * price[1])
+
+
+# -----------------------------------------------------------------------------
+# 每個請求的用量紀錄
+# -----------------------------------------------------------------------------
+class UsageLedger:
+    """一次分析中所有 OpenAI 呼叫的用量"""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, model: str, prompt_tokens: int, completion_tokens: int):
+        call = {
+            "stage": stage,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_micros": estimate_cost_micros(model, prompt_tokens, completion_tokens),
+        }
+        with self._lock:
+            self.calls.append(call)
+        return call
+
+    def totals(self) -> dict:
+        with self._lock:
+            calls = list(self.calls)
+        return {
+            "calls": len(calls),
+            "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+            "completion_tokens": sum(c["completion_tokens"] for c in calls),
+            "cost_micros": sum(c["cost_micros"] for c in calls),
+        }
+
+
+_current = contextvars.ContextVar("usage_ledger", default=None)
+
+
+def start_ledger():
+    """開始記錄用量，回傳 (ledger, token)；結束時以 token 呼叫 end_ledger"""
+    ledger = UsageLedger()
+    return ledger, _current.set(ledger)
+
+
+def end_ledger(token):
+    _current.reset(token)
+
+
+def current_ledger():
+    return _current.get()
+
+
+def record_usage(stage: str, model: str, usage: dict):
+    """記錄一次呼叫的 usage（OpenAI 回應中的 usage 區塊，可能缺少）"""
+    usage = usage or {}
+    prompt_tokens = int(usage.get("prompt_tokens") or 0)
+    completion_tokens = int(usage.get("completion_tokens") or 0)
+    TOKENS_TOTAL.inc(prompt_tokens, model=model, stage=stage, kind="prompt")
+    TOKENS_TOTAL.inc(completion_tokens, model=model, stage=stage, kind="completion")
+    cost_micros = estimate_cost_micros(model, prompt_tokens, completion_tokens)
+    COST_TOTAL.inc(cost_micros / MICRO_USD, model=model, stage=stage)
+    ledger = _current.get()
+    if ledger is not None:
+        ledger.add(stage, model, prompt_tokens, completion_tokens)
+
+
+# -----------------------------------------------------------------------------
+# 預算
+# -----------------------------------------------------------------------------
+class BudgetDecision:
+    """預算檢查結果：normal（照常）/ economy（改用便宜模型）/ degraded（便宜模型且省略短評呼叫）"""
+
+    def __init__(self, mode: str = "normal", model: str = None, reason: str = None):
+        self.mode = mode
+        self.model = model
+        self.reason = reason
+
+    def analyzer_kwargs(self) -> dict:
+        """傳給 analyze_profile 的參數（normal 時為空，沿用分析器預設模型）"""
+        if self.mode == "normal":
+            return {}
+        return {"model": self.model, "degraded": self.mode == "degraded"}
+
+    def to_dict(self) -> dict:
+        return {"mode": self.mode, "model": self.model, "reason": self.reason}
+
+
+class BudgetPolicy:
+    def __init__(self, daily_budget_usd: float = OPENAI_DAILY_BUDGET_USD,
+                 user_daily_budget_usd: float = OPENAI_USER_DAILY_BUDGET_USD,
+                 fallback_model: str = OPENAI_FALLBACK_MODEL,
+                 degrade_factor: float = OPENAI_DEGRADE_FACTOR):
+        self.daily_budget_micros = round(daily_budget_usd * MICRO_USD)
+        self.user_daily_budget_micros = round(user_daily_budget_usd * MICRO_USD)
+        self.fallback_model = fallback_model
+        self.degrade_factor = degrade_factor
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.daily_budget_micros or self.user_daily_budget_micros)
+
+    def decide(self, primary_model: str, spent_today_micros: int, user_spent_today_micros: int = None) -> BudgetDecision:
+        """
+        Args:
+            primary_model: 分析器預設模型
+            spent_today_micros: 今日所有用戶的花費
+            user_spent_today_micros: 此用戶今日花費（匿名用戶為 None，不套用個人預算）
+        """
+        ratio, reason = 0.0, None
+        if self.daily_budget_micros:
+            ratio, reason = spent_today_micros / self.daily_budget_micros, "daily_budget"
+        if self.user_daily_budget_micros and user_spent_today_micros is not None:
+            user_ratio = user_spent_today_micros / self.user_daily_budget_micros
+            if user_ratio > ratio:
+                ratio, reason = user_ratio, "user_budget"
+
+        if ratio < 1.0:
+            decision = BudgetDecision()
+        elif ratio < self.degrade_factor and self.fallback_model and self.fallback_model != primary_model:
+            decision = BudgetDecision("economy", self.fallback_model, reason)
+        else:
+            decision = BudgetDecision("degraded", self.fallback_model or primary_model, reason)
+        BUDGET_DECISIONS.inc(mode=decision.mode)
+        return decision
+
+    def to_dict(self) -> dict:
+        return {
+            "daily_budget_usd": self.daily_budget_micros / MICRO_USD,
+            "user_daily_budget_usd": self.user_daily_budget_micros / MICRO_USD,
+            "fallback_model": self.fallback_model,
+            "degrade_factor": self.degrade_factor,
+        }
@@ -0,0 +1,170 @@
+# password_hasher.py - 密碼雜湊服務
+
+"""
+密碼雜湊服務
+
+- scrypt / pbkdf2 在小型行程池中執行，不佔用 request 執行緒（也不受 GIL 影響）
+- 等待中的工作有上限，超過時立即回傳 HasherBusyError（登入洪水不會拖垮其他端點）
+- 雜湊參數可設定（werkzeug method 字串），登入時若既有雜湊的參數不同則重新雜湊
+- 記錄最近的延遲樣本並計算 p50 / p95 / p99
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HasherBusyError(Exception):
+    """等待中的雜湊工作已達上限，或等待逾時"""
+
+
+# 行程池執行的函數（需為模組層級才能 pickle）
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+def _percentile(sorted_samples, pct):
+    index = min(len(sorted_samples) - 1, int(round(pct / 100.0 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+class PasswordHasher:
+    """行程池密碼雜湊"""
+
+    def __init__(self, method: str = "scrypt:32768:8:1", workers: int = 1,
+                 max_pending: int = 16, timeout: float = 10.0, sample_size: int = 1024):
+        """
+        Args:
+            method: werkzeug 雜湊參數，例如 scrypt:32768:8:1、pbkdf2:sha256:600000
+            workers: 行程數（0 = 在呼叫端執行緒直接計算）
+            max_pending: 執行中 + 等待中的工作上限
+            timeout: 等待結果的最長秒數
+            sample_size: 保留的延遲樣本數
+        """
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        self._prefix = None
+        self._samples = {"hash": deque(maxlen=sample_size), "verify": deque(maxlen=sample_size)}
+        self._stats_lock = threading.Lock()
+        self.stats = {"hash": 0, "verify": 0, "rehash": 0, "rejected": 0, "timeouts": 0}
+        self._pending = 0
+        atexit.register(self.shutdown)
+
+    # ------------------------------------------------------------------
+    # 公開 API
+    # ------------------------------------------------------------------
+    def hash(self, password: str) -> str:
+        return self._run("hash", _hash, password, self.method)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        if not pwhash:
+            return False
+        return self._run("verify", _verify, pwhash, password)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        """既有雜湊的參數與目前設定不同"""
+        if not pwhash or "$" not in pwhash:
+            return False
+        return pwhash.split("$", 1)[0] != self.prefix
+
+    @property
+    def prefix(self) -> str:
+        # method 只寫演算法（例如 "scrypt"）時，實際參數以 werkzeug 的預設值為準，計算一次後記住
+        if self._prefix is None:
+            full_colons = {"scrypt": 3, "pbkdf2": 2}.get(self.method.split(":", 1)[0])
+            if self.method.count(":") == full_colons:
+                self._prefix = self.method
+            else:
+                self._prefix = self.hash("").split("$", 1)[0]
+        return self._prefix
+
+    def record_rehash(self):
+        with self._stats_lock:
+            self.stats["rehash"] += 1
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+            samples = {op: sorted(values) for op, values in self._samples.items()}
+            stats["pending"] = self._pending
+        stats.update({"method": self.method, "workers": self.workers, "max_pending": self.max_pending})
+        latency = {}
+        for op, values in samples.items():
+            if values:
+                latency[op] = {
+                    "count": len(values),
+                    "p50_ms": round(_percentile(values, 50), 2),
+                    "p95_ms": round(_percentile(values, 95), 2),
+                    "p99_ms": round(_percentile(values, 99), 2),
+                    "max_ms": round(values[-1], 2),
+                }
+        stats["latency"] = latency
+        return stats
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # ------------------------------------------------------------------
+    # 內部
+    # ------------------------------------------------------------------
+    def _run(self, op, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self.stats["rejected"] += 1
+            raise HasherBusyError("密碼雜湊佇列已滿")
+        start = time.perf_counter()
+        with self._stats_lock:
+            self._pending += 1
+        try:
+            if self.workers <= 0:
+                result = fn(*args)
+            else:
+                future = self._get_pool().submit(fn, *args)
+                try:
+                    result = future.result(timeout=self.timeout)
+                except FutureTimeoutError:
+                    future.cancel()
+                    with self._stats_lock:
+                        self.stats["timeouts"] += 1
+                    raise HasherBusyError("密碼雜湊逾時")
+        finally:
+            with self._stats_lock:
+                self._pending -= 1
+            self._slots.release()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self.stats[op] += 1
+            self._samples[op].append(elapsed_ms)
+        return result
+
+    def _get_pool(self):
+        pid = os.getpid()
+        if self._pool is not None and self._pool_pid == pid:
+            return self._pool
+        with self._pool_lock:
+            # gunicorn fork 後繼承的行程池不可用，每個 worker 各自建立
+            if self._pool is None or self._pool_pid != pid:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+                self._pool_pid = pid
+        return self._pool
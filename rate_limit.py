@@ -0,0 +1,306 @@
+# rate_limit.py - 昂貴端點的請求頻率限制
+
+"""
+請求頻率限制（GCRA）
+
+- 每個限制（例如 10/minute）以 GCRA（generic cell rate algorithm）計算：每個 key 只保存一個
+  「理論到達時間」(TAT)，允許在 period 內用完 limit 次，之後以 period / limit 的速率恢復；
+  效果等同平滑的 sliding window，但只需一個數值、一次讀寫
+- key：規則名稱 + 身分（登入用戶為 user:<id>，匿名為 ip:<位址>）+ 限制的週期
+- 儲存（RATE_LIMIT_STORAGE_URL）：
+  - 未設定 / memory://      行程內（每個 worker 各自計算）
+  - sqlite:///path/to/file   同一台機器上的 worker 共用（單一 UPSERT ... RETURNING，不需額外服務）
+  - redis://host:6379/0      Redis（Lua 腳本原子更新，需安裝 redis；本機 Redis 相容服務亦可）
+- 儲存發生錯誤時放行（不因限流服務故障擋下所有請求）
+- 回應標頭：RateLimit-Limit / RateLimit-Remaining / RateLimit-Reset / RateLimit-Policy，超過時另有 Retry-After
+"""
+
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from metrics import REGISTRY
+
+try:
+    import redis
+except ImportError:  # redis 是可選的
+    redis = None
+
+
+RATE_LIMIT_DECISIONS = REGISTRY.counter(
+    "rate_limit_decisions_total", "頻率限制檢查結果（allowed / limited / error）", ("rule", "result")
+)
+
+_UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+_LIMIT_PATTERN = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*$")
+
+
+class Limit:
+    """limit 次 / period 秒"""
+
+    def __init__(self, limit: int, period: float):
+        if limit < 1 or period <= 0:
+            raise ValueError(f"無效的頻率限制: {limit}/{period}s")
+        self.limit = limit
+        self.period = float(period)
+        self.interval = self.period / limit
+
+    def policy(self) -> str:
+        return f"{self.limit};w={int(self.period)}"
+
+    def __repr__(self):
+        return f"Limit({self.limit}/{int(self.period)}s)"
+
+
+def parse_limits(spec: str) -> list:
+    """
+    "10/minute;100/day" -> [Limit(10, 60), Limit(100, 86400)]
+
+    週期可帶倍數（"5/10minutes"）；空字串表示不限制
+    """
+    limits = []
+    for part in (spec or "").replace(",", ";").split(";"):
+        if not part.strip():
+            continue
+        match = _LIMIT_PATTERN.match(part.lower())
+        if match is None:
+            raise ValueError(f"無法解析頻率限制: {part!r}")
+        count, multiplier, unit = match.groups()
+        limits.append(Limit(int(count), int(multiplier or 1) * _UNITS[unit]))
+    return limits
+
+
+class Decision:
+    """一次檢查的結果（多個限制時為最嚴格的一個）"""
+
+    __slots__ = ("allowed", "limit", "remaining", "reset_after", "retry_after")
+
+    def __init__(self, allowed: bool, limit: Limit, remaining: int, reset_after: float, retry_after: float = 0.0):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_after = reset_after
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_tat(cls, limit: Limit, allowed: bool, tat: float, now: float) -> "Decision":
+        if allowed:
+            remaining = int((limit.period - (tat - now)) / limit.interval + 1e-9)
+            return cls(True, limit, max(remaining, 0), max(tat - now, 0.0))
+        retry_after = tat + limit.interval - limit.period - now
+        return cls(False, limit, 0, max(tat - now, 0.0), max(retry_after, 0.0))
+
+    def headers(self) -> dict:
+        headers = {
+            "RateLimit-Limit": str(self.limit.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_after)),
+            "RateLimit-Policy": self.limit.policy(),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(math.ceil(self.retry_after), 1))
+        return headers
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, rule: str, decision: Decision):
+        super().__init__(f"{rule}: rate limited")
+        self.rule = rule
+        self.decision = decision
+
+
+# -----------------------------------------------------------------------------
+# 儲存
+#
+# hit(key, now, interval, period) -> (是否允許, TAT)：允許時 TAT 已更新，不允許時為目前的 TAT
+# -----------------------------------------------------------------------------
+class MemoryStore:
+    """行程內儲存（每個 worker 各自計算）"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._tats = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, now: float, interval: float, period: float):
+        with self._lock:
+            tat = max(self._tats.get(key, now), now) + interval
+            if tat - period > now:
+                return False, tat - interval
+            self._tats[key] = tat
+            if len(self._tats) > self.max_keys:
+                self._prune(now)
+            return True, tat
+
+    def _prune(self, now: float):
+        # TAT 已過的 key 等同沒有紀錄
+        for key in [key for key, tat in self._tats.items() if tat <= now]:
+            del self._tats[key]
+
+    def reset(self):
+        with self._lock:
+            self._tats.clear()
+
+    def after_fork(self):
+        return
+
+
+class SQLiteStore:
+    """
+    SQLite 檔案儲存（同一台機器的 gunicorn worker 共用）
+
+    每次檢查是一個 autocommit 的 UPSERT ... RETURNING；WAL + synchronous=NORMAL 下不需 fsync
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._hits = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID"
+        )
+
+    def _connection(self):
+        # 每個執行緒一條連線；fork 後重新連線（不沿用父行程的 SQLite 連線）
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def hit(self, key: str, now: float, interval: float, period: float):
+        conn = self._connection()
+        row = conn.execute(
+            "INSERT INTO rate_limits (key, tat) VALUES (:key, :now + :interval) "
+            "ON CONFLICT(key) DO UPDATE SET tat = max(tat, :now) + :interval "
+            "WHERE max(tat, :now) + :interval - :period <= :now "
+            "RETURNING tat",
+            {"key": key, "now": now, "interval": interval, "period": period}
+        ).fetchone()
+        self._hits += 1
+        if self._hits % self.PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM rate_limits WHERE tat <= ?", (now,))
+        if row is not None:
+            return True, row[0]
+        row = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+        return False, row[0] if row else now
+
+    def reset(self):
+        self._connection().execute("DELETE FROM rate_limits")
+
+    def after_fork(self):
+        self._local = threading.local()
+
+
+class RedisStore:
+    """Redis 儲存（Lua 腳本原子更新，key 在 TAT 之後自動過期）"""
+
+    SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local period = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+if tat < now then tat = now end
+local new_tat = tat + interval
+if new_tat - period > now then
+    return {0, tostring(tat)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, tostring(new_tat)}
+"""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        if redis is None:
+            raise RuntimeError("redis 未安裝，無法使用 Redis 頻率限制儲存")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(self.SCRIPT)
+
+    def hit(self, key: str, now: float, interval: float, period: float):
+        allowed, tat = self._script(keys=[self.prefix + key], args=[now, interval, period])
+        return bool(allowed), float(tat)
+
+    def reset(self):
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+    def after_fork(self):
+        self.client.connection_pool.reset()
+
+
+def create_rate_limit_store(url: str):
+    """依 URL 建立儲存；未設定時為行程內儲存"""
+    if not url or url == "memory://":
+        return MemoryStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://")):
+        return RedisStore(url)
+    raise ValueError(f"不支援的頻率限制儲存: {url}")
+
+
+# -----------------------------------------------------------------------------
+# 規則與檢查
+# -----------------------------------------------------------------------------
+class RateLimiter:
+    def __init__(self, store, enabled: bool = True, clock=time.time):
+        self.store = store
+        self.enabled = enabled
+        self.clock = clock
+        self.rules = {}
+
+    def rule(self, name: str, user: str = None, anonymous: str = ""):
+        """
+        登記規則
+
+        Args:
+            user: 登入用戶的限制（以用戶 id 計算）；None 表示與匿名相同、一律以 IP 計算
+            anonymous: 匿名請求的限制（以 IP 計算）
+        """
+        anonymous_limits = parse_limits(anonymous)
+        user_limits = anonymous_limits if user is None else parse_limits(user)
+        self.rules[name] = (user_limits, anonymous_limits, user is not None)
+
+    def check(self, name: str, user_id=None, ip: str = None):
+        """
+        記錄一次請求並回傳 Decision；規則未設定限制或停用時回傳 None
+
+        多個限制（例如每分鐘與每日）時，不允許的那個優先，否則回傳剩餘次數最少的
+        """
+        user_limits, anonymous_limits, per_user = self.rules.get(name, ((), (), False))
+        if per_user and user_id is not None:
+            limits, identity = user_limits, f"user:{user_id}"
+        else:
+            limits, identity = anonymous_limits, f"ip:{ip or 'unknown'}"
+        if not self.enabled or not limits:
+            return None
+
+        now = self.clock()
+        result = None
+        try:
+            for limit in limits:
+                allowed, tat = self.store.hit(f"{name}:{identity}:{int(limit.period)}", now, limit.interval, limit.period)
+                decision = Decision.from_tat(limit, allowed, tat, now)
+                if not allowed:
+                    RATE_LIMIT_DECISIONS.inc(rule=name, result="limited")
+                    return decision
+                if result is None or decision.remaining < result.remaining:
+                    result = decision
+        except Exception:
+            RATE_LIMIT_DECISIONS.inc(rule=name, result="error")
+            raise
+        RATE_LIMIT_DECISIONS.inc(rule=name, result="allowed")
+        return result
+
+    def reset(self):
+        self.store.reset()
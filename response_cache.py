@@ -0,0 +1,151 @@
+# response_cache.py - 公開讀取 API 的回應快取
+
+"""
+回應快取（排行榜、分享連結的分析結果）
+
+- 以 (路由, 正規化後的參數) 為 key，保存序列化好的回應內容與強 ETag
+- 每筆快取帶有 tag（例如 username:foo、leaderboard），資料變更時以 tag 失效
+- 失效時遞增 generation；產生內容前記下 generation，產生期間若有失效就不寫入（避免存回舊資料）
+- 過期後的 stale 期間仍回傳舊內容，同時在背景重新產生（stale-while-revalidate），
+  同一個 key 同時只有一個背景更新
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "tags", "fresh_until", "stale_until", "encoded")
+
+    def __init__(self, body: bytes, tags, ttl: float, stale_ttl: float):
+        now = time.monotonic()
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.tags = frozenset(tags)
+        self.fresh_until = now + ttl
+        self.stale_until = self.fresh_until + stale_ttl
+        # 壓縮後的內容（{encoding: bytes}，第一次需要時才產生）
+        self.encoded = {}
+
+
+class ResponseCache:
+    """執行緒安全的回應快取（LRU + TTL + tag 失效）"""
+
+    def __init__(self, maxsize: int = 512, ttl: float = 300.0, stale_ttl: float = 60.0, name: str = "response"):
+        """
+        Args:
+            maxsize: 最多保留筆數
+            ttl: 新鮮秒數
+            stale_ttl: 過期後仍可回傳舊內容（同時背景更新）的秒數
+            name: 名稱（統計使用）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.name = name
+        self._data = OrderedDict()
+        self._tags = {}
+        self._refreshing = set()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "refreshes": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key):
+        """
+        Returns:
+            (CachedResponse, 是否需要背景更新)；沒有可用內容時為 (None, False)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry.stale_until <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.stats["misses"] += 1
+                return None, False
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            if entry.fresh_until > now:
+                return entry, False
+            self.stats["stale"] += 1
+            if key in self._refreshing:
+                return entry, False
+            self._refreshing.add(key)
+            return entry, True
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def set(self, key, body: bytes, tags=(), generation: int = None) -> CachedResponse:
+        """寫入快取；generation 為產生內容前讀取的值，之後若有失效則不寫入"""
+        entry = CachedResponse(body, tags, self.ttl, self.stale_ttl)
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return entry
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return entry
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = entry
+            for tag in entry.tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+                self.stats["evictions"] += 1
+        return entry
+
+    def refresh(self, key, build, tags=()):
+        """背景重新產生內容（build() 回傳 bytes，失敗時保留舊內容直到 stale 期間結束）"""
+        generation = self._generation
+
+        def run():
+            try:
+                body = build()
+                if body is not None:
+                    with self._lock:
+                        self.stats["refreshes"] += 1
+                    self.set(key, body, tags, generation)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f"{self.name}-refresh", daemon=True).start()
+
+    def invalidate_tag(self, tag) -> int:
+        with self._lock:
+            self._generation += 1
+            keys = self._tags.pop(tag, set())
+            for key in keys:
+                self._remove(key)
+            self.stats["invalidations"] += len(keys)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self._data)
+            stats["tags"] = len(self._tags)
+        lookups = stats["hits"] + stats["misses"]
+        stats["maxsize"] = self.maxsize
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,124 @@
+# response_compression.py - 動態回應壓縮（gzip / brotli）
+
+"""
+API 回應壓縮
+
+- 依 Accept-Encoding 協商：有安裝 brotli 時優先 br，否則 gzip；q=0 表示不接受
+- 只壓縮 200、文字類型（JSON、HTML、純文字）、大小超過 COMPRESS_MIN_SIZE 的回應；
+  已有 Content-Encoding（預先壓縮的靜態檔）、串流回應與 Cache-Control: no-transform 不處理
+- 強 ETag 依壓縮格式加上後綴（"abc" -> "abc-gzip"），If-None-Match 比對時視為同一份內容
+- 所有可壓縮的回應都帶 Vary: Accept-Encoding，CDN 不會把壓縮版本送給不支援的客戶端
+"""
+
+import gzip
+import os
+
+from metrics import REGISTRY
+from static_assets import parse_accept_encoding
+
+try:
+    import brotli
+except ImportError:  # 選用：未安裝時只提供 gzip
+    brotli = None
+
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))  # gzip 1-9
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 4))  # brotli 0-11（動態壓縮不宜太高）
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'text/html', 'text/plain', 'text/css', 'text/csv',
+    'application/javascript', 'text/javascript', 'image/svg+xml',
+}
+# 偏好順序
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+COMPRESSED_RESPONSES = REGISTRY.counter(
+    "http_compressed_responses_total", "動態壓縮的回應數", ("encoding",)
+)
+COMPRESSED_BYTES = REGISTRY.counter(
+    "http_compression_bytes_total", "動態壓縮前後的位元組數", ("stage",)
+)
+
+
+def negotiate_encoding(accept_encoding: str):
+    """回傳客戶端接受且偏好的壓縮格式；不接受任何壓縮時為 None"""
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_encoding(accept_encoding)
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+    COMPRESSED_RESPONSES.inc(encoding=encoding)
+    COMPRESSED_BYTES.inc(len(data), stage="in")
+    COMPRESSED_BYTES.inc(len(compressed), stage="out")
+    return compressed
+
+
+def encoded_etag(etag: str, encoding: str = None) -> str:
+    """壓縮後的表示使用不同的強 ETag（不含引號）"""
+    return f"{etag}-{encoding}" if encoding else etag
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match 是否命中（不論客戶端拿到的是哪一種壓縮格式）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = {etag} | {encoded_etag(etag, encoding) for encoding in ('br', 'gzip')}
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag.strip('"') in candidates:
+            return True
+    return False
+
+
+def is_compressible(response) -> bool:
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+        return False
+    if 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return False
+    if 'no-transform' in response.headers.get('Cache-Control', ''):
+        return False
+    return (response.content_length or 0) >= COMPRESS_MIN_SIZE
+
+
+def compress_response(response, accept_encoding: str, if_none_match: str = None):
+    """
+    after_request：依 Accept-Encoding 壓縮回應內容
+
+    路由的 make_conditional 只比對未壓縮的 ETag；客戶端送回壓縮版本的 ETag（"abc-gzip"）時在這裡改回 304
+    """
+    if not is_compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(accept_encoding)
+    etag, weak = response.get_etag()
+    if etag and etag_matches(if_none_match, etag):
+        response.status_code = 304
+        response.set_data(b'')
+        response.headers.pop('Content-Length', None)
+        response.set_etag(encoded_etag(etag, encoding), weak)
+        return response
+    if encoding is None:
+        return response
+    data = response.get_data()
+    compressed = compress(data, encoding)
+    if len(compressed) >= len(data):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(encoded_etag(etag, encoding), weak)
+    return response
@@ -0,0 +1,214 @@
+# search_index.py - 管理後台搜尋索引
+
+"""
+管理後台 username / email 搜尋索引
+
+- SQLite：FTS5 trigram tokenizer 外部內容表，以 trigger 自動同步新增/更新/刪除
+- PostgreSQL：pg_trgm GIN 索引，ILIKE '%term%' 可直接使用索引
+
+不支援的環境（或搜尋字串少於 3 個字元）會退回原本的 ILIKE 掃描。
+"""
+
+from sqlalchemy import Integer, column, event, or_, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app_logging import get_logger
+
+search_log = get_logger("search")
+
+
+# 每個資料表需要建立索引的欄位
+SEARCH_FIELDS = {
+    "users": ("email", "username"),
+    "analysis_results": ("username",),
+}
+
+# trigram 最少需要 3 個字元才能比對
+MIN_TRIGRAM_LENGTH = 3
+
+
+def _escape_like(term: str) -> str:
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _fts_phrase(term: str) -> str:
+    """將搜尋字串轉為 FTS5 片語（雙引號需重複跳脫）"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+class SearchIndex:
+    """搜尋索引管理器"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.enabled = self.dialect in ('sqlite', 'postgresql')
+
+    # ------------------------------------------------------------------
+    # DDL
+    # ------------------------------------------------------------------
+    def _sqlite_statements(self, table: str, fields: tuple) -> list:
+        fts = f"{table}_fts"
+        cols = ", ".join(fields)
+        new_vals = ", ".join(f"new.{f}" for f in fields)
+        old_vals = ", ".join(f"old.{f}" for f in fields)
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{cols}, content='{table}', content_rowid='id', tokenize='trigram')",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+        ]
+
+    def install(self, conn, table: str, concurrently: bool = False):
+        """
+        為單一資料表建立索引（CREATE ... IF NOT EXISTS，可重複執行）
+
+        Args:
+            concurrently: PostgreSQL 以 CREATE INDEX CONCURRENTLY 建立（conn 需為 autocommit）
+        """
+        fields = SEARCH_FIELDS.get(table)
+        if not fields or not self.enabled:
+            return
+        if self.dialect == 'sqlite':
+            fts = f"{table}_fts"
+            existed = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"), {"n": fts}
+            ).first() is not None
+            for stmt in self._sqlite_statements(table, fields):
+                conn.execute(text(stmt))
+            if not existed:
+                # 既有資料需要重建一次索引
+                conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        else:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            keyword = "CREATE INDEX CONCURRENTLY" if concurrently else "CREATE INDEX"
+            for field in fields:
+                conn.execute(text(
+                    f"{keyword} IF NOT EXISTS ix_{table}_{field}_trgm "
+                    f"ON {table} USING gin ({field} gin_trgm_ops)"
+                ))
+
+    def drop(self, conn, table: str):
+        if self.dialect == 'sqlite' and table in SEARCH_FIELDS:
+            conn.execute(text(f"DROP TABLE IF EXISTS {table}_fts"))
+
+    def ensure(self):
+        """啟動時確保所有索引存在；失敗時停用並退回 ILIKE"""
+        if not self.enabled:
+            return False
+        try:
+            with self.engine.begin() as conn:
+                for table in SEARCH_FIELDS:
+                    self.install(conn, table)
+            search_log.info("✅ 搜尋索引就緒 (%s)", self.dialect)
+        except SQLAlchemyError as e:
+            self.enabled = False
+            search_log.warning("⚠️ 建立搜尋索引失敗，退回 ILIKE: %s", e)
+        return self.enabled
+
+    def attach(self, *tables):
+        """
+        掛上 SQLAlchemy DDL 事件，讓 create_all / drop_all 自動維護索引
+
+        Args:
+            tables: SQLAlchemy Table 物件
+        """
+        for table in tables:
+            event.listen(table, 'after_create', lambda target, conn, **kw: self._safe_install(conn, target.name))
+            event.listen(table, 'before_drop', lambda target, conn, **kw: self.drop(conn, target.name))
+
+    def _safe_install(self, conn, table: str):
+        if not self.enabled:
+            return
+        try:
+            if self.dialect == 'postgresql':
+                # 使用 savepoint，避免失敗時整個 create_all 交易被中止
+                with conn.begin_nested():
+                    self.install(conn, table)
+            else:
+                self.install(conn, table)
+        except SQLAlchemyError as e:
+            self.enabled = False
+            search_log.warning("⚠️ 建立搜尋索引失敗，退回 ILIKE: %s", e)
+
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+    def _use_fts(self, term: str) -> bool:
+        return self.enabled and self.dialect == 'sqlite' and len(term) >= MIN_TRIGRAM_LENGTH
+
+    def filter_clause(self, model, field: str, term: str):
+        """
+        產生子字串搜尋條件
+
+        Args:
+            model: SQLAlchemy model（需有 id 主鍵）
+            field: 欄位名稱
+            term: 搜尋字串
+        """
+        table = model.__tablename__
+        if self._use_fts(term) and field in SEARCH_FIELDS.get(table, ()):
+            fts = f"{table}_fts"
+            param = f"fts_{table}_{field}"
+            subquery = text(
+                f"SELECT rowid FROM {fts} WHERE {fts} MATCH :{param}"
+            ).bindparams(**{param: f"{field} : {_fts_phrase(term)}"}).columns(column('rowid', Integer))
+            return model.id.in_(subquery)
+        return getattr(model, field).ilike(f"%{_escape_like(term)}%", escape='\\')
+
+    def search_ids(self, session, model, term: str, limit: int = 20) -> list:
+        """
+        排序搜尋：前綴符合優先，其次依相關度（bm25 / similarity）
+
+        Returns:
+            依排名排序的 id 列表
+        """
+        table = model.__tablename__
+        fields = SEARCH_FIELDS[table]
+        params = {"term": term, "prefix": f"{_escape_like(term)}%", "limit": limit}
+        prefix_match = " OR ".join(f"t.{f} LIKE :prefix ESCAPE '\\'" for f in fields)
+
+        if self._use_fts(term):
+            fts = f"{table}_fts"
+            params["match"] = _fts_phrase(term)
+            sql = (
+                f"SELECT t.id FROM {fts} JOIN {table} t ON t.id = {fts}.rowid "
+                f"WHERE {fts} MATCH :match "
+                f"ORDER BY ({prefix_match}) DESC, bm25({fts}), t.id DESC LIMIT :limit"
+            )
+        elif self.enabled and self.dialect == 'postgresql':
+            prefix_match = prefix_match.replace(' LIKE ', ' ILIKE ')
+            contains = " OR ".join(f"t.{f} ILIKE :contains ESCAPE '\\'" for f in fields)
+            similarity = ", ".join(f"similarity(t.{f}, :term)" for f in fields)
+            if len(fields) > 1:
+                similarity = f"GREATEST({similarity})"
+            params["contains"] = f"%{_escape_like(term)}%"
+            sql = (
+                f"SELECT t.id FROM {table} t WHERE {contains} "
+                f"ORDER BY ({prefix_match}) DESC, {similarity} DESC, t.id DESC LIMIT :limit"
+            )
+        else:
+            params["contains"] = f"%{_escape_like(term)}%"
+            clause = or_(*[
+                getattr(model, f).ilike(params["contains"], escape='\\') for f in fields
+            ])
+            rows = session.query(model).filter(clause).order_by(model.id.desc()).limit(limit).all()
+            prefix = term.lower()
+            rows.sort(key=lambda r: not any((getattr(r, f) or '').lower().startswith(prefix) for f in fields))
+            return [r.id for r in rows]
+
+        try:
+            return [row[0] for row in session.execute(text(sql), params)]
+        except SQLAlchemyError as e:
+            if self.dialect != 'postgresql':
+                raise
+            # pg_trgm 未安裝（遷移未能建立索引）時停用並退回 ILIKE
+            session.rollback()
+            self.enabled = False
+            search_log.warning("⚠️ 相似度搜尋失敗，退回 ILIKE: %s", e)
+            return self.search_ids(session, model, term, limit)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+啟動耗時報告
+
+以乾淨的子行程量測：
+- `python -X importtime -c "import app"`：匯入最久的模組（累計時間）
+- 冷啟動到第一個 /health 回應的時間
+
+用法：
+    python startup_report.py [顯示模組數，預設 20]
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent
+
+HEALTH_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+resp = app.app.test_client().get('/health')
+done = time.perf_counter()
+print(json.dumps({
+    "status_code": resp.status_code,
+    "import_ms": round((imported - start) * 1000, 1),
+    "first_health_ms": round((done - start) * 1000, 1),
+    "initialized": sorted(app._initialized),
+    "firebase_admin_loaded": __import__('sys').modules.get('firebase_admin') is not None,
+}))
+"""
+
+
+def _subprocess_env(env=None) -> dict:
+    merged = dict(os.environ)
+    # 背景初始化會與量測搶 CPU，報告中關閉
+    merged.setdefault("STARTUP_WARMUP", "0")
+    merged.setdefault("HTTP_WARMUP", "0")
+    merged.update(env or {})
+    return merged
+
+
+def parse_importtime(stderr: str) -> list:
+    """
+    解析 -X importtime 的輸出
+
+    Returns:
+        [(模組名稱, 自身 μs, 累計 μs)]，依出現順序
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 表頭
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+def measure_importtime(env=None) -> list:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT_DIR, env=_subprocess_env(env), capture_output=True, text=True, check=True
+    )
+    return parse_importtime(result.stderr)
+
+
+def measure_time_to_health(env=None) -> dict:
+    """在新的 Python 行程中匯入 app 並送出第一個 /health，回傳各階段毫秒數"""
+    result = subprocess.run(
+        [sys.executable, "-c", HEALTH_SCRIPT],
+        cwd=ROOT_DIR, env=_subprocess_env(env), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    top = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rows = measure_importtime()
+    total_us = next((cumulative for name, _, cumulative in rows if name == "app"), 0)
+    # 只列出第一層套件，避免子模組重複計算
+    top_level = [row for row in rows if "." not in row[0] and row[0] != "app"]
+    top_level.sort(key=lambda row: row[2], reverse=True)
+
+    print(f"📦 import app 共 {total_us / 1000:.1f}ms")
+    print(f"{'模組':<32}{'累計 ms':>10}{'自身 ms':>10}")
+    for name, self_us, cumulative_us in top_level[:top]:
+        print(f"{name:<32}{cumulative_us / 1000:>10.1f}{self_us / 1000:>10.1f}")
+
+    health = measure_time_to_health()
+    print()
+    print(f"🚀 冷啟動到第一個 /health: {health['first_health_ms']}ms（匯入 {health['import_ms']}ms）")
+    print(f"   已初始化: {', '.join(health['initialized']) or '無'}"
+          f"  firebase_admin 已載入: {health['firebase_admin_loaded']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# static_assets.py - 靜態檔案預先壓縮與指紋化
+
+"""
+靜態檔案管線
+
+- load_or_build()：為 static/ 下每個檔案計算內容 hash，產生指紋化檔名（app.css -> app.3f2a9c1b0d.css），
+  文字類檔案預先壓縮成 .gz（有安裝 brotli 時另產生 .br），輸出到 STATIC_BUILD_DIR
+- HTML 中的 /static/xxx 參照改寫為指紋化網址；HTML 本身網址不變（入口頁），以 ETag 重新驗證
+- 指紋化網址內容永不變動：Cache-Control: immutable，一年
+- 建置結果（manifest.json）以來源檔的大小與修改時間判斷是否過期，未變動時直接沿用
+
+部署時可先執行 python static_assets.py 建置，worker 啟動後不必再壓縮
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+import threading
+
+try:
+    import brotli
+except ImportError:  # 選用：未安裝時只提供 gzip
+    brotli = None
+
+
+STATIC_DIR = os.getenv('STATIC_DIR', 'static')
+STATIC_BUILD_DIR = os.getenv('STATIC_BUILD_DIR', 'data/static-build')
+STATIC_URL_PREFIX = '/static/'
+# 小於此大小的檔案不壓縮（壓縮後的標頭開銷大於節省）
+STATIC_MIN_COMPRESS_SIZE = int(os.getenv('STATIC_MIN_COMPRESS_SIZE', 512))
+
+COMPRESSIBLE_EXTENSIONS = {'.html', '.css', '.js', '.json', '.svg', '.txt', '.md', '.xml', '.map'}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+# 預先壓縮格式的偏好順序
+ENCODINGS = ('br', 'gzip')
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+MANIFEST_VERSION = 1
+_HASHED_NAME = re.compile(r'^[A-Za-z0-9_./-]+\.([0-9a-f]{10})\.[A-Za-z0-9]+$')
+_STATIC_REF = re.compile(r'(["\'(])/static/([A-Za-z0-9_./-]+)(["\')?#])')
+
+
+class Asset:
+    """一個靜態檔案的建置結果"""
+
+    def __init__(self, name: str, entry: dict):
+        self.name = name
+        self.hashed_name = entry["hashed"]
+        self.digest = entry["digest"]
+        self.mimetype = entry["mimetype"]
+        self.path = entry["path"]
+        self.encodings = entry.get("encodings", {})
+
+    def etag(self, encoding: str = None) -> str:
+        """強 ETag；不同壓縮格式是不同的表示，ETag 也要不同"""
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    def matches(self, if_none_match: str) -> bool:
+        """If-None-Match 是否命中（任一壓縮格式的 ETag 都代表同一份內容）"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            tag = tag.strip('"')
+            if tag == self.digest or tag.rsplit('-', 1)[0] == self.digest:
+                return True
+        return False
+
+    def relative_path(self, encoding: str = None) -> str:
+        """建置目錄下的相對路徑（保留子目錄，例如 img/logo.<hash>.svg.gz），供 X-Accel-Redirect 使用"""
+        return self.hashed_name + (ENCODING_SUFFIXES[encoding] if encoding else '')
+
+    def select_encoding(self, accept_encoding: str):
+        """依 Accept-Encoding 選擇預先壓縮的版本，回傳 (encoding, 檔案路徑)"""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ENCODINGS:
+            if encoding in self.encodings and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                return encoding, self.encodings[encoding]
+        return None, self.path
+
+
+def parse_accept_encoding(header: str) -> dict:
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def _hashed_name(name: str, digest: str) -> str:
+    root, ext = os.path.splitext(name)
+    return f"{root}.{digest[:10]}{ext}"
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class AssetManifest:
+    """static/ 的建置結果：原始名稱與指紋化名稱都可查到對應檔案"""
+
+    def __init__(self, static_dir: str = STATIC_DIR, build_dir: str = STATIC_BUILD_DIR):
+        self.static_dir = os.path.abspath(static_dir)
+        self.build_dir = os.path.abspath(build_dir)
+        self.assets = {}
+        self.hashed = {}
+        self.stats = {"built": 0, "reused": 0, "bytes": 0, "gzip_bytes": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.build_dir, 'manifest.json')
+
+    def _sources(self) -> dict:
+        """{相對路徑: (大小, 修改時間)}"""
+        sources = {}
+        for root, dirs, files in os.walk(self.static_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for filename in sorted(files):
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(root, filename)
+                stat = os.stat(path)
+                name = os.path.relpath(path, self.static_dir).replace(os.sep, '/')
+                sources[name] = [stat.st_size, stat.st_mtime_ns]
+        return sources
+
+    def load_or_build(self) -> "AssetManifest":
+        """來源檔未變動時沿用既有 manifest，否則重新建置"""
+        with self._lock:
+            sources = self._sources()
+            try:
+                with open(self.manifest_path, encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get("version") == MANIFEST_VERSION and manifest.get("sources") == sources \
+                        and all(os.path.exists(e["path"]) for e in manifest["assets"].values()):
+                    self._load(manifest)
+                    self.stats["reused"] = len(self.assets)
+                    return self
+            except (OSError, ValueError, KeyError):
+                pass
+            self._build(sources)
+            return self
+
+    def _load(self, manifest: dict):
+        self.assets = {name: Asset(name, entry) for name, entry in manifest["assets"].items()}
+        self.hashed = {asset.hashed_name: asset for asset in self.assets.values()}
+
+    def _build(self, sources: dict):
+        entries = {}
+        stats = {"built": 0, "reused": 0, "bytes": 0, "gzip_bytes": 0}
+        # 先處理非 HTML（HTML 改寫參照時需要它們的指紋化名稱）
+        names = sorted(sources, key=lambda n: (n.endswith('.html'), n))
+        for name in names:
+            with open(os.path.join(self.static_dir, name), 'rb') as f:
+                data = f.read()
+            if name.endswith('.html'):
+                data = self._rewrite_references(data.decode('utf-8'), entries).encode('utf-8')
+            entries[name] = self._build_asset(name, data, stats)
+        manifest = {"version": MANIFEST_VERSION, "sources": sources, "assets": entries}
+        _write_atomic(self.manifest_path, json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+        self._load(manifest)
+        self.stats = stats
+
+    def _build_asset(self, name: str, data: bytes, stats: dict) -> dict:
+        digest = hashlib.sha256(data).hexdigest()[:20]
+        hashed = _hashed_name(name, digest)
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        path = os.path.join(self.build_dir, hashed)
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+        encodings = {}
+        if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS and len(data) >= STATIC_MIN_COMPRESS_SIZE:
+            compressors = [('gzip', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                compressors.append(('br', lambda d: brotli.compress(d, quality=11)))
+            for encoding, compress in compressors:
+                encoded_path = path + ENCODING_SUFFIXES[encoding]
+                if not os.path.exists(encoded_path):
+                    _write_atomic(encoded_path, compress(data))
+                encodings[encoding] = encoded_path
+            stats["gzip_bytes"] += os.path.getsize(encodings['gzip'])
+        stats["built"] += 1
+        stats["bytes"] += len(data)
+        return {"hashed": hashed, "digest": digest, "mimetype": mimetype, "path": path, "encodings": encodings}
+
+    @staticmethod
+    def _rewrite_references(html: str, entries: dict) -> str:
+        def replace(match):
+            entry = entries.get(match.group(2))
+            if entry is None:
+                return match.group(0)
+            return f"{match.group(1)}{STATIC_URL_PREFIX}{entry['hashed']}{match.group(3)}"
+        return _STATIC_REF.sub(replace, html)
+
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+    def lookup(self, name: str):
+        """
+        以原始名稱或指紋化名稱查詢
+
+        Returns:
+            (Asset, 是否為指紋化網址)；找不到時為 (None, False)
+        """
+        asset = self.hashed.get(name) or self._previous_build(name)
+        if asset is not None:
+            return asset, True
+        return self.assets.get(name), False
+
+    def _previous_build(self, name: str):
+        """舊版指紋網址（重新建置前的檔案仍保留，已快取舊 HTML 的瀏覽器不會 404）"""
+        match = _HASHED_NAME.match(name)
+        if match is None or '..' in name.split('/'):
+            return None
+        path = os.path.join(self.build_dir, name)
+        if not os.path.isfile(path):
+            return None
+        encodings = {encoding: path + suffix for encoding, suffix in ENCODING_SUFFIXES.items()
+                     if os.path.isfile(path + suffix)}
+        return Asset(name, {
+            "hashed": name, "digest": match.group(1), "path": path, "encodings": encodings,
+            "mimetype": mimetypes.guess_type(name)[0] or 'application/octet-stream',
+        })
+
+    def url(self, name: str) -> str:
+        asset = self.assets.get(name)
+        return STATIC_URL_PREFIX + (asset.hashed_name if asset else name)
+
+    def snapshot(self) -> dict:
+        return {
+            "assets": len(self.assets),
+            "brotli": brotli is not None,
+            "build_dir": self.build_dir,
+            **self.stats,
+        }
+
+
+def main():
+    manifest = AssetManifest().load_or_build()
+    stats = manifest.snapshot()
+    print(f"✅ 靜態檔案 {stats['assets']} 個（新建 {stats['built']}，沿用 {stats['reused']}）→ {stats['build_dir']}")
+    if not stats["brotli"]:
+        print("ℹ️ 未安裝 brotli，只產生 gzip 版本（pip install brotli）")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
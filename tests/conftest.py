@@ -2,6 +2,7 @@ import json
 import os
 import io
 import sys
+import tempfile
 from pathlib import Path
 
 import pytest
@@ -18,6 +19,10 @@ os.environ.setdefault("DATABASE_URL", "sqlite:///test-data.sqlite3")
 os.environ.setdefault("JWT_SECRET", "test-secret-key")
 os.environ.setdefault("OPENAI_API_KEY", "test-openai-key")
 os.environ.setdefault("APP_BASE_URL", "http://localhost:8000")
+os.environ.setdefault("HTTP_WARMUP", "0")
+os.environ.setdefault("STARTUP_WARMUP", "0")
+os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="socialavatar-metrics-"))
+os.environ.setdefault("STATIC_BUILD_DIR", tempfile.mkdtemp(prefix="socialavatar-static-"))
 
 
 ANALYSIS_JSON = {
@@ -49,6 +54,7 @@ def app_module():
     """匯入 Flask app 模組"""
     import app as app_module  # noqa
 
+    app_module.ensure_db_ready()
     return app_module
 
 
@@ -57,6 +63,12 @@ def _reset_db(app_module):
     """每個測試前清空資料"""
     app_module.Base.metadata.drop_all(bind=app_module.engine)
     app_module.Base.metadata.create_all(bind=app_module.engine)
+    app_module.invalidate_count_cache()
+    app_module.invalidate_analysis_detail()
+    app_module.token_cache.clear()
+    app_module.user_cache.clear()
+    app_module.response_cache.clear()
+    app_module.rate_limiter.reset()
 
 
 @pytest.fixture
@@ -108,3 +120,28 @@ def create_test_image():
 def sample_image_file():
     return create_test_image()
 
+
+
+@pytest.fixture
+def admin_headers(monkeypatch, app_module, auth_headers):
+    """以測試用戶身分取得管理員權限"""
+    monkeypatch.setattr(app_module, "ADMIN_EMAILS", ["test@example.com"])
+    return auth_headers
+
+
+@pytest.fixture
+def query_counter(app_module):
+    """記錄主資料庫與唯讀 engine 執行的 SQL（用於斷言每個端點的查詢次數）"""
+    from sqlalchemy import event
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = {app_module.engine, app_module.read_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", capture)
+    yield statements
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", capture)
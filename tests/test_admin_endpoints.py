@@ -0,0 +1,287 @@
+import json
+from datetime import datetime, timedelta
+
+
+def _seed_analyses(app_module, count, base_value=1000):
+    """直接寫入分析記錄，created_at 依序遞增"""
+    session = app_module.SessionLocal()
+    try:
+        start = datetime(2024, 1, 1)
+        for i in range(count):
+            payload = {
+                "username": f"user{i}",
+                "followers": 100 + i,
+                "value_estimation": {"account_asset_value": base_value * (i + 1)}
+            }
+            session.add(app_module.AnalysisResult(
+                username=f"user{i}",
+                username_key=f"user{i}",
+                display_name=f"User {i}",
+                data=json.dumps(payload),
+                account_asset_value=base_value * (i + 1),
+                created_at=start + timedelta(minutes=i)
+            ))
+        session.commit()
+    finally:
+        session.close()
+    app_module.invalidate_count_cache()
+
+
+def test_admin_analyses_cursor_pagination(client, admin_headers, app_module):
+    _seed_analyses(app_module, 7)
+
+    seen = []
+    cursor = None
+    for _ in range(5):
+        params = {"per_page": 3}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/api/admin/analyses", query_string=params, headers=admin_headers)
+        assert resp.status_code == 200
+        data = resp.get_json()
+        seen.extend(a["username"] for a in data["analyses"])
+        cursor = data["pagination"]["next_cursor"]
+        assert data["pagination"]["has_more"] is (cursor is not None)
+        if not cursor:
+            break
+
+    assert seen == [f"user{i}" for i in range(6, -1, -1)]
+
+
+def test_cursor_pagination_with_null_created_at(client, admin_headers, app_module):
+    from sqlalchemy import text
+
+    _seed_analyses(app_module, 7)
+    session = app_module.SessionLocal()
+    session.execute(text("UPDATE analysis_results SET created_at = NULL WHERE username IN ('user1', 'user4')"))
+    session.commit()
+    session.close()
+
+    seen = []
+    cursor = None
+    for _ in range(5):
+        params = {"per_page": 2, **({"cursor": cursor} if cursor else {})}
+        data = client.get("/api/admin/analyses", query_string=params, headers=admin_headers).get_json()
+        seen.extend(a["username"] for a in data["analyses"])
+        cursor = data["pagination"]["next_cursor"]
+        if not cursor:
+            break
+    # 沒有建立時間的記錄排在最後，每筆只出現一次
+    assert seen == ["user6", "user5", "user3", "user2", "user0", "user4", "user1"]
+
+
+def test_admin_analyses_total_exact_and_estimated(client, admin_headers, app_module):
+    _seed_analyses(app_module, 4)
+
+    resp = client.get("/api/admin/analyses?include_total=1", headers=admin_headers)
+    pagination = resp.get_json()["pagination"]
+    assert pagination["total"] == 4
+    assert pagination["total_estimated"] is False
+
+    resp = client.get("/api/admin/analyses", headers=admin_headers)
+    pagination = resp.get_json()["pagination"]
+    assert pagination["total"] == 4
+    assert pagination["total_estimated"] is True
+
+
+def test_admin_analyses_invalid_cursor(client, admin_headers):
+    resp = client.get("/api/admin/analyses?cursor=not-a-cursor", headers=admin_headers)
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "invalid_cursor"
+
+
+def test_admin_users_cursor_pagination(client, admin_headers, app_module):
+    resp = client.get("/api/admin/users?per_page=1", headers=admin_headers)
+    data = resp.get_json()
+    assert data["ok"] is True
+    assert len(data["users"]) == 1
+    assert data["pagination"]["has_more"] is False
+
+
+def test_admin_analyses_value_filter_in_sql(client, admin_headers, app_module):
+    _seed_analyses(app_module, 6)  # values: 1000 .. 6000
+
+    resp = client.get(
+        "/api/admin/analyses",
+        query_string={"min_value": 2000, "max_value": 4500, "include_total": 1, "per_page": 2},
+        headers=admin_headers
+    )
+    data = resp.get_json()
+    assert data["pagination"]["total"] == 3
+    assert [a["account_asset_value"] for a in data["analyses"]] == [4000, 3000]
+    assert data["pagination"]["has_more"] is True
+
+    resp = client.get(
+        "/api/admin/analyses",
+        query_string={"min_value": 2000, "max_value": 4500, "cursor": data["pagination"]["next_cursor"]},
+        headers=admin_headers
+    )
+    assert [a["account_asset_value"] for a in resp.get_json()["analyses"]] == [2000]
+
+
+def test_save_analysis_result_populates_value_column(app_module):
+    app_module.save_analysis_result({
+        "username": "valuecol",
+        "value_estimation": {"account_asset_value": 12345}
+    })
+    session = app_module.SessionLocal()
+    try:
+        record = session.query(app_module.AnalysisResult).filter_by(username_key="valuecol").one()
+        assert record.account_asset_value == 12345
+    finally:
+        session.close()
+
+
+def test_admin_analysis_detail_projection_and_etag(client, admin_headers, app_module):
+    _seed_analyses(app_module, 2)
+    session = app_module.SessionLocal()
+    analysis_id = session.query(app_module.AnalysisResult).filter_by(username_key="user1").one().id
+    session.close()
+
+    resp = client.get(f"/api/admin/analyses/{analysis_id}", headers=admin_headers)
+    assert resp.status_code == 200
+    detail = resp.get_json()["analysis"]
+    assert detail["account_asset_value"] == 2000
+    assert detail["data"]["followers"] == 101
+    etag = resp.headers["ETag"]
+
+    resp = client.get(f"/api/admin/analyses/{analysis_id}", headers={**admin_headers, "If-None-Match": etag})
+    assert resp.status_code == 304
+
+    resp = client.get(f"/api/admin/analyses/{analysis_id}?fields=post_value,account_asset_value", headers=admin_headers)
+    assert set(resp.get_json()["analysis"]) == {"id", "post_value", "account_asset_value"}
+
+    # 更新後快取與 ETag 都應失效
+    client.put(f"/api/admin/analyses/{analysis_id}/update", json={"account_asset_value": 9999}, headers=admin_headers)
+    resp = client.get(f"/api/admin/analyses/{analysis_id}", headers={**admin_headers, "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.get_json()["analysis"]["account_asset_value"] == 9999
+
+    client.delete(f"/api/admin/analyses/{analysis_id}", headers=admin_headers)
+    resp = client.get(f"/api/admin/analyses/{analysis_id}", headers=admin_headers)
+    assert resp.status_code == 404
+
+
+def test_admin_analysis_detail_invalidated_across_workers(tmp_path, client, admin_headers, app_module, monkeypatch):
+    from ttl_cache import FileInvalidationChannel
+
+    _seed_analyses(app_module, 1)
+    session = app_module.SessionLocal()
+    analysis_id = session.query(app_module.AnalysisResult).one().id
+    session.close()
+
+    path = str(tmp_path / "invalidation.log")
+    channel = FileInvalidationChannel(path, poll_interval=0)
+    app_module.subscribe_cache_invalidation(channel)
+    monkeypatch.setattr(app_module, "cache_channel", channel)
+    assert client.get(f"/api/admin/analyses/{analysis_id}", headers=admin_headers).status_code == 200
+
+    # 另一個 worker 刪除記錄：只通知、不動本 worker 的快取
+    session = app_module.SessionLocal()
+    session.query(app_module.AnalysisResult).filter_by(id=analysis_id).delete()
+    session.commit()
+    session.close()
+    FileInvalidationChannel(path, poll_interval=0).publish("analysis", analysis_id)
+    assert client.get(f"/api/admin/analyses/{analysis_id}", headers=admin_headers).status_code == 404
+
+def _seed_users(app_module, emails):
+    session = app_module.SessionLocal()
+    try:
+        for email in emails:
+            name = email.split("@")[0]
+            session.add(app_module.User(email=email, username=name, display_name=name, password_hash="x"))
+        session.commit()
+    finally:
+        session.close()
+    app_module.invalidate_count_cache()
+
+
+def test_admin_user_search_uses_index_and_tracks_updates(client, admin_headers, app_module):
+    _seed_users(app_module, ["alice.wang@example.com", "bob@sample.org", "malice@example.com"])
+
+    resp = client.get("/api/admin/users", query_string={"search_email": "alice"}, headers=admin_headers)
+    emails = {u["email"] for u in resp.get_json()["users"]}
+    assert emails == {"alice.wang@example.com", "malice@example.com"}
+
+    # 索引需隨更新自動同步
+    session = app_module.SessionLocal()
+    user = session.query(app_module.User).filter_by(username="bob").one()
+    user.email = "alice.bob@sample.org"
+    session.commit()
+    session.close()
+
+    resp = client.get("/api/admin/users", query_string={"search_email": "alice"}, headers=admin_headers)
+    assert len(resp.get_json()["users"]) == 3
+
+    # 前綴符合排在前面
+    resp = client.get("/api/admin/search/users", query_string={"q": "mal"}, headers=admin_headers)
+    assert [u["email"] for u in resp.get_json()["users"]] == ["malice@example.com"]
+    resp = client.get("/api/admin/search/users", query_string={"q": "alice"}, headers=admin_headers)
+    assert resp.get_json()["users"][-1]["email"] == "malice@example.com"
+
+
+def test_admin_short_search_term_falls_back_to_ilike(client, admin_headers, app_module):
+    _seed_users(app_module, ["xy@example.com"])
+    resp = client.get("/api/admin/users", query_string={"search_username": "xy"}, headers=admin_headers)
+    assert [u["username"] for u in resp.get_json()["users"]] == ["xy"]
+
+
+def test_list_endpoints_skip_full_payload(client, admin_headers, app_module):
+    from sqlalchemy import event
+
+    user_id = app_module.SessionLocal().query(app_module.User.id).scalar()
+    for i in range(3):
+        app_module.save_analysis_result({
+            "username": f"summary{i}",
+            "user_id": user_id,
+            "followers": 500 + i,
+            "analysis_text": "很長的分析" * 40,
+            "value_estimation": {"account_asset_value": 1000 * (i + 1), "post_value": 50},
+        })
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(app_module.engine, "before_cursor_execute", capture)
+    try:
+        admin = client.get("/api/admin/analyses", headers=admin_headers).get_json()
+        board = client.get("/api/leaderboard").get_json()
+        mine = client.get("/api/user/analyses", headers=admin_headers).get_json()
+        stats = client.get("/api/admin/stats", headers=admin_headers).get_json()
+        list_statements = list(statements)
+        detail = client.get(f"/api/admin/analyses/{admin['analyses'][0]['id']}", headers=admin_headers)
+    finally:
+        event.remove(app_module.engine, "before_cursor_execute", capture)
+
+    assert not [s for s in list_statements if "data_blob" in s]
+    assert admin["analyses"][0]["post_value"] == 50
+    assert board["leaderboard"][0]["username"] == "summary2"
+    assert mine["analyses"][0]["analysis_text"].endswith("...")
+    assert len(mine["analyses"][0]["analysis_text"]) == 103
+    assert stats["stats"]["values"]["total"] == 6000
+    assert detail.get_json()["analysis"]["data"]["followers"] in (500, 501, 502)
+
+
+def test_read_endpoints_use_read_pool(client, admin_headers, app_module):
+    import pytest
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    _seed_analyses(app_module, 2)
+    before = app_module.pool_metrics(app_module.read_engine)["checkouts"]
+    assert client.get("/api/leaderboard").status_code == 200
+    assert client.get("/api/result?username=user1").status_code == 200
+
+    resp = client.get("/api/admin/db/pool", headers=admin_headers)
+    pools = resp.get_json()["pools"]
+    assert pools["read"]["checkouts"] >= before + 2
+    assert pools["primary"]["checkouts"] > 0
+    assert {"wait_ms_avg", "wait_ms_max", "checked_out", "timeouts"} <= set(pools["primary"])
+
+    # 唯讀連線不能寫入
+    with app_module.read_engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        with pytest.raises(OperationalError):
+            conn.execute(text("DELETE FROM analysis_results"))
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+
+def _current_user_id(client, auth_headers):
+    return client.get("/api/auth/me", headers=auth_headers).get_json()["user"]["id"]
+
+
+def _payload(username, value, user_id):
+    return {
+        "username": username,
+        "followers": 1000,
+        "user_id": user_id,
+        "value_estimation": {"account_asset_value": value, "post_value": value // 10}
+    }
+
+
+def test_reanalysis_appends_history_and_rollups(client, auth_headers, app_module):
+    user_id = _current_user_id(client, auth_headers)
+    for value in (1000, 3000, 2000):
+        app_module.save_analysis_result(_payload("historyuser", value, user_id))
+
+    session = app_module.SessionLocal()
+    try:
+        assert session.query(app_module.AnalysisResult).count() == 1
+        assert session.query(app_module.AnalysisHistory).count() == 3
+        rollup = session.query(app_module.AnalysisRollup).filter_by(period="day").one()
+        assert (rollup.count, rollup.min_value, rollup.max_value, rollup.last_value) == (3, 1000, 3000, 2000)
+    finally:
+        session.close()
+
+    stats = client.get("/api/user/stats", headers=auth_headers).get_json()["stats"]
+    assert stats["total_analyses"] == 3
+    assert stats["latest_value"] == 2000
+    assert stats["highest_value"] == 3000
+    assert [p["value"] for p in stats["value_history"]] == [2000]
+
+    monthly = client.get("/api/user/stats?granularity=month", headers=auth_headers).get_json()["stats"]
+    assert monthly["granularity"] == "month"
+    assert monthly["total_analyses"] == 3
+
+
+def test_value_change_compares_same_account(client, auth_headers, app_module):
+    user_id = _current_user_id(client, auth_headers)
+    yesterday = (datetime.utcnow() - timedelta(days=1)).replace(hour=12, minute=0)
+    session = app_module.SessionLocal()
+    for key, value, created_at in (
+        ("bigaccount", 1000, yesterday - timedelta(hours=1)),
+        ("bigaccount", 5000, yesterday),
+        ("smallaccount", 100, yesterday + timedelta(minutes=1)),
+    ):
+        app_module.record_analysis_snapshot(session, key, key, user_id, _payload(key, value, user_id), created_at=created_at)
+    app_module.record_analysis_snapshot(
+        session, "bigaccount", "bigaccount", user_id, _payload("bigaccount", 6000, user_id),
+        created_at=yesterday + timedelta(days=1)
+    )
+    app_module.record_analysis_snapshot(
+        session, "smallaccount", "smallaccount", user_id, _payload("smallaccount", 150, user_id),
+        created_at=yesterday + timedelta(days=1, minutes=1)
+    )
+    session.commit()
+    session.close()
+
+    stats = client.get("/api/user/stats", headers=auth_headers).get_json()["stats"]
+    # 主要帳號（最近分析的 smallaccount）與自己的前一天比較，不與 bigaccount 比較
+    assert stats["value_change"] == 50
+    assert [(a["username"], a["latest_value"], a["value_change"]) for a in stats["accounts"]] == [
+        ("smallaccount", 150, 50), ("bigaccount", 6000, 1000)
+    ]
+    assert len(stats["value_history"]) == 4
+
+def test_prune_downsamples_old_snapshots(app_module):
+    session = app_module.SessionLocal()
+    old_day = datetime.utcnow() - timedelta(days=200)
+    for hour in range(3):
+        app_module.record_analysis_snapshot(
+            session, "olduser", "olduser", 1, _payload("olduser", 100 * (hour + 1), 1),
+            created_at=old_day.replace(hour=hour)
+        )
+    app_module.record_analysis_snapshot(session, "olduser", "olduser", 1, _payload("olduser", 999, 1))
+    session.commit()
+    session.close()
+
+    assert app_module.prune_analysis_history(retention_days=90) == 2
+
+    session = app_module.SessionLocal()
+    try:
+        values = sorted(h.account_asset_value for h in session.query(app_module.AnalysisHistory))
+        assert values == [300, 999]
+    finally:
+        session.close()
+
+
+def test_prune_scheduled_in_background_after_interval(app_module, monkeypatch):
+    calls = []
+    monkeypatch.setattr(app_module, "prune_analysis_history", lambda: calls.append(1))
+    # 啟動後第一次儲存就在背景執行，之後每隔 HISTORY_PRUNE_INTERVAL 一次
+    monkeypatch.setattr(app_module, "_last_history_prune", 0.0)
+    app_module.maybe_prune_analysis_history().join()
+    assert calls == [1]
+    assert app_module.maybe_prune_analysis_history() is None
+
+    monkeypatch.setattr(app_module, "_last_history_prune", app_module._last_history_prune - app_module.HISTORY_PRUNE_INTERVAL)
+    app_module.maybe_prune_analysis_history().join()
+    assert calls == [1, 1]
+
+def test_backfill_resumes_for_records_without_snapshots(app_module):
+    app_module.save_analysis_result(_payload("withhistory", 1000, None))
+    session = app_module.SessionLocal()
+    # 升級前的記錄：沒有快照
+    session.add(app_module.AnalysisResult(
+        username="legacy", username_key="legacy", data="",
+        data_blob=app_module.payload_codec.encode(_payload("legacy", 5000, None))
+    ))
+    session.commit()
+    session.close()
+
+    assert app_module.backfill_analysis_history(batch_size=1) == 1
+    assert app_module.backfill_analysis_history() == 0
+    session = app_module.SessionLocal()
+    try:
+        values = sorted(row.account_asset_value for row in session.query(app_module.AnalysisHistory))
+        assert values == [1000, 5000]
+    finally:
+        session.close()
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import httpx
+
+
+def run_requests(application, requests):
+    async def main():
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await asyncio.gather(*(request(client) for request in requests))
+
+    return asyncio.run(main())
+
+
+def test_bridge_serves_regular_routes(client):
+    import asgi
+
+    application = asgi.ASGIApplication(threads=2)
+
+    async def health(http):
+        return await http.get("/health", headers={"Origin": "http://example.com"})
+
+    (resp,) = run_requests(application, [health])
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "ok"
+    assert "access-control-allow-origin" in resp.headers
+
+
+def test_analyze_waits_on_ai_without_holding_threads(client, auth_headers, monkeypatch, app_module,
+                                                    sample_image_file):
+    import asgi
+
+    analysis_text, _ = app_module.analyzer.analyze_profile(None)
+
+    class SlowAsyncAnalyzer:
+        def analyze_profile(self, image):
+            raise AssertionError("ASGI 模式不應使用同步分析")
+
+        async def analyze_profile_async(self, image):
+            await asyncio.sleep(0.3)  # 模擬等待 OpenAI
+            return analysis_text, "這是測試短評，內容夠長可以直接使用"
+
+    monkeypatch.setattr(app_module, "analyzer", SlowAsyncAnalyzer())
+    # 同一用戶 20 個並行分析，超過預設的頻率限制
+    monkeypatch.setattr(app_module.rate_limiter, "enabled", False)
+    image_bytes = sample_image_file.getvalue()
+    application = asgi.ASGIApplication(threads=2)
+
+    async def analyze(http):
+        return await http.post(
+            "/bd/analyze", headers=auth_headers,
+            files={"profile": ("profile.jpg", image_bytes, "image/jpeg")}
+        )
+
+    start = time.perf_counter()
+    responses = run_requests(application, [analyze] * 20)
+    elapsed = time.perf_counter() - start
+
+    assert all(resp.status_code == 200 for resp in responses), responses[0].text
+    assert responses[0].json()["user_id"] is not None
+    # 20 個分析 x 0.3 秒，只有 2 條執行緒：若等待 AI 時佔用執行緒至少需要 3 秒
+    assert elapsed < 2.5
+
+
+def test_analyze_errors_match_sync_view(client):
+    import asgi
+
+    async def missing_profile(http):
+        return await http.post("/bd/analyze", files={"other": ("x.jpg", b"123", "image/jpeg")})
+
+    (resp,) = run_requests(asgi.ASGIApplication(threads=1), [missing_profile])
+    assert resp.status_code == 400
+    assert resp.json() == {"ok": False, "error": "缺少 profile 圖片"}
+
+
+def test_disconnect_during_upload_is_not_processed(monkeypatch):
+    import asgi
+
+    application = asgi.ASGIApplication(threads=1)
+    called, sent = [], []
+
+    async def analyze(environ):
+        called.append(environ)
+
+    monkeypatch.setattr(application, "_analyze", analyze)
+    messages = iter([
+        {"type": "http.request", "body": b"--partial", "more_body": True},
+        {"type": "http.disconnect"},
+    ])
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/bd/analyze", "headers": [], "query_string": b""}
+    asyncio.run(application(scope, receive, send))
+    assert called == [] and sent == []
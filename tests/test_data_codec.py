@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from data_codec import (
+    FORMAT_MSGPACK, FORMAT_MSGPACK_ZSTD, FORMAT_MSGPACK_ZSTD_DICT,
+    PayloadCodec, PayloadDecodeError,
+)
+
+
+def _payload(i):
+    return {
+        "username": f"user{i}",
+        "display_name": f"User {i}",
+        "followers": 1000 + i,
+        "value_estimation": {"account_asset_value": 5000 + i, "post_value": 300, "story_value": 120},
+        "personality_type": {"primary_type": f"type_{i % 9}", "reasoning": "穩定輸出生活風格內容" * 3},
+        "improvement_tips": ["持續分享高品質內容", "提升粉絲互動頻率"],
+    }
+
+
+def test_codec_roundtrip_formats():
+    payload = _payload(1)
+    raw = PayloadCodec(compress=False).encode(payload)
+    assert raw[0] == FORMAT_MSGPACK
+    packed = PayloadCodec(compress=True).encode(payload)
+    assert packed[0] == FORMAT_MSGPACK_ZSTD
+    assert len(packed) < len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+    codec = PayloadCodec()
+    assert codec.decode(raw) == payload
+    assert codec.decode(packed) == payload
+    with pytest.raises(PayloadDecodeError):
+        codec.decode(b"\x7fgarbage")
+
+
+def test_codec_shared_dictionary_survives_restart(tmp_path):
+    codec = PayloadCodec(dict_dir=str(tmp_path))
+    dict_id = codec.train_dictionary([_payload(i) for i in range(500)], size=4096)
+    blob = codec.encode(_payload(7))
+    assert blob[0] == FORMAT_MSGPACK_ZSTD_DICT
+
+    # 新的 process 從字典目錄載入同一份字典
+    reloaded = PayloadCodec(dict_dir=str(tmp_path))
+    assert reloaded.active_dict_id == dict_id
+    assert reloaded.decode(blob) == _payload(7)
+
+    # 沒有字典檔就無法解碼
+    with pytest.raises(PayloadDecodeError):
+        PayloadCodec(dict_dir=str(tmp_path / "missing")).decode(blob)
+
+
+def test_codec_dictionary_stored_in_database(tmp_path, app_module):
+    codec = PayloadCodec(dict_dir=str(tmp_path / "a"), dict_store=app_module.payload_dict_store)
+    dict_id = codec.train_dictionary([_payload(i) for i in range(500)], size=4096)
+    blob = codec.encode(_payload(7))
+
+    # 另一台機器沒有本機字典檔，從資料庫取回並寫入本機快取
+    other = PayloadCodec(dict_dir=str(tmp_path / "b"), dict_store=app_module.payload_dict_store)
+    assert other.active_dict_id == dict_id
+    assert other.decode(blob) == _payload(7)
+    assert (tmp_path / "b" / f"payload-{dict_id}.zdict").exists()
+
+
+def test_legacy_rows_are_read_transparently_and_migrated(app_module):
+    legacy = _payload(3)
+    session = app_module.SessionLocal()
+    session.add(app_module.AnalysisResult(
+        username="user3", username_key="user3", data=json.dumps(legacy, ensure_ascii=False)
+    ))
+    session.commit()
+    session.close()
+
+    assert app_module.get_analysis_result("user3") == legacy
+
+    assert app_module.migrate_legacy_payloads(batch_size=1) == 1
+    session = app_module.SessionLocal()
+    record = session.query(app_module.AnalysisResult).filter_by(username_key="user3").one()
+    assert record.data == ""
+    assert record.data_blob is not None
+    session.close()
+    assert app_module.get_analysis_result("user3") == legacy
+    assert app_module.migrate_legacy_payloads() == 0
+
+
+def test_save_writes_binary_payload(app_module):
+    app_module.save_analysis_result(_payload(5))
+    session = app_module.SessionLocal()
+    record = session.query(app_module.AnalysisResult).filter_by(username_key="user5").one()
+    assert record.data == ""
+    assert app_module.payload_codec.decode(record.data_blob) == _payload(5)
+    session.close()
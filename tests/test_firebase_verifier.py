@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import jwt
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from firebase_verifier import FirebaseTokenError, FirebaseTokenVerifier
+
+PROJECT_ID = "demo-project"
+
+
+def make_key_pair():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken")])
+    now = datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode("ascii")
+
+
+def make_token(key, kid, exp_in=3600, **claims):
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": "uid-123",
+        "iat": now,
+        "auth_time": now,
+        "exp": now + exp_in,
+        "email": "user@example.com",
+        **claims,
+    }
+    return jwt.encode(payload, key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def key_server():
+    """本地 key server，模擬 Google 的 x509 公開憑證端點"""
+    state = {"certs": {}, "requests": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state["requests"] += 1
+            body = json.dumps(state["certs"]).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Cache-Control", "public, max-age=3600")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}/certs"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def test_verifies_locally_and_caches_results(key_server, tmp_path):
+    key, pem = make_key_pair()
+    key_server["certs"] = {"k1": pem}
+    verifier = FirebaseTokenVerifier(PROJECT_ID, certs_url=key_server["url"],
+                                     cache_path=str(tmp_path / "certs.json"))
+
+    token = make_token(key, "k1")
+    claims = verifier.verify(token)
+    assert claims["uid"] == "uid-123"
+    assert claims["email"] == "user@example.com"
+    assert verifier.expires_at > time.time() + 3000
+
+    # 同一個 token 第二次直接命中驗證快取，也不再下載憑證
+    assert verifier.verify(token)["uid"] == "uid-123"
+    assert verifier.verified.snapshot()["hits"] == 1
+    assert key_server["requests"] == 1
+
+
+def test_rejects_expired_and_wrong_audience(key_server):
+    key, pem = make_key_pair()
+    key_server["certs"] = {"k1": pem}
+    verifier = FirebaseTokenVerifier(PROJECT_ID, certs_url=key_server["url"])
+
+    with pytest.raises(FirebaseTokenError) as exc:
+        verifier.verify(make_token(key, "k1", exp_in=-60))
+    assert exc.value.code == "expired"
+
+    with pytest.raises(FirebaseTokenError) as exc:
+        verifier.verify(make_token(key, "k1", aud="other-project"))
+    assert exc.value.code == "invalid"
+
+    other_key, _ = make_key_pair()
+    with pytest.raises(FirebaseTokenError) as exc:
+        verifier.verify(make_token(other_key, "k1"))
+    assert exc.value.code == "invalid"
+
+
+def test_unknown_kid_triggers_refresh(key_server):
+    old_key, old_pem = make_key_pair()
+    new_key, new_pem = make_key_pair()
+    key_server["certs"] = {"old": old_pem}
+    verifier = FirebaseTokenVerifier(PROJECT_ID, certs_url=key_server["url"])
+    assert verifier.verify(make_token(old_key, "old"))["uid"] == "uid-123"
+
+    # Google 輪替金鑰：新 kid 觸發一次同步更新
+    key_server["certs"] = {"old": old_pem, "new": new_pem}
+    assert verifier.verify(make_token(new_key, "new", sub="uid-456"))["uid"] == "uid-456"
+    assert key_server["requests"] == 2
+
+    # 偽造 kid 不會在最短間隔內重複下載
+    with pytest.raises(FirebaseTokenError):
+        verifier.verify(make_token(new_key, "bogus"))
+    assert key_server["requests"] == 2
+
+
+def test_persisted_certs_used_when_key_server_down(key_server, tmp_path):
+    key, pem = make_key_pair()
+    key_server["certs"] = {"k1": pem}
+    cache_path = str(tmp_path / "certs.json")
+    FirebaseTokenVerifier(PROJECT_ID, certs_url=key_server["url"], cache_path=cache_path).refresh()
+
+    # 重啟後 key server 無法連線，仍以檔案中的憑證驗證
+    restarted = FirebaseTokenVerifier(PROJECT_ID, certs_url="http://127.0.0.1:9/certs",
+                                      cache_path=cache_path, timeout=0.5)
+    assert restarted.verify(make_token(key, "k1"))["uid"] == "uid-123"
+    assert restarted.stats["fetches"] == 0
@@ -0,0 +1,105 @@
+import asyncio
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_client import HttpClient
+
+
+@pytest.fixture
+def upstream():
+    """本地 keep-alive 伺服器：/slow 延遲回應，POST 回傳收到的 JSON（gzip 壓縮回應）"""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path == "/slow":
+                time.sleep(0.5)
+            self._reply(b'{"ok": true}')
+
+        def do_HEAD(self):
+            self._reply(b"")
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            received.append((self.headers.get("Content-Encoding"), json.loads(body)))
+            self._reply(gzip.compress(body), {"Content-Encoding": "gzip"})
+
+        def _reply(self, body, headers=None):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", received
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused_and_measured(upstream):
+    base_url, _ = upstream
+    client = HttpClient()
+    client.warm_up([f"{base_url}/"], background=False)
+    for _ in range(4):
+        assert client.get(f"{base_url}/").json() == {"ok": True}
+
+    stats = client.snapshot()["127.0.0.1"]
+    assert stats["calls"] == 5
+    assert stats["new_connections"] == 1
+    assert stats["connection_reuse_rate"] == 0.8
+    assert stats["p50_ms"] <= stats["p99_ms"]
+
+
+def test_per_host_timeout(upstream):
+    base_url, _ = upstream
+    client = HttpClient(host_timeouts={"127.0.0.1": 0.1})
+    with pytest.raises(requests.Timeout):
+        client.get(f"{base_url}/slow")
+    assert client.get(f"{base_url}/slow", timeout=2).status_code == 200
+    assert client.snapshot()["127.0.0.1"]["errors"] == 1
+
+
+def test_gzip_request_and_response(upstream):
+    base_url, received = upstream
+    client = HttpClient(gzip_hosts={"127.0.0.1"})
+    payload = {"messages": ["內容" * 1000]}
+    resp = client.post(f"{base_url}/echo", json=payload)
+    assert received[-1] == ("gzip", payload)
+    assert resp.json() == payload  # 回應自動解壓
+
+    client.post(f"{base_url}/echo", json={"small": True})
+    assert received[-1] == (None, {"small": True})  # 小於門檻不壓縮
+
+
+def test_async_requests_share_pool(upstream):
+    base_url, received = upstream
+    client = HttpClient()
+
+    async def main():
+        for i in range(3):
+            resp = await client.apost(f"{base_url}/echo", json={"i": i})
+            assert resp.json() == {"i": i}
+        await client.aclose()
+
+    asyncio.run(main())
+    stats = client.snapshot()["127.0.0.1"]
+    assert stats["calls"] == 3
+    assert stats["new_connections"] == 1
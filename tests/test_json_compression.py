@@ -0,0 +1,76 @@
+import gzip
+from datetime import datetime
+
+from json_provider import FastJSONProvider
+
+
+def _seed(app_module, count):
+    for i in range(count):
+        app_module.save_analysis_result({
+            "username": f"compress{i}",
+            "display_name": f"壓縮測試 {i}",
+            "followers": 1000 + i,
+            "value_estimation": {"account_asset_value": 1000 * (i + 1)},
+        })
+
+
+def test_provider_serializes_datetime_and_unicode(app_module):
+    moment = datetime(2024, 1, 2, 3, 4, 5, 678000)
+    for use_orjson in (True, False):
+        provider = FastJSONProvider(app_module.app, use_orjson=use_orjson)
+        assert provider.dumps({"at": moment, "name": "測試"}) == f'{{"at":"{moment.isoformat()}","name":"測試"}}'
+        assert provider.dumps({1: moment.date()}) == '{"1":"2024-01-02"}'
+        assert provider.loads(provider.dumps_bytes({"n": 2 ** 70})) == {"n": 2 ** 70}
+
+
+def test_cached_response_compressed_per_encoding(client, app_module):
+    _seed(app_module, 30)
+    plain = client.get("/api/leaderboard")
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["Vary"] == "Accept-Encoding"
+    assert plain.get_json()["leaderboard"][0]["created_at"].startswith(str(datetime.utcnow().year))
+
+    gz = client.get("/api/leaderboard", headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert gz.headers["X-Cache"] == "HIT"
+    assert gzip.decompress(gz.data) == plain.data
+    assert gz.headers["ETag"] != plain.headers["ETag"]
+
+    # 任一壓縮格式的 ETag 都代表同一份內容
+    resp = client.get("/api/leaderboard", headers={"If-None-Match": gz.headers["ETag"]})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == plain.headers["ETag"]
+    assert client.get("/api/leaderboard", headers={"Accept-Encoding": "gzip;q=0"}).data == plain.data
+
+
+def test_dynamic_responses_compressed_above_threshold(client, admin_headers, app_module):
+    _seed(app_module, 30)
+    resp = client.get("/api/admin/analyses?limit=30", headers={**admin_headers, "Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert len(app_module.app.json.loads(gzip.decompress(resp.data))["analyses"]) == 30
+
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+
+
+def test_gzip_clients_revalidate_view_etags(client, admin_headers, app_module):
+    app_module.save_analysis_result({
+        "username": "etaggzip",
+        "analysis_text": "很長的分析" * 400,
+        "value_estimation": {"account_asset_value": 1000},
+    })
+    session = app_module.SessionLocal()
+    analysis_id = session.query(app_module.AnalysisResult).filter_by(username_key="etaggzip").one().id
+    session.close()
+
+    headers = {**admin_headers, "Accept-Encoding": "gzip"}
+    first = client.get(f"/api/admin/analyses/{analysis_id}", headers=headers)
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert first.headers["ETag"].endswith('-gzip"')
+
+    second = client.get(f"/api/admin/analyses/{analysis_id}", headers={**headers, "If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 304
+    assert second.data == b""
+    assert second.headers["ETag"] == first.headers["ETag"]
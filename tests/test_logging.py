@@ -0,0 +1,56 @@
+import io
+import json
+import logging
+import queue
+
+import pytest
+
+import app_logging
+
+
+@pytest.fixture
+def log_stream():
+    stream = io.StringIO()
+    app_logging.setup_logging(level="DEBUG", fmt="json", sample_rates={}, stream=stream)
+    yield stream
+    app_logging.setup_logging()
+
+
+def read_records(stream):
+    app_logging.flush_logging()
+    return [json.loads(line) for line in stream.getvalue().splitlines() if line]
+
+
+def test_records_are_json_and_carry_request_id(client, log_stream):
+    resp = client.get("/api/leaderboard", headers={"X-Request-ID": "req-123"})
+    assert resp.status_code == 200
+    assert resp.headers["X-Request-ID"] == "req-123"
+    assert client.get("/health").headers["X-Request-ID"] != "req-123"
+
+    records = [r for r in read_records(log_stream) if r.get("request_id") == "req-123"]
+    assert records, log_stream.getvalue()
+    assert {r["category"] for r in records} == {"leaderboard"}
+    assert all(r["level"] == "DEBUG" and r["ts"].endswith("Z") for r in records)
+
+
+def test_sampling_drops_info_but_keeps_warnings(log_stream):
+    app_logging.setup_logging(level="DEBUG", sample_rates={"auth": 0.0}, stream=log_stream)
+    log = app_logging.get_logger("auth")
+    for _ in range(5):
+        log.info("sampled out")
+    log.warning("⚠️ kept")
+    app_logging.get_logger("db").info("other category", extra={"data": {"rows": 3}})
+
+    records = read_records(log_stream)
+    assert [(r["category"], r["msg"]) for r in records] == [("auth", "⚠️ kept"), ("db", "other category")]
+    assert records[1]["rows"] == 3
+    assert app_logging.snapshot()["dropped_sampled"] == {"auth": 5}
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = app_logging.NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    record = logging.LogRecord("socialavatar.test", logging.INFO, __file__, 1, "x=%s", (1,), None)
+    for _ in range(3):
+        handler.emit(record)
+    assert handler.dropped == 2
+    assert handler.queue.get_nowait().msg == "x=1"
@@ -0,0 +1,81 @@
+import json
+import os
+
+from metrics import Registry, render, read_snapshots
+from tracing import start_trace, end_trace, span
+
+
+def test_analyze_reports_stages_and_metrics(client, admin_headers, sample_image_file):
+    resp = client.post(
+        "/bd/analyze",
+        data={"profile": (sample_image_file, "profile.jpg")},
+        headers=admin_headers,
+        content_type="multipart/form-data"
+    )
+    assert resp.status_code == 200
+    stages = [part.split(";")[0] for part in resp.headers["Server-Timing"].split(", ")]
+    assert {"decode", "extract", "valuation", "save", "db"} <= set(stages)
+
+    body = client.get("/metrics", headers=admin_headers).get_data(as_text=True)
+    assert 'socialavatar_http_request_duration_seconds_count{route="/bd/analyze",method="POST",status="200"}' in body
+    assert 'socialavatar_analysis_stage_duration_seconds_bucket{stage="extract",le="+Inf"}' in body
+    assert 'socialavatar_db_query_duration_seconds_count{engine="primary",operation="INSERT"}' in body
+    assert 'socialavatar_cache_requests_total{cache="token",result="hit"}' in body
+    assert 'socialavatar_db_pool_checkouts_total{engine="primary"}' in body
+
+
+def test_metrics_token_required(client, monkeypatch, app_module, auth_headers):
+    # 未設定 token 時只有管理員可讀取
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers=auth_headers).status_code == 403
+
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    resp = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+
+
+def test_snapshots_from_workers_are_summed(tmp_path):
+    registry = Registry()
+    latency = registry.histogram("stage_seconds", "test", ("stage",), buckets=(0.1, 1))
+    hits = registry.counter("hits_total", "test", ("cache",))
+    latency.observe(0.05, stage="describe")
+    latency.observe(0.5, stage="describe")
+    hits.inc(cache="token")
+    registry.write_snapshot(str(tmp_path))
+
+    # 模擬另一個仍在執行的 worker（以父行程 pid 命名）
+    other = registry.snapshot()
+    other["pid"] = os.getppid()
+    (tmp_path / f"{os.getppid()}.json").write_text(json.dumps(other))
+    # 已結束的 worker：counter / histogram 併入 archived.json 後刪除快照，gauge 捨棄
+    dead = dict(other, metrics=dict(other["metrics"], socialavatar_busy={
+        "type": "gauge", "help": "test", "labelnames": [], "samples": [[[], 3]]
+    }))
+    (tmp_path / "999999999.json").write_text(json.dumps(dead))
+
+    body = render(read_snapshots(str(tmp_path)))
+    assert 'socialavatar_stage_seconds_bucket{stage="describe",le="0.1"} 3' in body
+    assert 'socialavatar_stage_seconds_bucket{stage="describe",le="+Inf"} 6' in body
+    assert 'socialavatar_stage_seconds_count{stage="describe"} 6' in body
+    assert 'socialavatar_hits_total{cache="token"} 3' in body
+    assert "socialavatar_busy" not in body
+    assert not (tmp_path / "999999999.json").exists()
+
+    # 之後的讀取仍包含已結束 worker 的累計值（不會重複計算）
+    body = render(read_snapshots(str(tmp_path)))
+    assert 'socialavatar_hits_total{cache="token"} 3' in body
+
+
+def test_spans_accumulate_on_current_trace():
+    trace, token = start_trace()
+    try:
+        with span("describe", model="gpt-4o-mini"):
+            pass
+        with span("describe", model="gpt-4o-mini"):
+            pass
+    finally:
+        end_trace(token)
+    assert list(trace.stage_ms()) == ["describe"]
+    assert trace.server_timing().startswith("describe;dur=")
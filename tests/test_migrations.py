@@ -0,0 +1,91 @@
+import json
+
+from sqlalchemy import create_engine, inspect, text
+
+from migrations import MigrationRunner, backfill_account_values
+
+
+def test_migrations_upgrade_legacy_schema_once(tmp_path, app_module):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        # 最早期的資料表結構（沒有 user_id / account_asset_value 等欄位）
+        conn.execute(text(
+            "CREATE TABLE analysis_results (id INTEGER PRIMARY KEY, username VARCHAR(255) NOT NULL, "
+            "username_key VARCHAR(255) NOT NULL UNIQUE, display_name VARCHAR(255), data TEXT NOT NULL, "
+            "created_at DATETIME, updated_at DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO analysis_results (username, username_key, data) VALUES ('old', 'old', :data)"
+        ), {"data": json.dumps({"value_estimation": {"account_asset_value": 4321}})})
+
+    runner = MigrationRunner(engine, app_module.Base.metadata)
+    assert runner.current_version() == 0
+    assert runner.upgrade() == runner.head
+    assert runner.current_version() == runner.head
+
+    inspector = inspect(engine)
+    columns = {col["name"] for col in inspector.get_columns("analysis_results")}
+    assert {"user_id", "account_asset_value", "data_blob", "summary"} <= columns
+    indexes = {idx["name"] for idx in inspector.get_indexes("analysis_results")}
+    assert "ix_analysis_results_created_at_id" in indexes
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT account_asset_value FROM analysis_results")).scalar() == 4321
+
+    # 已是最新版本時不會重跑
+    assert runner.upgrade() == 0
+    assert runner.pending() == []
+    engine.dispose()
+
+
+def test_concurrent_sqlite_upgrades_apply_each_migration_once(tmp_path, app_module):
+    import threading
+
+    path = tmp_path / "concurrent.db"
+    engines = [create_engine(f"sqlite:///{path}", connect_args={"timeout": 30}) for _ in range(4)]
+    # 模擬多個 worker 同時以 MIGRATE_ON_START=1 啟動
+    runners = [MigrationRunner(engine, app_module.Base.metadata) for engine in engines]
+    results, errors = [], []
+
+    def upgrade(runner):
+        try:
+            results.append(runner.upgrade())
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+
+    threads = [threading.Thread(target=upgrade, args=(runner,)) for runner in runners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert sorted(results) == [0, 0, 0, runners[0].head]
+    with engines[0].connect() as conn:
+        versions = conn.execute(text("SELECT version FROM schema_version")).scalars().all()
+    assert sorted(versions) == list(range(1, runners[0].head + 1))
+    for engine in engines:
+        engine.dispose()
+
+def test_account_value_backfill_skips_malformed_rows(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'values.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE analysis_results (id INTEGER PRIMARY KEY, data TEXT, account_asset_value BIGINT)"
+        ))
+        rows = [
+            json.dumps({"value_estimation": {"account_asset_value": 100}}),
+            "{not json",
+            json.dumps({"value_estimation": {"account_asset_value": "n/a"}}),
+            json.dumps({"value_estimation": {"account_asset_value": "300"}}),
+        ]
+        for data in rows:
+            conn.execute(text("INSERT INTO analysis_results (data) VALUES (:data)"), {"data": data})
+        # PostgreSQL 走的 Python 分批回填：一筆格式錯誤不影響其他記錄
+        assert backfill_account_values(conn, batch_size=2) == 2
+        values = conn.execute(text("SELECT account_asset_value FROM analysis_results ORDER BY id")).scalars().all()
+    assert values == [100, None, None, 300]
+    engine.dispose()
+
+def test_app_registers_data_migrations(app_module):
+    runner = app_module.migration_runner
+    assert runner.head >= 8
+    assert runner.current_version() == runner.head
@@ -0,0 +1,143 @@
+import io
+
+from PIL import Image
+
+from ai_analyzer import IGAnalyzer
+from openai_usage import BudgetPolicy, estimate_cost_micros
+
+
+AI_TEXT = """毒舌短評：質感在線，粉絲還在路上
+帳號名稱: usage_user
+粉絲數: 12000
+```json
+{"basic_info": {"username": "usage_user", "followers": 12000}, "personality_type": {"primary_type": "type_3"}}
+```"""
+
+
+class FakeResponse:
+    status_code = 200
+    text = ""
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class FakeOpenAI:
+    """記錄每次呼叫使用的模型，回傳固定內容與 usage"""
+
+    def __init__(self):
+        self.models = []
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.models.append(json["model"])
+        return FakeResponse({
+            "choices": [{"message": {"content": AI_TEXT}}],
+            "usage": {"prompt_tokens": 1000, "completion_tokens": 200},
+        })
+
+
+def _image():
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), color="white").save(buf, format="JPEG")
+    buf.seek(0)
+    return buf
+
+
+def _analyze(client, headers, image):
+    return client.post(
+        "/bd/analyze",
+        data={"profile": (image, "profile.jpg")},
+        headers=headers,
+        content_type="multipart/form-data"
+    )
+
+
+def _use_fake_openai(monkeypatch, app_module):
+    fake = FakeOpenAI()
+    monkeypatch.setattr(app_module, "analyzer", IGAnalyzer("sk-test", "gpt-4o", http_client=fake))
+    return fake
+
+
+def test_usage_recorded_per_analysis_and_rolled_up(client, auth_headers, admin_headers, monkeypatch, app_module,
+                                                   sample_image_file):
+    fake = _use_fake_openai(monkeypatch, app_module)
+    resp = _analyze(client, auth_headers, sample_image_file)
+    assert resp.status_code == 200
+    assert "usage" not in resp.get_json() and "_usage" not in resp.get_json()
+    assert fake.models == ["gpt-4o"] * 3
+
+    per_call = estimate_cost_micros("gpt-4o", 1000, 200)
+    session = app_module.SessionLocal()
+    try:
+        history = session.query(app_module.AnalysisHistory).one()
+        assert (history.prompt_tokens, history.completion_tokens, history.cost_micros) == (3000, 600, 3 * per_call)
+        stages = {r.stage: r.calls for r in session.query(app_module.OpenAIUsageRollup)}
+        assert stages == {"describe": 1, "analyze": 1, "review": 1}
+    finally:
+        session.close()
+
+    usage = client.get("/api/admin/stats", headers=admin_headers).get_json()["stats"]["openai_usage"]
+    assert usage["today"]["calls"] == 3
+    assert usage["today"]["cost_usd"] == round(3 * per_call / 1_000_000, 4)
+    assert usage["top_users"][0]["calls"] == 3
+    assert {row["stage"] for row in usage["by_model"]} == {"describe", "analyze", "review"}
+
+
+def test_budget_switches_to_cheaper_model_then_degrades(client, auth_headers, monkeypatch, app_module):
+    fake = _use_fake_openai(monkeypatch, app_module)
+    per_call_usd = estimate_cost_micros("gpt-4o", 1000, 200) / 1_000_000
+    # 第一次分析（3 次呼叫）後超出預算，但未超過 2 倍
+    monkeypatch.setattr(app_module, "budget_policy", BudgetPolicy(
+        daily_budget_usd=per_call_usd * 2, fallback_model="gpt-4o-mini", degrade_factor=2.0
+    ))
+
+    assert _analyze(client, auth_headers, _image()).status_code == 200
+    assert fake.models == ["gpt-4o"] * 3
+
+    fake.models.clear()
+    assert _analyze(client, auth_headers, _image()).status_code == 200
+    assert fake.models == ["gpt-4o-mini"] * 3
+
+    monkeypatch.setattr(app_module, "budget_policy", BudgetPolicy(
+        daily_budget_usd=per_call_usd, fallback_model="gpt-4o-mini", degrade_factor=2.0
+    ))
+    fake.models.clear()
+    resp = _analyze(client, auth_headers, _image())
+    assert resp.status_code == 200
+    # degraded：只做完整分析，短評由分析內容擷取
+    assert fake.models == ["gpt-4o-mini"]
+    assert resp.get_json()["analysis_text"]
+
+
+def test_empty_completion_still_counts_against_budget(client, auth_headers, monkeypatch, app_module):
+    fake = _use_fake_openai(monkeypatch, app_module)
+    # 200 但內容為空：tokens 已計費，分析失敗也要記錄
+    monkeypatch.setattr(fake, "post", lambda *args, **kwargs: FakeResponse({
+        "choices": [{"message": {"content": ""}}],
+        "usage": {"prompt_tokens": 1000, "completion_tokens": 200},
+    }))
+    assert _analyze(client, auth_headers, _image()).status_code >= 400
+
+    session = app_module.SessionLocal()
+    try:
+        rollup = session.query(app_module.OpenAIUsageRollup).one()
+        assert (rollup.calls, rollup.prompt_tokens, rollup.cost_micros) == (1, 1000, estimate_cost_micros("gpt-4o", 1000, 200))
+    finally:
+        session.close()
+
+def test_user_budget_only_applies_to_signed_in_users():
+    policy = BudgetPolicy(daily_budget_usd=0, user_daily_budget_usd=1.0, fallback_model="gpt-4o-mini")
+    assert policy.decide("gpt-4o", 5_000_000, None).mode == "normal"
+    decision = policy.decide("gpt-4o", 5_000_000, 1_200_000)
+    assert (decision.mode, decision.model, decision.reason) == ("economy", "gpt-4o-mini", "user_budget")
+    assert policy.decide("gpt-4o-mini", 0, 1_200_000).mode == "degraded"
+
+
+def test_unpriced_models_use_conservative_estimate():
+    assert estimate_cost_micros("gpt-5.1", 1_000_000, 0) == 1_250_000
+    assert estimate_cost_micros("gpt-5.1-2025-11-13", 0, 1000) == 10_000
+    # 未知模型不當成免費，以已知模型中最高的單價估算
+    assert estimate_cost_micros("o9-preview", 1000, 1000) == estimate_cost_micros("gpt-4-turbo", 1000, 1000) > 0
@@ -0,0 +1,56 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from password_hasher import HasherBusyError, PasswordHasher
+
+
+def test_process_pool_hash_verify_and_percentiles():
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=1)
+    try:
+        pwhash = hasher.hash("secret123")
+        assert pwhash.startswith("pbkdf2:sha256:1000$")
+        assert hasher.verify(pwhash, "secret123") is True
+        assert hasher.verify(pwhash, "wrong") is False
+        assert hasher.needs_rehash(pwhash) is False
+        assert hasher.needs_rehash(generate_password_hash("secret123", method="pbkdf2:sha256:500")) is True
+
+        stats = hasher.snapshot()
+        assert stats["hash"] == 1 and stats["verify"] == 2
+        assert stats["latency"]["verify"]["count"] == 2
+        assert stats["latency"]["verify"]["p50_ms"] <= stats["latency"]["verify"]["p99_ms"]
+    finally:
+        hasher.shutdown()
+
+
+def test_queue_limit_rejects_immediately():
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=0, max_pending=1)
+    hasher._slots.acquire()  # 模擬一個執行中的工作
+    with pytest.raises(HasherBusyError):
+        hasher.hash("secret123")
+    assert hasher.snapshot()["rejected"] == 1
+
+
+def test_login_rehashes_when_cost_changes(client, app_module, monkeypatch):
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=0, max_pending=1)
+    monkeypatch.setattr(app_module, "password_hasher", hasher)
+    session = app_module.SessionLocal()
+    session.add(app_module.User(
+        email="old@example.com", username="olduser", display_name="Old",
+        password_hash=generate_password_hash("secret123", method="pbkdf2:sha256:500")
+    ))
+    session.commit()
+    session.close()
+
+    resp = client.post("/api/auth/login", json={"email": "old@example.com", "password": "secret123"})
+    assert resp.status_code == 200
+    session = app_module.SessionLocal()
+    user = session.query(app_module.User).filter_by(email="old@example.com").one()
+    assert user.password_hash.startswith("pbkdf2:sha256:1000$")
+    session.close()
+    assert hasher.snapshot()["rehash"] == 1
+
+    # 佇列已滿時回傳 503，而不是佔住 request 執行緒
+    hasher._slots.acquire()
+    resp = client.post("/api/auth/login", json={"email": "old@example.com", "password": "secret123"})
+    assert resp.status_code == 503
+    assert resp.get_json()["error"] == "auth_busy"
@@ -0,0 +1,47 @@
+import gc
+import json
+import os
+
+import pytest
+from sqlalchemy import text
+
+from ai_analyzer import PromptBuilder
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要 os.fork")
+def test_worker_rebuilds_connections_after_fork(app_module):
+    assert app_module.create_app() is app_module.app
+    assert "shared_state" in app_module._initialized
+    assert PromptBuilder.build_analysis_prompt.cache_info().currsize >= 1
+
+    app_module.http_client._record("api.openai.com", 0.1, error=False)
+    app_module.last_ai_response = {"raw": "master"}
+    parent_pool = app_module.engine.pool
+    try:
+        app_module.before_fork()
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            result = {}
+            try:
+                app_module.after_fork()
+                with app_module.engine.connect() as conn:
+                    result["db"] = conn.execute(text("SELECT 1")).scalar()
+                result["new_pool"] = app_module.engine.pool is not parent_pool
+                result["http_stats"] = app_module.http_client.snapshot()
+                result["last_ai_response"] = app_module.last_ai_response
+                result["health"] = app_module.app.test_client().get("/health").status_code
+            finally:
+                os.write(write_fd, json.dumps(result).encode("utf-8"))
+                os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            result = json.loads(f.read() or "{}")
+        os.waitpid(pid, 0)
+    finally:
+        gc.unfreeze()
+        app_module.last_ai_response = None
+
+    assert result == {"db": 1, "new_pool": True, "http_stats": {}, "last_ai_response": None, "health": 200}
+    # master 的指標與狀態不受 worker 影響
+    assert "api.openai.com" in app_module.http_client.snapshot()
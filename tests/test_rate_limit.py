@@ -0,0 +1,92 @@
+import io
+import time
+
+from PIL import Image
+
+from rate_limit import MemoryStore, RateLimiter, SQLiteStore, parse_limits
+
+
+def _image():
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), color="white").save(buf, format="JPEG")
+    buf.seek(0)
+    return buf
+
+
+def _analyze(client, headers=None):
+    return client.post(
+        "/bd/analyze",
+        data={"profile": (_image(), "profile.jpg")},
+        headers=headers or {},
+        content_type="multipart/form-data"
+    )
+
+
+def test_anonymous_analyze_limited_per_ip_users_per_account(client, auth_headers, monkeypatch, app_module):
+    limiter = RateLimiter(MemoryStore())
+    limiter.rule("analyze", user="5/minute", anonymous="2/minute;10/day")
+    monkeypatch.setattr(app_module, "rate_limiter", limiter)
+
+    first = _analyze(client)
+    assert first.status_code == 200
+    assert (first.headers["RateLimit-Limit"], first.headers["RateLimit-Remaining"]) == ("2", "1")
+    assert first.headers["RateLimit-Policy"] == "2;w=60"
+    assert _analyze(client).headers["RateLimit-Remaining"] == "0"
+
+    limited = _analyze(client)
+    assert limited.status_code == 429
+    assert limited.get_json()["error"] == "rate_limited"
+    assert 1 <= int(limited.headers["Retry-After"]) <= 30
+    # 登入用戶以帳號計算，不受同一 IP 的匿名請求影響
+    resp = _analyze(client, auth_headers)
+    assert resp.status_code == 200
+    assert resp.headers["RateLimit-Remaining"] == "4"
+
+    # 代理後方以代理加上的 X-Forwarded-For 最右側位址區分用戶端，用戶端自帶的位址無效
+    monkeypatch.setattr(app_module, "TRUSTED_PROXY_COUNT", 1)
+    assert _analyze(client, {"X-Forwarded-For": "203.0.113.9"}).status_code == 200
+    assert _analyze(client, {"X-Forwarded-For": "10.0.0.1, 203.0.113.9"}).status_code == 200
+    assert _analyze(client, {"X-Forwarded-For": "198.51.100.5, 203.0.113.9"}).status_code == 429
+
+
+def test_login_limited_by_ip(client, monkeypatch, app_module):
+    limiter = RateLimiter(MemoryStore())
+    limiter.rule("auth", anonymous="1/minute")
+    monkeypatch.setattr(app_module, "rate_limiter", limiter)
+    assert client.post("/api/auth/login", json={}).status_code == 400
+    resp = client.post("/api/auth/login", json={})
+    assert resp.status_code == 429
+    assert resp.headers["RateLimit-Remaining"] == "0"
+
+
+def test_gcra_shared_across_sqlite_stores(tmp_path):
+    now = [1000.0]
+    path = str(tmp_path / "ratelimit.db")
+    # 兩個 store 模擬兩個 worker 共用同一個檔案
+    workers = [RateLimiter(SQLiteStore(path), clock=lambda: now[0]) for _ in range(2)]
+    for limiter in workers:
+        limiter.rule("analyze", anonymous="4/minute")
+
+    results = [workers[i % 2].check("analyze", ip="198.51.100.1") for i in range(5)]
+    assert [d.allowed for d in results] == [True, True, True, True, False]
+    assert [d.remaining for d in results[:4]] == [3, 2, 1, 0]
+    assert results[-1].retry_after == 15.0
+
+    # 每 15 秒恢復一次
+    now[0] += 15
+    assert workers[0].check("analyze", ip="198.51.100.1").allowed
+    assert not workers[1].check("analyze", ip="198.51.100.1").allowed
+    assert workers[1].check("analyze", ip="198.51.100.2").remaining == 3
+
+
+def test_checks_stay_under_one_millisecond(tmp_path):
+    assert [(l.limit, l.period) for l in parse_limits("10/minute; 100/day,5/10minutes")] == [
+        (10, 60), (100, 86400), (5, 600)
+    ]
+    for store in (MemoryStore(), SQLiteStore(str(tmp_path / "bench.db"))):
+        limiter = RateLimiter(store)
+        limiter.rule("analyze", user="1000/minute;10000/day", anonymous="1000/minute")
+        start = time.perf_counter()
+        for i in range(500):
+            limiter.check("analyze", user_id=i % 50)
+        assert (time.perf_counter() - start) / 500 < 0.001, type(store).__name__
@@ -0,0 +1,65 @@
+import json
+
+
+def _seed_own_analysis(app_module, user_id):
+    session = app_module.SessionLocal()
+    session.add(app_module.AnalysisResult(
+        username="mine", username_key="mine", user_id=user_id,
+        data=json.dumps({"followers": 10, "value_estimation": {"account_asset_value": 100}}),
+        summary=json.dumps({"followers": 10, "analysis_text": ""}),
+        account_asset_value=100
+    ))
+    session.commit()
+    record_id = session.query(app_module.AnalysisResult.id).scalar()
+    session.close()
+    return record_id
+
+
+def _select_count(statements):
+    return sum(1 for s in statements if s.lstrip().upper().startswith("SELECT"))
+
+
+def test_user_me_reuses_authenticated_user(client, auth_headers, query_counter):
+    resp = client.get("/api/user/me", headers=auth_headers)
+    assert resp.status_code == 200
+    assert resp.get_json()["user"]["email"] == "test@example.com"
+    # 只有驗證時的一次用戶查詢
+    assert len(query_counter) == 1
+
+    # 之後的請求直接使用快取的用戶
+    query_counter.clear()
+    assert client.get("/api/user/me", headers=auth_headers).status_code == 200
+    assert query_counter == []
+
+
+def test_user_analyses_query_count(client, auth_headers, app_module, query_counter):
+    user_id = app_module.SessionLocal().query(app_module.User.id).scalar()
+    _seed_own_analysis(app_module, user_id)
+    query_counter.clear()
+
+    resp = client.get("/api/user/analyses", headers=auth_headers)
+    assert resp.get_json()["count"] == 1
+    # 用戶查詢 + 分析列表查詢（decorator 與 handler 不再重複解碼 / 查詢）
+    assert len(query_counter) == 2
+
+
+def test_admin_endpoints_query_counts(client, admin_headers, app_module, query_counter):
+    record_id = _seed_own_analysis(app_module, None)
+    query_counter.clear()
+
+    resp = client.get(f"/api/admin/analyses/{record_id}", headers=admin_headers)
+    assert resp.status_code == 200
+    assert len(query_counter) == 2
+
+    # 用戶已快取，只剩讀取分析記錄
+    query_counter.clear()
+    resp = client.delete(f"/api/admin/analyses/{record_id}", headers=admin_headers)
+    assert resp.status_code == 200
+    assert _select_count(query_counter) == 1
+
+
+def test_missing_token_still_rejected(client, query_counter):
+    resp = client.get("/api/user/analyses")
+    assert resp.status_code == 401
+    assert resp.get_json()["error"] == "authorization_header_missing"
+    assert query_counter == []
@@ -0,0 +1,83 @@
+import time
+
+from response_cache import ResponseCache
+
+
+def _save(app_module, username, value):
+    app_module.save_analysis_result({
+        "username": username,
+        "followers": 100,
+        "value_estimation": {"account_asset_value": value},
+    })
+
+
+def test_leaderboard_cached_with_etag_and_invalidated_on_save(client, app_module):
+    _save(app_module, "cache1", 1000)
+    first = client.get("/api/leaderboard?limit=10")
+    assert first.headers["X-Cache"] == "MISS"
+    assert "stale-while-revalidate" in first.headers["Cache-Control"]
+    etag = first.headers["ETag"]
+    assert not etag.startswith("W/")
+
+    # 參數正規化後是同一個 key
+    second = client.get("/api/leaderboard?limit=10&timeframe=bogus")
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.headers["ETag"] == etag
+    assert client.get("/api/leaderboard?limit=10", headers={"If-None-Match": etag}).status_code == 304
+
+    _save(app_module, "cache2", 5000)
+    third = client.get("/api/leaderboard?limit=10", headers={"If-None-Match": etag})
+    assert third.status_code == 200
+    assert third.headers["X-Cache"] == "MISS"
+    assert third.get_json()["leaderboard"][0]["username"] == "cache2"
+
+
+def test_result_invalidated_by_admin_edit(client, admin_headers, app_module):
+    _save(app_module, "edited", 1000)
+    assert client.get("/api/result?username=@Edited").get_json()["value_estimation"]["account_asset_value"] == 1000
+    assert client.get("/api/result?username=edited").headers["X-Cache"] == "HIT"
+    # 找不到的帳號不快取
+    assert client.get("/api/result?username=nobody").status_code == 404
+    assert app_module.response_cache.snapshot()["size"] == 1
+
+    session = app_module.SessionLocal()
+    analysis_id = session.query(app_module.AnalysisResult).filter_by(username_key="edited").one().id
+    session.close()
+    client.put(f"/api/admin/analyses/{analysis_id}/update", json={"account_asset_value": 9999}, headers=admin_headers)
+
+    resp = client.get("/api/result?username=edited")
+    assert resp.headers["X-Cache"] == "MISS"
+    assert resp.get_json()["value_estimation"]["account_asset_value"] == 9999
+
+
+def test_stale_entry_served_while_refreshing_in_background():
+    cache = ResponseCache(ttl=0.01, stale_ttl=30)
+    cache.set("k", b"v1", tags=("t",))
+    time.sleep(0.02)
+
+    entry, needs_refresh = cache.get("k")
+    assert entry.body == b"v1" and needs_refresh
+    # 同一個 key 同時只有一個背景更新
+    assert cache.get("k") == (entry, False)
+
+    cache.refresh("k", lambda: b"v2", ("t",))
+    for _ in range(100):
+        entry, _ = cache.get("k")
+        if entry.body == b"v2":
+            break
+        time.sleep(0.01)
+    assert entry.body == b"v2"
+    assert cache.snapshot()["refreshes"] == 1
+
+
+def test_build_started_before_invalidation_is_not_stored():
+    cache = ResponseCache()
+    generation = cache.generation
+    cache.invalidate_tag("username:foo")
+    cache.set("k", b"old", tags=("username:foo",), generation=generation)
+    assert cache.get("k") == (None, False)
+
+    cache.set("k", b"new", tags=("username:foo",), generation=cache.generation)
+    assert cache.get("k")[0].body == b"new"
+    assert cache.invalidate_tag("username:foo") == 1
+    assert cache.snapshot()["tags"] == 0
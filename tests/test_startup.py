@@ -0,0 +1,71 @@
+import os
+import threading
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import startup_report
+
+# 冷啟動到第一個 /health 的上限（CI 機器較慢時可用環境變數調整）
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", 2500))
+
+
+def test_time_to_first_health_within_budget(tmp_path):
+    health = startup_report.measure_time_to_health({"DATABASE_URL": f"sqlite:///{tmp_path}/startup.db"})
+    assert health["status_code"] == 200
+    assert health["first_health_ms"] < STARTUP_BUDGET_MS, health
+    # /health 不觸發資料庫檢查、Firebase 或 AI 分析器初始化
+    assert health["initialized"] == []
+    assert health["firebase_admin_loaded"] is False
+
+
+def test_lazy_init_runs_once_across_threads(app_module, monkeypatch):
+    calls = []
+    monkeypatch.setattr(app_module, "_initialized", set())
+    monkeypatch.setattr(app_module, "analyzer", None)
+    monkeypatch.setattr(app_module, "init_analyzer", lambda: calls.append(1))
+
+    threads = [threading.Thread(target=app_module.get_analyzer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert "analyzer_init_ms" in app_module.STARTUP_TIMINGS
+
+
+def test_startup_report_endpoint(client, admin_headers):
+    resp = client.get("/api/admin/startup", headers=admin_headers)
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["timings_ms"]["import_ms"] > 0
+    assert "database" in data["initialized"]
+
+
+def test_parse_importtime():
+    rows = startup_report.parse_importtime(
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   zipimport\n"
+        "import time:      5000 |      90000 | app\n"
+    )
+    assert rows == [("zipimport", 120, 120), ("app", 5000, 90000)]
+
+
+def test_failed_init_retried_on_next_call(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "_initialized", set())
+    attempts = []
+
+    def current_version():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OperationalError("SELECT 1", {}, Exception("database is down"))
+        return app_module.migration_runner.head
+
+    monkeypatch.setattr(app_module.migration_runner, "current_version", current_version)
+    with pytest.raises(OperationalError):
+        app_module.ensure_db_ready()
+    assert "database" not in app_module._initialized
+
+    app_module.ensure_db_ready()
+    assert "database" in app_module._initialized
+    assert len(attempts) == 2
@@ -0,0 +1,77 @@
+import gzip
+import re
+
+from static_assets import AssetManifest
+
+
+def test_html_references_fingerprinted_assets(client):
+    resp = client.get("/static/landing.html", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.headers["Vary"] == "Accept-Encoding"
+    assert "must-revalidate" in resp.headers["Cache-Control"]
+    html = gzip.decompress(resp.data).decode("utf-8")
+    assert "/static/app.css" not in html
+    css_url = re.search(r"/static/app\.[0-9a-f]{10}\.css", html).group(0)
+
+    css = client.get(css_url)
+    assert css.status_code == 200
+    assert css.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert css.mimetype == "text/css"
+    assert "Content-Encoding" not in css.headers
+
+    # 不同壓縮格式的 ETag 代表同一份內容
+    gz = client.get(css_url, headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["ETag"] != css.headers["ETag"]
+    assert client.get(css_url, headers={"If-None-Match": gz.headers["ETag"]}).status_code == 304
+
+
+def test_index_and_unknown_paths(client):
+    resp = client.get("/")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/html"
+    assert client.get("/", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+    assert client.get("/static/missing.js").status_code == 404
+    assert client.get("/static/../app.py").status_code == 404
+
+
+def test_manifest_reused_until_sources_change(tmp_path):
+    static_dir = tmp_path / "static"
+    static_dir.mkdir()
+    (static_dir / "site.js").write_text("console.log('v1');" * 100)
+    (static_dir / "index.html").write_text('<script src="/static/site.js"></script>')
+    build_dir = tmp_path / "build"
+
+    first = AssetManifest(str(static_dir), str(build_dir)).load_or_build()
+    assert first.stats["built"] == 2
+    assert "gzip" in first.lookup("site.js")[0].encodings
+    assert AssetManifest(str(static_dir), str(build_dir)).load_or_build().stats["reused"] == 2
+
+    (static_dir / "site.js").write_text("console.log('v2');" * 100)
+    second = AssetManifest(str(static_dir), str(build_dir)).load_or_build()
+    assert second.stats["built"] == 2
+    assert second.url("site.js") != first.url("site.js")
+    # HTML 內容跟著指紋改變，ETag 也會不同
+    assert second.lookup("index.html")[0].digest != first.lookup("index.html")[0].digest
+    assert second.url("site.js") in open(second.lookup("index.html")[0].path).read()
+    # 舊版指紋網址仍可取得（已快取舊 HTML 的瀏覽器不會 404）
+    old_asset, fingerprinted = second.lookup(first.url("site.js").rsplit("/", 1)[1])
+    assert fingerprinted and open(old_asset.path).read().startswith("console.log('v1');")
+    assert second.lookup("../static/site.js") == (None, False)
+
+
+def test_accel_redirect_keeps_subdirectory_and_encoding(tmp_path, client, monkeypatch, app_module):
+    static_dir = tmp_path / "static"
+    (static_dir / "img").mkdir(parents=True)
+    (static_dir / "img" / "logo.svg").write_text("<svg>" + "<g/>" * 500 + "</svg>")
+    manifest = AssetManifest(str(static_dir), str(tmp_path / "build")).load_or_build()
+    monkeypatch.setattr(app_module, "get_static_manifest", lambda: manifest)
+    monkeypatch.setattr(app_module, "STATIC_ACCEL_PREFIX", "/_static/")
+
+    url = manifest.url("img/logo.svg")
+    hashed = url[len("/static/"):]
+    assert hashed.startswith("img/logo.")
+    resp = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["X-Accel-Redirect"] == f"/_static/{hashed}.gz"
+    assert (tmp_path / "build" / f"{hashed}.gz").exists()
+    assert client.get(url).headers["X-Accel-Redirect"] == f"/_static/{hashed}"
@@ -0,0 +1,52 @@
+import time
+
+from ttl_cache import FileInvalidationChannel, TTLCache
+
+
+def test_ttl_cache_lru_expiry_and_hit_rate():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # 淘汰最久未使用的 b
+    assert cache.get("b") is None
+    cache.set("short", 4, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+
+    stats = cache.snapshot()
+    assert stats["evictions"] >= 1
+    assert stats["expired"] == 1
+    assert stats["hits"] == 1
+    assert 0 < stats["hit_rate"] < 1
+
+
+def test_file_invalidation_channel_between_workers(tmp_path):
+    path = str(tmp_path / "invalidations.log")
+    worker_a = FileInvalidationChannel(path, poll_interval=0)
+    worker_b = FileInvalidationChannel(path, poll_interval=0)
+    received = []
+    worker_a.subscribe("user", received.append)
+    worker_b.subscribe("user", received.append)
+
+    worker_a.publish("user", 42)
+    worker_a.poll()
+    assert received == []  # 不處理自己發出的訊息
+    worker_b.poll()
+    assert received == ["42"]
+
+
+def test_user_cache_invalidated_on_admin_delete(client, admin_headers, app_module):
+    assert client.get("/api/user/me", headers=admin_headers).status_code == 200
+    user_id = client.get("/api/user/me", headers=admin_headers).get_json()["user"]["id"]
+    assert app_module.user_cache.get(user_id) is not None
+    stats = client.get("/api/admin/cache/stats", headers=admin_headers).get_json()["caches"]
+    assert stats["token"]["hits"] >= 1
+    assert stats["user"]["hit_rate"] > 0
+
+    resp = client.delete(f"/api/admin/users/{user_id}", headers=admin_headers)
+    assert resp.status_code == 200
+    # 快取已失效，刪除後的 token 不能再使用
+    assert app_module.user_cache.get(user_id) is None
+    resp = client.get("/api/user/me", headers=admin_headers)
+    assert resp.status_code == 401
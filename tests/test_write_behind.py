@@ -0,0 +1,82 @@
+import threading
+
+from write_behind import WriteBehindQueue
+
+
+def test_write_behind_coalesces_into_batches():
+    batches = []
+    writer = WriteBehindQueue(batches.append, max_batch=10, max_delay=0.2)
+    for i in range(25):
+        writer.submit(i)
+    writer.flush()
+    assert sorted(x for batch in batches for x in batch) == list(range(25))
+    assert len(batches) < 25
+    writer.close()
+
+
+def test_write_behind_close_drains_and_falls_back_to_sync():
+    written = []
+    gate = threading.Event()
+
+    def slow_flush(batch):
+        gate.wait(1)
+        written.extend(batch)
+
+    writer = WriteBehindQueue(slow_flush, max_batch=2, max_delay=0.01)
+    for i in range(5):
+        writer.submit(i)
+    gate.set()
+    writer.close()
+    assert sorted(written) == list(range(5))
+
+    # 關閉後改為同步寫入
+    writer.submit(99)
+    assert written[-1] == 99
+
+
+def test_write_behind_spills_failures_and_replays(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+
+    def failing(batch):
+        raise RuntimeError("db down")
+
+    writer = WriteBehindQueue(failing, spill_path=str(spill))
+    writer.submit({"username": "a"})
+    writer.close()
+    assert spill.exists()
+
+    replayed = []
+    assert WriteBehindQueue(replayed.extend, spill_path=str(spill)).replay_spill() == 1
+    assert replayed == [{"username": "a"}]
+    assert not spill.exists()
+
+
+def test_batched_save_upserts_once_and_keeps_every_snapshot(app_module):
+    writer = WriteBehindQueue(app_module.save_analysis_results_batch, max_batch=10, max_delay=0.2)
+    for value in (100, 200, 300):
+        writer.submit({"username": "BatchUser", "value_estimation": {"account_asset_value": value}})
+    writer.close()
+
+    session = app_module.SessionLocal()
+    try:
+        record = session.query(app_module.AnalysisResult).one()
+        assert record.username_key == "batchuser"
+        assert record.account_asset_value == 300
+        assert session.query(app_module.AnalysisHistory).count() == 3
+    finally:
+        session.close()
+
+
+def test_batch_save_keeps_usage_on_queued_items(app_module):
+    usage = {"prompt_tokens": 1000, "completion_tokens": 200, "cost_micros": 4500}
+    item = {"username": "usageuser", "value_estimation": {"account_asset_value": 100}, "_usage": usage}
+    app_module.save_analysis_results_batch([item])
+    # 失敗重試與 spill 使用同一個 dict，用量不能被移除
+    assert item["_usage"] == usage
+
+    session = app_module.SessionLocal()
+    try:
+        assert session.query(app_module.AnalysisHistory.cost_micros).scalar() == 4500
+        assert "_usage" not in app_module.load_record_data(session.query(app_module.AnalysisResult).one())
+    finally:
+        session.close()
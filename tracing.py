@@ -0,0 +1,128 @@
+# tracing.py - 請求內的階段計時
+
+"""
+輕量 tracing：每個請求一個 Trace（存在 contextvar，執行緒與 asyncio task 皆適用）
+
+- span("describe", model=...)：記錄一個階段的耗時，同時寫入 Prometheus histogram
+  （有 model 時另外記錄 OpenAI 延遲，標籤為 stage / model）
+- instrument_engine()：以 SQLAlchemy engine 事件記錄每個查詢的耗時與次數
+- Trace.server_timing()：轉成 Server-Timing 標頭，瀏覽器 DevTools 可直接看到各階段耗時
+"""
+
+import contextlib
+import contextvars
+import threading
+import time
+
+from sqlalchemy import event
+
+from metrics import REGISTRY
+
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP 請求處理時間（依路由）", ("route", "method", "status")
+)
+STAGE_LATENCY = REGISTRY.histogram(
+    "analysis_stage_duration_seconds", "分析流程各階段耗時", ("stage",)
+)
+OPENAI_LATENCY = REGISTRY.histogram(
+    "openai_request_duration_seconds", "OpenAI 呼叫耗時（依階段與模型）", ("stage", "model", "outcome")
+)
+DB_QUERY_LATENCY = REGISTRY.histogram(
+    "db_query_duration_seconds", "SQL 查詢耗時", ("engine", "operation"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """一個請求的階段耗時（毫秒）與資料庫查詢統計"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.db_queries = 0
+        self.db_ms = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, elapsed_ms: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + elapsed_ms
+
+    def add_query(self, elapsed_ms: float):
+        with self._lock:
+            self.db_queries += 1
+            self.db_ms += elapsed_ms
+
+    def stage_ms(self) -> dict:
+        with self._lock:
+            stages = {stage: round(ms, 1) for stage, ms in self.stages.items()}
+            if self.db_queries:
+                stages["db"] = round(self.db_ms, 1)
+        return stages
+
+    def server_timing(self) -> str:
+        parts = [f"{stage};dur={ms}" for stage, ms in self.stage_ms().items()]
+        if self.db_queries:
+            parts[-1] += f';desc="{self.db_queries} queries"'
+        return ", ".join(parts)
+
+
+def start_trace():
+    """開始新的 Trace，回傳 (trace, token)；結束時以 token 呼叫 end_trace"""
+    trace = Trace()
+    return trace, _current.set(trace)
+
+
+def end_trace(token):
+    _current.reset(token)
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextlib.contextmanager
+def span(stage: str, model: str = None):
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(elapsed, stage=stage)
+        if model is not None:
+            OPENAI_LATENCY.observe(elapsed, stage=stage, model=model, outcome=outcome)
+        trace = _current.get()
+        if trace is not None:
+            trace.add(stage, elapsed * 1000)
+
+
+def instrument_engine(engine, name: str):
+    """記錄 engine 上每個 SQL 的耗時（依語句類型），並累計到目前請求的 Trace"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_LATENCY.observe(elapsed, engine=name, operation=operation)
+        trace = _current.get()
+        if trace is not None:
+            trace.add_query(elapsed * 1000)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
@@ -0,0 +1,229 @@
+# ttl_cache.py - 行程內 TTL + LRU 快取
+
+"""
+行程內 TTL + LRU 快取與跨 worker 失效通知
+
+- TTLCache：容量上限（LRU 淘汰）+ 每筆到期時間，統計命中率
+- 失效通道（可選）：一個 worker 失效某個 key 時通知其他 worker
+  - file:///path/to/log  共用檔案（同一台機器上的多個 gunicorn worker）
+  - redis://host:6379/0  Redis pub/sub（需安裝 redis）
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # redis 是可選的
+    redis = None
+
+
+class TTLCache:
+    """執行緒安全的 TTL + LRU 快取"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, name: str = "cache"):
+        """
+        Args:
+            maxsize: 最多保留筆數（超過時淘汰最久未使用的）
+            ttl: 預設存活秒數
+            name: 名稱（統計與失效通道使用）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """寫入快取；ttl 未指定時使用預設值，<= 0 時不寫入"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def pop(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self._data)
+        lookups = stats["hits"] + stats["misses"]
+        stats["maxsize"] = self.maxsize
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# -----------------------------------------------------------------------------
+# 跨 worker 失效通道
+# -----------------------------------------------------------------------------
+class FileInvalidationChannel:
+    """
+    以共用檔案傳遞失效訊息：publish 追加一行，其他 worker 在 poll 時讀取新增內容
+
+    poll 最多每 poll_interval 秒檢查一次檔案大小，平常只有一次 os.stat
+    """
+
+    def __init__(self, path: str, poll_interval: float = 1.0, max_size: int = 1024 * 1024):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_size = max_size
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._next_poll = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 只處理啟動之後的訊息
+        self._offset = os.path.getsize(path) if os.path.exists(path) else 0
+        self._inode = self._stat_inode()
+
+    @property
+    def _origin(self):
+        # 每次計算，fork 後的 worker 各自有不同的來源標記
+        return f"{os.getpid()}-{id(self)}"
+
+    def subscribe(self, name: str, handler):
+        self._handlers[name] = handler
+
+    def after_fork(self):
+        """fork 後呼叫：重建鎖，並從目前檔案結尾開始讀取"""
+        self._lock = threading.Lock()
+        self._offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self._inode = self._stat_inode()
+        self._next_poll = 0.0
+
+    def publish(self, name: str, key):
+        line = f"{self._origin}\t{name}\t{key}\n"
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+        if os.path.getsize(self.path) > self.max_size:
+            # 檔案過大時輪替；其他 worker 發現 inode 改變後從頭讀取
+            try:
+                os.replace(self.path, f"{self.path}.1")
+            except OSError:
+                pass
+
+    def poll(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now < self._next_poll:
+            return
+        with self._lock:
+            self._next_poll = now + self.poll_interval
+            inode = self._stat_inode()
+            if inode is None:
+                return
+            if inode != self._inode:
+                self._inode, self._offset = inode, 0
+            size = os.path.getsize(self.path)
+            if size <= self._offset:
+                return
+            with open(self.path, encoding="utf-8") as f:
+                f.seek(self._offset)
+                chunk = f.read()
+            self._offset = size
+        for line in chunk.splitlines():
+            parts = line.split("\t", 2)
+            if len(parts) != 3 or parts[0] == self._origin:
+                continue
+            handler = self._handlers.get(parts[1])
+            if handler:
+                handler(parts[2])
+
+    def _stat_inode(self):
+        try:
+            return os.stat(self.path).st_ino
+        except OSError:
+            return None
+
+
+class RedisInvalidationChannel:
+    """以 Redis pub/sub 傳遞失效訊息（背景執行緒接收，poll 不需做事）"""
+
+    def __init__(self, url: str, channel: str = "cache-invalidation"):
+        if redis is None:
+            raise RuntimeError("redis 未安裝，無法使用 Redis 失效通道")
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._handlers = {}
+        self._thread = None
+
+    @property
+    def _origin(self):
+        return f"{os.getpid()}-{id(self)}"
+
+    def subscribe(self, name: str, handler):
+        self._handlers[name] = handler
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._listen, name="CacheInvalidation", daemon=True)
+            self._thread.start()
+
+    def after_fork(self):
+        """fork 後呼叫：背景接收執行緒不會被複製到子行程，重新啟動"""
+        self.client.connection_pool.reset()
+        self._thread = None
+        if self._handlers:
+            self._thread = threading.Thread(target=self._listen, name="CacheInvalidation", daemon=True)
+            self._thread.start()
+
+    def publish(self, name: str, key):
+        self.client.publish(self.channel, f"{self._origin}\t{name}\t{key}")
+
+    def poll(self, force: bool = False):
+        return
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for message in pubsub.listen():
+            data = message.get("data")
+            if isinstance(data, bytes):
+                data = data.decode("utf-8")
+            parts = (data or "").split("\t", 2)
+            if len(parts) != 3 or parts[0] == self._origin:
+                continue
+            handler = self._handlers.get(parts[1])
+            if handler:
+                handler(parts[2])
+
+
+def create_invalidation_channel(url: str):
+    """依 URL 建立失效通道；未設定時回傳 None"""
+    if not url:
+        return None
+    if url.startswith("file://"):
+        return FileInvalidationChannel(url[len("file://"):])
+    if url.startswith(("redis://", "rediss://")):
+        return RedisInvalidationChannel(url)
+    raise ValueError(f"不支援的失效通道: {url}")
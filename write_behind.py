@@ -0,0 +1,182 @@
+# write_behind.py - 批次背景寫入佇列
+
+"""
+Write-behind 佇列：把多個請求的寫入合併為批次交易
+
+- 背景執行緒在 max_delay 內收集最多 max_batch 筆，一次交給 flush_fn 寫入
+- 批次失敗時逐筆重試，仍失敗則寫入 spill 檔（JSON Lines），下次啟動時重播
+- close() 會把佇列中剩下的資料同步寫完，供 atexit / gunicorn worker_exit 使用
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+from app_logging import get_logger
+
+logger = get_logger("write_behind")
+
+
+_SENTINEL = object()
+
+
+class WriteBehindQueue:
+    """批次背景寫入佇列"""
+
+    def __init__(self, flush_fn, max_batch: int = 50, max_delay: float = 0.05,
+                 spill_path: str = None, name: str = "write-behind"):
+        """
+        Args:
+            flush_fn: 接收 list 的寫入函數，失敗時應拋出例外
+            max_batch: 單一批次最多筆數
+            max_delay: 收集批次的最長等待秒數
+            spill_path: 寫入失敗時的備份檔路徑（None 表示不備份）
+            name: 背景執行緒名稱（用於日誌）
+        """
+        self.flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.spill_path = spill_path
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.stats = {"submitted": 0, "batches": 0, "written": 0, "spilled": 0}
+
+    # ------------------------------------------------------------------
+    # 公開介面
+    # ------------------------------------------------------------------
+    def submit(self, item):
+        """加入佇列；佇列已關閉時直接同步寫入"""
+        if self._closed:
+            self._write([item])
+            return
+        self._ensure_started()
+        self.stats["submitted"] += 1
+        self._queue.put(item)
+
+    def flush(self):
+        """等待目前佇列中的資料全部寫入"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self, timeout: float = 10.0):
+        """停止背景執行緒並同步寫完剩餘資料（可重複呼叫）"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(_SENTINEL)
+            thread.join(timeout)
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _SENTINEL:
+                leftovers.append(item)
+            self._queue.task_done()
+        if leftovers:
+            self._write(leftovers)
+        logger.info("[%s] ✅ 已關閉，統計: %s", self.name, self.stats)
+
+    def replay_spill(self):
+        """重播上次寫入失敗留下的 spill 檔（多個 worker 只會有一個搶到）"""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return 0
+        claimed = f"{self.spill_path}.{os.getpid()}.replay"
+        try:
+            os.replace(self.spill_path, claimed)
+        except OSError:
+            return 0
+        items = []
+        with open(claimed, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        items.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        for start in range(0, len(items), self.max_batch):
+            self._write(items[start:start + self.max_batch])
+        os.remove(claimed)
+        logger.info("[%s] 🔁 已重播 %s 筆 spill 資料", self.name, len(items))
+        return len(items)
+
+    # ------------------------------------------------------------------
+    # 內部實作
+    # ------------------------------------------------------------------
+    def _ensure_started(self):
+        # 延遲到第一次寫入才啟動執行緒，避免 gunicorn preload fork 前就建立執行緒
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _SENTINEL:
+                self._queue.task_done()
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if nxt is _SENTINEL:
+                    stop = True
+                    self._queue.task_done()
+                    break
+                batch.append(nxt)
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch):
+        try:
+            self.flush_fn(batch)
+            self.stats["batches"] += 1
+            self.stats["written"] += len(batch)
+            return
+        except Exception as e:
+            logger.warning("[%s] ⚠️ 批次寫入失敗（%s 筆），改為逐筆重試: %s", self.name, len(batch), e)
+        for item in batch:
+            try:
+                self.flush_fn([item])
+                self.stats["written"] += 1
+            except Exception as e:
+                logger.error("[%s] ❌ 單筆寫入失敗: %s", self.name, e)
+                self._spill(item)
+
+    def _spill(self, item):
+        self.stats["spilled"] += 1
+        if not self.spill_path:
+            return
+        try:
+            spill_dir = os.path.dirname(self.spill_path)
+            if spill_dir:
+                os.makedirs(spill_dir, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            logger.error("[%s] ❌ 寫入 spill 檔失敗: %s", self.name, e)